@@ -3,7 +3,8 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 from flask_migrate import Migrate
 from config import Config
-import logging
+from app.logging_setup import configure_logging
+from app.http_cache import configure_http_cache
 
 db = SQLAlchemy()
 login_manager = LoginManager()
@@ -14,35 +15,62 @@ def create_app(config_class=Config):
     app = Flask(__name__)
     app.config.from_object(config_class)
     
-    # Настройка логирования
-    logging.basicConfig(
-        level=logging.INFO,
-        format='[%(asctime)s] %(levelname)s in %(module)s: %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
-    )
-    log = logging.getLogger('werkzeug')
-    log.setLevel(logging.WARNING)  # Показывать только предупреждения и ошибки
+    # Настройка асинхронного логирования
+    configure_logging(app)
     
-    # Настройка логгера для game_manager
-    game_logger = logging.getLogger('game_manager')
-    game_logger.setLevel(logging.INFO)
+    # Сжатие ответов и долгое кеширование статических файлов
+    configure_http_cache(app)
+    
+    # Собранные сценарии страниц и спрайт иконок (app.js, icons.svg)
+    from app import assets
+    assets.init_app(app)
     
     db.init_app(app)
     login_manager.init_app(app)
     migrate.init_app(app, db)
     
+    # Кеш пользователей для login_manager.user_loader
+    from app.identity_cache import IdentityCache
+    IdentityCache.get_instance().init_app(app)
+    
     from app.routes import auth, main, game
     app.register_blueprint(auth.bp)
     app.register_blueprint(main.bp)
     app.register_blueprint(game.bp)
     
-    from app.game_manager import GameManager
+    # Правила игры собираются один раз при запуске
+    from app.rules import GameRules
+    GameRules.load(app)
+    
+    # Кеш фрагментов карты главной страницы
+    from app.map_fragment import MapFragmentCache
+    MapFragmentCache.get_instance().init_app(app)
+    
+    # Приложение для воспроизведения журнала ходов создается без игрового цикла
+    if not app.config.get('GAME_AUTOSTART', True):
+        return app
+    
+    from app.games import active_game_ids, start_game
+    from app.models.game import DEFAULT_GAME_ID
+    game_ids = active_game_ids(app)
+    
+    # Вычисления ходов выполняются в пуле процессов, его процессы запускаются
+    # до потоков игровых циклов
+    from app.resolver_pool import ResolverPool
+    ResolverPool.get_instance().init_app(app, games=len(game_ids))
     
-    # Инициализируем GameManager при создании приложения
-    game_manager = GameManager.get_instance()
-    game_manager.start_game(app)
+    # Ходы всех игр сервера обрабатывает общий планировщик
+    from app.game_scheduler import GameScheduler
+    GameScheduler.get_instance().init_app(app)
     
-    # Сохраняем game_manager в конфигурации приложения
-    app.config['GAME_MANAGER'] = game_manager
+    # Для каждой активной игры запускаются журнал ходов, двоичные снимки мира,
+    # игровой цикл и очередь приема действий
+    for game_id in game_ids:
+        game_manager, action_queue = start_game(app, game_id)
+        
+        # Сохраняем объекты первой игры в конфигурации приложения
+        if game_id == DEFAULT_GAME_ID:
+            app.config['GAME_MANAGER'] = game_manager
+            app.config['ACTION_QUEUE'] = action_queue
     
     return app 
\ No newline at end of file
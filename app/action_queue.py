@@ -0,0 +1,384 @@
+from contextlib import contextmanager
+from datetime import datetime
+import json
+import os
+import threading
+import time
+import logging
+from sqlalchemy import insert, update
+from sqlalchemy.exc import DBAPIError, OperationalError, TimeoutError as PoolTimeoutError
+
+from app import db
+from app.models.game import Cell, DEFAULT_GAME_ID
+from app.models.user import Faction
+from app.models.user_action import UserAction
+from app.models.faction_log import FactionLog
+
+# Ресурсы фракции, которые могут изменяться действиями игроков
+RESOURCE_FIELDS = ('gold', 'wood', 'stone', 'ore', 'warriors')
+
+# Результаты одной попытки записи пакета (ActionQueue.flush)
+FLUSH_EMPTY = 'empty'  # записывать нечего
+FLUSH_WRITTEN = 'written'  # пакет записан
+FLUSH_RETRY = 'retry'  # временная ошибка: пакет возвращен в очередь для повтора
+FLUSH_DEAD_LETTER = 'dead_letter'  # пакет не записан и сохранен в файл недоставленных действий
+
+def is_transient_error(error):
+    """Проверяет, может ли запись пройти при повторе (блокировка базы, потеря соединения)"""
+    if isinstance(error, PoolTimeoutError):
+        return True
+    if isinstance(error, DBAPIError) and error.connection_invalidated:
+        return True
+    return isinstance(error, OperationalError)
+
+class ActionQueue:
+    """Очередь приёма действий игроков с групповой записью в базу данных
+
+    Действия проверяются по состоянию в памяти (ресурсы фракций и клетки карты),
+    сразу подтверждаются и складываются в очередь. Фоновый поток раз в
+    FLUSH_INTERVAL секунд записывает накопленные действия, готовые записи
+    журнала фракций и изменения ресурсов одной транзакцией.
+    У каждой игры своя очередь со своим фоновым потоком.
+
+    Подтвержденные действия не теряются при ошибке записи: при временной
+    ошибке пакет возвращается в начало очереди и записывается повторно с
+    растущей паузой (RETRY_LIMIT попыток). Если пакет записать нельзя, действия
+    пакета записываются по одному, а незаписанные сохраняются в файл
+    недоставленных действий (ACTION_QUEUE_DEAD_LETTER_FILE) и только после
+    этого списания откатываются в памяти.
+    """
+    _instances = {}
+    FLUSH_INTERVAL = 0.005  # интервал групповой записи в секундах
+    RETRY_LIMIT = 5  # повторов записи пакета после временных ошибок
+    RETRY_DELAY = 0.05  # пауза перед первым повтором в секундах, дальше удваивается
+    RETRY_MAX_DELAY = 2.0  # наибольшая пауза между повторами в секундах
+
+    def __init__(self, game_id=DEFAULT_GAME_ID):
+        self.game_id = game_id
+        self.app = None
+        self.logger = logging.getLogger('action_queue')
+        self._lock = threading.RLock()  # защищает состояние в памяти и очередь
+        self._flush_lock = threading.Lock()  # не даёт двум записям идти одновременно
+        self._wakeup = threading.Event()
+        self._pending = []  # список троек (поля UserAction, изменения ресурсов по фракциям, поля FactionLog)
+        self._balances = {}  # faction_id -> {ресурс: значение}
+        self._cells = {}  # (x, y) -> {'faction_id': ..., 'building_type': ...}
+        self._faction_names = {}  # faction_id -> название фракции
+        self._writer = None
+        self._running = False
+        self._paused = False  # запись приостановлена на время обработки хода
+        self._retry_attempts = 0  # неудачных попыток записи первого пакета очереди подряд
+        self._retry_at = None  # время (time.monotonic) следующего повтора записи
+        self.dead_letter_path = None
+
+    @classmethod
+    def get_instance(cls, game_id=DEFAULT_GAME_ID):
+        if game_id not in cls._instances:
+            cls._instances[game_id] = ActionQueue(game_id)
+        return cls._instances[game_id]
+
+    def start(self, app=None):
+        """Загружает состояние и запускает фоновую запись"""
+        if app:
+            self.app = app
+
+        if not self.app:
+            self.logger.error("Ошибка: приложение не инициализировано")
+            return
+
+        if self._running:
+            return
+
+        self.FLUSH_INTERVAL = self.app.config.get('ACTION_QUEUE_FLUSH_INTERVAL', self.FLUSH_INTERVAL)
+        self.RETRY_LIMIT = self.app.config.get('ACTION_QUEUE_RETRY_LIMIT', self.RETRY_LIMIT)
+        self.RETRY_DELAY = self.app.config.get('ACTION_QUEUE_RETRY_DELAY', self.RETRY_DELAY)
+        self.dead_letter_path = self._dead_letter_path(self.app)
+        try:
+            self.reload_state()
+        except Exception as e:
+            self.logger.error("Ошибка при загрузке состояния очереди действий: %s", str(e))
+
+        self._running = True
+        self._writer = threading.Thread(target=self._run, name=f'action-queue-writer-{self.game_id}', daemon=True)
+        self._writer.start()
+
+    def stop(self):
+        """Останавливает фоновую запись, предварительно сбросив очередь"""
+        self._running = False
+        self._wakeup.set()
+        self.flush(block=True)
+
+    def _dead_letter_path(self, app):
+        """Путь к файлу недоставленных действий по настройке ACTION_QUEUE_DEAD_LETTER_FILE
+
+        Относительный путь считается от папки instance приложения, у игр,
+        кроме первой, к имени добавляется суффикс _game<id>. Пустое значение
+        отключает файл (незаписанные действия только попадают в лог).
+        """
+        filename = app.config.get('ACTION_QUEUE_DEAD_LETTER_FILE')
+        if not filename:
+            return None
+        if not os.path.isabs(filename):
+            filename = os.path.join(app.instance_path, filename)
+        if self.game_id != DEFAULT_GAME_ID:
+            root, extension = os.path.splitext(filename)
+            filename = f'{root}_game{self.game_id}{extension}'
+        return filename
+
+    def reload_state(self):
+        """Перечитывает ресурсы фракций и клетки игры из базы данных
+
+        Изменения действий, которые ещё лежат в очереди, накладываются поверх
+        прочитанных значений, чтобы не потерять уже подтверждённые списания.
+        """
+        with self._flush_lock:
+            with self.app.app_context():
+                factions = Faction.query.filter_by(game_id=self.game_id).all()
+                cells = Cell.query.filter_by(game_id=self.game_id).all()
+                balances = {
+                    faction.id: {field: getattr(faction, field) or 0 for field in RESOURCE_FIELDS}
+                    for faction in factions
+                }
+                cell_map = {
+                    (cell.x, cell.y): {'faction_id': cell.faction_id, 'building_type': cell.building_type}
+                    for cell in cells
+                }
+                faction_names = {faction.id: faction.name for faction in factions}
+
+            with self._lock:
+                for _, deltas, _ in self._pending:
+                    self._apply_deltas(balances, deltas)
+                self._balances = balances
+                self._cells = cell_map
+                self._faction_names = faction_names
+
+    @contextmanager
+    def intake(self):
+        """Блокирует состояние в памяти на время проверки и постановки действий в очередь"""
+        with self._lock:
+            yield self
+
+    def balance(self, faction_id):
+        """Возвращает текущие ресурсы фракции с учетом уже принятых действий"""
+        with self._lock:
+            balance = self._balances.get(faction_id)
+            return dict(balance) if balance is not None else None
+
+    def faction_name(self, faction_id):
+        """Возвращает название фракции"""
+        return self._faction_names.get(faction_id)
+
+    def cell(self, x, y):
+        """Возвращает состояние клетки по координатам"""
+        return self._cells.get((x, y))
+
+    def is_adjacent(self, x, y, faction_id):
+        """Проверяет, граничит ли клетка с территорией фракции"""
+        for adj_x, adj_y in ((x+1, y), (x-1, y), (x, y+1), (x, y-1)):
+            cell = self._cells.get((adj_x, adj_y))
+            if cell and cell['faction_id'] == faction_id:
+                return True
+        return False
+
+    def enqueue(self, action_fields, deltas, log_fields=None):
+        """Ставит действие в очередь и сразу применяет изменения ресурсов в памяти
+
+        deltas - словарь {faction_id: {ресурс: изменение}}, отрицательные
+        значения означают списание. log_fields - готовая запись журнала
+        фракции, которая сохраняется вместе с действием.
+        """
+        with self._lock:
+            self._apply_deltas(self._balances, deltas)
+            self._pending.append((action_fields, deltas, log_fields))
+        self._wakeup.set()
+
+    def enqueue_many(self, entries):
+        """Ставит в очередь несколько действий сразу
+
+        Все действия попадают в один пакет записи и сохраняются одним коммитом.
+        entries - список троек (поля UserAction, изменения ресурсов, поля FactionLog).
+        """
+        with self._lock:
+            for action_fields, deltas, log_fields in entries:
+                self._apply_deltas(self._balances, deltas)
+                self._pending.append((action_fields, deltas, log_fields))
+        self._wakeup.set()
+
+    def fence(self, advance_turn):
+        """Фиксирует набор действий хода перед его обработкой
+
+        advance_turn вызывается под блокировкой приема: после этого новые
+        действия получают номер следующего хода. Все ранее принятые действия
+        записываются в базу данных, а фоновая запись приостанавливается, чтобы
+        списания нового хода не пересекались с изменениями обработки хода.
+        Прием действий при этом не блокируется. Возвращает результат advance_turn.
+        """
+        with self._lock:
+            result = advance_turn()
+            self._paused = True
+        # Ход обрабатывается только после записи всех его действий (или их сохранения в файл)
+        self.flush(block=True)
+        return result
+
+    def resume(self):
+        """Возобновляет фоновую запись после обработки хода
+
+        Состояние в памяти перечитывается из базы данных с учетом действий,
+        принятых во время обработки хода.
+        """
+        try:
+            self.reload_state()
+        finally:
+            with self._lock:
+                self._paused = False
+            self._wakeup.set()
+
+    def flush(self, respect_pause=False, block=False):
+        """Записывает все накопленные действия одной транзакцией
+
+        При временной ошибке пакет возвращается в начало очереди. Без block
+        повтор выполнит фоновый поток после паузы; с block запись повторяется
+        здесь же, пока пакет не будет записан или сохранен в файл
+        недоставленных действий. Возвращает результат последней попытки
+        (FLUSH_EMPTY, FLUSH_WRITTEN, FLUSH_RETRY или FLUSH_DEAD_LETTER).
+        """
+        while True:
+            status = self._flush_once(respect_pause)
+            if status != FLUSH_RETRY or not block:
+                return status
+            time.sleep(max(0.0, self._retry_at - time.monotonic()))
+
+    def _flush_once(self, respect_pause):
+        """Одна попытка записи накопленных действий"""
+        with self._flush_lock:
+            with self._lock:
+                if respect_pause and self._paused:
+                    return FLUSH_EMPTY
+                batch, self._pending = self._pending, []
+
+            if not batch:
+                return FLUSH_EMPTY
+
+            try:
+                self._write(batch)
+            except Exception as e:
+                if is_transient_error(e) and self._retry_attempts < self.RETRY_LIMIT:
+                    self._retry_attempts += 1
+                    delay = min(self.RETRY_DELAY * 2 ** (self._retry_attempts - 1), self.RETRY_MAX_DELAY)
+                    self.logger.warning("Ошибка при записи пакета из %s действий, повтор %s через %.2f с: %s",
+                                        len(batch), self._retry_attempts, delay, str(e))
+                    with self._lock:
+                        # Действия, принятые за время записи, идут после возвращенного пакета
+                        self._pending = batch + self._pending
+                    self._retry_at = time.monotonic() + delay
+                    return FLUSH_RETRY
+                self.logger.error("Ошибка при записи пакета из %s действий: %s", len(batch), str(e))
+                failed = self._write_each(batch, e)
+                status = FLUSH_DEAD_LETTER if failed else FLUSH_WRITTEN
+            else:
+                failed = []
+                status = FLUSH_WRITTEN
+            self._retry_attempts = 0
+            self._retry_at = None
+            if failed:
+                self._save_dead_letters(failed)
+
+        if failed:
+            # Откатываем списания незаписанных действий в памяти, чтобы состояние совпадало с базой данных
+            self.reload_state()
+        return status
+
+    def _write(self, batch):
+        """Записывает действия, записи журнала фракций и изменения ресурсов пакета одной транзакцией"""
+        totals = {}
+        self._apply_deltas(totals, *(deltas for _, deltas, _ in batch))
+        log_rows = [log_fields for _, _, log_fields in batch if log_fields]
+
+        with self.app.app_context():
+            try:
+                db.session.execute(insert(UserAction), [fields for fields, _, _ in batch])
+                if log_rows:
+                    db.session.execute(insert(FactionLog), log_rows)
+                for faction_id, changes in totals.items():
+                    values = {
+                        getattr(Faction, field): getattr(Faction, field) + amount
+                        for field, amount in changes.items() if amount
+                    }
+                    if values:
+                        db.session.execute(update(Faction).where(Faction.id == faction_id).values(values))
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+
+    def _write_each(self, batch, error):
+        """Записывает действия пакета по одному, возвращает пары (действие, ошибка) незаписанных
+
+        Так ошибка в одном действии (error - ошибка записи всего пакета) не
+        отменяет остальные действия пакета.
+        """
+        if len(batch) == 1:
+            return [(batch[0], str(error))]
+        failed = []
+        for entry in batch:
+            try:
+                self._write([entry])
+            except Exception as e:
+                failed.append((entry, str(e)))
+        return failed
+
+    def _save_dead_letters(self, failed):
+        """Сохраняет незаписанные действия в файл недоставленных действий (JSON lines)
+
+        Каждая строка - поля UserAction, изменения ресурсов, запись журнала
+        фракции и ошибка: по ним действие можно восстановить вручную.
+        """
+        self.logger.error("Не записано действий: %s (игра %s), они сохраняются в %s",
+                          len(failed), self.game_id, self.dead_letter_path or 'лог')
+        lines = [
+            json.dumps({
+                'game_id': self.game_id,
+                'failed_at': datetime.utcnow().isoformat(),
+                'error': error,
+                'action': action_fields,
+                'deltas': {str(faction_id): changes for faction_id, changes in deltas.items()},
+                'log': log_fields
+            }, ensure_ascii=False, default=str, sort_keys=True)
+            for (action_fields, deltas, log_fields), error in failed
+        ]
+        if self.dead_letter_path is None:
+            for line in lines:
+                self.logger.error("Недоставленное действие: %s", line)
+            return
+        try:
+            os.makedirs(os.path.dirname(self.dead_letter_path), exist_ok=True)
+            with open(self.dead_letter_path, 'a', encoding='utf-8') as dead_letter_file:
+                dead_letter_file.write(''.join(line + '\n' for line in lines))
+                dead_letter_file.flush()
+                os.fsync(dead_letter_file.fileno())
+        except OSError as e:
+            self.logger.error("Ошибка при записи файла недоставленных действий: %s", str(e))
+            for line in lines:
+                self.logger.error("Недоставленное действие: %s", line)
+
+    def _run(self):
+        """Цикл фоновой записи"""
+        while self._running:
+            if self._retry_at is None or self._paused:
+                self._wakeup.wait()
+                # Даем очереди накопиться, чтобы записать несколько действий одним коммитом
+                time.sleep(self.FLUSH_INTERVAL)
+            else:
+                # Повтор после временной ошибки - не раньше назначенного времени
+                time.sleep(max(0.0, self._retry_at - time.monotonic()))
+            self._wakeup.clear()
+            self.flush(respect_pause=True)
+
+    @staticmethod
+    def _apply_deltas(balances, *deltas_list):
+        """Складывает изменения ресурсов в словарь балансов фракций"""
+        for deltas in deltas_list:
+            for faction_id, changes in deltas.items():
+                balance = balances.setdefault(faction_id, {field: 0 for field in RESOURCE_FIELDS})
+                for field, amount in changes.items():
+                    balance[field] = balance.get(field, 0) + amount
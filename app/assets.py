@@ -0,0 +1,168 @@
+import hashlib
+import json
+import os
+import re
+import tempfile
+
+from flask import current_app, url_for, abort
+
+try:
+    import rjsmin
+except ImportError:  # сжатие сценариев при сборке необязательно (пакет rjsmin)
+    rjsmin = None
+
+from app.http_cache import shared_body
+from app.map_image import ASSETS_DIR, icon_sprite
+
+# Сценарии страниц, собираемые в общий файл app.js (каждый запускается только на своей странице)
+BUNDLE_SOURCES = ('js/src/game.js', 'js/src/spectator.js')
+
+# Собранные файлы и их список (manifest.json) лежат в static/dist,
+# имена файлов содержат хеш содержимого
+DIST_DIR = 'dist'
+MANIFEST_FILE = 'manifest.json'
+DIST_FILE_PATTERN = re.compile(r'^(app\.[0-9a-f]+(\.min)?\.js|icons\.[0-9a-f]+\.svg)$')
+
+# Меняется при изменении способа сборки, чтобы старые файлы пересобрались
+BUILD_VERSION = 3
+
+# Собранные файлы с хешем содержимого в имени не меняются: кешируются на год
+ASSET_MAX_AGE = 365 * 24 * 3600
+
+def _source_hash(static_folder):
+    """Хеш исходных файлов сборки: сценариев и иконок"""
+    digest = hashlib.sha1(str(BUILD_VERSION).encode('ascii'))
+    paths = [os.path.join(static_folder, source) for source in BUNDLE_SOURCES]
+    for root, _, files in sorted(os.walk(ASSETS_DIR)):
+        paths += [os.path.join(root, name) for name in sorted(files)]
+    for path in paths:
+        digest.update(os.path.relpath(path, static_folder).encode('utf-8'))
+        with open(path, 'rb') as source_file:
+            digest.update(source_file.read())
+    return digest.hexdigest()
+
+def bundle_assets(static_folder, minify=False):
+    """Собирает app.js (сценарии страниц подряд) и спрайт иконок icons.svg
+
+    Возвращает {имя: (имя файла с хешем содержимого, содержимое, тип)}.
+    Каждый сценарий - самостоятельная функция, поэтому сценарии просто
+    записываются друг за другом. С minify=True app.js сжимается пакетом
+    rjsmin (app.<хеш>.min.js), если он установлен.
+    """
+    scripts = []
+    for source in BUNDLE_SOURCES:
+        with open(os.path.join(static_folder, source), encoding='utf-8') as source_file:
+            scripts.append(source_file.read().rstrip() + '\n')
+    script = '\n'.join(scripts)
+    script_suffix = '.js'
+    if minify and rjsmin is not None:
+        script = rjsmin.jsmin(script)
+        script_suffix = '.min.js'
+    files = {
+        'app.js': ('app', script_suffix, script, 'text/javascript'),
+        'icons.svg': ('icons', '.svg', icon_sprite(), 'image/svg+xml')
+    }
+    bundle = {}
+    for name, (prefix, suffix, text, mimetype) in files.items():
+        data = text.encode('utf-8')
+        bundle[name] = (f'{prefix}.{hashlib.sha1(data).hexdigest()[:12]}{suffix}', data, mimetype)
+    return bundle
+
+def _write_atomic(path, data):
+    """Записывает файл целиком: читатели видят либо прежний файл, либо новый"""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=f'.{os.path.basename(path)}.')
+    try:
+        with os.fdopen(fd, 'wb') as tmp_file:
+            tmp_file.write(data)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+
+def build_assets(static_folder):
+    """Записывает собранные файлы (см. bundle_assets) в static/dist
+
+    Файлы записываются с хешем содержимого в имени, их имена - в
+    static/dist/manifest.json, app.js сжимается (minify в bundle_assets).
+    Файлы прошлых сборок удаляются.
+    Вызывается скриптом build_assets.py при сборке образа, а не при запуске
+    сервера. Возвращает содержимое manifest.json.
+    """
+    dist_dir = os.path.join(static_folder, DIST_DIR)
+    os.makedirs(dist_dir, exist_ok=True)
+
+    files = {}
+    for name, (filename, data, _) in bundle_assets(static_folder, minify=True).items():
+        path = os.path.join(dist_dir, filename)
+        if not os.path.exists(path):
+            _write_atomic(path, data)
+        files[name] = filename
+    manifest = {
+        'source_hash': _source_hash(static_folder),
+        'files': {name: f'{DIST_DIR}/{filename}' for name, filename in files.items()}
+    }
+    _write_atomic(os.path.join(dist_dir, MANIFEST_FILE),
+                  json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8'))
+
+    for filename in os.listdir(dist_dir):
+        if DIST_FILE_PATTERN.match(filename) and filename not in files.values():
+            try:
+                os.remove(os.path.join(dist_dir, filename))
+            except OSError:
+                pass
+    return manifest
+
+def load_manifest(static_folder):
+    """Возвращает manifest.json сборки, если он соответствует исходным файлам, иначе None"""
+    try:
+        with open(os.path.join(static_folder, DIST_DIR, MANIFEST_FILE), encoding='utf-8') as manifest_file:
+            manifest = json.load(manifest_file)
+    except (OSError, ValueError):
+        return None
+    if manifest.get('source_hash') != _source_hash(static_folder):
+        return None
+    if not all(os.path.exists(os.path.join(static_folder, path)) for path in manifest['files'].values()):
+        return None
+    return manifest
+
+def asset_url(name):
+    """Адрес собранного файла по его имени в manifest.json ('app.js', 'icons.svg')"""
+    assets = current_app.extensions['assets']
+    if assets['bodies'] is not None:
+        return url_for('assets', filename=assets['files'][name])
+    return url_for('static', filename=assets['files'][name])
+
+def serve_asset(filename):
+    """Отдает файл, собранный в памяти при запуске (если сборки в static/dist нет)"""
+    body = current_app.extensions['assets']['bodies'].get(filename)
+    if body is None:
+        abort(404)
+    data, mimetype = body
+    response = current_app.response_class(data, mimetype=mimetype)
+    response.cache_control.public = True
+    response.cache_control.max_age = ASSET_MAX_AGE
+    response.cache_control.immutable = True
+    return shared_body(response)
+
+def init_app(app):
+    """Подключает собранные файлы к приложению
+
+    Файлы собираются заранее скриптом build_assets.py. Если сборки нет или
+    исходные файлы изменились, файлы собираются в памяти и отдаются по адресу
+    /assets/<файл>: сервер ничего не записывает в свою папку, поэтому работает
+    и из образа только для чтения. В шаблонах доступна функция asset_url.
+    """
+    manifest = load_manifest(app.static_folder)
+    if manifest is not None:
+        app.extensions['assets'] = {'files': manifest['files'], 'bodies': None}
+    else:
+        app.logger.warning("Сборка %s отсутствует или устарела, файлы собраны в памяти (см. build_assets.py)",
+                           os.path.join(app.static_folder, DIST_DIR))
+        bundle = bundle_assets(app.static_folder)
+        app.extensions['assets'] = {
+            'files': {name: filename for name, (filename, _, _) in bundle.items()},
+            'bodies': {filename: (data, mimetype) for filename, data, mimetype in bundle.values()}
+        }
+        app.add_url_rule('/assets/<filename>', 'assets', serve_asset)
+    app.add_template_global(asset_url)
@@ -3,34 +3,66 @@ import threading
 import time
 import logging
 import random
-from sqlalchemy import func
+import numpy as np
+from sqlalchemy import insert, update, delete, select, and_, or_, func
 
 from app import db
-from app.models.game import Cell, Building, BuildingType
+from app.models.game import Game, Cell, Building, BuildingType, DEFAULT_GAME_ID
 from app.models.user import User, Faction
-from app.models.user_action import UserAction, ActionType
-from app.models.faction_log import FactionLog
+from app.models.user_action import UserAction
+from app.models.faction_log import FactionLog, SYSTEM_USERNAME, SYSTEM_ACTION_TYPE
+from app.action_queue import ActionQueue, RESOURCE_FIELDS
+from app.world_snapshot import WorldSnapshot
+from app.turn_journal import TurnJournal
+from app.snapshot_store import SnapshotStore, FACTION_FIELDS
+from app.map_image import MapImageStore
+from app.rules import GameRules
+from app.game_scheduler import GameScheduler
+from app.resolver import WorldState, CellState, FactionState, TurnAction
+from app.resolver_pool import ResolverPool
+from app.resolver import combat, events
 
 class GameManager:
-    _instance = None
+    """Игровой цикл одной игры
+
+    У каждой игры свой экземпляр со своим счетчиком ходов и снимком мира.
+    Ходы всех игр планирует общий GameScheduler.
+    """
+    _instances = {}
     TURN_DURATION = 60  # длительность хода в секундах
     
-    def __init__(self):
+    def __init__(self, game_id=DEFAULT_GAME_ID):
+        self.game_id = game_id
         self.turn_start_time = None
         self.turn_timer = None
         self.is_running = False
         self.app = None
-        self.current_turn = 0
+        self.current_turn = 0  # ход, к которому относятся новые действия игроков
+        self.resolving_turn = None  # ход, который сейчас обрабатывается
         self.next_turn_time = None  # время следующего хода
+        self.snapshot = None  # снимок мира после последнего завершенного хода
+        self._faction_log_buffer = []  # записи журнала фракций, накопленные за обработку хода
+        self.rng = random.Random()  # генератор случайных чисел обрабатываемого хода
+        self._turn_lock = threading.RLock()  # не дает обработке хода и откату мира идти одновременно
+        self._turn_generation = 0  # меняется при откате мира, чтобы отменить уже сработавший таймер хода
         self.logger = logging.getLogger('game_manager')
     
     @classmethod
-    def get_instance(cls):
-        if cls._instance is None:
-            # Используем обычный print, так как экземпляр еще не создан и логгер недоступен
-            print("[GameManager] Создание нового экземпляра GameManager")
-            cls._instance = GameManager()
-        return cls._instance
+    def get_instance(cls, game_id=DEFAULT_GAME_ID):
+        if game_id not in cls._instances:
+            logging.getLogger('game_manager').info("[GameManager] Создание экземпляра GameManager для игры %s", game_id)
+            cls._instances[game_id] = GameManager(game_id)
+        return cls._instances[game_id]
+    
+    @classmethod
+    def find(cls, game_id):
+        """Возвращает экземпляр уже запущенной на сервере игры или None"""
+        return cls._instances.get(game_id)
+    
+    @classmethod
+    def game_ids(cls):
+        """Возвращает идентификаторы игр, для которых созданы экземпляры"""
+        return sorted(cls._instances)
     
     @property
     def seconds_left(self):
@@ -63,14 +95,22 @@ class GameManager:
             self.turn_timer.cancel()
         
         self.is_running = True
-        self.current_turn = 1
         self.turn_start_time = datetime.utcnow()
         self.next_turn_time = self.turn_start_time + timedelta(seconds=self.TURN_DURATION)
         
-        with self.app.app_context():
-            self._initialize_faction_resources()
+        # Продолжаем игру с последнего обработанного хода, если игра уже идет
+        if not self._resume_from_store():
+            self.current_turn = 1
+            
+            with self.app.app_context():
+                self._initialize_faction_resources()
+                self._save_turn(1)
+                db.session.commit()
+            
+            self.publish_snapshot()
+            self._store_snapshot()
         
-        self.logger.info("Игра запущена")
+        self.logger.info("Игра %s запущена, текущий ход %s", self.game_id, self.current_turn)
         
         # Запускаем первый ход
         self._schedule_next_turn()
@@ -80,7 +120,7 @@ class GameManager:
         self.is_running = False
         if self.turn_timer:
             self.turn_timer.cancel()
-        self.logger.info("Игра остановлена")
+        self.logger.info("Игра %s остановлена", self.game_id)
     
     def _schedule_next_turn(self):
         """Планирует следующий ход"""
@@ -92,695 +132,550 @@ class GameManager:
             self.turn_timer.cancel()
             self.turn_timer = None
         
-        # Планируем следующий ход
-        self.turn_timer = threading.Timer(self.TURN_DURATION, self._process_turn)
-        self.turn_timer.daemon = True
-        self.turn_timer.start()
+        # Планируем следующий ход в общем планировщике игр
+        self.turn_timer = GameScheduler.get_instance().schedule(
+            self.game_id, self.TURN_DURATION, self._process_turn, args=(self._turn_generation,)
+        )
         
         # Устанавливаем время следующего хода
         self.next_turn_time = datetime.utcnow() + timedelta(seconds=self.TURN_DURATION)
-        self.logger.info(f"Запланирован ход {self.current_turn + 1} на {self.next_turn_time.strftime('%H:%M:%S')}")
+        self.logger.info("Игра %s: запланирован ход %s на %s", self.game_id, self.current_turn + 1, self.next_turn_time.strftime('%H:%M:%S'))
     
-    def _process_turn(self):
+    def _process_turn(self, generation=None):
         """Обработка хода игры"""
-        self.logger.info(f"Обработка хода {self.current_turn}")
-        
-        # Обрабатываем захваты клеток
-        self._process_cell_captures()
-        
-        # Проверяем связность территорий и освобождаем несвязанные клетки
-        self._check_territory_connectivity()
-        
-        # Обрабатываем строительство зданий
-        self._process_buildings()
-        
-        # Обновляем ресурсы фракций
-        self._update_faction_resources()
+        with self._turn_lock:
+            # Таймер, сработавший во время отката мира или после остановки игры, больше не действителен
+            if not self.is_running or (generation is not None and generation != self._turn_generation):
+                return
+            
+            # Переключаем прием действий на следующий ход и фиксируем набор действий текущего.
+            # Игроки продолжают отправлять действия во время обработки, они относятся уже к новому ходу.
+            action_queue = ActionQueue.get_instance(self.game_id)
+            self.resolving_turn = action_queue.fence(self._advance_turn_epoch)
+            self.logger.info("Игра %s: обработка хода %s", self.game_id, self.resolving_turn)
+            
+            try:
+                # Фиксируем входные данные хода в журнале, чтобы ход можно было воспроизвести
+                seed = random.SystemRandom().getrandbits(63)
+                self._journal_turn(seed)
+                
+                self._resolve_turn(seed)
+                
+                # Новые правила игры вступают в силу только между ходами
+                GameRules.reload_if_changed(self.app)
+                
+                # Периодически сохраняем двоичный снимок мира на начало нового хода
+                self._store_snapshot()
+            finally:
+                self.resolving_turn = None
+                self._faction_log_buffer = []
+                # Возобновляем запись действий нового хода поверх результатов обработки
+                action_queue.resume()
+            
+            # Планируем следующий ход
+            self._schedule_next_turn()
+    
+    def _resolve_turn(self, seed):
+        """Выполняет обработку хода self.resolving_turn
         
-        # Увеличиваем номер текущего хода
-        self.current_turn += 1
+        Состояние мира и действия хода загружаются из базы данных, ход
+        обрабатывается чистой функцией app.resolver.resolve_turn в пуле
+        процессов ResolverPool, изменения сохраняются одной транзакцией.
+        Случайные величины берутся из генератора с зерном seed, поэтому при
+        одинаковом состоянии мира и одинаковых действиях результат хода повторяется.
+        """
+        self.rng = random.Random(seed)
+        rules = GameRules.get_instance()
+        result = None
         
-        # Сохраняем изменения в базе данных
         with self.app.app_context():
             try:
+                state, cell_ids = self._load_world_state()
+                result = ResolverPool.get_instance().resolve(self.game_id, rules, state, self._load_turn_actions(), seed)
+                self._log_turn_result(state, result)
+                self._apply_turn_result(state, cell_ids, result)
+                self._save_turn(self.current_turn)
+                
+                # Сохраняем изменения и накопленные записи журнала фракций в базе данных
+                self._flush_faction_logs()
                 db.session.commit()
             except Exception as e:
-                self.logger.error(f"Ошибка при сохранении изменений хода: {str(e)}")
+                self.logger.error("Игра %s: ошибка при обработке хода %s: %s", self.game_id, self.resolving_turn, str(e))
                 db.session.rollback()
+                result = None
         
-        # Планируем следующий ход
-        self._schedule_next_turn()
+        # Публикуем снимок мира с результатами хода для читателей
+        if result is not None:
+            version = self._next_snapshot_version()
+            self.snapshot = WorldSnapshot(version, self.current_turn, result.state.cells, result.state.factions)
+        else:
+            self.publish_snapshot(rng=self.rng)
     
-    def _process_cell_captures(self):
-        """Обрабатывает захваты клеток в конце хода"""
-        with self.app.app_context():
-            try:
-                # Получаем все действия захвата клеток для текущего хода
-                capture_actions = UserAction.query.filter_by(
-                    action_type='capture_cell',
-                    turn=self.current_turn
-                ).all()
-                
-                # Получаем все действия защиты клеток для текущего хода
-                defend_actions = UserAction.query.filter_by(
-                    action_type='defend_cell',
-                    turn=self.current_turn
-                ).all()
-                
-                # Группируем действия защиты по координатам клеток
-                cell_defenses = {}
-                for action in defend_actions:
-                    key = (action.target_x, action.target_y)
-                    if key not in cell_defenses:
-                        cell_defenses[key] = []
-                    cell_defenses[key].append(action)
-                
-                # Группируем действия по координатам клеток
-                cell_captures = {}
-                for action in capture_actions:
-                    key = (action.target_x, action.target_y)
-                    if key not in cell_captures:
-                        cell_captures[key] = []
-                    cell_captures[key].append(action)
+    def _load_world_state(self):
+        """Загружает состояние мира игры из базы данных (требует контекст приложения)
+        
+        Возвращает (WorldState, словарь идентификаторов клеток по координатам).
+        """
+        cell_ids = {}
+        cells = []
+        for row in db.session.execute(
+            select(Cell.id, Cell.x, Cell.y, Cell.faction_id, Cell.building_type, Cell.neutral_defenders,
+                   Building.type, Building.level)
+            .outerjoin(Building, Building.cell_id == Cell.id)
+            .where(Cell.game_id == self.game_id)
+        ):
+            cell_ids[(row.x, row.y)] = row.id
+            cells.append(CellState(
+                x=row.x,
+                y=row.y,
+                faction_id=row.faction_id,
+                building_type=row.building_type,
+                building=row.type.name if row.type else None,
+                building_level=row.level if row.type else None,
+                neutral_defenders=row.neutral_defenders
+            ))
+        factions = [
+            FactionState(
+                id=faction.id,
+                name=faction.name,
+                short_name=faction.name.replace("-Квантум", "").replace(" Квантум", ""),
+                color=faction.color,
+                **{field: getattr(faction, field) for field in FACTION_FIELDS}
+            )
+            for faction in Faction.query.filter_by(game_id=self.game_id).order_by(Faction.id).all()
+        ]
+        return WorldState(cells, factions), cell_ids
+    
+    def _load_turn_actions(self):
+        """Загружает действия обрабатываемого хода в порядке их записи"""
+        return tuple(
+            TurnAction(
+                id=row.id,
+                faction_id=row.faction_id,
+                action_type=row.action_type,
+                x=row.target_x,
+                y=row.target_y,
+                building_type=row.building_type,
+                warriors=row.warriors
+            )
+            for row in db.session.execute(
+                select(UserAction.id, User.faction_id, UserAction.action_type, UserAction.target_x,
+                       UserAction.target_y, UserAction.building_type, UserAction.warriors)
+                .join(User, User.id == UserAction.user_id)
+                .where(UserAction.game_id == self.game_id, UserAction.turn == self.resolving_turn)
+                .order_by(UserAction.id)
+            )
+        )
+    
+    def _apply_turn_result(self, state, cell_ids, result):
+        """Сохраняет в базе данных изменения состояния мира и события хода"""
+        cell_updates = []
+        new_buildings = []
+        for old_cell, cell in zip(state.cells, result.state.cells):
+            if cell == old_cell:
+                continue
+            cell_id = cell_ids[(cell.x, cell.y)]
+            cell_updates.append({
+                'id': cell_id,
+                'faction_id': cell.faction_id,
+                'building_type': cell.building_type,
+                'neutral_defenders': cell.neutral_defenders
+            })
+            if cell.building and not old_cell.building:
+                new_buildings.append({'cell_id': cell_id, 'type': BuildingType[cell.building], 'level': cell.building_level or 1})
+        if cell_updates:
+            db.session.execute(update(Cell), cell_updates)
+        if new_buildings:
+            db.session.execute(insert(Building), new_buildings)
+        
+        faction_updates = [
+            dict({field: getattr(faction, field) for field in FACTION_FIELDS}, id=faction.id)
+            for old_faction, faction in zip(state.factions, result.state.factions)
+            if faction != old_faction
+        ]
+        if faction_updates:
+            db.session.execute(update(Faction), faction_updates)
+        
+        # Распущенные из-за нехватки золота воины уменьшают отряды действий, опустевшие действия удаляются
+        dismissed_actions = []
+        for event in result.events:
+            if event.kind == events.WARRIORS_DISMISSED:
+                db.session.execute(
+                    update(UserAction).where(UserAction.id == event.action_id)
+                    .values(warriors=UserAction.warriors - event.amount)
+                )
+                dismissed_actions.append(event.action_id)
+            elif event.kind == events.GOLD_SHORTAGE:
+                self._log_faction(event.faction_id, event.message)
+        if dismissed_actions:
+            db.session.execute(
+                delete(UserAction).where(UserAction.id.in_(dismissed_actions), UserAction.warriors <= 0)
+            )
+    
+    def _log_turn_result(self, state, result):
+        """Пишет в журнал сервера итоги обработки хода"""
+        for event in result.events:
+            if event.kind == events.BUILD_REJECTED:
+                self.logger.warning(event.message)
+            else:
+                self.logger.info(event.message)
+        
+        outcome = result.combat
+        if outcome is not None:
+            counts = np.bincount(outcome.outcomes, minlength=len(combat.OUTCOME_NAMES))
+            self.logger.info(
+                "Бои за %s клеток: захвачено %s, неудачных захватов %s, освобождено %s, ничьих %s, возвратов %s, попыток захвата замка %s",
+                len(outcome.cells), *(int(count) for count in counts)
+            )
+            if self.logger.isEnabledFor(logging.DEBUG):
+                for slot, index in enumerate(outcome.cells):
+                    cell = state.cells[index]
+                    winner = int(outcome.winners[slot])
+                    self.logger.debug(
+                        "Клетка (%s, %s): %s, фракция %s, сила %s против %s, требовалось превысить %s, возвращено %s воинов",
+                        cell.x, cell.y, combat.OUTCOME_NAMES[outcome.outcomes[slot]],
+                        state.factions[winner].id if winner >= 0 else None, int(outcome.strengths[slot]),
+                        int(outcome.second_strengths[slot]), int(outcome.required[slot]), int(outcome.refunds[slot])
+                    )
+        
+        economy_result = result.economy
+        for index, (old, faction) in enumerate(zip(state.factions, result.state.factions)):
+            # Краткий итог по фракции (воины до обработки хода, включая возвращенных после боев)
+            self.logger.info(
+                "Ресурсы фракции %s: золото %s -> %s, дерево %s -> %s, камень %s -> %s, руда %s -> %s, воины %s -> %s",
+                faction.name, old.gold, faction.gold, old.wood, faction.wood, old.stone, faction.stone,
+                old.ore, faction.ore, old.warriors, faction.warriors
+            )
+            
+            # Подробности расчета пишем только при включенном уровне DEBUG
+            if self.logger.isEnabledFor(logging.DEBUG):
+                self.logger.debug("[GameManager] Фракция %s:", faction.name)
+                self.logger.debug("  - Всего территорий: %s", int(economy_result.territories[index]))
+                for resource, title in (('gold', 'Золото'), ('wood', 'Дерево'), ('stone', 'Камень'),
+                                        ('ore', 'Руда'), ('warriors', 'Воины')):
+                    new_value = getattr(faction, resource)
+                    old_value = getattr(old, resource)
+                    self.logger.debug(
+                        "  - %s: %s -> %s (+%s), макс: %s -> %s", title, old_value, new_value,
+                        new_value - old_value, getattr(old, f'max_{resource}'), getattr(faction, f'max_{resource}')
+                    )
+                self.logger.debug("  - Расходы на воинов: %s золота", int(economy_result.upkeep[index]))
                 
-                # Проверяем, какие фракции владеют центральной клеткой (бонус к боевой мощи)
-                factions_with_bonus = set()
-                center_cells = Cell.query.filter_by(x=3, y=3).all()
-                for cell in center_cells:
-                    if cell.faction_id:
-                        factions_with_bonus.add(cell.faction_id)
-                        self.logger.info(f"Фракция {cell.faction_id} имеет бонус +20% к боевой мощи от центральной клетки")
+                # Логируем бонусы от специальных клеток
+                bonus = [int(value) for value in economy_result.resource_bonus[index]]
+                if any(value > 0 for value in bonus):
+                    self.logger.debug("  Бонусы от специальных клеток: Золото +%s, Дерево +%s, Камень +%s, Руда +%s", *bonus)
+    
+    def _journal_turn(self, seed):
+        """Записывает в журнал ходов действия обрабатываемого хода и зерно генератора
+        
+        Вместе с действиями сохраняются изменения ресурсов фракций, сделанные при
+        приеме действий: разница между текущими ресурсами и снимком прошлого хода.
+        """
+        journal = TurnJournal.get_instance(self.game_id)
+        if not journal.enabled:
+            return
+        
+        try:
+            with self.app.app_context():
+                actions = UserAction.query.filter_by(game_id=self.game_id, turn=self.resolving_turn).order_by(UserAction.id).all()
+                factions = Faction.query.filter_by(game_id=self.game_id).order_by(Faction.id).all()
                 
-                # Обрабатываем каждую клетку, на которую претендуют фракции
-                for coords, actions in cell_captures.items():
-                    x, y = coords
-                    
-                    # Получаем клетку
-                    cell = Cell.query.filter_by(x=x, y=y).first()
-                    if not cell:
-                        self.logger.warning(f"Клетка с координатами ({x}, {y}) не найдена")
-                        continue
-                    
-                    # Проверяем, является ли клетка угловой (с замком)
-                    if self.is_corner_cell(x, y) and cell.faction_id:
-                        self.logger.warning(f"Попытка захвата замка фракции {cell.faction_id} на клетке ({x}, {y})")
-                        # Возвращаем воинов всем фракциям, которые пытались захватить замок
-                        for action in actions:
-                            user = action.user
-                            faction = user.faction
-                            if faction:
-                                faction.warriors = min(faction.warriors + action.warriors, faction.max_warriors)
-                                self.logger.info(f"Возвращено {action.warriors} воинов фракции {faction.id} (попытка захвата замка)")
-                        continue
-                    
-                    # Получаем защитников клетки, если они есть
-                    defenders = cell_defenses.get((x, y), [])
-                    total_defenders = 0
-                    
-                    # Если клетка принадлежит фракции и есть защитники
-                    if cell.faction_id and defenders:
-                        # Суммируем всех защитников с учетом бонуса
-                        for action in defenders:
-                            user = action.user
-                            faction_id = user.faction_id
-                            warriors = action.warriors
-                            
-                            # Применяем бонус к боевой мощи, если фракция владеет центральной клеткой
-                            if faction_id in factions_with_bonus:
-                                bonus_warriors = int(warriors * 0.2)
-                                effective_warriors = warriors + bonus_warriors
-                                self.logger.info(f"Фракция {faction_id} получает бонус +{bonus_warriors} к защите клетки ({x}, {y})")
-                                total_defenders += effective_warriors
-                            else:
-                                total_defenders += warriors
-                        
-                        self.logger.info(f"Клетка ({x}, {y}) защищается {total_defenders} воинами фракции {cell.faction_id}")
-                    
-                    # Если на клетку претендует только одна фракция
-                    if len(actions) == 1:
-                        action = actions[0]
-                        user = action.user
-                        faction_id = user.faction_id
-                        warriors_sent = action.warriors
-                        
-                        # Применяем бонус к боевой мощи, если фракция владеет центральной клеткой
-                        effective_warriors = warriors_sent
-                        if faction_id in factions_with_bonus:
-                            bonus_warriors = int(warriors_sent * 0.2)
-                            effective_warriors = warriors_sent + bonus_warriors
-                            self.logger.info(f"Фракция {faction_id} получает бонус +{bonus_warriors} к захвату клетки ({x}, {y})")
-                        
-                        # Получаем фракцию пользователя
-                        faction = Faction.query.get(faction_id)
-                        if not faction:
-                            self.logger.warning(f"Фракция с ID {faction_id} не найдена")
-                            continue
-                        
-                        # Если клетка уже принадлежит этой фракции, просто возвращаем воинов
-                        if cell.faction_id == faction_id:
-                            self.logger.info(f"Клетка ({x}, {y}) уже принадлежит фракции {faction_id}")
-                            # Возвращаем воинов обратно фракции
-                            faction.warriors = min(faction.warriors + warriors_sent, faction.max_warriors)
-                            self.logger.info(f"Возвращено {warriors_sent} воинов фракции {faction_id}")
-                            continue
-                        
-                        # Проверяем, требуются ли дополнительные воины для захвата
-                        additional_warriors_required = self.get_required_warriors_for_capture(cell)
-                        
-                        # Учитываем защитников клетки
-                        if cell.faction_id and total_defenders > 0:
-                            additional_warriors_required += total_defenders
-                        
-                        # Если требуются дополнительные воины и их недостаточно
-                        # Используем effective_warriors для сравнения с требуемым количеством
-                        if additional_warriors_required > 0 and effective_warriors <= additional_warriors_required:
-                            self.logger.info(f"Недостаточно воинов для захвата клетки ({x}, {y}). Требуется минимум {additional_warriors_required + 1} воинов.")
-                            # Все воины погибают
-                            self.logger.info(f"Фракция {faction_id} потеряла {warriors_sent} воинов в попытке захвата клетки ({x}, {y})")
+                intake = {}
+                if self.snapshot is not None:
+                    for faction in factions:
+                        previous = self.snapshot.faction(faction.id)
+                        if previous is None:
                             continue
-                        
-                        # Если клетка пуста или принадлежит другой фракции
-                        old_faction_id = cell.faction_id
-                        
-                        # Захватываем клетку
-                        cell.faction_id = faction_id
-                        db.session.add(cell)
-                        
-                        # Рассчитываем, сколько воинов вернется
-                        remaining_warriors = max(0, warriors_sent - additional_warriors_required)
-                        
-                        # Возвращаем оставшихся воинов обратно фракции
-                        faction.warriors = min(faction.warriors + remaining_warriors, faction.max_warriors)
-                        
-                        if old_faction_id:
-                            self.logger.info(f"Фракция {faction_id} захватила клетку ({x}, {y}) у фракции {old_faction_id}")
-                        else:
-                            self.logger.info(f"Фракция {faction_id} захватила пустую клетку ({x}, {y})")
-                        
-                        lost_warriors = warriors_sent - remaining_warriors
-                        self.logger.info(f"Отправлено {warriors_sent} воинов, потеряно {lost_warriors}, возвращено {remaining_warriors} воинов фракции {faction_id}")
-                    
-                    # Если на клетку претендуют несколько фракций
-                    else:
-                        # Группируем действия по фракциям и суммируем воинов с учетом бонуса
-                        faction_warriors = {}
-                        for action in actions:
-                            user = action.user
-                            faction_id = user.faction_id
-                            warriors = action.warriors
-                            
-                            if faction_id not in faction_warriors:
-                                faction_warriors[faction_id] = 0
-                            
-                            # Применяем бонус к боевой мощи, если фракция владеет центральной клеткой
-                            if faction_id in factions_with_bonus:
-                                bonus_warriors = int(warriors * 0.2)
-                                effective_warriors = warriors + bonus_warriors
-                                self.logger.info(f"Фракция {faction_id} получает бонус +{bonus_warriors} к захвату клетки ({x}, {y})")
-                                faction_warriors[faction_id] += effective_warriors
-                            else:
-                                faction_warriors[faction_id] += warriors
-                        
-                        # Проверяем, требуются ли дополнительные воины для захвата
-                        additional_warriors_required = self.get_required_warriors_for_capture(cell)
-                        
-                        # Учитываем защитников клетки
-                        if cell.faction_id and total_defenders > 0:
-                            additional_warriors_required += total_defenders
-                            
-                        if additional_warriors_required > 0:
-                            self.logger.info(f"Для захвата клетки ({x}, {y}) требуется на {additional_warriors_required} воинов больше")
-                        
-                        # Сортируем фракции по количеству воинов (по убыванию)
-                        sorted_factions = sorted(faction_warriors.items(), key=lambda x: x[1], reverse=True)
-                        
-                        # Проверяем, есть ли ничья между фракциями с наибольшим количеством воинов
-                        if len(sorted_factions) >= 2 and sorted_factions[0][1] == sorted_factions[1][1]:
-                            # Ничья - территория остается нейтральной, все воины погибают
-                            self.logger.info(f"Ничья в битве за клетку ({x}, {y}). Территория остается нейтральной.")
-                            
-                            # Если клетка принадлежала какой-то фракции, освобождаем её
-                            if cell.faction_id:
-                                old_faction_id = cell.faction_id
-                                cell.faction_id = None
-                                db.session.add(cell)
-                                self.logger.info(f"Клетка ({x}, {y}) освобождена от фракции {old_faction_id}")
-                            
-                            # Логируем потери всех фракций
-                            for faction_id, warriors in faction_warriors.items():
-                                self.logger.info(f"Фракция {faction_id} потеряла {warriors} воинов в битве за клетку ({x}, {y})")
-                        
-                        else:
-                            # Есть победитель
-                            winning_faction_id, max_warriors = sorted_factions[0]
-                            
-                            # Проверяем, достаточно ли воинов для захвата с учетом дополнительных требований
-                            if max_warriors <= additional_warriors_required:
-                                self.logger.info(f"Недостаточно воинов для захвата клетки ({x}, {y}). Требуется минимум {additional_warriors_required + 1} воинов.")
-                                
-                                # Территория остается нейтральной, все воины погибают
-                                if cell.faction_id:
-                                    old_faction_id = cell.faction_id
-                                    cell.faction_id = None
-                                    db.session.add(cell)
-                                    self.logger.info(f"Клетка ({x}, {y}) освобождена от фракции {old_faction_id}")
-                                
-                                # Логируем потери всех фракций
-                                for faction_id, warriors in faction_warriors.items():
-                                    self.logger.info(f"Фракция {faction_id} потеряла {warriors} воинов в битве за клетку ({x}, {y})")
-                                
-                                continue
-                            
-                            # Получаем фракцию победителя
-                            winning_faction = Faction.query.get(winning_faction_id)
-                            if not winning_faction:
-                                self.logger.warning(f"Фракция с ID {winning_faction_id} не найдена")
-                                continue
-                            
-                            # Рассчитываем оставшихся воинов
-                            # Если есть вторая по силе фракция, то остаются воины, равные разнице
-                            # между воинами победителя и второй фракции
-                            remaining_warriors = 0
-                            if len(sorted_factions) >= 2:
-                                second_faction_warriors = sorted_factions[1][1]
-                                remaining_warriors = max(0, max_warriors - second_faction_warriors)
-                            else:
-                                # Если нет второй фракции, то остаются все воины
-                                remaining_warriors = max_warriors
-                            
-                            # Учитываем дополнительные требования для захвата
-                            remaining_warriors = max(0, remaining_warriors - additional_warriors_required)
-                            
-                            # Захватываем клетку
-                            old_faction_id = cell.faction_id
-                            cell.faction_id = winning_faction_id
-                            db.session.add(cell)
-                            
-                            # Возвращаем оставшихся воинов победившей фракции
-                            if remaining_warriors > 0:
-                                winning_faction.warriors = min(winning_faction.warriors + remaining_warriors, winning_faction.max_warriors)
-                                self.logger.info(f"Возвращено {remaining_warriors} воинов фракции {winning_faction_id}")
-                            
-                            if old_faction_id:
-                                self.logger.info(f"Фракция {winning_faction_id} захватила клетку ({x}, {y}) у фракции {old_faction_id}")
-                            else:
-                                self.logger.info(f"Фракция {winning_faction_id} захватила пустую клетку ({x}, {y})")
-                            
-                            # Логируем потери
-                            lost_warriors = max_warriors - remaining_warriors
-                            self.logger.info(f"Фракция {winning_faction_id} отправила {max_warriors} воинов, потеряла {lost_warriors}, осталось: {remaining_warriors}")
-                            
-                            # Логируем потери других фракций
-                            for faction_id, warriors in faction_warriors.items():
-                                if faction_id != winning_faction_id:
-                                    self.logger.info(f"Фракция {faction_id} потеряла {warriors} воинов в битве за клетку ({x}, {y})")
+                        delta = [(getattr(faction, field) or 0) - (getattr(previous, field) or 0) for field in RESOURCE_FIELDS]
+                        if any(delta):
+                            intake[faction.id] = delta
+                else:
+                    self.logger.warning("Нет снимка прошлого хода, изменения ресурсов хода %s не записаны в журнал", self.resolving_turn)
                 
+                journal.append(self.resolving_turn, seed, GameRules.get_instance().version, intake, actions)
+        except Exception as e:
+            self.logger.error("Ошибка при записи хода %s в журнал: %s", self.resolving_turn, str(e))
+    
+    def replay_turn(self, record):
+        """Воспроизводит ход по записи журнала ходов на текущей базе данных
+        
+        Применяет изменения ресурсов приема действий, сохраняет действия хода
+        и выполняет обработку хода с зерном из журнала.
+        """
+        rules_version = GameRules.get_instance().version
+        if record.rules_version != rules_version:
+            self.logger.warning("Ход %s записан по правилам версии %s, текущая версия %s", record.turn, record.rules_version, rules_version)
+        
+        self.resolving_turn = record.turn
+        self.current_turn = record.turn + 1
+        try:
+            with self.app.app_context():
+                for faction_id, delta in record.intake.items():
+                    values = {
+                        getattr(Faction, field): getattr(Faction, field) + amount
+                        for field, amount in zip(RESOURCE_FIELDS, delta) if amount
+                    }
+                    db.session.execute(update(Faction).where(Faction.id == faction_id).values(values))
+                if record.actions:
+                    db.session.execute(insert(UserAction), [
+                        dict(action, turn=record.turn, game_id=self.game_id) for action in record.actions
+                    ])
                 db.session.commit()
-                self.logger.info("Обработка захватов клеток завершена")
-            except Exception as e:
-                self.logger.error(f"Ошибка при обработке захватов клеток: {str(e)}")
-                db.session.rollback()
+            
+            self._resolve_turn(record.seed)
+        finally:
+            self.resolving_turn = None
+            self._faction_log_buffer = []
     
-    def _process_buildings(self):
-        """Обрабатывает строительство зданий в конце хода"""
+    def _store_snapshot(self):
+        """Сохраняет на диск снимок мира, если для текущего хода подошел срок"""
+        store = SnapshotStore.get_instance(self.game_id)
+        snapshot = self.snapshot
+        if snapshot is None or snapshot.turn != self.current_turn or not store.is_due(snapshot.turn):
+            return
+        try:
+            store.save(snapshot)
+            self.logger.info("Сохранен снимок мира на начало хода %s", snapshot.turn)
+        except Exception as e:
+            self.logger.error("Ошибка при сохранении снимка мира: %s", str(e))
+    
+    def _resume_from_store(self):
+        """Продолжает игру с последнего обработанного хода
+        
+        Ход базы данных (Game.turn) записывается вместе с результатами каждого
+        хода. Если он совпадает с ходом последнего снимка мира, а в журнале
+        после снимка ничего нет, снимок загружается из файла без обращения к
+        базе данных. Если база данных ушла дальше снимка (журнал отключен или
+        запись в него не удалась), снимок строится заново по базе данных.
+        Если база данных отстает от снимка и журнала или ее ход неизвестен, мир
+        восстанавливается по снимку и журналу ходов. Возвращает False, только
+        если игра еще не начиналась.
+        """
+        store = SnapshotStore.get_instance(self.game_id)
+        latest_turn = store.latest_turn()
+        database_turn = self._load_turn()
+        if latest_turn is None and database_turn is None:
+            return False
+        
+        last_journaled = TurnJournal.get_instance(self.game_id).last_turn()
+        turn = max(latest_turn or 1, 1 if last_journaled is None else last_journaled + 1)
+        
+        try:
+            if latest_turn is not None and database_turn is not None and database_turn == latest_turn == turn:
+                self.snapshot = store.load(latest_turn, self._next_snapshot_version())
+                self.current_turn = latest_turn
+                self.logger.info("Игра продолжена по снимку мира хода %s", latest_turn)
+                return True
+            if latest_turn is not None and (database_turn is None or database_turn < turn):
+                self._rollback_world(turn)
+                self.logger.info("Игра продолжена по снимку мира хода %s и журналу ходов", latest_turn)
+                return True
+        except Exception as e:
+            self.logger.error("Не удалось продолжить игру по снимку мира: %s", str(e))
+        
+        # База данных не старше снимка и журнала (или их не удалось прочитать): состояние
+        # мира берется из базы данных, стартовые ресурсы фракций не сбрасываются
+        self._resume_from_database(database_turn or self._last_action_turn() or latest_turn or 1)
+        return True
+    
+    def _resume_from_database(self, turn):
+        """Продолжает игру с хода turn по состоянию мира в базе данных"""
+        self.current_turn = turn
+        with self.app.app_context():
+            self._save_turn(turn)
+            db.session.commit()
+        self.publish_snapshot()
+        self._store_snapshot()
+        self.logger.info("Игра продолжена по базе данных с хода %s", turn)
+    
+    def _load_turn(self):
+        """Возвращает ход базы данных (Game.turn) или None, если он не записан"""
         with self.app.app_context():
+            return db.session.execute(select(Game.turn).where(Game.id == self.game_id)).scalar()
+    
+    def _last_action_turn(self):
+        """Возвращает последний ход с действиями игроков (для базы данных без Game.turn)"""
+        with self.app.app_context():
+            return db.session.execute(
+                select(func.max(UserAction.turn)).where(UserAction.game_id == self.game_id)
+            ).scalar()
+    
+    def _save_turn(self, turn):
+        """Записывает ход базы данных (требует контекст приложения, фиксируется вместе с изменениями мира)"""
+        db.session.execute(update(Game).where(Game.id == self.game_id).values(turn=turn))
+    
+    def rollback(self, turn):
+        """Откатывает игру к началу хода turn (команда администратора)
+        
+        Действия, принятые в текущем ходу, отменяются. Бросает ValueError,
+        если для хода нет снимка мира или записей в журнале ходов.
+        """
+        action_queue = ActionQueue.get_instance(self.game_id)
+        with self._turn_lock:
+            if turn < 1 or turn > self.current_turn:
+                raise ValueError(f"Нельзя откатить игру к ходу {turn}")
+            
+            # Отменяем запланированный ход и приостанавливаем запись действий
+            self._turn_generation += 1
+            if self.turn_timer:
+                self.turn_timer.cancel()
+                self.turn_timer = None
+            action_queue.fence(lambda: self.current_turn)
+            
             try:
-                # Получаем все действия строительства для текущего хода
-                build_actions = UserAction.query.filter_by(
-                    action_type='build',
-                    turn=self.current_turn
-                ).all()
-                
-                self.logger.info(f"Обработка строительства зданий: найдено {len(build_actions)} действий")
-                
-                for action in build_actions:
-                    x = action.target_x
-                    y = action.target_y
-                    building_type = action.building_type
-                    user = action.user
-                    
-                    # Получаем клетку
-                    cell = Cell.query.filter_by(x=x, y=y).first()
-                    if not cell:
-                        self.logger.warning(f"Клетка с координатами ({x}, {y}) не найдена")
-                        continue
-                    
-                    # Проверяем, что клетка принадлежит фракции пользователя
-                    if not cell.faction_id or cell.faction_id != user.faction_id:
-                        self.logger.warning(f"Клетка ({x}, {y}) не принадлежит фракции {user.faction_id}")
-                        continue
-                    
-                    # Проверяем, что на клетке нет здания
-                    if cell.building_type:
-                        self.logger.warning(f"На клетке ({x}, {y}) уже есть здание {cell.building_type}")
-                        continue
-                    
-                    # Строим здание
-                    cell.building_type = building_type
-                    
-                    # Создаем объект здания в базе данных
-                    building_enum = None
-                    try:
-                        building_enum = BuildingType[building_type]
-                    except KeyError:
-                        self.logger.warning(f"Неизвестный тип здания: {building_type}")
-                        continue
-                    
-                    building = Building(type=building_enum, level=1, cell=cell)
-                    db.session.add(building)
-                    
-                    self.logger.info(f"Построено здание {building_type} на клетке ({x}, {y}) для фракции {user.faction_id}")
-                
-                db.session.commit()
-                self.logger.info("Обработка строительства зданий завершена")
-            except Exception as e:
-                self.logger.error(f"Ошибка при обработке строительства зданий: {str(e)}")
-                db.session.rollback()
+                self._rollback_world(turn)
+            finally:
+                action_queue.resume()
+                self.turn_start_time = datetime.utcnow()
+                self._schedule_next_turn()
+            
+            self.logger.info("Игра %s откачена к началу хода %s", self.game_id, turn)
     
-    def _update_faction_resources(self):
-        """Обновляет ресурсы всех фракций"""
+    def _rollback_world(self, turn):
+        """Восстанавливает мир на начало хода turn
+        
+        Берется последний снимок мира не позже turn, затем по журналу ходов
+        заново обрабатываются ходы между снимком и turn. Действия отмененных
+        ходов удаляются, как и системные записи журнала фракций, которые
+        появятся снова при воспроизведении.
+        """
+        store = SnapshotStore.get_instance(self.game_id)
+        base_turn = store.latest_turn(at_most=turn)
+        if base_turn is None:
+            raise ValueError(f"Нет снимка мира для хода {turn} или более раннего")
+        
+        journal = TurnJournal.get_instance(self.game_id)
+        records = journal.records(base_turn, turn - 1) if base_turn < turn else []
+        if [record.turn for record in records] != list(range(base_turn, turn)):
+            raise ValueError(f"В журнале ходов нет всех ходов с {base_turn} по {turn - 1}")
+        
+        version = self._next_snapshot_version()
+        snapshot = store.load(base_turn, version)
+        
         with self.app.app_context():
             try:
-                factions = Faction.query.all()
-                current_turn = self.current_turn  # Используем текущий ход напрямую
-                
-                for faction in factions:
-                    # Получаем всех пользователей фракции
-                    faction_users = User.query.filter_by(faction_id=faction.id).all()
-                    
-                    # Получаем все клетки фракции
-                    faction_cells = Cell.query.filter_by(faction_id=faction.id).all()
-                    territories_count = len(faction_cells)
-                    
-                    # Сохраняем старые значения для логирования
-                    old_gold = faction.gold
-                    old_wood = faction.wood
-                    old_stone = faction.stone
-                    old_ore = faction.ore
-                    old_warriors = faction.warriors
-                    old_max_gold = faction.max_gold
-                    old_max_wood = faction.max_wood
-                    old_max_stone = faction.max_stone
-                    old_max_ore = faction.max_ore
-                    old_max_warriors = faction.max_warriors
-                    
-                    # Устанавливаем базовые максимальные значения ресурсов
-                    faction.max_gold = 100
-                    faction.max_wood = 50
-                    faction.max_stone = 50
-                    faction.max_ore = 50
-                    faction.max_warriors = 10
-                    
-                    # Обновляем максимальные значения ресурсов на основе зданий
-                    total_storage_bonus = 0
-                    total_warrior_capacity = 0
-                    
-                    # Дополнительный доход от зданий
-                    building_income = {
-                        'gold': 0,
-                        'wood': 0,
-                        'stone': 0,
-                        'ore': 0
-                    }
-                    
-                    for cell in faction_cells:
-                        if cell.building_type:
-                            # Добавляем бонус к хранилищу от зданий
-                            storage_bonus = 10  # Базовый бонус к хранилищу
-                            total_storage_bonus += storage_bonus
-                            
-                            # Добавляем вместимость воинов от зданий
-                            warrior_capacity = 5  # Базовая вместимость воинов
-                            total_warrior_capacity += warrior_capacity
-                            
-                            # Добавляем доход от зданий (+3 к соответствующему ресурсу)
-                            if cell.building_type == BuildingType.SAWMILL.value:
-                                building_income['wood'] += 3
-                            elif cell.building_type == BuildingType.QUARRY.value:
-                                building_income['stone'] += 3
-                            elif cell.building_type == BuildingType.MINE.value:
-                                building_income['ore'] += 3
-                    
-                    # Применяем бонусы к максимальным значениям ресурсов
-                    faction.max_gold += total_storage_bonus
-                    faction.max_wood += total_storage_bonus
-                    faction.max_stone += total_storage_bonus
-                    faction.max_ore += total_storage_bonus
-                    faction.max_warriors += total_warrior_capacity
-                    
-                    # Базовый прирост ресурсов
-                    base_income = {
-                        'gold': 1,  # Базовый прирост золота
-                        'wood': 3,
-                        'stone': 3,
-                        'ore': 3
-                    }
-                    
-                    # Обновляем базовые ресурсы с учетом дохода от зданий
-                    faction.wood = min(faction.wood + base_income['wood'] + building_income['wood'], faction.max_wood)
-                    faction.stone = min(faction.stone + base_income['stone'] + building_income['stone'], faction.max_stone)
-                    faction.ore = min(faction.ore + base_income['ore'] + building_income['ore'], faction.max_ore)
-                    
-                    # Обновляем золото: базовый прирост + 1 за каждую территорию + доход от зданий
-                    gold_from_territories = territories_count  # +1 за каждую территорию
-                    
-                    # Проверяем наличие клеток с бонусами к ресурсам
-                    resource_bonus = {
-                        'gold': 0,
-                        'wood': 0,
-                        'stone': 0,
-                        'ore': 0
-                    }
-                    
-                    # Координаты клеток с бонусами к ресурсам
-                    gold_bonus_cell = (1, 3)
-                    wood_bonus_cell = (3, 1)
-                    ore_bonus_cell = (3, 5)
-                    stone_bonus_cell = (5, 3)
-                    warriors_bonus_cell = (3, 3)  # Центральная клетка с бонусом к воинам
-                    
-                    # Проверяем, владеет ли фракция клетками с бонусами
-                    for cell in faction_cells:
-                        if (cell.x, cell.y) == gold_bonus_cell:
-                            # Бонус +30% к общему доходу золота
-                            resource_bonus['gold'] = 0.3 * (base_income['gold'] + gold_from_territories + building_income['gold'])
-                            self.logger.info(f"Фракция {faction.name} получает бонус +30% к золоту от клетки {gold_bonus_cell}")
-                        elif (cell.x, cell.y) == wood_bonus_cell:
-                            # Бонус +30% к общему доходу дерева
-                            resource_bonus['wood'] = 0.3 * (base_income['wood'] + building_income['wood'])
-                            self.logger.info(f"Фракция {faction.name} получает бонус +30% к дереву от клетки {wood_bonus_cell}")
-                        elif (cell.x, cell.y) == ore_bonus_cell:
-                            # Бонус +30% к общему доходу руды
-                            resource_bonus['ore'] = 0.3 * (base_income['ore'] + building_income['ore'])
-                            self.logger.info(f"Фракция {faction.name} получает бонус +30% к руде от клетки {ore_bonus_cell}")
-                        elif (cell.x, cell.y) == stone_bonus_cell:
-                            # Бонус +30% к общему доходу камня
-                            resource_bonus['stone'] = 0.3 * (base_income['stone'] + building_income['stone'])
-                            self.logger.info(f"Фракция {faction.name} получает бонус +30% к камню от клетки {stone_bonus_cell}")
-                        elif (cell.x, cell.y) == warriors_bonus_cell:
-                            # Бонус к боевой мощи при захватах и защитах (логируем, но не меняем максимум воинов)
-                            self.logger.info(f"Фракция {faction.name} получает бонус +30% к боевой мощи от клетки {warriors_bonus_cell}")
-                    
-                    # Округляем бонусы до целых чисел
-                    for resource in resource_bonus:
-                        resource_bonus[resource] = int(resource_bonus[resource])
-                    
-                    # Подсчитываем общее количество воинов, включая отправленных на захват и защиту
-                    total_warriors = faction.warriors
-                    
-                    # Получаем воинов, отправленных на захват и защиту
-                    warriors_sent_to_capture = 0
-                    warriors_sent_to_defend = 0
-                    
-                    for user in faction_users:
-                        # Воины, отправленные на захват
-                        capture_actions = UserAction.query.filter_by(
-                            user_id=user.id,
-                            action_type=ActionType.CAPTURE_CELL.value,
-                            turn=current_turn
-                        ).all()
-                        
-                        for action in capture_actions:
-                            if action.warriors:
-                                warriors_sent_to_capture += action.warriors
-                        
-                        # Воины, отправленные на защиту
-                        defend_actions = UserAction.query.filter_by(
-                            user_id=user.id,
-                            action_type=ActionType.DEFEND_CELL.value,
-                            turn=current_turn
-                        ).all()
-                        
-                        for action in defend_actions:
-                            if action.warriors:
-                                warriors_sent_to_defend += action.warriors
-                    
-                    # Общее количество воинов, включая отправленных
-                    total_warriors += warriors_sent_to_capture + warriors_sent_to_defend
-                    
-                    # Списываем золото за содержание всех воинов (0.5 золота за каждого воина)
-                    gold_for_warriors = total_warriors * 0.5  # Снижена стоимость содержания
-                    
-                    # Округляем стоимость содержания до целого числа
-                    gold_for_warriors = int(gold_for_warriors)
-                    
-                    # Итоговое изменение золота: прирост минус расходы на воинов
-                    gold_change = base_income['gold'] + gold_from_territories + building_income['gold'] + resource_bonus['gold'] - gold_for_warriors
-                    
-                    # Обновляем золото с учетом расходов на воинов
-                    faction.gold = max(0, min(faction.gold + gold_change, faction.max_gold))
-                    
-                    # Если золота не хватает на содержание воинов, уменьшаем их количество
-                    if faction.gold == 0 and gold_change < 0:
-                        # Определяем, сколько воинов нужно распустить
-                        warriors_to_dismiss = abs(gold_change)
-                        self.logger.info(f"Фракция {faction.name} не может содержать {warriors_to_dismiss} воинов из-за нехватки золота")
-                        
-                        # Сначала уменьшаем количество воинов в резерве
-                        if faction.warriors > 0:
-                            dismissed_from_reserve = min(faction.warriors, warriors_to_dismiss)
-                            faction.warriors -= dismissed_from_reserve
-                            warriors_to_dismiss -= dismissed_from_reserve
-                            self.logger.info(f"Фракция {faction.name} распустила {dismissed_from_reserve} воинов из резерва")
-                        
-                        # Если нужно распустить еще воинов, уменьшаем количество воинов, отправленных на защиту
-                        if warriors_to_dismiss > 0 and warriors_sent_to_defend > 0:
-                            # Получаем все действия защиты для этой фракции
-                            defend_actions = []
-                            for user in faction_users:
-                                user_defend_actions = UserAction.query.filter_by(
-                                    user_id=user.id,
-                                    action_type=ActionType.DEFEND_CELL.value,
-                                    turn=current_turn
-                                ).all()
-                                defend_actions.extend(user_defend_actions)
-                            
-                            # Сортируем действия по количеству воинов (сначала с наибольшим количеством)
-                            defend_actions.sort(key=lambda a: a.warriors if a.warriors else 0, reverse=True)
-                            
-                            # Уменьшаем количество воинов в действиях защиты
-                            dismissed_from_defend = 0
-                            for action in defend_actions:
-                                if warriors_to_dismiss <= 0:
-                                    break
-                                
-                                if action.warriors:
-                                    warriors_to_remove = min(action.warriors, warriors_to_dismiss)
-                                    action.warriors -= warriors_to_remove
-                                    warriors_to_dismiss -= warriors_to_remove
-                                    dismissed_from_defend += warriors_to_remove
-                                    
-                                    # Если все воины были удалены, отменяем действие
-                                    if action.warriors <= 0:
-                                        db.session.delete(action)
-                            
-                            if dismissed_from_defend > 0:
-                                self.logger.info(f"Фракция {faction.name} потеряла {dismissed_from_defend} воинов, отправленных на защиту")
-                        
-                        # Если нужно распустить еще воинов, уменьшаем количество воинов, отправленных на захват
-                        if warriors_to_dismiss > 0 and warriors_sent_to_capture > 0:
-                            # Получаем все действия захвата для этой фракции
-                            capture_actions = []
-                            for user in faction_users:
-                                user_capture_actions = UserAction.query.filter_by(
-                                    user_id=user.id,
-                                    action_type=ActionType.CAPTURE_CELL.value,
-                                    turn=current_turn
-                                ).all()
-                                capture_actions.extend(user_capture_actions)
-                            
-                            # Сортируем действия по количеству воинов (сначала с наибольшим количеством)
-                            capture_actions.sort(key=lambda a: a.warriors if a.warriors else 0, reverse=True)
-                            
-                            # Уменьшаем количество воинов в действиях захвата
-                            dismissed_from_capture = 0
-                            for action in capture_actions:
-                                if warriors_to_dismiss <= 0:
-                                    break
-                                
-                                if action.warriors:
-                                    warriors_to_remove = min(action.warriors, warriors_to_dismiss)
-                                    action.warriors -= warriors_to_remove
-                                    warriors_to_dismiss -= warriors_to_remove
-                                    dismissed_from_capture += warriors_to_remove
-                                    
-                                    # Если все воины были удалены, отменяем действие
-                                    if action.warriors <= 0:
-                                        db.session.delete(action)
-                            
-                            if dismissed_from_capture > 0:
-                                self.logger.info(f"Фракция {faction.name} потеряла {dismissed_from_capture} воинов, отправленных на захват")
-                        
-                        # Добавляем запись в лог фракции о потере воинов
-                        log_entry = FactionLog(
-                            faction_id=faction.id,
-                            turn=current_turn,
-                            message=f"Из-за нехватки золота фракция потеряла {abs(gold_change)} воинов",
-                            timestamp=datetime.utcnow()
-                        )
-                        db.session.add(log_entry)
-                    
-                    # Проверяем наличие казармы для получения воинов
-                    has_barracks = False
-                    for cell in faction_cells:
-                        if cell.building and cell.building.type == BuildingType.BARRACKS:
-                            has_barracks = True
-                            break
-                    
-                    # Если есть казарма, добавляем 1 воина за ход
-                    if has_barracks:
-                        faction.warriors = min(faction.warriors + 1, faction.max_warriors)
-                    
-                    # Добавляем ресурсы от зданий
-                    for cell in faction_cells:
-                        if cell.building:
-                            production = cell.building.get_production()
-                            for resource, amount in production.items():
-                                if resource in ['wood', 'stone', 'ore', 'gold']:
-                                    current = getattr(faction, resource)
-                                    maximum = getattr(faction, f'max_{resource}')
-                                    setattr(faction, resource, min(current + amount, maximum))
-                    
-                    # Добавляем бонусы от специальных клеток
-                    faction.wood = min(faction.wood + resource_bonus['wood'], faction.max_wood)
-                    faction.stone = min(faction.stone + resource_bonus['stone'], faction.max_stone)
-                    faction.ore = min(faction.ore + resource_bonus['ore'], faction.max_ore)
-                    
-                    self.logger.info(f"[GameManager] Фракция {faction.name}:")
-                    self.logger.info(f"  - Всего территорий: {territories_count}")
-                    self.logger.info(f"  - Золото: {old_gold} -> {faction.gold} (+{faction.gold - old_gold}), макс: {old_max_gold} -> {faction.max_gold}")
-                    self.logger.info(f"  - Дерево: {old_wood} -> {faction.wood} (+{faction.wood - old_wood}), макс: {old_max_wood} -> {faction.max_wood}")
-                    self.logger.info(f"  - Камень: {old_stone} -> {faction.stone} (+{faction.stone - old_stone}), макс: {old_max_stone} -> {faction.max_stone}")
-                    self.logger.info(f"  - Руда: {old_ore} -> {faction.ore} (+{faction.ore - old_ore}), макс: {old_max_ore} -> {faction.max_ore}")
-                    self.logger.info(f"  - Воины: {old_warriors} -> {faction.warriors} (+{faction.warriors - old_warriors}), макс: {old_max_warriors} -> {faction.max_warriors}")
-                    self.logger.info(f"  - Воины на захвате: {warriors_sent_to_capture}")
-                    self.logger.info(f"  - Воины на защите: {warriors_sent_to_defend}")
-                    self.logger.info(f"  - Общее количество воинов: {total_warriors}")
-                    self.logger.info(f"  - Расходы на воинов: {gold_for_warriors} золота")
-                    
-                    # Логируем изменения ресурсов
-                    self.logger.info(f"Обновление ресурсов для фракции {faction.name}:")
-                    self.logger.info(f"  Золото: {old_gold} -> {faction.gold} (изменение: {faction.gold - old_gold})")
-                    self.logger.info(f"  Дерево: {old_wood} -> {faction.wood} (изменение: {faction.wood - old_wood})")
-                    self.logger.info(f"  Камень: {old_stone} -> {faction.stone} (изменение: {faction.stone - old_stone})")
-                    self.logger.info(f"  Руда: {old_ore} -> {faction.ore} (изменение: {faction.ore - old_ore})")
-                    self.logger.info(f"  Воины: {old_warriors} -> {faction.warriors} (изменение: {faction.warriors - old_warriors})")
-                    
-                    # Логируем доход от зданий
-                    if any(value > 0 for value in building_income.values()):
-                        self.logger.info(f"  Доход от зданий: Золото +{building_income['gold']}, Дерево +{building_income['wood']}, Камень +{building_income['stone']}, Руда +{building_income['ore']}")
-                    
-                    # Логируем бонусы от специальных клеток
-                    if any(value > 0 for value in resource_bonus.values()):
-                        self.logger.info(f"  Бонусы от специальных клеток: Золото +{resource_bonus['gold']}, Дерево +{resource_bonus['wood']}, Камень +{resource_bonus['stone']}, Руда +{resource_bonus['ore']}")
-                    
-                    db.session.add(faction)
-                
+                self._restore_world(snapshot)
+                self._save_turn(base_turn)
+                db.session.execute(delete(UserAction).where(UserAction.game_id == self.game_id, UserAction.turn >= base_turn))
+                db.session.execute(delete(FactionLog).where(FactionLog.game_id == self.game_id, or_(
+                    FactionLog.turn >= turn,
+                    and_(FactionLog.turn >= base_turn, FactionLog.action_type == SYSTEM_ACTION_TYPE)
+                )))
                 db.session.commit()
-                self.logger.info("Ресурсы всех фракций обновлены")
-            except Exception as e:
+            except Exception:
                 db.session.rollback()
-                self.logger.error(f"Ошибка при обновлении ресурсов фракций: {str(e)}")
+                raise
+        
+        self.snapshot = snapshot
+        self.current_turn = base_turn
+        for record in records:
+            self.replay_turn(record)
+        self.current_turn = turn
+        
+        # Ходы после turn будут сыграны заново
+        journal.truncate(turn)
+        store.discard_after(turn)
+    
+    def _restore_world(self, snapshot):
+        """Записывает состояние мира из снимка в базу данных (требует контекст приложения)"""
+        db.session.execute(update(Faction), [
+            dict({field: getattr(faction, field) for field in FACTION_FIELDS}, id=faction.id)
+            for faction in snapshot.factions
+        ])
+        
+        cell_ids = {
+            (x, y): cell_id
+            for cell_id, x, y in db.session.execute(select(Cell.id, Cell.x, Cell.y).where(Cell.game_id == self.game_id))
+        }
+        db.session.execute(update(Cell), [
+            {
+                'id': cell_ids[(cell.x, cell.y)],
+                'faction_id': cell.faction_id,
+                'building_type': cell.building_type,
+                'neutral_defenders': cell.neutral_defenders
+            }
+            for cell in snapshot.cells if (cell.x, cell.y) in cell_ids
+        ])
+        
+        db.session.execute(delete(Building).where(Building.cell_id.in_(cell_ids.values())))
+        buildings = [
+            {'cell_id': cell_ids[(cell.x, cell.y)], 'type': BuildingType[cell.building], 'level': cell.building_level or 1}
+            for cell in snapshot.cells if cell.building and (cell.x, cell.y) in cell_ids
+        ]
+        if buildings:
+            db.session.execute(insert(Building), buildings)
+    
+    def _advance_turn_epoch(self):
+        """Переключает номер хода, к которому относятся новые действия
+        
+        Вызывается очередью действий под блокировкой приема, поэтому ни одно
+        действие не может получить номер уже обрабатываемого хода.
+        Возвращает номер хода, который будет обработан.
+        """
+        resolving_turn = self.current_turn
+        self.current_turn += 1
+        return resolving_turn
+    
+    def _log_faction(self, faction_id, message):
+        """Добавляет системную запись в журнал фракции
+        
+        Записи накапливаются в памяти и сохраняются одной вставкой в конце хода.
+        """
+        self._faction_log_buffer.append({
+            'faction_id': faction_id,
+            'game_id': self.game_id,
+            'turn': self.resolving_turn,
+            'username': SYSTEM_USERNAME,
+            'action_type': SYSTEM_ACTION_TYPE,
+            'message': message,
+            'timestamp': datetime.utcnow()
+        })
+    
+    def _flush_faction_logs(self):
+        """Сохраняет накопленные записи журнала фракций одной вставкой"""
+        if not self._faction_log_buffer:
+            return
+        rows, self._faction_log_buffer = self._faction_log_buffer, []
+        db.session.execute(insert(FactionLog), rows)
+    
+    def publish_snapshot(self, rng=None):
+        """Строит снимок мира по базе данных и атомарно заменяет им текущий
+        
+        Читатели, получившие старый снимок, продолжают работать с ним:
+        снимки неизменяемы, поэтому блокировки не нужны. По новому снимку
+        сразу рисуется изображение карты для зрителей.
+        """
+        try:
+            with self.app.app_context():
+                version = self._next_snapshot_version()
+                self.snapshot = WorldSnapshot.build(version, self.current_turn, rng, self.game_id)
+        except Exception as e:
+            self.logger.error("Ошибка при построении снимка мира: %s", str(e))
+            return self.snapshot
+        try:
+            MapImageStore.get_instance(self.game_id).publish(self.snapshot)
+        except Exception as e:
+            self.logger.error("Ошибка при сохранении изображения карты: %s", str(e))
+        return self.snapshot
+    
+    def _next_snapshot_version(self):
+        """Возвращает версию для нового снимка мира
+        
+        Версия не меньше текущего времени в секундах, поэтому версии растут и
+        между перезапусками сервера: клиент, загрузивший карту до перезапуска,
+        не примет новую карту за уже загруженную (map_version в /api/state,
+        MapDeltas, тайлы карты).
+        """
+        previous = self.snapshot.version if self.snapshot else 0
+        return max(previous + 1, int(time.time()))
+    
+    def get_snapshot(self):
+        """Возвращает снимок мира последнего завершенного хода"""
+        snapshot = self.snapshot
+        if snapshot is None:
+            snapshot = self.publish_snapshot()
+        return snapshot
     
     def get_turn_info(self):
         """Возвращает информацию о текущем ходе"""
@@ -814,11 +709,12 @@ class GameManager:
         }
     
     def _initialize_faction_resources(self):
-        """Инициализирует стартовые ресурсы для всех фракций"""
+        """Инициализирует стартовые ресурсы для всех фракций игры"""
+        rules = GameRules.get_instance()
         try:
             with self.app.app_context():
                 with db.session.begin():
-                    factions = Faction.query.all()
+                    factions = Faction.query.filter_by(game_id=self.game_id).all()
                     
                     for faction in factions:
                         # Сохраняем старые значения для логирования
@@ -828,154 +724,22 @@ class GameManager:
                         old_ore = faction.ore
                         old_warriors = faction.warriors
                         
-                        # Устанавливаем стартовые значения ресурсов
-                        faction.gold = 15  # Начальное золото - 15 единиц
-                        faction.max_gold = 100  # Базовое максимальное значение
-                        
-                        faction.wood = 10  # Начальное дерево - 10 единиц
-                        faction.max_wood = 50
-                        
-                        faction.stone = 10  # Начальный камень - 10 единиц
-                        faction.max_stone = 50
-                        
-                        faction.ore = 10  # Начальная руда - 10 единиц
-                        faction.max_ore = 50
-                        
-                        faction.warriors = 2  # Начальное количество воинов - 2
-                        faction.max_warriors = 20
+                        # Устанавливаем стартовые значения ресурсов и их лимиты
+                        for resource in RESOURCE_FIELDS:
+                            setattr(faction, resource, rules.initial_resources[resource])
+                            setattr(faction, f'max_{resource}', rules.initial_limits[resource])
                         
                         db.session.add(faction)
                         
-                        self.logger.info(f"[GameManager] Инициализация ресурсов фракции {faction.name}:")
-                        self.logger.info(f"  - Золото: {old_gold} -> {faction.gold}")
-                        self.logger.info(f"  - Дерево: {old_wood} -> {faction.wood}")
-                        self.logger.info(f"  - Камень: {old_stone} -> {faction.stone}")
-                        self.logger.info(f"  - Руда: {old_ore} -> {faction.ore}")
-                        self.logger.info(f"  - Воины: {old_warriors} -> {faction.warriors}")
+                        self.logger.debug("[GameManager] Инициализация ресурсов фракции %s:", faction.name)
+                        self.logger.debug("  - Золото: %s -> %s", old_gold, faction.gold)
+                        self.logger.debug("  - Дерево: %s -> %s", old_wood, faction.wood)
+                        self.logger.debug("  - Камень: %s -> %s", old_stone, faction.stone)
+                        self.logger.debug("  - Руда: %s -> %s", old_ore, faction.ore)
+                        self.logger.debug("  - Воины: %s -> %s", old_warriors, faction.warriors)
                     
                     self.logger.info("[GameManager] Стартовые ресурсы фракций установлены")
         except Exception as e:
-            self.logger.error(f"[GameManager] Ошибка при инициализации ресурсов фракций: {str(e)}")
+            self.logger.error("[GameManager] Ошибка при инициализации ресурсов фракций: %s", str(e))
             with self.app.app_context():
                 db.session.rollback()
-    
-    def is_corner_cell(self, x, y):
-        """Проверяет, является ли клетка угловой (с замком)"""
-        corners = [(0, 0), (0, 6), (6, 0), (6, 6)]
-        return (x, y) in corners
-        
-    def is_connected_to_castle(self, faction_id):
-        """Проверяет связность территории фракции с замком
-        
-        Возвращает словарь, где ключи - это координаты клеток (x, y), 
-        а значения - булевы значения, указывающие, связана ли клетка с замком
-        """
-        with self.app.app_context():
-            try:
-                # Получаем все клетки фракции
-                faction_cells = Cell.query.filter_by(faction_id=faction_id).all()
-                
-                # Если нет клеток, возвращаем пустой словарь
-                if not faction_cells:
-                    return {}
-                
-                # Находим замок (угловую клетку)
-                castle_cell = None
-                for cell in faction_cells:
-                    if self.is_corner_cell(cell.x, cell.y):
-                        castle_cell = cell
-                        break
-                
-                # Если замок не найден, считаем, что ни одна клетка не связана
-                if not castle_cell:
-                    return {(cell.x, cell.y): False for cell in faction_cells}
-                
-                # Используем поиск в ширину для определения связности
-                connected = {(cell.x, cell.y): False for cell in faction_cells}
-                connected[(castle_cell.x, castle_cell.y)] = True
-                
-                queue = [(castle_cell.x, castle_cell.y)]
-                visited = set([(castle_cell.x, castle_cell.y)])
-                
-                # Направления для соседних клеток (вверх, вправо, вниз, влево)
-                directions = [(0, 1), (1, 0), (0, -1), (-1, 0)]
-                
-                while queue:
-                    x, y = queue.pop(0)
-                    
-                    # Проверяем соседние клетки
-                    for dx, dy in directions:
-                        nx, ny = x + dx, y + dy
-                        
-                        # Проверяем, что координаты в пределах карты
-                        if nx < 0 or nx > 6 or ny < 0 or ny > 6:
-                            continue
-                        
-                        # Проверяем, что клетка принадлежит этой фракции и еще не посещена
-                        if (nx, ny) in connected and (nx, ny) not in visited:
-                            connected[(nx, ny)] = True
-                            queue.append((nx, ny))
-                            visited.add((nx, ny))
-                
-                return connected
-            except Exception as e:
-                self.logger.error(f"Ошибка при проверке связности территории: {str(e)}")
-                return {}
-    
-    def get_required_warriors_for_capture(self, cell):
-        """Определяет, сколько дополнительных воинов требуется для захвата клетки
-        
-        Если на нейтральной клетке есть постройка, требуется дополнительное количество воинов,
-        которое хранится в поле neutral_defenders
-        """
-        # Если клетка не нейтральная, дополнительные воины не требуются
-        if cell.faction_id is not None:
-            return 0
-            
-        # Если на нейтральной клетке есть постройка, используем сохраненное значение защитников
-        if cell.building_type is not None:
-            # Если значение защитников еще не установлено, генерируем его
-            if cell.neutral_defenders is None:
-                cell.neutral_defenders = random.randint(1, 3)
-                db.session.add(cell)
-                db.session.commit()
-                self.logger.info(f"Установлено {cell.neutral_defenders} защитников для нейтральной клетки ({cell.x}, {cell.y}) с постройкой {cell.building_type}")
-            
-            return cell.neutral_defenders
-            
-        # В остальных случаях дополнительные воины не требуются
-        return 0
-
-    def _check_territory_connectivity(self):
-        """Проверяет связность территорий и освобождает несвязанные клетки"""
-        with self.app.app_context():
-            try:
-                factions = Faction.query.all()
-                
-                for faction in factions:
-                    # Получаем все клетки фракции
-                    faction_cells = Cell.query.filter_by(faction_id=faction.id).all()
-                    
-                    # Проверяем связность территории
-                    connected = self.is_connected_to_castle(faction.id)
-                    
-                    for cell in faction_cells:
-                        # Пропускаем угловые клетки (замки)
-                        if self.is_corner_cell(cell.x, cell.y):
-                            continue
-                            
-                        # Проверяем, связана ли клетка с замком
-                        if (cell.x, cell.y) in connected and connected[(cell.x, cell.y)]:
-                            # Клетка связана с замком
-                            continue
-                        
-                        # Клетка не связана с замком - освобождаем её
-                        self.logger.info(f"Клетка ({cell.x}, {cell.y}) фракции {faction.id} не связана с замком и будет освобождена")
-                        cell.faction_id = None
-                        db.session.add(cell)
-                
-                db.session.commit()
-                self.logger.info("Проверка связности территорий завершена")
-            except Exception as e:
-                self.logger.error(f"Ошибка при проверке связности территорий: {str(e)}")
-                db.session.rollback() 
\ No newline at end of file
@@ -0,0 +1,89 @@
+from concurrent.futures import ThreadPoolExecutor
+import heapq
+import itertools
+import logging
+import threading
+import time
+
+class ScheduledTurn:
+    """Запланированный ход игры, который можно отменить до его начала"""
+    __slots__ = ('game_id', 'due', 'callback', 'args', 'cancelled')
+
+    def __init__(self, game_id, due, callback, args):
+        self.game_id = game_id
+        self.due = due
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+class GameScheduler:
+    """Планировщик ходов всех игр сервера
+
+    Один поток хранит ближайшие ходы всех игр в куче по времени и при
+    наступлении срока передает ход в пул рабочих потоков. Ходы разных игр
+    обрабатываются независимо, поэтому долгий ход большой игры не задерживает
+    маленькие. Одна игра не обрабатывает два хода одновременно: следующий ход
+    планируется только после завершения текущего.
+    """
+    _instance = None
+    WORKERS = 4  # количество потоков обработки ходов
+
+    def __init__(self):
+        self.logger = logging.getLogger('game_manager')
+        self._condition = threading.Condition()
+        self._queue = []  # куча троек (время хода, порядковый номер, ScheduledTurn)
+        self._sequence = itertools.count()
+        self._executor = None
+        self._thread = None
+
+    @classmethod
+    def get_instance(cls):
+        if cls._instance is None:
+            cls._instance = GameScheduler()
+        return cls._instance
+
+    def init_app(self, app):
+        """Задает размер пула обработки ходов по настройке GAME_SCHEDULER_WORKERS"""
+        self.WORKERS = max(1, app.config.get('GAME_SCHEDULER_WORKERS', self.WORKERS))
+
+    def schedule(self, game_id, delay, callback, args=()):
+        """Планирует вызов callback(*args) через delay секунд
+
+        Возвращает ScheduledTurn, метод cancel() которого отменяет ход.
+        """
+        turn = ScheduledTurn(game_id, time.monotonic() + delay, callback, args)
+        with self._condition:
+            self._start()
+            heapq.heappush(self._queue, (turn.due, next(self._sequence), turn))
+            self._condition.notify()
+        return turn
+
+    def _start(self):
+        """Запускает поток планировщика и пул обработки ходов (под блокировкой)"""
+        if self._thread is not None:
+            return
+        self._executor = ThreadPoolExecutor(max_workers=self.WORKERS, thread_name_prefix='game-turn')
+        self._thread = threading.Thread(target=self._run, name='game-scheduler', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        """Цикл планировщика: ждет ближайший ход и передает его в пул"""
+        while True:
+            with self._condition:
+                while not self._queue or self._queue[0][0] > time.monotonic():
+                    timeout = self._queue[0][0] - time.monotonic() if self._queue else None
+                    self._condition.wait(timeout)
+                _, _, turn = heapq.heappop(self._queue)
+            if not turn.cancelled:
+                self._executor.submit(self._execute, turn)
+
+    def _execute(self, turn):
+        if turn.cancelled:
+            return
+        try:
+            turn.callback(*turn.args)
+        except Exception:
+            self.logger.exception("Ошибка при обработке хода игры %s", turn.game_id)
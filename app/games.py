@@ -0,0 +1,81 @@
+import logging
+
+from app import db
+from app.models.game import Game, Cell, Building, BuildingType, DEFAULT_GAME_ID
+from app.models.user import Faction
+from app.rules import GameRules, start_positions
+
+# Фракции новой игры: название и цвет
+DEFAULT_FACTIONS = (
+    ('IT-Квантум', '#FF0000'),
+    ('Design-Квантум', '#00FF00'),
+    ('Robo-Квантум', '#0000FF'),
+    ('Aero-Квантум', '#FFFF00'),
+)
+
+def create_game(name, factions=DEFAULT_FACTIONS, game_id=None):
+    """Создает игру с фракциями, пустой картой и замками в стартовых клетках
+
+    Требует контекст приложения. Возвращает созданный объект Game.
+    """
+    rules = GameRules.get_instance()
+    game = Game(id=game_id, name=name)
+    db.session.add(game)
+    db.session.flush()
+
+    faction_objects = [Faction(game_id=game.id, name=faction_name, color=color) for faction_name, color in factions]
+    db.session.add_all(faction_objects)
+
+    cells = {}
+    for x in range(rules.map_size):
+        for y in range(rules.map_size):
+            cells[(x, y)] = Cell(game_id=game.id, x=x, y=y, faction_id=None)
+    db.session.add_all(cells.values())
+    db.session.flush()
+
+    # Каждая фракция начинает с замком в своем углу карты
+    for faction, position in zip(faction_objects, start_positions(rules.map_size)):
+        cell = cells[position]
+        cell.faction_id = faction.id
+        db.session.add(Building(type=BuildingType.CASTLE, level=1, cell_id=cell.id))
+
+    db.session.commit()
+    return game
+
+def active_game_ids(app):
+    """Возвращает идентификаторы игр, игровой цикл которых запускается при старте сервера
+
+    Если таблицы игр еще нет (база данных создается заново), запускается только
+    первая игра, как до появления нескольких игр.
+    """
+    try:
+        with app.app_context():
+            game_ids = [game_id for (game_id,) in db.session.query(Game.id).filter_by(is_active=True).order_by(Game.id)]
+    except Exception as e:
+        logging.getLogger('game_manager').error("Ошибка при загрузке списка игр: %s", str(e))
+        return [DEFAULT_GAME_ID]
+    return game_ids
+
+def start_game(app, game_id):
+    """Запускает журнал ходов, снимки мира, изображения, тайлы и изменения карты, игровой цикл и очередь действий игры"""
+    from app.turn_journal import TurnJournal
+    from app.snapshot_store import SnapshotStore
+    from app.map_image import MapImageStore
+    from app.map_tiles import MapTiles
+    from app.map_deltas import MapDeltas
+    from app.game_manager import GameManager
+    from app.action_queue import ActionQueue
+
+    TurnJournal.get_instance(game_id).init_app(app)
+    SnapshotStore.get_instance(game_id).init_app(app)
+    MapImageStore.get_instance(game_id).init_app(app)
+    MapTiles.get_instance(game_id).init_app(app)
+    MapDeltas.get_instance(game_id).init_app(app)
+
+    game_manager = GameManager.get_instance(game_id)
+    game_manager.start_game(app)
+
+    # Очередь приема действий с групповой записью в базу данных
+    action_queue = ActionQueue.get_instance(game_id)
+    action_queue.start(app)
+    return game_manager, action_queue
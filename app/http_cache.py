@@ -0,0 +1,167 @@
+from collections import OrderedDict
+import gzip
+import hashlib
+import os
+import threading
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # сжатие brotli необязательно (пакет brotli)
+    brotli = None
+
+# Типы ответов, которые имеет смысл сжимать
+COMPRESSIBLE_MIMETYPES = (
+    'application/json', 'application/javascript', 'text/javascript', 'text/css', 'text/html',
+    'image/svg+xml', 'application/vnd.kvantwars.map-columns+json', 'application/vnd.kvantwars.map'
+)
+
+# Статические файлы по адресу с хешем содержимого не меняются: кешируются на год
+STATIC_MAX_AGE = 365 * 24 * 3600
+
+def compress(data, encoding, level):
+    """Сжимает тело ответа способом encoding (br или gzip)"""
+    if encoding == 'br':
+        return brotli.compress(data, quality=level)
+    return gzip.compress(data, compresslevel=level, mtime=0)
+
+def shared_body(response):
+    """Отмечает ответ, тело которого одинаково для всех клиентов
+
+    Сжатые тела таких ответов хранятся в CompressionCache. Остальные ответы
+    (страницы и состояние игры конкретного пользователя) сжимаются без кеша.
+    """
+    response.shared_body = True
+    return response
+
+class CompressionCache:
+    """Сжатые тела ответов по хешу содержимого
+
+    Большие ответы (карта, тайлы, изображения) закодированы заранее и
+    одинаковы для всех клиентов до смены снимка мира, поэтому каждое тело
+    сжимается один раз на способ сжатия. Хеш тела считается намного
+    быстрее сжатия. Хранится не более size тел, давно не использованные
+    вытесняются. В кеш попадают только ответы, отмеченные shared_body,
+    и статические файлы.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self._lock = threading.Lock()
+        self._bodies = OrderedDict()
+
+    def compress(self, data, encoding, level):
+        key = (hashlib.sha1(data).digest(), encoding)
+        with self._lock:
+            body = self._bodies.get(key)
+            if body is not None:
+                self._bodies.move_to_end(key)
+                return body
+
+        body = compress(data, encoding, level)
+        if self.size:
+            with self._lock:
+                self._bodies[key] = body
+                while len(self._bodies) > self.size:
+                    self._bodies.popitem(last=False)
+        return body
+
+class StaticHashes:
+    """Хеши содержимого статических файлов для адресов вида /static/<файл>?v=<хеш>
+
+    Хеш файла пересчитывается только при изменении времени его модификации.
+    """
+
+    def __init__(self, static_folder):
+        self.static_folder = static_folder
+        self._lock = threading.Lock()
+        self._hashes = {}
+
+    def get(self, filename):
+        """Возвращает хеш содержимого файла или None, если файла нет"""
+        path = os.path.join(self.static_folder, filename)
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return None
+        with self._lock:
+            cached = self._hashes.get(filename)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        with open(path, 'rb') as static_file:
+            digest = hashlib.sha1(static_file.read()).hexdigest()[:12]
+        with self._lock:
+            self._hashes[filename] = (mtime, digest)
+        return digest
+
+def _accepted_encoding():
+    """Лучший поддерживаемый клиентом способ сжатия: br, gzip или None"""
+    encodings = request.accept_encodings
+    if brotli is not None and encodings['br']:
+        return 'br'
+    if encodings['gzip']:
+        return 'gzip'
+    return None
+
+def configure_http_cache(app):
+    """Включает сжатие ответов и долгое кеширование статических файлов
+
+    Ответы типов COMPRESSIBLE_MIMETYPES длиннее COMPRESSION_MIN_SIZE байт
+    сжимаются brotli (если установлен пакет brotli) или gzip. Сжатые тела
+    общих для всех клиентов ответов (shared_body) и статических файлов хранятся
+    в CompressionCache (COMPRESSION_CACHE_SIZE тел). url_for('static')
+    добавляет к адресу хеш содержимого файла (параметр v), и файлы по такому
+    адресу отдаются с Cache-Control: immutable на год.
+    """
+    min_size = app.config.get('COMPRESSION_MIN_SIZE', 1024)
+    gzip_level = app.config.get('COMPRESSION_GZIP_LEVEL', 6)
+    brotli_level = app.config.get('COMPRESSION_BROTLI_LEVEL', 5)
+    cache = CompressionCache(app.config.get('COMPRESSION_CACHE_SIZE', 64))
+    hashes = StaticHashes(app.static_folder)
+
+    @app.url_defaults
+    def add_static_hash(endpoint, values):
+        if endpoint == 'static' and 'v' not in values:
+            digest = hashes.get(values.get('filename', ''))
+            if digest is not None:
+                values['v'] = digest
+
+    @app.after_request
+    def cache_and_compress(response):
+        if request.endpoint == 'static' and response.status_code in (200, 304):
+            version = request.args.get('v')
+            if version is not None and version == hashes.get(request.view_args.get('filename', '')):
+                response.cache_control.public = True
+                response.cache_control.max_age = STATIC_MAX_AGE
+                response.cache_control.immutable = True
+                response.cache_control.no_cache = None
+
+        if not min_size or response.mimetype not in COMPRESSIBLE_MIMETYPES:
+            return response
+        response.vary.add('Accept-Encoding')
+        if response.status_code != 200 or 'Content-Encoding' in response.headers:
+            return response
+        # Потоковые ответы не сжимаются, кроме файлов (их тело читается целиком)
+        if response.is_streamed and not response.direct_passthrough:
+            return response
+        encoding = _accepted_encoding()
+        if encoding is None:
+            return response
+
+        response.direct_passthrough = False
+        data = response.get_data()
+        if len(data) < min_size:
+            return response
+        level = brotli_level if encoding == 'br' else gzip_level
+        if getattr(response, 'shared_body', False) or request.endpoint == 'static':
+            response.set_data(cache.compress(data, encoding, level))
+        else:
+            response.set_data(compress(data, encoding, level))
+        response.headers['Content-Encoding'] = encoding
+        # Сжатое тело отличается от несжатого побайтно, поэтому ETag становится слабым
+        # (при проверке If-None-Match слабые ETag сравниваются без учета сжатия)
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
@@ -0,0 +1,106 @@
+from collections import OrderedDict
+import threading
+import time
+
+from flask_login import UserMixin
+from sqlalchemy.orm import joinedload
+
+class FactionIdentity:
+    """Неизменяемые данные фракции пользователя: идентификатор, игра, название и цвет
+
+    Ресурсы фракции сюда не входят: они меняются каждый ход и берутся из
+    очереди действий (ActionQueue.balance).
+    """
+    __slots__ = ('id', 'game_id', 'name', 'color')
+
+    def __init__(self, faction):
+        self.id = faction.id
+        self.game_id = faction.game_id
+        self.name = faction.name
+        self.color = faction.color
+
+class UserIdentity(UserMixin):
+    """Пользователь для current_user: данные учетной записи без привязки к сессии базы данных"""
+    __slots__ = ('id', 'username', 'full_name', 'is_approved', 'is_admin', 'faction_id', 'faction')
+
+    def __init__(self, user):
+        self.id = user.id
+        self.username = user.username
+        self.full_name = user.full_name
+        self.is_approved = bool(user.is_approved)
+        self.is_admin = bool(user.is_admin)
+        self.faction_id = user.faction_id
+        self.faction = FactionIdentity(user.faction) if user.faction is not None else None
+
+class IdentityCache:
+    """Кеш пользователей для login_manager.user_loader
+
+    Без кеша каждый запрос (а страница игры опрашивает сервер каждую
+    секунду) начинается с чтения пользователя и его фракции из базы данных.
+    Кеш хранит UserIdentity не более IDENTITY_CACHE_TTL секунд и не более
+    IDENTITY_CACHE_SIZE пользователей, давно не использованные вытесняются.
+    После изменения учетной записи или фракции пользователя вызывается
+    invalidate, иначе изменение станет видно только по истечении TTL.
+    """
+    _instance = None
+
+    def __init__(self):
+        self.size = 1024
+        self.ttl = 60
+        self._lock = threading.Lock()
+        self._identities = OrderedDict()
+        # Увеличивается при каждом сбросе записей: пользователь, прочитанный
+        # из базы до сброса, не попадает в кеш
+        self._generation = 0
+
+    @classmethod
+    def get_instance(cls):
+        if cls._instance is None:
+            cls._instance = IdentityCache()
+        return cls._instance
+
+    def init_app(self, app):
+        """Задает размер кеша и время жизни записей (IDENTITY_CACHE_SIZE, IDENTITY_CACHE_TTL; 0 отключает кеш)"""
+        self.size = max(0, app.config.get('IDENTITY_CACHE_SIZE', self.size) or 0)
+        self.ttl = max(0, app.config.get('IDENTITY_CACHE_TTL', self.ttl) or 0)
+        self.clear()
+
+    def load(self, user_id):
+        """Возвращает UserIdentity пользователя или None, если пользователя нет"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._identities.get(user_id)
+            if entry is not None:
+                if entry[0] > now:
+                    self._identities.move_to_end(user_id)
+                    return entry[1]
+                del self._identities[user_id]
+            generation = self._generation
+
+        # Пользователь и его фракция читаются одним запросом
+        from app import db
+        from app.models.user import User
+        user = db.session.get(User, user_id, options=[joinedload(User.faction)])
+        if user is None:
+            return None
+        identity = UserIdentity(user)
+        if self.size and self.ttl:
+            with self._lock:
+                if generation != self._generation:
+                    return identity
+                self._identities[user_id] = (now + self.ttl, identity)
+                self._identities.move_to_end(user_id)
+                while len(self._identities) > self.size:
+                    self._identities.popitem(last=False)
+        return identity
+
+    def invalidate(self, user_id):
+        """Удаляет пользователя из кеша после изменения его учетной записи или фракции"""
+        with self._lock:
+            self._identities.pop(user_id, None)
+            self._generation += 1
+
+    def clear(self):
+        with self._lock:
+            self._identities.clear()
+            self._generation += 1
@@ -0,0 +1,63 @@
+from datetime import datetime
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+
+# Слушатель очереди логов; создается один раз на процесс
+_listener = None
+
+class JsonLinesFormatter(logging.Formatter):
+    """Форматирует запись лога как одну строку JSON"""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.utcfromtimestamp(record.created).strftime('%Y-%m-%dT%H:%M:%S.%fZ'),
+            'level': record.levelname,
+            'logger': record.name,
+            'module': record.module,
+            'message': record.getMessage(),
+        }
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+def configure_logging(app):
+    """Настраивает асинхронное логирование через QueueHandler/QueueListener
+
+    Обработчики запросов и игровой цикл только кладут записи в очередь,
+    форматирование и вывод выполняет фоновый поток слушателя. Уровни логгеров
+    задаются в конфигурации (LOG_LEVEL и LOG_LEVELS), формат вывода -
+    LOG_FORMAT: 'text' или 'json' (JSON lines).
+    """
+    global _listener
+
+    root = logging.getLogger()
+    root.setLevel(app.config.get('LOG_LEVEL', 'INFO'))
+
+    # Уровни отдельных подсистем
+    for name, level in app.config.get('LOG_LEVELS', {}).items():
+        logging.getLogger(name).setLevel(level)
+
+    if _listener is not None:
+        return
+
+    if app.config.get('LOG_FORMAT') == 'json':
+        formatter = JsonLinesFormatter()
+    else:
+        formatter = logging.Formatter(
+            '[%(asctime)s] %(levelname)s in %(module)s: %(message)s',
+            datefmt='%Y-%m-%d %H:%M:%S'
+        )
+
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    root.handlers = [logging.handlers.QueueHandler(log_queue)]
+
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    # При завершении процесса дописываем оставшиеся в очереди записи
+    atexit.register(_listener.stop)
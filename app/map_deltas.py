@@ -0,0 +1,76 @@
+from collections import OrderedDict
+import threading
+
+from app.models.game import DEFAULT_GAME_ID
+
+class MapDeltas:
+    """Изменения карты игры между версиями снимка мира
+
+    Хранит данные клеток (как в /api/map) последних MAP_DELTA_HISTORY версий
+    снимка, выданных клиентам. Клиент, у которого уже есть карта одной из этих
+    версий, получает в /api/state только изменившиеся с нее клетки, а не всю
+    карту. Изменения до текущей версии вычисляются один раз на исходную версию.
+
+    Версия запоминается, когда ее впервые получает клиент (главная страница
+    или /api/state): версии, которых не видел ни один клиент, не нужны.
+    """
+    _instances = {}
+
+    def __init__(self, game_id=DEFAULT_GAME_ID):
+        self.game_id = game_id
+        self.history_size = 16
+        self._lock = threading.Lock()
+        self._history = OrderedDict()
+        self._version = None
+        self._changes = {}
+
+    @classmethod
+    def get_instance(cls, game_id=DEFAULT_GAME_ID):
+        if game_id not in cls._instances:
+            cls._instances[game_id] = MapDeltas(game_id)
+        return cls._instances[game_id]
+
+    def init_app(self, app):
+        """Задает количество хранимых версий по настройке MAP_DELTA_HISTORY (0 отключает изменения)"""
+        with self._lock:
+            self.history_size = max(0, app.config.get('MAP_DELTA_HISTORY', self.history_size) or 0)
+            self._history.clear()
+            self._version = None
+            self._changes = {}
+
+    def record(self, snapshot):
+        """Запоминает версию снимка мира, которую получит клиент"""
+        with self._lock:
+            self._update(snapshot)
+
+    def changes(self, snapshot, from_version):
+        """Клетки, изменившиеся с версии from_version до снимка snapshot
+
+        Клетки в том же виде, что в /api/map. Возвращает None, если версии
+        from_version нет в истории: тогда клиенту нужна вся карта.
+        """
+        with self._lock:
+            self._update(snapshot)
+            changes = self._changes.get(from_version)
+            if changes is None:
+                cells = self._history.get(from_version)
+                current = snapshot.map_data()
+                # Клетки снимков идут в одном порядке; если их набор изменился, передается вся карта
+                if cells is None or len(cells) != len(current) \
+                        or any((old['x'], old['y']) != (cell['x'], cell['y']) for old, cell in zip(cells, current)):
+                    return None
+                changes = [cell for old, cell in zip(cells, current) if old != cell]
+                self._changes[from_version] = changes
+            return changes
+
+    def _update(self, snapshot):
+        """Добавляет снимок мира в историю (под блокировкой)"""
+        if snapshot.version == self._version or not self.history_size:
+            return
+        self._history[snapshot.version] = snapshot.map_data()
+        self._history.move_to_end(snapshot.version)
+        while len(self._history) > self.history_size:
+            self._history.popitem(last=False)
+        self._version = snapshot.version
+        # Изменения считались до прежней текущей версии
+        self._changes = {}
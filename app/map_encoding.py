@@ -0,0 +1,117 @@
+import json
+import struct
+
+import numpy as np
+
+from app.map_image import faction_colors
+
+# Форматы данных карты /api/map, выбираются по заголовку Accept
+MAP_JSON_MIMETYPE = 'application/json'
+MAP_COLUMNS_MIMETYPE = 'application/vnd.kvantwars.map-columns+json'
+MAP_BINARY_MIMETYPE = 'application/vnd.kvantwars.map'
+MAP_MIMETYPES = (MAP_JSON_MIMETYPE, MAP_COLUMNS_MIMETYPE, MAP_BINARY_MIMETYPE)
+
+# Двоичный формат карты (little-endian): заголовок - сигнатура KWM2, версия
+# снимка мира, номер хода, размеры сетки (по x и по y) и длина словарей в байтах;
+# затем словари в JSON (building_types, factions, faction_names, faction_colors) и записи
+# MAP_RECORD по всем позициям сетки в порядке (x, y): координаты клетки определяются номером записи
+MAP_BINARY_MAGIC = b'KWM2'
+MAP_BINARY_HEADER = struct.Struct('<4sIIHHI')
+# Фракция и тип здания записываются номером в словаре factions и building_types + 1
+# (идентификатор фракции может не поместиться в запись). Отсутствующие значения:
+# faction = 0, building_type = 0, neutral_defenders = NO_DEFENDERS.
+# Флаг CELL_EXISTS отмечает позиции, где есть клетка
+MAP_RECORD = np.dtype([
+    ('faction', '<u2'), ('building_type', 'u1'), ('flags', 'u1'), ('neutral_defenders', '<u2')
+])
+NO_DEFENDERS = 0xFFFF
+CELL_EXISTS = 1
+
+def map_columns(snapshot):
+    """Данные карты снимка мира по столбцам
+
+    Вместо списка словарей (как в /api/map) каждое поле клетки - массив
+    значений по всем клеткам в порядке снимка. Типы зданий закодированы
+    номерами в словаре building_types (-1 - нет здания), названия и цвета
+    фракций передаются один раз в faction_names и faction_colors по
+    идентификатору фракции.
+    neutral_defenders заполнено только у нейтральных клеток с постройками.
+    """
+    building_types = {}
+    x, y, faction_ids, building_codes, defenders = [], [], [], [], []
+    for cell in snapshot.cells:
+        x.append(cell.x)
+        y.append(cell.y)
+        faction_ids.append(cell.faction_id)
+        if cell.building_type is None:
+            building_codes.append(-1)
+        else:
+            building_codes.append(building_types.setdefault(cell.building_type, len(building_types)))
+        defenders.append(cell.neutral_defenders if cell.faction_id is None and cell.building_type is not None else None)
+
+    return {
+        'version': snapshot.version,
+        'turn': snapshot.turn,
+        'building_types': list(building_types),
+        'faction_names': {faction.id: faction.short_name for faction in snapshot.factions},
+        'faction_colors': faction_colors(snapshot.factions),
+        'x': x,
+        'y': y,
+        'faction_id': faction_ids,
+        'building_type': building_codes,
+        'neutral_defenders': defenders
+    }
+
+def pack_map(snapshot):
+    """Данные карты снимка мира в двоичном формате (одна запись MAP_RECORD на позицию сетки)"""
+    columns = snapshot.map_columns()
+    x = np.asarray(columns['x'], dtype=np.int64)
+    y = np.asarray(columns['y'], dtype=np.int64)
+    width = int(x.max(initial=-1)) + 1
+    height = int(y.max(initial=-1)) + 1
+
+    records = np.zeros(width * height, dtype=MAP_RECORD)
+    records['neutral_defenders'] = NO_DEFENDERS
+    positions = x * height + y
+    factions = {}
+    records['faction'][positions] = [
+        factions.setdefault(faction_id, len(factions)) + 1 if faction_id else 0 for faction_id in columns['faction_id']
+    ]
+    records['building_type'][positions] = np.asarray(columns['building_type'], dtype=np.int64) + 1
+    records['flags'][positions] = CELL_EXISTS
+    records['neutral_defenders'][positions] = [
+        NO_DEFENDERS if defenders is None else defenders for defenders in columns['neutral_defenders']
+    ]
+
+    dictionaries = json.dumps({
+        'building_types': columns['building_types'],
+        'factions': list(factions),
+        'faction_names': columns['faction_names'],
+        'faction_colors': columns['faction_colors']
+    }, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    header = MAP_BINARY_HEADER.pack(MAP_BINARY_MAGIC, snapshot.version, snapshot.turn,
+                                    width, height, len(dictionaries))
+    return header + dictionaries + records.tobytes()
+
+def unpack_map(data):
+    """Разбирает двоичные данные карты
+
+    Возвращает (версия, ход, словари, записи MAP_RECORD в виде массива width x height).
+    """
+    magic, version, turn, width, height, dictionaries_size = MAP_BINARY_HEADER.unpack_from(data)
+    if magic != MAP_BINARY_MAGIC:
+        raise ValueError("Неизвестный формат данных карты")
+    offset = MAP_BINARY_HEADER.size
+    dictionaries = json.loads(data[offset:offset + dictionaries_size].decode('utf-8'))
+    records = np.frombuffer(data, dtype=MAP_RECORD, count=width * height, offset=offset + dictionaries_size)
+    return version, turn, dictionaries, records.reshape(width, height)
+
+def encode_map(snapshot, mimetype):
+    """Кодирует данные карты снимка мира в формат mimetype (один из MAP_MIMETYPES)"""
+    if mimetype == MAP_BINARY_MIMETYPE:
+        return pack_map(snapshot)
+    if mimetype == MAP_COLUMNS_MIMETYPE:
+        data = snapshot.map_columns()
+    else:
+        data = list(snapshot.map_data())
+    return json.dumps(data, separators=(',', ':'), sort_keys=True).encode('utf-8')
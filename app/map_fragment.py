@@ -0,0 +1,102 @@
+from collections import OrderedDict
+import threading
+
+from flask import render_template
+from markupsafe import Markup
+
+from app.map_image import BUILDING_ICONS, RESOURCE_ICONS, cell_color, faction_colors
+
+def map_cells(snapshot, rules, faction_id=None):
+    """Данные клеток для шаблона карты главной страницы
+
+    Клетки идут в порядке снимка мира (строка - координата x, столбец - y),
+    как их выводит /api/map. faction_id - фракция игрока: у соседних с ее
+    территорией клеток выставляется признак adjacent.
+    """
+    faction_names = {faction.id: faction.short_name for faction in snapshot.factions}
+    colors = faction_colors(snapshot.factions)
+    cells = []
+    for cell in snapshot.cells:
+        building = (cell.building_type or '').upper() or None
+        is_castle = building == 'CASTLE' or (cell.faction_id and rules.is_castle_cell(cell.x, cell.y))
+        # Угловая клетка фракции без здания показывается с замком
+        if building is None and is_castle:
+            building = 'CASTLE'
+
+        bonus = None
+        resource = rules.resource_bonus_resource(cell.x, cell.y)
+        if resource in RESOURCE_ICONS:
+            bonus = (RESOURCE_ICONS[resource], resource, rules.resource_bonus_percent)
+        elif rules.is_combat_bonus_cell(cell.x, cell.y):
+            bonus = (RESOURCE_ICONS['warriors'], 'warriors', rules.combat_bonus_percent)
+
+        cells.append({
+            'x': cell.x,
+            'y': cell.y,
+            'faction_id': cell.faction_id,
+            'color': cell_color(cell.faction_id, colors) if cell.faction_id else None,
+            'faction_name': faction_names.get(cell.faction_id) if is_castle else None,
+            'building': building.lower() if building else None,
+            'building_icon': BUILDING_ICONS.get(building),
+            'neutral_defenders': cell.neutral_defenders
+                if cell.faction_id is None and cell.building_type else None,
+            'bonus': bonus,
+            'is_adjacent': bool(faction_id) and snapshot.is_adjacent(cell.x, cell.y, faction_id)
+        })
+    return cells
+
+class MapFragmentCache:
+    """Кеш HTML-фрагмента карты главной страницы
+
+    Сетка карты зависит только от снимка мира и фракции игрока (подсветка
+    соседних клеток), поэтому фрагмент рисуется один раз на ключ
+    (игра, версия снимка, версия правил, фракция) и вставляется в страницу готовым.
+    На каждый запрос рисуется только остальная часть страницы.
+    Хранится не более MAP_FRAGMENT_CACHE_SIZE фрагментов, при переполнении
+    удаляются давно не использованные. Фрагменты прошлых версий снимка
+    больше не запрашиваются и вытесняются сами.
+    """
+    _instance = None
+
+    def __init__(self):
+        self.size = 64
+        self._lock = threading.Lock()
+        self._fragments = OrderedDict()
+
+    @classmethod
+    def get_instance(cls):
+        if cls._instance is None:
+            cls._instance = MapFragmentCache()
+        return cls._instance
+
+    def init_app(self, app):
+        """Задает размер кеша по настройке MAP_FRAGMENT_CACHE_SIZE (0 отключает кеш)"""
+        self.size = max(0, app.config.get('MAP_FRAGMENT_CACHE_SIZE', self.size) or 0)
+        self.clear()
+
+    def render(self, game_id, snapshot, rules, faction_id=None):
+        """Возвращает HTML сетки карты снимка мира для фракции faction_id
+
+        Вызывается в контексте запроса.
+        """
+        key = (game_id, snapshot.version, rules.version, faction_id)
+        with self._lock:
+            fragment = self._fragments.get(key)
+            if fragment is not None:
+                self._fragments.move_to_end(key)
+                return fragment
+
+        # Фрагмент рисуется вне блокировки: при одновременных промахах
+        # он нарисуется несколько раз, но запросы не ждут друг друга
+        fragment = Markup(render_template('main/_map_grid.html', cells=map_cells(snapshot, rules, faction_id)))
+        if self.size:
+            with self._lock:
+                self._fragments[key] = fragment
+                self._fragments.move_to_end(key)
+                while len(self._fragments) > self.size:
+                    self._fragments.popitem(last=False)
+        return fragment
+
+    def clear(self):
+        with self._lock:
+            self._fragments.clear()
@@ -0,0 +1,262 @@
+from html import escape
+import hashlib
+import os
+import re
+import threading
+
+from app.models.game import DEFAULT_GAME_ID
+from app.rules import GameRules
+
+ASSETS_DIR = os.path.join(os.path.dirname(__file__), 'static', 'assets')
+
+# Иконки зданий (по имени BuildingType) и ресурсов в папке static/assets
+BUILDING_ICONS = {
+    'CASTLE': 'buildings/Замок.svg',
+    'SAWMILL': 'buildings/Лесопилка.svg',
+    'MINE': 'buildings/Шахта.svg',
+    'QUARRY': 'buildings/Карьер.svg',
+    'WAREHOUSE': 'buildings/Склад.svg',
+    'BARRACKS': 'buildings/Казарма.svg',
+}
+RESOURCE_ICONS = {
+    'gold': 'resources/Золото.svg',
+    'wood': 'resources/Дерево.svg',
+    'stone': 'resources/Камень.svg',
+    'ore': 'resources/Руда.svg',
+    'warriors': 'resources/Воины.svg',
+    'shield': 'resources/Щит.svg',
+}
+
+# Цвета клеток фракций по их порядку в игре (фракции следующих игр получают те же цвета);
+# фракциям сверх этого списка достается их цвет Faction.color
+FACTION_COLORS = ('#ff6b6b', '#4ecdc4', '#ffe66d', '#6b5b95')
+OTHER_FACTION_COLOR = '#cccccc'
+NEUTRAL_COLOR = '#ffffff'
+
+# Размеры карты на изображении (как в .map-container и .map-cell главной страницы)
+CELL_SIZE = 60
+CELL_GAP = 2
+MAP_PADDING = 5
+ICON_SIZE = 32
+
+MAP_IMAGE_FILE_PATTERN = re.compile(r'^map_\d+_[0-9a-f]+\.svg$')
+
+def faction_colors(factions):
+    """Цвета фракций игры {faction_id: цвет} по их порядку в снимке мира (по идентификатору)"""
+    return {
+        faction.id: FACTION_COLORS[position] if position < len(FACTION_COLORS) else faction.color or OTHER_FACTION_COLOR
+        for position, faction in enumerate(factions)
+    }
+
+def cell_color(faction_id, colors):
+    """Цвет клетки на карте по фракции-владельцу (colors - результат faction_colors)"""
+    if not faction_id:
+        return NEUTRAL_COLOR
+    return colors.get(faction_id, OTHER_FACTION_COLOR)
+
+def _icon_symbol(name, path):
+    """Превращает файл иконки в <symbol> и его стили
+
+    Классы стилей иконок из редактора (st0, st1...) совпадают в разных файлах,
+    поэтому к ним добавляется префикс с именем иконки.
+    """
+    with open(os.path.join(ASSETS_DIR, path), encoding='utf-8') as icon_file:
+        source = re.sub(r'<\?xml.*?\?>|<!--.*?-->', '', icon_file.read(), flags=re.S)
+    view_box = re.search(r'viewBox="([^"]*)"', source).group(1)
+    style = ''.join(re.findall(r'<style[^>]*>(.*?)</style>', source, flags=re.S))
+    style = re.sub(r'\.([A-Za-z_][\w-]*)', lambda match: f'.{name}-{match.group(1)}', style)
+    body = re.search(r'<svg[^>]*>(.*)</svg>', source, flags=re.S).group(1)
+    body = re.sub(r'<style[^>]*>.*?</style>', '', body, flags=re.S)
+    body = re.sub(r'\sid="[^"]*"', '', body)
+    body = re.sub(
+        r'class="([^"]*)"',
+        lambda match: 'class="%s"' % ' '.join(f'{name}-{css_class}' for css_class in match.group(1).split()),
+        body
+    )
+    symbol = f'<symbol id="{name}" viewBox="{view_box}">{" ".join(body.split())}</symbol>'
+    return symbol, ' '.join(style.split())
+
+_icons = None
+
+def icon_defs():
+    """Возвращает (символы, стили) всех иконок зданий и ресурсов (читаются один раз)"""
+    global _icons
+    if _icons is None:
+        symbols, styles = [], []
+        icons = [(f'building-{name.lower()}', path) for name, path in BUILDING_ICONS.items()]
+        icons += [(f'resource-{name}', path) for name, path in RESOURCE_ICONS.items()]
+        for name, path in icons:
+            symbol, style = _icon_symbol(name, path)
+            symbols.append(symbol)
+            styles.append(style)
+        _icons = (''.join(symbols), ' '.join(styles))
+    return _icons
+
+def icon_sprite():
+    """Собирает спрайт иконок: отдельный SVG-файл со всеми символами icon_defs
+
+    Страницы ссылаются на символы спрайта как <use href="icons.svg#building-castle">.
+    Стили из <style> внешнего файла в такие ссылки не переносятся, поэтому
+    стили классов записываются прямо в атрибуты style элементов.
+    """
+    symbols, styles = icon_defs()
+    declarations = {}
+    for selectors, declaration in re.findall(r'([^{}]+)\{([^}]*)\}', styles):
+        for selector in selectors.split(','):
+            selector = selector.strip()
+            if selector.startswith('.'):
+                declarations[selector[1:]] = declarations.get(selector[1:], '') + declaration.strip()
+    symbols = re.sub(
+        r'class="([^"]*)"',
+        lambda match: 'style="%s"' % ''.join(declarations.get(css_class, '') for css_class in match.group(1).split()),
+        symbols
+    )
+    return f'<svg xmlns="http://www.w3.org/2000/svg">{symbols}</svg>'
+
+def render_map_svg(snapshot, rules):
+    """Рисует карту снимка мира в SVG
+
+    Клетки расположены так же, как на главной странице: строка - координата x,
+    столбец - y. На клетках показаны цвета фракций, здания, названия фракций
+    над замками, защитники нейтральных клеток и бонусные ресурсы.
+    """
+    symbols, styles = icon_defs()
+    faction_names = {faction.id: faction.short_name for faction in snapshot.factions}
+    colors = faction_colors(snapshot.factions)
+    step = CELL_SIZE + CELL_GAP
+    size = rules.map_size * step - CELL_GAP + 2 * MAP_PADDING
+    offset = (CELL_SIZE - ICON_SIZE) // 2
+
+    parts = [
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{size}" height="{size}" viewBox="0 0 {size} {size}" '
+        f'font-family="sans-serif">',
+        f'<title>Ход {snapshot.turn}</title>',
+        f'<defs><style>{styles} .label{{fill:#fff;font-weight:bold}}</style>{symbols}</defs>',
+    ]
+    for cell in snapshot.cells:
+        left = MAP_PADDING + cell.y * step
+        top = MAP_PADDING + cell.x * step
+        parts.append(f'<g transform="translate({left},{top})">')
+        parts.append(f'<rect x="1" y="1" width="{CELL_SIZE - 2}" height="{CELL_SIZE - 2}" '
+                     f'fill="{cell_color(cell.faction_id, colors)}" stroke="#ccc" stroke-width="2"/>')
+        parts.append(f'<text x="3" y="{CELL_SIZE - 3}" font-size="7" fill="#666">{cell.x},{cell.y}</text>')
+
+        building = (cell.building or cell.building_type or '').upper() or None
+        if building is None and cell.faction_id and rules.is_castle_cell(cell.x, cell.y):
+            building = 'CASTLE'
+        if building in BUILDING_ICONS:
+            parts.append(f'<use href="#building-{building.lower()}" x="{offset}" y="{offset}" '
+                         f'width="{ICON_SIZE}" height="{ICON_SIZE}"/>')
+        if building == 'CASTLE' and cell.faction_id in faction_names:
+            parts.append(f'<rect x="{CELL_SIZE // 2 - 16}" y="2" width="32" height="9" rx="2" fill="rgba(0,0,0,0.7)"/>'
+                         f'<text class="label" x="{CELL_SIZE // 2}" y="9" font-size="7" text-anchor="middle">'
+                         f'{escape(faction_names[cell.faction_id])}</text>')
+
+        if cell.faction_id is None and cell.building_type and cell.neutral_defenders:
+            parts.append(f'<rect x="{CELL_SIZE - 26}" y="{CELL_SIZE - 15}" width="24" height="13" rx="3" '
+                         f'fill="rgba(0,0,0,0.7)"/>'
+                         f'<use href="#resource-shield" x="{CELL_SIZE - 25}" y="{CELL_SIZE - 13}" width="10" height="10"/>'
+                         f'<text class="label" x="{CELL_SIZE - 14}" y="{CELL_SIZE - 4}" font-size="10">'
+                         f'{cell.neutral_defenders}</text>')
+
+        resource = rules.resource_bonus_resource(cell.x, cell.y)
+        if resource in RESOURCE_ICONS:
+            parts.append(f'<rect x="{CELL_SIZE - 15}" y="2" width="13" height="13" rx="3" fill="rgba(0,0,0,0.5)"/>'
+                         f'<use href="#resource-{resource}" x="{CELL_SIZE - 14}" y="3" width="11" height="11"/>')
+        parts.append('</g>')
+    parts.append('</svg>')
+    return ''.join(parts)
+
+class MapImageStore:
+    """Изображения карты для зрителей, по одному на ход
+
+    Карта рисуется в SVG один раз при публикации снимка мира и сохраняется
+    в файл map_<ход>_<хеш содержимого>.svg. Имя файла меняется вместе с
+    содержимым, поэтому браузеры и прокси могут кешировать изображение
+    бессрочно, а зритель загружает новый файл только после смены хода.
+    Хранится не более MAP_IMAGE_KEEP последних изображений каждой игры.
+    """
+    _instances = {}
+
+    def __init__(self, game_id=DEFAULT_GAME_ID):
+        self.game_id = game_id
+        self.directory = None
+        self.keep = 10
+        self._lock = threading.Lock()
+        self._current = None  # (версия снимка, имя файла)
+
+    @classmethod
+    def get_instance(cls, game_id=DEFAULT_GAME_ID):
+        if game_id not in cls._instances:
+            cls._instances[game_id] = MapImageStore(game_id)
+        return cls._instances[game_id]
+
+    @classmethod
+    def find(cls, game_id):
+        """Возвращает хранилище изображений запущенной на сервере игры или None"""
+        return cls._instances.get(game_id)
+
+    @property
+    def enabled(self):
+        return self.directory is not None
+
+    def init_app(self, app):
+        """Определяет папку изображений по настройке MAP_IMAGE_DIR
+
+        Относительный путь считается от папки instance приложения, пустое
+        значение отключает изображения. У каждой игры своя папка game_<id>.
+        """
+        directory = app.config.get('MAP_IMAGE_DIR')
+        self.keep = app.config.get('MAP_IMAGE_KEEP', self.keep)
+        self._current = None
+        if not directory:
+            self.directory = None
+            return
+        if not os.path.isabs(directory):
+            directory = os.path.join(app.instance_path, directory)
+        directory = os.path.join(directory, f'game_{self.game_id}')
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+
+    def publish(self, snapshot):
+        """Рисует карту снимка мира и сохраняет ее, если такого изображения еще нет
+
+        Возвращает имя файла изображения или None, если изображения отключены.
+        """
+        if not self.enabled:
+            return None
+        with self._lock:
+            current = self._current
+            if current is not None and current[0] == snapshot.version:
+                return current[1]
+
+            data = render_map_svg(snapshot, GameRules.get_instance()).encode('utf-8')
+            filename = f'map_{snapshot.turn:08d}_{hashlib.sha1(data).hexdigest()[:12]}.svg'
+            path = os.path.join(self.directory, filename)
+            if os.path.exists(path):
+                os.utime(path)
+            else:
+                temp_path = path + '.tmp'
+                with open(temp_path, 'wb') as image_file:
+                    image_file.write(data)
+                os.replace(temp_path, path)
+            self._current = (snapshot.version, filename)
+            self._discard_old(filename)
+            return filename
+
+    def image_name(self, snapshot):
+        """Возвращает имя файла изображения снимка мира, рисуя его при необходимости"""
+        current = self._current
+        if current is not None and current[0] == snapshot.version:
+            return current[1]
+        return self.publish(snapshot)
+
+    def _discard_old(self, keep_filename):
+        """Удаляет самые старые изображения сверх лимита (под блокировкой)"""
+        if not self.keep:
+            return
+        filenames = [name for name in os.listdir(self.directory) if MAP_IMAGE_FILE_PATTERN.match(name)]
+        filenames.sort(key=lambda name: os.path.getmtime(os.path.join(self.directory, name)))
+        for filename in filenames[:max(0, len(filenames) - self.keep)]:
+            if filename != keep_filename:
+                os.remove(os.path.join(self.directory, filename))
@@ -0,0 +1,115 @@
+import hashlib
+import json
+import threading
+
+from app.models.game import DEFAULT_GAME_ID
+
+class MapTile:
+    """Квадрат карты: данные клеток, версия и закодированный ответ с его ETag"""
+    __slots__ = ('cells', 'version', 'payload', 'etag')
+
+    def __init__(self, cells, version):
+        self.cells = cells
+        self.version = version
+        self.payload = None
+        self.etag = None
+
+class MapTiles:
+    """Карта игры, разбитая на квадраты (тайлы) MAP_TILE_SIZE x MAP_TILE_SIZE
+
+    Тайл (tx, ty) содержит клетки с x // size == tx и y // size == ty.
+    У каждого тайла своя версия - версия снимка мира, в котором изменилась
+    одна из его клеток. Клиент загружает только видимые тайлы и по списку
+    версий перезапрашивает лишь изменившиеся. Закодированные данные тайла
+    хранятся до изменения одной из его клеток.
+
+    Тайлы обновляются по снимку мира при первом запросе после его смены:
+    данные клеток каждого тайла сравниваются с прежними.
+    """
+    _instances = {}
+
+    def __init__(self, game_id=DEFAULT_GAME_ID):
+        self.game_id = game_id
+        self.tile_size = 16
+        self._lock = threading.Lock()
+        self._snapshot_version = None
+        self._tiles = {}
+        self._versions = None
+
+    @classmethod
+    def get_instance(cls, game_id=DEFAULT_GAME_ID):
+        if game_id not in cls._instances:
+            cls._instances[game_id] = MapTiles(game_id)
+        return cls._instances[game_id]
+
+    def init_app(self, app):
+        """Задает сторону тайла по настройке MAP_TILE_SIZE"""
+        with self._lock:
+            self.tile_size = max(1, app.config.get('MAP_TILE_SIZE', self.tile_size))
+            self._snapshot_version = None
+            self._tiles = {}
+            self._versions = None
+
+    def versions(self, snapshot):
+        """Возвращает сторону тайла, количество тайлов по x и y и их версии
+
+        versions[tx][ty] - версия тайла (tx, ty), 0 - в тайле нет клеток.
+        """
+        with self._lock:
+            self._update(snapshot)
+            return self._versions
+
+    def tile(self, snapshot, tx, ty):
+        """Возвращает тайл с закодированными данными (MapTile) или None, если в тайле нет клеток"""
+        with self._lock:
+            self._update(snapshot)
+            tile = self._tiles.get((tx, ty))
+            if tile is None:
+                return None
+            if tile.payload is None:
+                tile.payload = json.dumps({
+                    'tx': tx,
+                    'ty': ty,
+                    'tile_size': self.tile_size,
+                    'version': tile.version,
+                    'cells': list(tile.cells)
+                }, separators=(',', ':'), sort_keys=True).encode('utf-8')
+                # ETag зависит от содержимого: версии снимков начинаются заново после перезапуска сервера
+                tile.etag = hashlib.sha1(tile.payload).hexdigest()[:16]
+            return tile
+
+    def _update(self, snapshot):
+        """Обновляет тайлы по снимку мира (под блокировкой)
+
+        Версия и закодированные данные тайла меняются, только если
+        изменилась хотя бы одна из его клеток.
+        """
+        if snapshot.version == self._snapshot_version:
+            return
+        size = self.tile_size
+        tile_cells = {}
+        # Данные клеток те же, что в /api/map
+        for cell in snapshot.map_data():
+            tile_cells.setdefault((cell['x'] // size, cell['y'] // size), []).append(cell)
+
+        tiles = {}
+        for key, cells in tile_cells.items():
+            cells = tuple(cells)
+            tile = self._tiles.get(key)
+            if tile is None or tile.cells != cells:
+                tile = MapTile(cells, snapshot.version)
+            tiles[key] = tile
+        self._tiles = tiles
+        self._snapshot_version = snapshot.version
+
+        tiles_x = 1 + max((tx for tx, _ in tiles), default=-1)
+        tiles_y = 1 + max((ty for _, ty in tiles), default=-1)
+        self._versions = {
+            'tile_size': size,
+            'tiles_x': tiles_x,
+            'tiles_y': tiles_y,
+            'versions': [
+                [tiles[(tx, ty)].version if (tx, ty) in tiles else 0 for ty in range(tiles_y)]
+                for tx in range(tiles_x)
+            ]
+        }
@@ -1,18 +1,47 @@
 from datetime import datetime
 from app import db
+from app.models.game import DEFAULT_GAME_ID
+
+# Имя и тип для записей, созданных игрой, а не игроками
+SYSTEM_USERNAME = 'Система'
+SYSTEM_ACTION_TYPE = 'SYSTEM'
 
 class FactionLog(db.Model):
-    """Модель для хранения логов фракции"""
+    """Модель для хранения логов фракции
+    
+    Сообщение, имя пользователя и тип действия сохраняются уже готовыми для
+    отображения, поэтому чтение журнала не требует дополнительных запросов.
+    """
     __tablename__ = 'faction_logs'
     
     id = db.Column(db.Integer, primary_key=True)
     faction_id = db.Column(db.Integer, db.ForeignKey('faction.id'), nullable=False)
+    game_id = db.Column(db.Integer, db.ForeignKey('game.id'), nullable=False, default=DEFAULT_GAME_ID, index=True)
     turn = db.Column(db.Integer, nullable=False)
+    username = db.Column(db.String(64), nullable=False, default=SYSTEM_USERNAME)
+    action_type = db.Column(db.String(50), nullable=False, default=SYSTEM_ACTION_TYPE)
     message = db.Column(db.String(255), nullable=False)
     timestamp = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Отношение к фракции
     faction = db.relationship('Faction', backref=db.backref('logs', lazy='dynamic'))
     
+    # Журнал читается по фракции и ходу, а также постранично по курсору (faction_id, id)
+    __table_args__ = (
+        db.Index('ix_faction_logs_faction_turn', 'faction_id', 'turn'),
+        db.Index('ix_faction_logs_faction_id_id', 'faction_id', 'id'),
+    )
+    
     def __repr__(self):
-        return f'<FactionLog {self.id}: {self.message}>' 
\ No newline at end of file
+        return f'<FactionLog {self.id}: {self.message}>'
+    
+    def to_dict(self):
+        """Преобразует объект в словарь для API"""
+        return {
+            'id': self.id,
+            'turn': self.turn,
+            'username': self.username,
+            'action_type': self.action_type,
+            'timestamp': self.timestamp.strftime('%H:%M:%S') if self.timestamp else None,
+            'message': self.message
+        }
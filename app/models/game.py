@@ -1,6 +1,10 @@
+from datetime import datetime
 from app import db
 from enum import Enum
 
+# Игра, которая была единственной до появления нескольких игр на одном сервере
+DEFAULT_GAME_ID = 1
+
 class BuildingType(Enum):
     CASTLE = 'castle'    # Замок
     SAWMILL = 'sawmill'  # Лесопилка
@@ -9,8 +13,31 @@ class BuildingType(Enum):
     WAREHOUSE = 'warehouse'  # Склад
     BARRACKS = 'barracks'   # Казарма
 
+class Game(db.Model):
+    """Игра (комната) со своей картой, фракциями и счетчиком ходов
+
+    На одном сервере может идти несколько независимых игр: клетки, фракции,
+    действия и журналы фракций привязаны к игре через game_id.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(64), unique=True, nullable=False)
+    is_active = db.Column(db.Boolean, default=True, nullable=False)  # игровой цикл запускается при старте сервера
+    # Ход, который принимает действия после последнего обработанного хода; записывается
+    # вместе с результатами хода (None - игра еще не начиналась или база данных старой версии)
+    turn = db.Column(db.Integer, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def to_dict(self):
+        """Преобразует объект в словарь для API"""
+        return {
+            'id': self.id,
+            'name': self.name,
+            'is_active': self.is_active
+        }
+
 class Cell(db.Model):
     id = db.Column(db.Integer, primary_key=True)
+    game_id = db.Column(db.Integer, db.ForeignKey('game.id'), nullable=False, default=DEFAULT_GAME_ID, index=True)
     x = db.Column(db.Integer, nullable=False)
     y = db.Column(db.Integer, nullable=False)
     faction_id = db.Column(db.Integer, db.ForeignKey('faction.id'))
@@ -21,8 +48,8 @@ class Cell(db.Model):
     faction = db.relationship('Faction', backref='cells')
     building = db.relationship('Building', backref='cell', uselist=False)
     
-    # Убеждаемся, что координаты клетки уникальны
-    __table_args__ = (db.UniqueConstraint('x', 'y'),)
+    # Убеждаемся, что координаты клетки уникальны в пределах игры
+    __table_args__ = (db.UniqueConstraint('game_id', 'x', 'y', name='uq_cell_game_xy'),)
 
 class Building(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -31,23 +58,12 @@ class Building(db.Model):
     cell_id = db.Column(db.Integer, db.ForeignKey('cell.id'), unique=True)
     
     def get_production(self):
-        """Возвращает производство ресурсов за ход в зависимости от типа и уровня здания"""
-        base_production = {
-            BuildingType.CASTLE: {},  # Замок не производит ресурсы напрямую
-            BuildingType.SAWMILL: {'wood': 3},
-            BuildingType.MINE: {'ore': 3},
-            BuildingType.QUARRY: {'stone': 3},
-            BuildingType.WAREHOUSE: {},  # Склад не производит ресурсы
-            BuildingType.BARRACKS: {}    # Казарма не производит ресурсы
-        }
-        
-        # Увеличиваем производство на 50% за каждый уровень после первого
-        production = base_production[self.type]
-        if self.level > 1:
-            for resource in production:
-                production[resource] = int(production[resource] * (1 + 0.5 * (self.level - 1)))
+        """Возвращает производство ресурсов за ход в зависимости от типа и уровня здания
         
-        return production
+        Значения берутся из заранее вычисленной таблицы правил игры (только для чтения).
+        """
+        from app.rules import GameRules
+        return GameRules.get_instance().building_production(self.type, self.level)
     
     def get_storage_bonus(self):
         """Возвращает бонус к хранилищу ресурсов (для складов и замков)"""
@@ -1,6 +1,7 @@
 from app import db, login_manager
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
+from app.models.game import DEFAULT_GAME_ID
 
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -21,15 +22,19 @@ class User(UserMixin, db.Model):
 
 @login_manager.user_loader
 def load_user(id):
-    return User.query.get(int(id))
+    # Пользователь и его фракция берутся из кеша (app.identity_cache), без запросов к базе на каждый запрос
+    from app.identity_cache import IdentityCache
+    return IdentityCache.get_instance().load(int(id))
 
 class Faction(db.Model):
     __tablename__ = 'faction'
     
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(64), unique=True, nullable=False)
+    game_id = db.Column(db.Integer, db.ForeignKey('game.id'), nullable=False, default=DEFAULT_GAME_ID, index=True)
+    name = db.Column(db.String(64), nullable=False)
     color = db.Column(db.String(7), nullable=False)  # HEX color code
     users = db.relationship('User', backref='faction', lazy=True)
+    game = db.relationship('Game', backref='factions')
     
     # Ресурсы фракции
     gold = db.Column(db.Integer, default=10)
@@ -43,4 +48,7 @@ class Faction(db.Model):
     max_wood = db.Column(db.Integer, default=50)
     max_stone = db.Column(db.Integer, default=50)
     max_ore = db.Column(db.Integer, default=50)
-    max_warriors = db.Column(db.Integer, default=20) 
\ No newline at end of file
+    max_warriors = db.Column(db.Integer, default=20)
+    
+    # Названия фракций уникальны в пределах игры
+    __table_args__ = (db.UniqueConstraint('game_id', 'name', name='uq_faction_game_name'),)
@@ -1,6 +1,7 @@
 from enum import Enum
 from app import db
 from datetime import datetime
+from app.models.game import DEFAULT_GAME_ID
 
 class ActionType(Enum):
     CAPTURE_CELL = 'capture_cell'
@@ -16,6 +17,7 @@ class UserAction(db.Model):
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    game_id = db.Column(db.Integer, db.ForeignKey('game.id'), nullable=False, default=DEFAULT_GAME_ID)
     action_type = db.Column(db.String(50), nullable=False)
     turn = db.Column(db.Integer, nullable=False)
     target_x = db.Column(db.Integer)
@@ -28,6 +30,9 @@ class UserAction(db.Model):
     # Отношения
     user = db.relationship('User', backref=db.backref('actions', lazy='dynamic'))
     
+    # Действия хода выбираются по игре и номеру хода
+    __table_args__ = (db.Index('ix_user_actions_game_turn', 'game_id', 'turn'),)
+    
     def __repr__(self):
         return f'<UserAction {self.id}: {self.action_type} by User {self.user_id} at Turn {self.turn}>'
     
@@ -36,6 +41,7 @@ class UserAction(db.Model):
         return {
             'id': self.id,
             'user_id': self.user_id,
+            'game_id': self.game_id,
             'action_type': self.action_type,
             'turn': self.turn,
             'target_x': self.target_x,
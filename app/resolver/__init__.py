@@ -0,0 +1,9 @@
+"""Обработка хода как чистая функция над неизменяемым состоянием мира
+
+Пакет не обращается к базе данных: GameManager загружает состояние мира и
+действия хода, вызывает resolve_turn и сохраняет изменения.
+"""
+from app.resolver.state import WorldState, CellState, FactionState, TurnAction
+from app.resolver.events import TurnEvent
+from app.resolver.turn import TurnResult, resolve_turn
+from app.resolver.regions import RegionExecutor
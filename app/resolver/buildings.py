@@ -0,0 +1,46 @@
+from app.models.game import BuildingType
+from app.models.user_action import ActionType
+from app.resolver.events import turn_event, BUILDING_BUILT, BUILD_REJECTED
+
+BUILDING_NAMES = frozenset(building_type.name for building_type in BuildingType)
+
+def build(rules, state, actions):
+    """Фаза строительства зданий в порядке действий хода
+
+    Здание строится на свободной от построек клетке фракции игрока.
+    Возвращает (новое состояние, события).
+    """
+    cells = None
+    events = []
+    for action in actions:
+        if action.action_type != ActionType.BUILD.value:
+            continue
+        x, y, faction_id = action.x, action.y, action.faction_id
+        index = state.cell_position(x, y)
+        if index is None:
+            events.append(turn_event(BUILD_REJECTED, f"Клетка с координатами ({x}, {y}) не найдена", faction_id=faction_id, x=x, y=y))
+            continue
+        cell = (cells or state.cells)[index]
+
+        if not cell.faction_id or cell.faction_id != faction_id:
+            events.append(turn_event(BUILD_REJECTED, f"Клетка ({x}, {y}) не принадлежит фракции {faction_id}", faction_id=faction_id, x=x, y=y))
+            continue
+        if cell.building_type:
+            events.append(turn_event(BUILD_REJECTED, f"На клетке ({x}, {y}) уже есть здание {cell.building_type}", faction_id=faction_id, x=x, y=y))
+            continue
+        if action.building_type not in BUILDING_NAMES:
+            events.append(turn_event(BUILD_REJECTED, f"Неизвестный тип здания: {action.building_type}", faction_id=faction_id, x=x, y=y))
+            continue
+
+        if cells is None:
+            cells = list(state.cells)
+        cells[index] = cell._replace(building_type=action.building_type, building=action.building_type, building_level=1)
+        events.append(turn_event(
+            BUILDING_BUILT,
+            f"Построено здание {action.building_type} на клетке ({x}, {y}) для фракции {faction_id}",
+            faction_id=faction_id, x=x, y=y
+        ))
+
+    if cells is None:
+        return state, events
+    return state.replace(cells=cells), events
@@ -0,0 +1,315 @@
+from collections import namedtuple
+
+import numpy as np
+
+from app.models.user_action import ActionType
+from app.resolver.events import turn_event, DEFENDERS_ASSIGNED
+from app.resolver.state import owner_positions
+
+# Роли действий в бою
+ATTACK, DEFEND = 0, 1
+
+# Исходы боя за клетку
+CAPTURED = 0       # клетка захвачена победителем
+FAILED = 1         # воинов не хватило, владелец клетки не меняется
+NEUTRALIZED = 2    # воинов победителя не хватило, клетка становится нейтральной
+TIE = 3            # ничья, клетка становится нейтральной
+RETURNED = 4       # клетка уже принадлежит атакующей фракции, воины возвращены
+CASTLE = 5         # попытка захвата чужого замка, воины возвращены
+
+OUTCOME_NAMES = ('captured', 'failed', 'neutralized', 'tie', 'returned', 'castle')
+
+# Входные данные фазы захватов:
+# action_cells, action_factions, action_warriors, action_roles - действия хода плоскими массивами
+# (индекс клетки, индекс фракции, воины, роль ATTACK/DEFEND);
+# cell_owners - индекс фракции-владельца клетки (-1 - нейтральная), cell_castles - клетка с замком,
+# cell_neutral_defenders - защитники нейтральной клетки с постройкой (0 - нет);
+# faction_warriors, faction_max_warriors - воины фракций, faction_bonus - фракция владеет клеткой боевого бонуса
+CombatInput = namedtuple('CombatInput', [
+    'action_cells', 'action_factions', 'action_warriors', 'action_roles',
+    'cell_owners', 'cell_castles', 'cell_neutral_defenders',
+    'faction_warriors', 'faction_max_warriors', 'faction_bonus'
+])
+
+# Таблица исходов по клеткам, за которые шел бой (массивы одной длины):
+# cells - индекс клетки, outcomes - исход, owners - владелец клетки после боя,
+# winners - фракция с наибольшей силой (-1 - нет), strengths - ее сила, second_strengths - сила второй фракции,
+# required - сколько силы нужно превысить для захвата, refunds - воины, возвращенные победителю
+CombatOutcome = namedtuple('CombatOutcome', [
+    'cells', 'outcomes', 'owners', 'winners', 'strengths', 'second_strengths', 'required', 'refunds'
+])
+
+# Бои части клеток: outcome - таблица исходов, faction_refunds - воины, возвращенные фракциям,
+# faction_touched - фракции, воины которых после возврата ограничиваются лимитом
+Battles = namedtuple('Battles', ['outcome', 'faction_refunds', 'faction_touched'])
+
+# Результат фазы захватов: outcome - таблица исходов, cell_owners - владельцы всех клеток,
+# faction_warriors - воины фракций после возврата, faction_refunds - возвращено воинов фракциям
+CombatResult = namedtuple('CombatResult', ['outcome', 'cell_owners', 'faction_warriors', 'faction_refunds'])
+
+def combat_strength(rules, warriors, has_bonus):
+    """Боевая мощь отрядов с учетом бонуса центральной клетки (как GameRules.combat_strength)"""
+    warriors = np.asarray(warriors, dtype=np.int64)
+    bonus = (warriors * rules.combat_bonus).astype(np.int64)
+    return warriors + np.where(has_bonus, bonus, 0)
+
+def resolve_combat(rules, data):
+    """Разрешает все бои хода за несколько проходов над массивами (см. fight)"""
+    return settle(data, [fight(rules, data)])
+
+def fight(rules, data):
+    """Разрешает бои за клетки из data, не применяя возврат воинов к фракциям
+
+    Правила совпадают с разбором захватов по клеткам:
+    - чужой замок захватить нельзя, воины возвращаются;
+    - если на клетку отправлено одно действие захвата, захват удается, когда
+      сила отряда превышает защитников клетки (или клетка без защитников),
+      возвращаются отправленные воины за вычетом защитников;
+    - если действий несколько, силы суммируются по фракциям; при равенстве
+      двух сильнейших или нехватке сил клетка становится нейтральной,
+      победителю возвращается перевес над второй фракцией за вычетом защитников.
+    """
+    cells = np.asarray(data.action_cells, dtype=np.int64)
+    factions = np.asarray(data.action_factions, dtype=np.int64)
+    warriors = np.asarray(data.action_warriors, dtype=np.int64)
+    roles = np.asarray(data.action_roles, dtype=np.int64)
+    cell_owners = np.asarray(data.cell_owners, dtype=np.int64)
+    faction_warriors = np.asarray(data.faction_warriors, dtype=np.int64)
+    faction_count = faction_warriors.shape[0]
+
+    strengths = combat_strength(rules, warriors, np.asarray(data.faction_bonus, dtype=bool)[factions])
+
+    # Защитники клеток: сумма силы защиты на своих клетках и нейтральные защитники
+    defending = roles == DEFEND
+    defense = np.bincount(cells[defending], weights=strengths[defending], minlength=cell_owners.shape[0]).astype(np.int64)
+    owned = cell_owners >= 0
+    cell_required = np.where(owned, defense, np.asarray(data.cell_neutral_defenders, dtype=np.int64))
+
+    attacking = roles == ATTACK
+    attack_cells = cells[attacking]
+    attack_factions = factions[attacking]
+    attack_warriors = warriors[attacking]
+    attack_strengths = strengths[attacking]
+
+    contested, attack_slot = np.unique(attack_cells, return_inverse=True)
+    contested_count = contested.shape[0]
+    attack_count = np.bincount(attack_slot, minlength=contested_count)
+    owners = cell_owners[contested]
+    required = cell_required[contested]
+    castle = np.asarray(data.cell_castles, dtype=bool)[contested] & (owners >= 0)
+
+    # Суммарная сила фракций на каждой клетке, две сильнейшие фракции
+    group_keys, group_slot = np.unique(attack_slot * max(faction_count, 1) + attack_factions, return_inverse=True)
+    group_strengths = np.bincount(group_slot, weights=attack_strengths, minlength=group_keys.shape[0]).astype(np.int64)
+    group_cells = group_keys // max(faction_count, 1)
+    group_factions = group_keys % max(faction_count, 1)
+    order = np.lexsort((-group_strengths, group_cells))
+    ordered_cells = group_cells[order]
+    first = np.ones(order.shape[0], dtype=bool)
+    first[1:] = ordered_cells[1:] != ordered_cells[:-1]
+    top = order[first]
+    winners = group_factions[top]
+    top_strengths = group_strengths[top]
+    has_second = np.zeros(order.shape[0], dtype=bool)
+    has_second[:-1] = first[:-1] & ~first[1:]
+    second_strengths = np.zeros(contested_count, dtype=np.int64)
+    second_strengths[ordered_cells[has_second]] = group_strengths[order[np.flatnonzero(has_second) + 1]]
+    contenders = np.bincount(group_cells, minlength=contested_count)
+
+    # Одно действие захвата: исход по отправленным воинам этого действия
+    single = attack_count == 1
+    single_warriors = np.bincount(attack_slot, weights=attack_warriors, minlength=contested_count).astype(np.int64)
+    single_returned = single & (owners == winners)
+    single_failed = single & ~single_returned & (required > 0) & (top_strengths <= required)
+
+    # Несколько действий: ничья двух сильнейших или нехватка сил освобождают клетку
+    multi = ~single
+    tie = multi & (contenders >= 2) & (top_strengths == second_strengths)
+    neutralized = multi & ~tie & (top_strengths <= required)
+
+    outcomes = np.full(contested_count, CAPTURED, dtype=np.int64)
+    outcomes[single_failed] = FAILED
+    outcomes[single_returned] = RETURNED
+    outcomes[neutralized] = NEUTRALIZED
+    outcomes[tie] = TIE
+    outcomes[castle] = CASTLE
+
+    new_owners = owners.copy()
+    new_owners[outcomes == CAPTURED] = winners[outcomes == CAPTURED]
+    new_owners[(outcomes == NEUTRALIZED) | (outcomes == TIE)] = -1
+
+    refunds = np.zeros(contested_count, dtype=np.int64)
+    single_captured = single & (outcomes == CAPTURED)
+    refunds[single_captured] = np.maximum(0, single_warriors - required)[single_captured]
+    refunds[single_returned & ~castle] = single_warriors[single_returned & ~castle]
+    multi_captured = multi & (outcomes == CAPTURED)
+    refunds[multi_captured] = np.maximum(0, top_strengths - second_strengths - required)[multi_captured]
+
+    # Возврат воинов фракциям: победителям боев и всем участникам штурма замка
+    castle_actions = castle[attack_slot]
+    refund_factions = np.concatenate([winners[~castle], attack_factions[castle_actions]])
+    refund_amounts = np.concatenate([refunds[~castle], attack_warriors[castle_actions]])
+    # Воины возвращаются с ограничением лимитом; при захвате одним действием
+    # ограничение применяется и при нулевом возврате
+    touched_mask = np.concatenate([
+        ((single & ((outcomes == CAPTURED) | (outcomes == RETURNED))) | (refunds > 0))[~castle],
+        np.ones(int(castle_actions.sum()), dtype=bool)
+    ])
+    faction_refunds = np.bincount(refund_factions, weights=refund_amounts, minlength=faction_count).astype(np.int64)
+    touched = np.bincount(refund_factions[touched_mask], minlength=faction_count) > 0
+
+    refunds[castle] = np.bincount(attack_slot[castle_actions], weights=attack_warriors[castle_actions],
+                                  minlength=contested_count).astype(np.int64)[castle]
+
+    return Battles(
+        outcome=CombatOutcome(
+            cells=contested,
+            outcomes=outcomes,
+            owners=new_owners,
+            winners=np.where(castle, -1, winners),
+            strengths=top_strengths,
+            second_strengths=second_strengths,
+            required=required,
+            refunds=refunds
+        ),
+        faction_refunds=faction_refunds,
+        faction_touched=touched
+    )
+
+def settle(data, battles):
+    """Сводит бои нескольких частей карты в результат фазы захватов
+
+    battles - результаты fight (Battles) с индексами клеток из data; клетки
+    разных частей не пересекаются. Возвраты воинов суммируются по фракциям,
+    а лимит воинов применяется один раз к сумме, поэтому результат не зависит
+    от того, как бои разделены на части.
+    """
+    cell_owners = np.asarray(data.cell_owners, dtype=np.int64)
+    faction_warriors = np.asarray(data.faction_warriors, dtype=np.int64)
+    if len(battles) == 1:
+        outcome = battles[0].outcome
+    else:
+        outcome = CombatOutcome._make(
+            np.concatenate([part.outcome[field] for part in battles])
+            for field in range(len(CombatOutcome._fields))
+        )
+        order = np.argsort(outcome.cells, kind='stable')
+        outcome = CombatOutcome._make(column[order] for column in outcome)
+
+    faction_refunds = np.sum([part.faction_refunds for part in battles], axis=0, dtype=np.int64)
+    touched = np.any([part.faction_touched for part in battles], axis=0)
+    new_warriors = np.where(
+        touched,
+        np.minimum(faction_warriors + faction_refunds, np.asarray(data.faction_max_warriors, dtype=np.int64)),
+        faction_warriors
+    )
+
+    result_owners = cell_owners.copy()
+    result_owners[outcome.cells] = outcome.owners
+    return CombatResult(
+        outcome=outcome,
+        cell_owners=result_owners,
+        faction_warriors=new_warriors,
+        faction_refunds=faction_refunds
+    )
+
+def _draw_defenders(rules, cell, rng, events):
+    defenders = rng.randint(*rules.neutral_defenders_range)
+    events.append(turn_event(
+        DEFENDERS_ASSIGNED,
+        f"Установлено {defenders} защитников для нейтральной клетки ({cell.x}, {cell.y}) с постройкой {cell.building_type}",
+        x=cell.x, y=cell.y, amount=defenders
+    ))
+    return defenders
+
+def resolve_captures(rules, state, actions, rng, regions=None):
+    """Фаза захватов клеток над состоянием мира
+
+    Возвращает (новое состояние, события, таблица исходов CombatOutcome или None).
+    Защитники нейтральных клеток с постройками назначаются при первой попытке
+    захвата в порядке действий хода, поэтому результат зависит только от rng.
+    regions - RegionExecutor для параллельного разрешения боев по регионам
+    карты (None - все бои разрешаются в вызывающем процессе).
+    """
+    events = []
+    rows = []
+    capture, defend = ActionType.CAPTURE_CELL.value, ActionType.DEFEND_CELL.value
+    for action in actions:
+        if action.action_type == capture:
+            role = ATTACK
+        elif action.action_type == defend:
+            role = DEFEND
+        else:
+            continue
+        cell_index = state.cell_position(action.x, action.y)
+        faction_index = state.faction_position(action.faction_id)
+        if cell_index is None or faction_index is None:
+            continue
+        rows.append((cell_index, faction_index, action.warriors or 0, role, action.x, action.y))
+    if not any(row[3] == ATTACK for row in rows):
+        return state, events, None
+
+    cells = list(state.cells)
+    neutral_defenders = np.zeros(len(cells), dtype=np.int64)
+    seen = set()
+    for cell_index, _, _, role, _, _ in rows:
+        cell = cells[cell_index]
+        if role != ATTACK or cell_index in seen:
+            continue
+        seen.add(cell_index)
+        if cell.faction_id is None and cell.building_type is not None:
+            if cell.neutral_defenders is None:
+                cell = cells[cell_index] = cell._replace(neutral_defenders=_draw_defenders(rules, cell, rng, events))
+            neutral_defenders[cell_index] = cell.neutral_defenders
+
+    faction_ids = [faction.id for faction in state.factions]
+    cell_owners = owner_positions(state, cells)
+    faction_bonus = np.zeros(len(faction_ids), dtype=bool)
+    bonus_index = state.cell_position(*rules.combat_bonus_cell)
+    if bonus_index is not None and cell_owners[bonus_index] >= 0:
+        faction_bonus[cell_owners[bonus_index]] = True
+    cell_castles = np.zeros(len(cells), dtype=bool)
+    for castle_xy in rules.castle_cells:
+        castle_index = state.cell_position(*castle_xy)
+        if castle_index is not None:
+            cell_castles[castle_index] = True
+
+    columns = np.array(rows, dtype=np.int64)
+    data = CombatInput(
+        action_cells=columns[:, 0],
+        action_factions=columns[:, 1],
+        action_warriors=columns[:, 2],
+        action_roles=columns[:, 3],
+        cell_owners=cell_owners,
+        cell_castles=cell_castles,
+        cell_neutral_defenders=neutral_defenders,
+        faction_warriors=np.array([faction.warriors or 0 for faction in state.factions], dtype=np.int64),
+        faction_max_warriors=np.array([faction.max_warriors or 0 for faction in state.factions], dtype=np.int64),
+        faction_bonus=faction_bonus
+    )
+    result = resolve_combat(rules, data) if regions is None else regions.resolve_combat(rules, data, columns[:, 4:6])
+
+    changed = np.flatnonzero(result.cell_owners != cell_owners)
+    for index, owner in zip(changed.tolist(), result.cell_owners[changed].tolist()):
+        cells[index] = cells[index]._replace(faction_id=faction_ids[owner] if owner >= 0 else None)
+    factions = [
+        faction._replace(warriors=int(warriors)) if warriors != (faction.warriors or 0) else faction
+        for faction, warriors in zip(state.factions, result.faction_warriors)
+    ]
+    return state.replace(cells=cells, factions=factions), events, result.outcome
+
+def assign_neutral_defenders(rules, state, rng):
+    """Назначает защитников нейтральным клеткам с постройками, у которых их еще нет
+
+    Возвращает (новое состояние, события).
+    """
+    events = []
+    cells = [
+        cell._replace(neutral_defenders=_draw_defenders(rules, cell, rng, events))
+        if cell.faction_id is None and cell.building_type is not None and cell.neutral_defenders is None
+        else cell
+        for cell in state.cells
+    ]
+    if not events:
+        return state, events
+    return state.replace(cells=cells), events
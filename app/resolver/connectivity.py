@@ -0,0 +1,62 @@
+from collections import deque
+
+from app.resolver.events import turn_event, CELL_RELEASED
+
+# Направления для соседних клеток (вверх, вправо, вниз, влево)
+DIRECTIONS = ((0, 1), (1, 0), (0, -1), (-1, 0))
+
+def connected_cells(rules, coords):
+    """Возвращает клетки из coords, связанные с замком фракции
+
+    coords - координаты клеток фракции в порядке (x, y). Поиск в ширину
+    идет от первого замка среди них; без замка связанных клеток нет.
+    """
+    owned = set(coords)
+    castle = next((xy for xy in coords if rules.is_castle_cell(*xy)), None)
+    if castle is None:
+        return set()
+
+    last_index = rules.map_size - 1
+    connected = {castle}
+    queue = deque([castle])
+    while queue:
+        x, y = queue.popleft()
+        for dx, dy in DIRECTIONS:
+            nx, ny = x + dx, y + dy
+            # Клетка в пределах карты, принадлежит фракции и еще не посещена
+            if 0 <= nx <= last_index and 0 <= ny <= last_index and (nx, ny) in owned and (nx, ny) not in connected:
+                connected.add((nx, ny))
+                queue.append((nx, ny))
+    return connected
+
+def release_disconnected(rules, state):
+    """Освобождает клетки фракций, не связанные с их замком
+
+    Замки не освобождаются. Возвращает (новое состояние, события).
+    """
+    faction_coords = {}
+    for cell in state.cells:
+        if cell.faction_id is not None:
+            faction_coords.setdefault(cell.faction_id, []).append((cell.x, cell.y))
+
+    released = []
+    for faction in state.factions:
+        coords = faction_coords.get(faction.id, [])
+        connected = connected_cells(rules, coords)
+        released.extend(
+            (xy, faction.id) for xy in coords if xy not in connected and not rules.is_castle_cell(*xy)
+        )
+    if not released:
+        return state, []
+
+    cells = list(state.cells)
+    events = []
+    for (x, y), faction_id in released:
+        index = state.cell_position(x, y)
+        cells[index] = cells[index]._replace(faction_id=None)
+        events.append(turn_event(
+            CELL_RELEASED,
+            f"Клетка ({x}, {y}) фракции {faction_id} не связана с замком и будет освобождена",
+            faction_id=faction_id, x=x, y=y
+        ))
+    return state.replace(cells=cells), events
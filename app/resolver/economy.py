@@ -0,0 +1,277 @@
+from collections import namedtuple
+
+import numpy as np
+
+from app.models.game import BuildingType
+from app.models.user_action import ActionType
+from app.resolver.events import turn_event, GOLD_SHORTAGE, WARRIORS_DISMISSED
+from app.resolver.state import owner_positions
+
+# Столбцы массива ресурсов фракций
+RESOURCES = ('gold', 'wood', 'stone', 'ore', 'warriors')
+GOLD, WOOD, STONE, ORE, WARRIORS = range(len(RESOURCES))
+# Ресурсы, которые производят здания и дают бонусные клетки
+INCOME_RESOURCES = RESOURCES[:WARRIORS]
+
+# Коды типов зданий в массивах по имени BuildingType (-1 - нет здания)
+BUILDING_TYPES = tuple(BuildingType)
+BUILDING_CODES = {building_type.name: code for code, building_type in enumerate(BUILDING_TYPES)}
+NO_BUILDING = -1
+
+# Таблицы правил в виде массивов
+EconomyTables = namedtuple('EconomyTables', [
+    'version', 'production', 'base_income', 'base_limits', 'bonus_cells', 'barracks_code'
+])
+
+# Входные данные фазы экономики:
+# balances - ресурсы фракций (F x 5), committed_warriors - воины, отправленные на захват и защиту (F),
+# owners - индекс фракции-владельца клетки (-1 - нейтральная), has_building_type - на клетке указан тип постройки,
+# building_types, building_levels - код и уровень здания на клетке, cell_x, cell_y - координаты клеток
+EconomyInput = namedtuple('EconomyInput', [
+    'balances', 'committed_warriors', 'owners', 'has_building_type',
+    'building_types', 'building_levels', 'cell_x', 'cell_y'
+])
+
+# Результат фазы экономики (все массивы по фракциям):
+# balances - новые ресурсы (F x 5), limits - новые лимиты (F x 5), territories - количество клеток,
+# production - производство зданий (F x 4), resource_bonus - бонусы особых клеток (F x 4),
+# upkeep - содержание воинов, gold_change - изменение золота,
+# dismissal - нужно распускать воинов из-за нехватки золота, dismissed_from_reserve - распущено из резерва,
+# dismiss_remaining - сколько воинов осталось распустить из отправленных на защиту и захват
+EconomyResult = namedtuple('EconomyResult', [
+    'balances', 'limits', 'territories', 'production', 'resource_bonus', 'upkeep', 'gold_change',
+    'dismissal', 'dismissed_from_reserve', 'dismiss_remaining'
+])
+
+# Доход одной фракции за ход по ресурсам без ограничения лимитами: base - базовый доход
+# (для золота вместе с золотом за территории), production - производство зданий,
+# bonus - бонусы особых клеток, upkeep - содержание воинов
+FactionIncome = namedtuple('FactionIncome', ['base', 'production', 'bonus', 'upkeep'])
+
+_tables_cache = {}
+
+def economy_tables(rules):
+    """Переводит таблицы правил в массивы (один раз на версию правил)"""
+    tables = _tables_cache.get(rules.version)
+    if tables is not None:
+        return tables
+
+    # Производство по коду здания и уровню: production[код, уровень, ресурс]
+    production = np.zeros((len(BUILDING_TYPES), rules.max_building_level + 1, len(INCOME_RESOURCES)), dtype=np.int64)
+    for code, building_type in enumerate(BUILDING_TYPES):
+        for level in range(1, rules.max_building_level + 1):
+            for resource, amount in rules.building_production(building_type, level).items():
+                if resource in INCOME_RESOURCES:
+                    production[code, level, INCOME_RESOURCES.index(resource)] = amount
+
+    tables = EconomyTables(
+        version=rules.version,
+        production=production,
+        base_income=np.array([rules.base_income.get(resource, 0) for resource in INCOME_RESOURCES], dtype=np.int64),
+        base_limits=np.array([rules.base_limits[resource] for resource in RESOURCES], dtype=np.int64),
+        bonus_cells=tuple(
+            (x, y, INCOME_RESOURCES.index(resource)) for (x, y), resource in rules.resource_bonus_cells.items()
+        ),
+        barracks_code=BUILDING_CODES[BuildingType.BARRACKS.name]
+    )
+    _tables_cache.clear()
+    _tables_cache[rules.version] = tables
+    return tables
+
+def resolve_economy(rules, data):
+    """Рассчитывает доход, лимиты и содержание воинов для всех фракций сразу
+
+    Порядок и округления совпадают с пофракционным расчетом: базовый доход,
+    золото за территории и бонусы особых клеток, содержание воинов, роспуск
+    воинов из резерва при нехватке золота, воины казармы, производство
+    зданий и ограничение лимитами.
+    """
+    tables = economy_tables(rules)
+    balances = np.asarray(data.balances, dtype=np.int64).reshape(-1, len(RESOURCES))
+    faction_count = balances.shape[0]
+
+    owners = np.asarray(data.owners, dtype=np.int64)
+    owned = owners >= 0
+    owner_index = owners[owned]
+
+    # Клетки и здания фракций
+    territories = np.bincount(owner_index, minlength=faction_count)
+    buildings_count = np.bincount(owners[owned & np.asarray(data.has_building_type, dtype=bool)], minlength=faction_count)
+
+    # Лимиты ресурсов: базовые значения плюс бонусы за каждое здание
+    limits = np.tile(tables.base_limits, (faction_count, 1))
+    limits[:, :WARRIORS] += (buildings_count * rules.storage_bonus_per_building)[:, None]
+    limits[:, WARRIORS] += buildings_count * rules.warrior_capacity_per_building
+
+    # Производство зданий по фракциям
+    building_types = np.asarray(data.building_types, dtype=np.int64)
+    has_building = owned & (building_types != NO_BUILDING)
+    levels = np.clip(np.asarray(data.building_levels, dtype=np.int64)[has_building], 1, rules.max_building_level)
+    cell_production = tables.production[building_types[has_building], levels]
+    producers = owners[has_building]
+    production = np.stack([
+        np.bincount(producers, weights=cell_production[:, column], minlength=faction_count)
+        for column in range(len(INCOME_RESOURCES))
+    ], axis=1).astype(np.int64) if faction_count else np.zeros((0, len(INCOME_RESOURCES)), dtype=np.int64)
+    has_barracks = np.bincount(producers[building_types[has_building] == tables.barracks_code], minlength=faction_count) > 0
+
+    # Бонусы особых клеток (несколько клеток одного ресурса не складываются)
+    gold_from_territories = territories * rules.gold_per_territory
+    has_bonus = np.zeros((faction_count, len(INCOME_RESOURCES)), dtype=bool)
+    cell_x = np.asarray(data.cell_x)
+    cell_y = np.asarray(data.cell_y)
+    for x, y, column in tables.bonus_cells:
+        bonus_owners = owners[(cell_x == x) & (cell_y == y) & owned]
+        has_bonus[bonus_owners, column] = True
+    bonus_base = np.tile(tables.base_income, (faction_count, 1))
+    bonus_base[:, GOLD] += gold_from_territories
+    resource_bonus = np.where(has_bonus, (rules.resource_bonus * bonus_base).astype(np.int64), 0)
+
+    # Содержание всех воинов, включая отправленных на захват и защиту
+    total_warriors = balances[:, WARRIORS] + np.asarray(data.committed_warriors, dtype=np.int64)
+    upkeep = (total_warriors * rules.warrior_maintenance).astype(np.int64)
+    gold_change = tables.base_income[GOLD] + gold_from_territories + resource_bonus[:, GOLD] - upkeep
+
+    result = balances.copy()
+    result[:, GOLD] = np.maximum(0, np.minimum(balances[:, GOLD] + gold_change, limits[:, GOLD]))
+
+    # При нехватке золота распускаем воинов, сначала из резерва
+    dismissal = (result[:, GOLD] == 0) & (gold_change < 0)
+    to_dismiss = np.where(dismissal, -gold_change, 0)
+    dismissed_from_reserve = np.minimum(np.maximum(result[:, WARRIORS], 0), to_dismiss)
+    result[:, WARRIORS] -= dismissed_from_reserve
+    dismiss_remaining = to_dismiss - dismissed_from_reserve
+
+    # Казарма дает воинов каждый ход
+    result[:, WARRIORS] = np.where(
+        has_barracks,
+        np.minimum(result[:, WARRIORS] + rules.barracks_warriors_per_turn, limits[:, WARRIORS]),
+        result[:, WARRIORS]
+    )
+
+    # Базовый доход, производство зданий и бонусы особых клеток с учетом лимитов
+    result[:, GOLD] = np.minimum(result[:, GOLD] + production[:, GOLD], limits[:, GOLD])
+    for column in (WOOD, STONE, ORE):
+        result[:, column] = np.minimum(
+            balances[:, column] + tables.base_income[column] + production[:, column] + resource_bonus[:, column],
+            limits[:, column]
+        )
+
+    return EconomyResult(
+        balances=result,
+        limits=limits,
+        territories=territories,
+        production=production,
+        resource_bonus=resource_bonus,
+        upkeep=upkeep,
+        gold_change=gold_change,
+        dismissal=dismissal,
+        dismissed_from_reserve=dismissed_from_reserve,
+        dismiss_remaining=dismiss_remaining
+    )
+
+def _cell_columns(cells):
+    """Столбцы клеток (CellState) для EconomyInput, кроме владельцев"""
+    return {
+        'has_building_type': np.array([bool(cell.building_type) for cell in cells], dtype=bool),
+        'building_types': np.array([BUILDING_CODES.get(cell.building, NO_BUILDING) for cell in cells], dtype=np.int64),
+        'building_levels': np.array([cell.building_level or 0 for cell in cells], dtype=np.int64),
+        'cell_x': np.array([cell.x for cell in cells], dtype=np.int64),
+        'cell_y': np.array([cell.y for cell in cells], dtype=np.int64),
+    }
+
+def faction_income(rules, cells, warriors):
+    """Доход и расходы одной фракции за ход по ее клеткам (CellState)
+
+    warriors - все воины фракции, включая отправленных на захват и защиту.
+    Расчет тот же, что при обработке хода (resolve_economy), но без лимитов.
+    """
+    tables = economy_tables(rules)
+    result = resolve_economy(rules, EconomyInput(
+        balances=np.array([[0] * WARRIORS + [warriors]], dtype=np.int64),
+        committed_warriors=np.zeros(1, dtype=np.int64),
+        owners=np.zeros(len(cells), dtype=np.int64),
+        **_cell_columns(cells)
+    ))
+    base = tables.base_income.copy()
+    base[GOLD] += result.territories[0] * rules.gold_per_territory
+
+    def by_resource(values):
+        return {resource: int(values[column]) for column, resource in enumerate(INCOME_RESOURCES)}
+
+    return FactionIncome(
+        base=by_resource(base),
+        production=by_resource(result.production[0]),
+        bonus=by_resource(result.resource_bonus[0]),
+        upkeep=int(result.upkeep[0])
+    )
+
+def update_economy(rules, state, actions):
+    """Фаза экономики над состоянием мира
+
+    При нехватке золота воины сначала распускаются из резерва, затем из
+    действий защиты и захвата хода (начиная с самых больших отрядов).
+    Возвращает (новое состояние, события, EconomyResult).
+    """
+    sent = np.zeros((len(state.factions), 2), dtype=np.int64)
+    sent_actions = {}
+    for action in actions:
+        if action.action_type == ActionType.DEFEND_CELL.value:
+            column = 0
+        elif action.action_type == ActionType.CAPTURE_CELL.value:
+            column = 1
+        else:
+            continue
+        position = state.faction_position(action.faction_id)
+        if position is None:
+            continue
+        sent[position, column] += action.warriors or 0
+        sent_actions.setdefault((position, column), []).append(action)
+
+    result = resolve_economy(rules, EconomyInput(
+        balances=np.array(
+            [[getattr(faction, resource) or 0 for resource in RESOURCES] for faction in state.factions],
+            dtype=np.int64
+        ).reshape(-1, len(RESOURCES)),
+        committed_warriors=sent.sum(axis=1),
+        owners=owner_positions(state),
+        **_cell_columns(state.cells)
+    ))
+
+    events = []
+    factions = []
+    for index, faction in enumerate(state.factions):
+        values = {}
+        for column, resource in enumerate(RESOURCES):
+            values[resource] = int(result.balances[index, column])
+            values[f'max_{resource}'] = int(result.limits[index, column])
+        factions.append(faction._replace(**values))
+
+        if not result.dismissal[index]:
+            continue
+        gold_change = int(result.gold_change[index])
+        events.append(turn_event(
+            GOLD_SHORTAGE,
+            f"Из-за нехватки золота фракция потеряла {abs(gold_change)} воинов",
+            faction_id=faction.id, amount=abs(gold_change)
+        ))
+
+        # Оставшихся воинов распускаем из отправленных: сначала на защиту, затем на захват
+        warriors_to_dismiss = int(result.dismiss_remaining[index])
+        for column in (0, 1):
+            if warriors_to_dismiss <= 0:
+                break
+            faction_actions = sorted(sent_actions.get((index, column), []), key=lambda a: a.warriors or 0, reverse=True)
+            for action in faction_actions:
+                if warriors_to_dismiss <= 0:
+                    break
+                if action.warriors:
+                    warriors_to_remove = min(action.warriors, warriors_to_dismiss)
+                    warriors_to_dismiss -= warriors_to_remove
+                    events.append(turn_event(
+                        WARRIORS_DISMISSED,
+                        f"Фракция {faction.name} распустила {warriors_to_remove} воинов из действия {action.action_type}",
+                        faction_id=faction.id, x=action.x, y=action.y, amount=warriors_to_remove, action_id=action.id
+                    ))
+
+    return state.replace(factions=factions), events, result
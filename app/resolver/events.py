@@ -0,0 +1,15 @@
+from collections import namedtuple
+
+# Виды событий обработки хода
+DEFENDERS_ASSIGNED = 'defenders_assigned'   # нейтральной клетке назначены защитники (amount)
+CELL_RELEASED = 'cell_released'             # клетка не связана с замком и освобождена
+BUILDING_BUILT = 'building_built'           # построено здание
+BUILD_REJECTED = 'build_rejected'           # строительство отклонено
+GOLD_SHORTAGE = 'gold_shortage'             # фракция распускает воинов из-за нехватки золота (amount)
+WARRIORS_DISMISSED = 'warriors_dismissed'   # из действия action_id распущено amount воинов
+
+# Событие обработки хода: message - описание для журнала сервера
+TurnEvent = namedtuple('TurnEvent', ['kind', 'message', 'faction_id', 'x', 'y', 'amount', 'action_id'])
+
+def turn_event(kind, message, faction_id=None, x=None, y=None, amount=None, action_id=None):
+    return TurnEvent(kind, message, faction_id, x, y, amount, action_id)
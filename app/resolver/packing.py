@@ -0,0 +1,136 @@
+from collections import namedtuple
+
+import numpy as np
+
+from app.resolver.state import WorldState, CellState, FactionState, TurnAction
+from app.resolver.events import TurnEvent
+from app.resolver.turn import TurnResult
+
+# Значение None в упакованных массивах
+NULL = -(2 ** 31)
+
+# Упакованное состояние мира для передачи в процесс обработки ходов:
+# cells - int32 (клетки, CELL_COLUMNS), factions - int64 (фракции, FACTION_COLUMNS),
+# strings - таблица строк, на которую ссылаются столбцы со строковыми значениями
+PackedWorld = namedtuple('PackedWorld', ['cells', 'factions', 'strings'])
+
+# Упакованные действия хода: rows - int64 (действия, ACTION_COLUMNS), strings - таблица строк
+PackedActions = namedtuple('PackedActions', ['rows', 'strings'])
+
+# Упакованный результат хода: cell_indexes - номера изменившихся клеток, cells - их новые
+# значения, factions - все фракции, events - int64 (события, EVENT_COLUMNS),
+# combat и economy - таблицы исходов боев и расчета экономики (уже массивы NumPy)
+PackedTurnResult = namedtuple('PackedTurnResult', [
+    'cell_indexes', 'cells', 'factions', 'events', 'strings', 'combat', 'economy'
+])
+
+CELL_COLUMNS = ('x', 'y', 'faction_id', 'building_type', 'building', 'building_level', 'neutral_defenders')
+CELL_STRINGS = ('building_type', 'building')
+FACTION_COLUMNS = ('id', 'name', 'short_name', 'color',
+                   'gold', 'wood', 'stone', 'ore', 'warriors',
+                   'max_gold', 'max_wood', 'max_stone', 'max_ore', 'max_warriors')
+FACTION_STRINGS = ('name', 'short_name', 'color')
+ACTION_COLUMNS = ('id', 'faction_id', 'action_type', 'x', 'y', 'building_type', 'warriors')
+ACTION_STRINGS = ('action_type', 'building_type')
+EVENT_COLUMNS = TurnEvent._fields
+EVENT_STRINGS = ('kind', 'message')
+
+class _StringTable:
+    """Таблица строк: каждая строка хранится один раз, в массивах - ее номер"""
+
+    def __init__(self):
+        self.codes = {}
+
+    def code(self, value):
+        if value is None:
+            return NULL
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.codes)
+        return code
+
+    def strings(self):
+        return tuple(self.codes)
+
+def _pack_rows(rows, columns, string_columns, strings, dtype):
+    """Упаковывает строки-кортежи в двумерный массив (по столбцам, а не по значениям)"""
+    table = np.empty((len(columns), len(rows)), dtype=dtype)
+    for position, values in enumerate(zip(*rows)):
+        if columns[position] in string_columns:
+            values = [strings.code(value) for value in values]
+        elif None in values:
+            values = [NULL if value is None else value for value in values]
+        table[position] = values
+    return table.T
+
+def _unpack_rows(table, columns, string_columns, strings, row_type):
+    """Восстанавливает строки-кортежи из двумерного массива"""
+    values = []
+    for position, column in enumerate(table.T.tolist()):
+        if columns[position] in string_columns:
+            column = [None if value == NULL else strings[value] for value in column]
+        elif NULL in column:
+            column = [None if value == NULL else value for value in column]
+        values.append(column)
+    return list(map(row_type._make, zip(*values)))
+
+def pack_state(state):
+    """Упаковывает состояние мира в массивы NumPy"""
+    strings = _StringTable()
+    cells = _pack_rows(state.cells, CELL_COLUMNS, CELL_STRINGS, strings, np.int32)
+    factions = _pack_rows(state.factions, FACTION_COLUMNS, FACTION_STRINGS, strings, np.int64)
+    return PackedWorld(cells, factions, strings.strings())
+
+def unpack_state(packed, base=None):
+    """Восстанавливает состояние мира из массивов
+
+    base - исходное состояние с тем же порядком клеток и фракций (например,
+    состояние до обработки хода): его индексы переиспользуются.
+    """
+    cells = _unpack_rows(packed.cells, CELL_COLUMNS, CELL_STRINGS, packed.strings, CellState)
+    factions = _unpack_rows(packed.factions, FACTION_COLUMNS, FACTION_STRINGS, packed.strings, FactionState)
+    if base is not None:
+        return base.replace(cells=cells, factions=factions)
+    return WorldState(cells, factions)
+
+def pack_actions(actions):
+    """Упаковывает действия хода в массив NumPy"""
+    strings = _StringTable()
+    rows = _pack_rows(tuple(actions), ACTION_COLUMNS, ACTION_STRINGS, strings, np.int64)
+    return PackedActions(rows, strings.strings())
+
+def unpack_actions(packed):
+    """Восстанавливает действия хода из массива"""
+    return tuple(_unpack_rows(packed.rows, ACTION_COLUMNS, ACTION_STRINGS, packed.strings, TurnAction))
+
+def pack_result(state, result):
+    """Упаковывает результат хода: только изменившиеся клетки, все фракции и события
+
+    state - состояние мира до обработки хода (с тем же порядком клеток).
+    """
+    strings = _StringTable()
+    new_cells = result.state.cells
+    changed = [index for index, (old, new) in enumerate(zip(state.cells, new_cells)) if old != new]
+    return PackedTurnResult(
+        cell_indexes=np.array(changed, dtype=np.int32),
+        cells=_pack_rows([new_cells[index] for index in changed], CELL_COLUMNS, CELL_STRINGS, strings, np.int32),
+        factions=_pack_rows(result.state.factions, FACTION_COLUMNS, FACTION_STRINGS, strings, np.int64),
+        events=_pack_rows(result.events, EVENT_COLUMNS, EVENT_STRINGS, strings, np.int64),
+        strings=strings.strings(),
+        combat=result.combat,
+        economy=result.economy
+    )
+
+def unpack_result(state, packed):
+    """Восстанавливает TurnResult по состоянию мира до хода и упакованному результату"""
+    cells = list(state.cells)
+    changed = _unpack_rows(packed.cells, CELL_COLUMNS, CELL_STRINGS, packed.strings, CellState)
+    for index, cell in zip(packed.cell_indexes.tolist(), changed):
+        cells[index] = cell
+    factions = _unpack_rows(packed.factions, FACTION_COLUMNS, FACTION_STRINGS, packed.strings, FactionState)
+    return TurnResult(
+        state=state.replace(cells=cells, factions=factions),
+        events=_unpack_rows(packed.events, EVENT_COLUMNS, EVENT_STRINGS, packed.strings, TurnEvent),
+        combat=packed.combat,
+        economy=packed.economy
+    )
@@ -0,0 +1,89 @@
+from itertools import repeat
+
+import numpy as np
+
+from app.resolver.combat import CombatInput, fight, settle, resolve_combat
+
+def action_regions(coords, region_size):
+    """Номера регионов карты (квадратов region_size x region_size) по координатам клеток действий"""
+    coords = np.asarray(coords, dtype=np.int64).reshape(-1, 2) // region_size
+    # Номер региона однозначен для любых неотрицательных координат
+    return coords[:, 0] * (int(coords[:, 1].max(initial=0)) + 1) + coords[:, 1]
+
+def split_combat(data, regions, parts):
+    """Делит входные данные боев на части по регионам карты
+
+    regions - номер региона для каждого действия. Регионы распределяются
+    по не более чем parts частям так, чтобы количество действий в частях было
+    близким (самые нагруженные регионы - первыми в наименее нагруженную часть).
+    Все действия одной клетки попадают в одну часть. Возвращает список пар
+    (индексы клеток части в data, CombatInput части с индексами клеток внутри части).
+    """
+    action_cells = np.asarray(data.action_cells, dtype=np.int64)
+    region_ids, region_slot, region_sizes = np.unique(regions, return_inverse=True, return_counts=True)
+    part_count = min(parts, region_ids.shape[0])
+    region_parts = np.empty(region_ids.shape[0], dtype=np.int64)
+    loads = [0] * part_count
+    for region in np.argsort(-region_sizes, kind='stable').tolist():
+        part = loads.index(min(loads))
+        region_parts[region] = part
+        loads[part] += int(region_sizes[region])
+
+    action_parts = region_parts[region_slot]
+    result = []
+    for part in range(part_count):
+        mask = action_parts == part
+        part_cells, local_cells = np.unique(action_cells[mask], return_inverse=True)
+        result.append((part_cells, CombatInput(
+            action_cells=local_cells,
+            action_factions=np.asarray(data.action_factions)[mask],
+            action_warriors=np.asarray(data.action_warriors)[mask],
+            action_roles=np.asarray(data.action_roles)[mask],
+            cell_owners=np.asarray(data.cell_owners)[part_cells],
+            cell_castles=np.asarray(data.cell_castles)[part_cells],
+            cell_neutral_defenders=np.asarray(data.cell_neutral_defenders)[part_cells],
+            faction_warriors=data.faction_warriors,
+            faction_max_warriors=data.faction_max_warriors,
+            faction_bonus=data.faction_bonus
+        )))
+    return result
+
+class RegionExecutor:
+    """Параллельное разрешение боев хода по регионам карты
+
+    Бои за разные клетки независимы, поэтому карта делится на квадратные
+    регионы, регионы - на части по количеству рабочих, и бои каждой части
+    разрешаются отдельно (executor - пул процессов с методом map). Общие для
+    всей карты итоги сводятся после: возврат воинов суммируется по фракциям
+    (app.resolver.combat.settle), а связность территорий проверяется следующей
+    фазой хода по всей карте. Результат совпадает с разрешением всех боев сразу.
+
+    Если действий боя меньше min_actions, бои разрешаются в вызывающем процессе:
+    передача данных в пул обходится дороже самих боев.
+    """
+
+    def __init__(self, executor, workers, region_size, min_actions):
+        self.executor = executor
+        self.workers = workers
+        self.region_size = max(1, region_size)
+        self.min_actions = min_actions
+
+    def resolve_combat(self, rules, data, coords):
+        """Разрешает бои хода (как app.resolver.combat.resolve_combat)
+
+        coords - координаты (x, y) клеток действий из data, массив N x 2.
+        """
+        if self.workers < 2 or len(data.action_cells) < self.min_actions:
+            return resolve_combat(rules, data)
+        regions = action_regions(coords, self.region_size)
+        parts = split_combat(data, regions, self.workers)
+        if len(parts) < 2:
+            return resolve_combat(rules, data)
+
+        battles = self.executor.map(fight, repeat(rules), [part for _, part in parts])
+        # Индексы клеток частей переводятся обратно в индексы клеток всей карты
+        battles = [
+            part_battles._replace(outcome=part_battles.outcome._replace(cells=part_cells[part_battles.outcome.cells]))
+            for (part_cells, _), part_battles in zip(parts, battles)
+        ]
+        return settle(data, battles)
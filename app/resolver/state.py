@@ -0,0 +1,80 @@
+from collections import namedtuple
+
+import numpy as np
+
+# Состояние клетки: building - тип здания (имя BuildingType), building_level - его уровень
+CellState = namedtuple('CellState', [
+    'x', 'y', 'faction_id', 'building_type', 'building', 'building_level', 'neutral_defenders'
+])
+
+# Состояние фракции
+FactionState = namedtuple('FactionState', [
+    'id', 'name', 'short_name', 'color',
+    'gold', 'wood', 'stone', 'ore', 'warriors',
+    'max_gold', 'max_wood', 'max_stone', 'max_ore', 'max_warriors'
+])
+
+# Зафиксированное действие хода, влияющее на обработку (захват, защита, строительство)
+TurnAction = namedtuple('TurnAction', [
+    'id', 'faction_id', 'action_type', 'x', 'y', 'building_type', 'warriors'
+])
+
+class WorldState:
+    """Неизменяемое состояние мира для обработки хода
+
+    Клетки хранятся в порядке (x, y), фракции - в порядке идентификаторов.
+    Фазы обработки не меняют состояние, а возвращают новое.
+    """
+    __slots__ = ('cells', 'factions', '_cell_index', '_faction_index')
+
+    def __init__(self, cells, factions):
+        cells = tuple(sorted(cells, key=lambda c: (c.x, c.y)))
+        factions = tuple(sorted(factions, key=lambda f: f.id))
+        object.__setattr__(self, 'cells', cells)
+        object.__setattr__(self, 'factions', factions)
+        object.__setattr__(self, '_cell_index', {(cell.x, cell.y): index for index, cell in enumerate(cells)})
+        object.__setattr__(self, '_faction_index', {faction.id: index for index, faction in enumerate(factions)})
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Состояние мира неизменяемо")
+
+    def cell(self, x, y):
+        """Возвращает клетку по координатам или None"""
+        index = self._cell_index.get((x, y))
+        return None if index is None else self.cells[index]
+
+    def cell_position(self, x, y):
+        """Возвращает номер клетки в self.cells или None"""
+        return self._cell_index.get((x, y))
+
+    def faction(self, faction_id):
+        """Возвращает фракцию по идентификатору или None"""
+        index = self._faction_index.get(faction_id)
+        return None if index is None else self.factions[index]
+
+    def faction_position(self, faction_id):
+        """Возвращает номер фракции в self.factions или None"""
+        return self._faction_index.get(faction_id)
+
+    def replace(self, cells=None, factions=None):
+        """Возвращает новое состояние с замененными клетками и/или фракциями
+
+        Клетки и фракции передаются в том же порядке, что и в текущем
+        состоянии (меняются только их поля), поэтому индексы переиспользуются.
+        """
+        state = object.__new__(WorldState)
+        object.__setattr__(state, 'cells', self.cells if cells is None else tuple(cells))
+        object.__setattr__(state, 'factions', self.factions if factions is None else tuple(factions))
+        object.__setattr__(state, '_cell_index', self._cell_index)
+        object.__setattr__(state, '_faction_index', self._faction_index)
+        return state
+
+def owner_positions(state, cells=None):
+    """Номера фракций-владельцев клеток в state.factions (-1 - нейтральная клетка)"""
+    owners = np.full(len(state.cells), -1, dtype=np.int64)
+    for index, cell in enumerate(state.cells if cells is None else cells):
+        if cell.faction_id is not None:
+            position = state.faction_position(cell.faction_id)
+            if position is not None:
+                owners[index] = position
+    return owners
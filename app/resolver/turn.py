@@ -0,0 +1,33 @@
+from collections import namedtuple
+
+from app.resolver.buildings import build
+from app.resolver.combat import resolve_captures, assign_neutral_defenders
+from app.resolver.connectivity import release_disconnected
+from app.resolver.economy import update_economy
+
+# Результат обработки хода: state - новое состояние мира, events - события в порядке фаз,
+# combat - таблица исходов боев (None, если захватов не было), economy - расчет экономики
+TurnResult = namedtuple('TurnResult', ['state', 'events', 'combat', 'economy'])
+
+def resolve_turn(rules, state, actions, rng, regions=None):
+    """Обрабатывает ход без обращения к базе данных
+
+    rules - правила игры (GameRules), state - состояние мира (WorldState) на
+    конец приема действий, actions - действия хода (TurnAction) в порядке их
+    записи, rng - генератор случайных чисел хода, regions - RegionExecutor
+    для параллельного разрешения боев на большой карте (необязательно).
+    Фазы идут в порядке: захваты, связность территорий, строительство,
+    экономика, назначение защитников нейтральным клеткам.
+    """
+    actions = tuple(actions)
+    state, capture_events, combat = resolve_captures(rules, state, actions, rng, regions)
+    state, connectivity_events = release_disconnected(rules, state)
+    state, building_events = build(rules, state, actions)
+    state, economy_events, economy = update_economy(rules, state, actions)
+    state, defender_events = assign_neutral_defenders(rules, state, rng)
+    return TurnResult(
+        state=state,
+        events=capture_events + connectivity_events + building_events + economy_events + defender_events,
+        combat=combat,
+        economy=economy
+    )
@@ -0,0 +1,229 @@
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+import logging
+import multiprocessing
+import multiprocessing.util
+import os
+import random
+import signal
+import threading
+import time
+
+from app.resolver import resolve_turn, RegionExecutor
+from app.resolver.packing import pack_state, unpack_state, pack_actions, unpack_actions, pack_result, unpack_result
+from app.rules import GameRules
+
+# Правила игры, собранные в процессе обработки ходов, по версии
+_worker_rules = {}
+# Пул разрешения боев по регионам в процессе обработки ходов (None - бои без разбиения)
+_worker_regions = None
+
+def _worker_ready():
+    return True
+
+def _worker_init(region_settings):
+    """Запускает пул регионов при старте процесса обработки ходов
+
+    Только что созданный процесс еще однопоточный, поэтому процессы пула
+    регионов создаются через fork безопасно. Позже, когда в процессе уже
+    работают потоки пула регионов, новые процессы не создаются.
+    """
+    global _worker_regions
+    _worker_regions = _region_executor(region_settings)
+
+def _region_worker_init(parent_pid):
+    """Завершает процесс пула регионов вслед за процессом обработки ходов
+
+    Процессы пула регионов наследуют от процесса обработки ходов канал, по
+    которому сервер узнает о его завершении. Пока они работают, аварийное
+    завершение процесса обработки ходов осталось бы незамеченным.
+    """
+    def watch():
+        while os.getppid() == parent_pid:
+            time.sleep(1)
+        os._exit(1)
+    threading.Thread(target=watch, name='region-worker-watch', daemon=True).start()
+
+def _fork_context():
+    """Контекст создания процессов пулов"""
+    # Процессы создаются через fork: при spawn дочерний процесс заново
+    # импортирует app.py и запустил бы в себе еще один сервер
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('fork' if 'fork' in methods else None)
+
+def _region_executor(settings):
+    """Создает RegionExecutor по настройкам (процессы, сторона региона, минимум действий) или None"""
+    processes, region_size, min_actions = settings
+    if processes < 2:
+        return None
+    executor = ProcessPoolExecutor(max_workers=processes, mp_context=_fork_context(),
+                                   initializer=_region_worker_init, initargs=(os.getpid(),))
+    # При fork все процессы пула запускаются сразу, при первой задаче
+    executor.submit(_worker_ready).result()
+    # При завершении процесс обработки ходов ждет свои дочерние процессы,
+    # поэтому пул регионов нужно остановить до этого ожидания
+    multiprocessing.util.Finalize(executor, executor.shutdown, exitpriority=10)
+    return RegionExecutor(executor, processes, region_size, min_actions)
+
+def _worker_resolve(rules_version, rules_source, packed_state, packed_actions, seed):
+    """Обрабатывает ход в процессе пула: на входе и выходе упакованные массивы"""
+    global _worker_regions
+    rules = _worker_rules.get(rules_version)
+    if rules is None:
+        rules = _worker_rules[rules_version] = GameRules.from_source(rules_source)
+    state = unpack_state(packed_state)
+    actions = unpack_actions(packed_actions)
+    try:
+        result = resolve_turn(rules, state, actions, random.Random(seed), _worker_regions)
+    except BrokenProcessPool:
+        # Процесс пула регионов завершился аварийно: пул останавливается, и до конца
+        # жизни процесса бои разрешаются без разбиения (новый пул здесь не создается)
+        _worker_regions.executor.shutdown(wait=False, cancel_futures=True)
+        _worker_regions = None
+        result = resolve_turn(rules, state, actions, random.Random(seed))
+    return pack_result(state, result)
+
+class ResolverPool:
+    """Пул процессов для обработки ходов
+
+    Вычисления хода (app.resolver.resolve_turn) выполняются в отдельных
+    процессах, поэтому ходы разных игр, наступившие одновременно, не
+    ждут друг друга из-за GIL. Каждая игра закреплена за своим процессом
+    (шардом), игры распределяются по шардам поровну. Состояние мира и действия
+    передаются упакованными массивами NumPy, а изменения в базу данных
+    записывает GameManager. При TURN_RESOLVER_PROCESSES = 0 ход обрабатывается
+    в вызывающем потоке.
+
+    Процессы создаются через fork только при запуске сервера. Шард, процесс
+    которого завершился аварийно или не вернул ход за TURN_RESOLVER_TIMEOUT
+    секунд, останавливается без замены (fork из сервера с работающими потоками
+    может зависнуть), а его игры переходят в другие шарды. Когда работающих
+    шардов не остается, ходы обрабатываются в вызывающем потоке.
+
+    На большой карте бои хода дополнительно делятся по регионам и
+    разрешаются в CAPTURE_REGION_PROCESSES процессах, запущенных процессом
+    обработки ходов (см. RegionExecutor).
+    """
+    _instance = None
+
+    def __init__(self):
+        self.processes = 0
+        self.timeout = None
+        self.logger = logging.getLogger('game_manager')
+        self.region_settings = (0, 1, 0)
+        self._lock = threading.Lock()
+        self._shards = []
+        # Идентификаторы процессов шардов
+        self._shard_pids = []
+        # Номер шарда по номеру игры
+        self._game_shards = {}
+
+    @classmethod
+    def get_instance(cls):
+        if cls._instance is None:
+            cls._instance = ResolverPool()
+        return cls._instance
+
+    @property
+    def enabled(self):
+        return self.processes > 0
+
+    def init_app(self, app, games=1):
+        """Запускает процессы пула по настройке TURN_RESOLVER_PROCESSES
+
+        games - количество активных игр: если количество процессов не задано,
+        запускается по процессу на игру, но не больше, чем процессоров.
+        Процессы запускаются сразу, пока в сервере еще не работают потоки
+        игровых циклов и очередей действий.
+        """
+        self.shutdown()
+        processes = app.config.get('TURN_RESOLVER_PROCESSES')
+        if processes is None:
+            processes = min(os.cpu_count() or 1, games) or 1
+        self.processes = max(0, processes)
+        self.timeout = app.config.get('TURN_RESOLVER_TIMEOUT') or None
+        self.region_settings = (
+            app.config.get('CAPTURE_REGION_PROCESSES', 0) or 0,
+            app.config.get('CAPTURE_REGION_SIZE', 16),
+            app.config.get('CAPTURE_REGION_MIN_ACTIONS', 0)
+        )
+        with self._lock:
+            self._shards = [self._start_shard() for _ in range(self.processes)]
+            self._shard_pids = [shard.submit(os.getpid).result() for shard in self._shards]
+
+    def resolve(self, game_id, rules, state, actions, seed):
+        """Обрабатывает ход игры и возвращает TurnResult
+
+        Генератор случайных чисел хода создается по зерну seed в том процессе,
+        где идет обработка, поэтому результат не зависит от того, включен ли пул.
+        """
+        if not self.enabled:
+            return resolve_turn(rules, state, actions, random.Random(seed))
+
+        with self._lock:
+            index, shard = self._game_shard(game_id)
+        if shard is None:
+            return resolve_turn(rules, state, actions, random.Random(seed))
+        try:
+            future = shard.submit(_worker_resolve, rules.version, rules.source,
+                                  pack_state(state), pack_actions(actions), seed)
+            result = future.result(timeout=self.timeout)
+        except BrokenProcessPool as e:
+            self.logger.error("Процесс обработки ходов %s завершился аварийно: %s", index, str(e))
+            self._stop_shard(index, shard)
+            return resolve_turn(rules, state, actions, random.Random(seed))
+        except TimeoutError:
+            self.logger.error("Процесс обработки ходов %s не вернул ход игры %s за %s с", index, game_id, self.timeout)
+            self._stop_shard(index, shard)
+            return resolve_turn(rules, state, actions, random.Random(seed))
+        return unpack_result(state, result)
+
+    def shutdown(self):
+        """Останавливает процессы пула"""
+        with self._lock:
+            for shard in self._shards:
+                if shard is not None:
+                    shard.shutdown(wait=False, cancel_futures=True)
+            self._shards = []
+            self._shard_pids = []
+            self._game_shards = {}
+
+    def _start_shard(self):
+        """Запускает процесс шарда вместе с его пулом регионов"""
+        shard = ProcessPoolExecutor(max_workers=1, mp_context=_fork_context(),
+                                    initializer=_worker_init, initargs=(self.region_settings,))
+        shard.submit(_worker_ready).result()
+        return shard
+
+    def _game_shard(self, game_id):
+        """Возвращает (номер, процесс) шарда игры или (None, None), если работающих шардов нет (под блокировкой)
+
+        Игра без шарда или с остановленным шардом закрепляется за работающим
+        шардом с наименьшим количеством игр.
+        """
+        index = self._game_shards.get(game_id)
+        if index is None or self._shards[index] is None:
+            running = [number for number, shard in enumerate(self._shards) if shard is not None]
+            if not running:
+                return None, None
+            self._game_shards.pop(game_id, None)
+            games = list(self._game_shards.values())
+            index = self._game_shards[game_id] = min(running, key=games.count)
+        return index, self._shards[index]
+
+    def _stop_shard(self, index, shard):
+        """Останавливает шард без замены, его игры переходят в другие шарды
+
+        Процесс шарда, не вернувший ход, мог зависнуть, поэтому он завершается
+        принудительно (процессы его пула регионов завершаются вслед за ним).
+        """
+        with self._lock:
+            if index >= len(self._shards) or self._shards[index] is not shard:
+                return
+            self._shards[index] = None
+            pid = self._shard_pids[index]
+        shard.shutdown(wait=False, cancel_futures=True)
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            pass
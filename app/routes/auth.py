@@ -1,6 +1,7 @@
 from flask import Blueprint, render_template, redirect, url_for, flash, request
 from flask_login import login_user, logout_user, login_required, current_user
 from app.models.user import User, Faction
+from app.identity_cache import IdentityCache
 from app import db
 from werkzeug.security import generate_password_hash
 
@@ -47,7 +48,8 @@ def register():
         
         flash(error)
     
-    factions = Faction.query.all()
+    # Фракции всех игр сервера, сгруппированные по играм
+    factions = Faction.query.order_by(Faction.game_id, Faction.id).all()
     return render_template('auth/register.html', factions=factions)
 
 @bp.route('/login', methods=['GET', 'POST'])
@@ -90,5 +92,7 @@ def approve_user(user_id):
     user = User.query.get_or_404(user_id)
     user.is_approved = True
     db.session.commit()
+    # Учетная запись изменилась: пользователь заново читается из базы при следующем запросе
+    IdentityCache.get_instance().invalidate(user.id)
     flash(f'Пользователь {user.username} одобрен.')
-    return redirect(url_for('admin.user_list')) 
\ No newline at end of file
+    return redirect(url_for('main.index'))
\ No newline at end of file
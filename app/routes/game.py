@@ -1,24 +1,52 @@
-from flask import Blueprint, jsonify, request, flash, redirect, url_for, render_template
+from flask import Blueprint, jsonify, request, flash, redirect, url_for, render_template, current_app, abort
 from flask_login import login_required, current_user
 from app import db
-from app.models.game import Cell, Building, BuildingType
-from app.models.user import Faction, User
+from app.models.game import Game, Building, BuildingType, DEFAULT_GAME_ID
 from app.models.user_action import UserAction, ActionType
 from datetime import datetime
-from sqlalchemy import and_, or_
+from sqlalchemy import and_, or_, func
 import logging
 from app.game_manager import GameManager
+from app.action_queue import ActionQueue, RESOURCE_FIELDS
 import json
-import random
 from app.models.faction_log import FactionLog
+from app.models.user import Faction
+from app.rules import GameRules
+from app.map_image import MapImageStore
+from app.map_encoding import MAP_MIMETYPES, MAP_JSON_MIMETYPE
+from app.map_tiles import MapTiles
+from app.map_deltas import MapDeltas
+from app.http_cache import shared_body
 
 bp = Blueprint('game', __name__)
 logger = logging.getLogger('game')
 
+# Размер страницы журнала фракции по умолчанию и максимальный
+FACTION_LOGS_DEFAULT_LIMIT = 50
+FACTION_LOGS_MAX_LIMIT = 200
+
+# Части состояния игры, которые можно запросить через /api/state
+STATE_FIELDS = ('turn', 'map', 'resources', 'logs')
+
+# Действия, которые можно отправить пакетом через /api/actions/batch
+BATCH_ACTION_TYPES = ('CAPTURE_CELL', 'DEFEND_CELL', 'BUILD', 'RECRUIT_WARRIORS', 'TRANSFER_RESOURCES')
+
+@bp.route('/api/games', methods=['GET'])
+def get_games():
+    """Возвращает список игр сервера с текущим ходом каждой"""
+    games = []
+    for game in Game.query.order_by(Game.id).all():
+        game_data = game.to_dict()
+        game_manager = GameManager.find(game.id)
+        game_data['current_turn'] = game_manager.current_turn if game_manager else None
+        game_data['is_running'] = bool(game_manager and game_manager.is_running)
+        games.append(game_data)
+    return jsonify(games)
+
 @bp.route('/api/turn', methods=['GET'])
 def get_turn():
-    """Возвращает информацию о текущем ходе"""
-    game_manager = GameManager.get_instance()
+    """Возвращает информацию о текущем ходе игры (параметр game_id)"""
+    game_manager = get_game_manager(requested_game_id())
     return jsonify({
         'current_turn': game_manager.current_turn,
         'seconds_left': game_manager.seconds_left
@@ -26,118 +54,215 @@ def get_turn():
 
 @bp.route('/api/map', methods=['GET'])
 def get_map():
-    """Возвращает данные карты для отображения"""
-    cells = Cell.query.all()
-    factions = Faction.query.all()
-    
-    # Создаем словарь с названиями фракций для быстрого доступа
-    faction_names = {}
-    for faction in factions:
-        # Сокращаем название фракции, убирая слово "Квантум"
-        short_name = faction.name.replace("-Квантум", "").replace(" Квантум", "")
-        faction_names[faction.id] = short_name
-    
-    map_data = []
-    for cell in cells:
-        cell_data = {
-            'x': cell.x,
-            'y': cell.y,
-            'faction_id': cell.faction_id,
-            'building_type': cell.building_type
-        }
-        
-        # Добавляем название фракции, если клетка принадлежит фракции
-        if cell.faction_id and cell.faction_id in faction_names:
-            cell_data['faction_name'] = faction_names[cell.faction_id]
-        
-        # Если клетка нейтральная и на ней есть постройка, добавляем информацию о защитниках
-        if cell.faction_id is None and cell.building_type is not None:
-            # Если значение защитников еще не установлено, генерируем его
-            if cell.neutral_defenders is None:
-                cell.neutral_defenders = random.randint(1, 3)
-                db.session.add(cell)
-                db.session.commit()
-            
-            cell_data['neutral_defenders'] = cell.neutral_defenders
-        
-        map_data.append(cell_data)
+    """Возвращает данные карты игры (параметр game_id) для отображения
     
-    return jsonify(map_data)
+    Данные берутся из снимка мира последнего завершенного хода, поэтому во время
+    обработки хода карта не читается из базы данных и всегда согласована.
+    Формат выбирается по заголовку Accept (см. app.map_encoding): список клеток
+    в JSON (по умолчанию), JSON по столбцам или двоичные записи фиксированной
+    длины. Ответ кодируется один раз на снимок мира.
+    """
+    snapshot = get_game_manager(requested_game_id()).get_snapshot()
+    mimetype = request.accept_mimetypes.best_match(MAP_MIMETYPES, default=MAP_JSON_MIMETYPE)
+    response = current_app.response_class(snapshot.map_payload(mimetype), mimetype=mimetype)
+    response.vary.add('Accept')
+    return shared_body(response)
+
+@bp.route('/api/map/tiles', methods=['GET'])
+def get_map_tiles():
+    """Возвращает разбиение карты игры (параметр game_id) на тайлы и версии тайлов
+    
+    Клиент периодически запрашивает версии и загружает через
+    /api/map/tiles/<tx>/<ty> только видимые тайлы, версия которых изменилась.
+    """
+    game_id = requested_game_id()
+    snapshot = get_game_manager(game_id).get_snapshot()
+    return jsonify(dict(MapTiles.get_instance(game_id).versions(snapshot), version=snapshot.version))
+
+@bp.route('/api/map/tiles/<int:tx>/<int:ty>', methods=['GET'])
+def get_map_tile(tx, ty):
+    """Возвращает клетки тайла (tx, ty) карты игры (параметр game_id)
+    
+    Клетки в том же виде, что в /api/map. Ответ кешируется на сервере до
+    изменения одной из клеток тайла; по заголовку If-None-Match неизменившийся
+    тайл не передается повторно (ответ 304).
+    """
+    game_id = requested_game_id()
+    tile = MapTiles.get_instance(game_id).tile(get_game_manager(game_id).get_snapshot(), tx, ty)
+    if tile is None:
+        return jsonify({'success': False, 'message': 'Тайл вне карты'}), 404
+    response = current_app.response_class(tile.payload, mimetype='application/json')
+    response.set_etag(tile.etag)
+    response.cache_control.no_cache = True
+    return shared_body(response.make_conditional(request))
+
+@bp.route('/api/map/image', methods=['GET'])
+def get_map_image():
+    """Возвращает URL изображения карты игры (параметр game_id) и время до конца хода
+    
+    Зрители запрашивают его раз в ход, чтобы загрузить новое изображение.
+    """
+    game_id = requested_game_id()
+    game_manager = get_game_manager(game_id)
+    image_url = map_image_url(game_id)
+    if image_url is None:
+        return jsonify({'success': False, 'message': 'Изображения карты отключены'}), 404
+    return jsonify({
+        'url': image_url,
+        'current_turn': game_manager.current_turn,
+        'seconds_left': game_manager.seconds_left
+    })
+
+@bp.route('/api/state', methods=['GET'])
+def get_state():
+    """Возвращает все данные главной страницы игры (параметр game_id) одним ответом
+    
+    Вместо отдельных запросов к /api/turn, /api/map, /api/resources и
+    /api/faction_logs. Все части строятся по одному снимку мира и одному
+    номеру текущего хода, поэтому не расходятся на границе хода.
+    Параметры:
+    - fields - нужные части через запятую (turn, map, resources, logs),
+      по умолчанию все;
+    - map_version - версия снимка мира, которая уже есть у клиента: если
+      она не изменилась, карта не передается (map = null);
+    - map_format=columns - карта по столбцам, как в /api/map с форматом
+      application/vnd.kvantwars.map-columns+json;
+    - map_changes=1 - если версия map_version изменилась, но еще хранится на
+      сервере, вместо всей карты передаются только изменившиеся с нее клетки:
+      map = null, map_changes = {from_version, cells} (клетки как в /api/map);
+    - logs_after - курсор журнала фракции, как after в /api/faction_logs.
+    Ресурсы и журнал возвращаются только игроку этой игры.
+    """
+    fields = set(filter(None, request.args.get('fields', ','.join(STATE_FIELDS)).split(',')))
+    unknown = fields - set(STATE_FIELDS)
+    if unknown:
+        return jsonify({'success': False, 'message': f"Неизвестные части состояния: {', '.join(sorted(unknown))}"}), 400
+    
+    game_id = requested_game_id()
+    game_manager = get_game_manager(game_id)
+    # Снимок мира читается один раз на весь ответ, номер хода берется из него же:
+    # game_manager.current_turn увеличивается в начале обработки хода, раньше
+    # публикации нового снимка
+    snapshot = game_manager.get_snapshot()
+    current_turn = snapshot.turn
+    
+    state = {'success': True, 'version': snapshot.version, 'current_turn': current_turn}
+    if 'turn' in fields:
+        state['turn'] = {'current_turn': current_turn, 'seconds_left': game_manager.seconds_left}
+    if 'map' in fields:
+        map_version = request.args.get('map_version', type=int)
+        map_deltas = MapDeltas.get_instance(game_id)
+        changes = None
+        if map_version is not None and map_version != snapshot.version and request.args.get('map_changes'):
+            changes = map_deltas.changes(snapshot, map_version)
+        else:
+            map_deltas.record(snapshot)
+        if map_version == snapshot.version:
+            state['map'] = None
+        elif changes is not None:
+            state['map'] = None
+            state['map_changes'] = {'from_version': map_version, 'cells': changes}
+        elif request.args.get('map_format') == 'columns':
+            state['map'] = snapshot.map_columns()
+        else:
+            state['map'] = list(snapshot.map_data())
+    
+    is_player = current_user.is_authenticated and current_user.faction is not None \
+        and current_user.faction.game_id == game_id
+    if 'resources' in fields:
+        state['resources'] = faction_resources_data(current_user, current_turn, game_id) if is_player else None
+    if 'logs' in fields:
+        state['logs'] = faction_logs_data(current_user.faction_id, current_turn,
+                                          after=request.args.get('logs_after', type=int)) if is_player else None
+    return jsonify(state)
 
 @bp.route('/api/faction_logs')
 @login_required
 def get_faction_logs():
-    """Возвращает логи действий фракции в текущем ходу"""
+    """Возвращает журнал действий фракции
+    
+    Без параметров возвращает записи текущего хода (сначала новые).
+    Параметры курсора (id записи журнала монотонно возрастает):
+    - after=<id> - записи новее указанной в порядке возрастания, чтобы клиент
+      получал только новые записи;
+    - before=<id> - записи старше указанной в порядке убывания, для просмотра
+      истории по всем ходам.
+    limit ограничивает количество записей. Все выборки идут по индексу
+    (faction_id, id) без смещений.
+    """
     if not current_user.faction_id:
         return jsonify({'success': False, 'message': 'Вы не принадлежите ни к одной фракции'})
     
-    current_turn = get_current_turn()
-    
-    # Получаем все действия пользователей фракции в текущем ходу
-    faction_users = User.query.filter_by(faction_id=current_user.faction_id).all()
-    faction_user_ids = [user.id for user in faction_users]
-    
-    actions = UserAction.query.filter(
-        UserAction.user_id.in_(faction_user_ids),
-        UserAction.turn == current_turn
-    ).order_by(UserAction.created_at.desc()).all()
-    
-    # Получаем логи фракции из таблицы faction_logs
-    faction_logs = FactionLog.query.filter_by(
-        faction_id=current_user.faction_id,
-        turn=current_turn
-    ).order_by(FactionLog.timestamp.desc()).all()
-    
-    # Преобразуем действия в понятный формат
-    logs = []
-    
-    # Добавляем логи действий пользователей
-    for action in actions:
-        user = User.query.get(action.user_id)
-        username = user.username if user else "Неизвестный пользователь"
-        
-        log_entry = {
-            'id': action.id,
-            'username': username,
-            'action_type': action.action_type,
-            'timestamp': action.created_at.strftime('%H:%M:%S'),
-            'message': format_action_message(action)
-        }
-        logs.append(log_entry)
-    
-    # Добавляем логи фракции
-    for log in faction_logs:
-        log_entry = {
-            'id': f'faction_log_{log.id}',
-            'username': 'Система',
-            'action_type': 'SYSTEM',
-            'timestamp': log.timestamp.strftime('%H:%M:%S'),
-            'message': log.message
-        }
-        logs.append(log_entry)
-    
-    # Сортируем все логи по времени (сначала новые)
-    logs.sort(key=lambda x: x['timestamp'], reverse=True)
+    try:
+        after = request.args.get('after', type=int)
+        before = request.args.get('before', type=int)
+        limit = min(max(int(request.args.get('limit', FACTION_LOGS_DEFAULT_LIMIT)), 1), FACTION_LOGS_MAX_LIMIT)
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Некорректные параметры запроса'})
     
-    return jsonify({
+    return jsonify(faction_logs_data(current_user.faction_id, get_current_turn(), after, before, limit))
+
+def faction_logs_data(faction_id, current_turn, after=None, before=None, limit=FACTION_LOGS_DEFAULT_LIMIT):
+    """Возвращает данные журнала фракции для /api/faction_logs и /api/state"""
+    query = FactionLog.query.filter(FactionLog.faction_id == faction_id)
+    
+    if after is not None:
+        # Новые записи после курсора
+        faction_logs = query.filter(FactionLog.id > after).order_by(FactionLog.id.asc()).limit(limit + 1).all()
+    elif before is not None:
+        # История до курсора
+        faction_logs = query.filter(FactionLog.id < before).order_by(FactionLog.id.desc()).limit(limit + 1).all()
+    else:
+        # Записи текущего хода, сначала новые
+        faction_logs = query.filter(FactionLog.turn == current_turn).order_by(FactionLog.id.desc()).limit(limit + 1).all()
+    
+    has_more = len(faction_logs) > limit
+    faction_logs = faction_logs[:limit]
+    ids = [log.id for log in faction_logs]
+    
+    # Курсор для следующего запроса новых записей
+    if after is not None:
+        cursor = max(ids) if ids else after
+    elif before is None:
+        cursor = max(ids) if ids else last_faction_log_id(faction_id)
+    else:
+        cursor = None
+    
+    return {
         'success': True,
         'current_turn': current_turn,
-        'logs': logs
-    })
+        'logs': [log.to_dict() for log in faction_logs],
+        'cursor': cursor,
+        'next_before': min(ids) if ids and has_more else None,
+        'has_more': has_more
+    }
+
+def last_faction_log_id(faction_id):
+    """Возвращает id последней записи журнала фракции (0, если записей нет)"""
+    last_id = db.session.query(func.max(FactionLog.id)).filter(FactionLog.faction_id == faction_id).scalar()
+    return last_id or 0
 
-def format_action_message(action):
-    """Форматирует сообщение о действии для отображения в логах"""
-    if action.action_type == ActionType.CAPTURE_CELL.value:
-        return f"Отправлено {action.warriors} воинов для захвата клетки ({action.target_x}, {action.target_y})"
+def format_action_message(action_fields):
+    """Форматирует сообщение о действии для отображения в логах
+    
+    Вызывается один раз при постановке действия в очередь, готовое сообщение
+    сохраняется в журнал фракции.
+    """
+    action_type = action_fields['action_type']
+    target_x = action_fields['target_x']
+    target_y = action_fields['target_y']
     
-    elif action.action_type == ActionType.BUILD.value:
-        building_name = get_building_name(action.building_type)
-        return f"Начато строительство {building_name} на клетке ({action.target_x}, {action.target_y})"
+    if action_type == ActionType.CAPTURE_CELL.value:
+        return f"Отправлено {action_fields['warriors']} воинов для захвата клетки ({target_x}, {target_y})"
     
-    elif action.action_type == ActionType.TRANSFER_RESOURCES.value:
-        resources_data = json.loads(action.resources) if action.resources else {}
-        target_faction_id = resources_data.get('faction_id')
-        target_faction = Faction.query.get(target_faction_id) if target_faction_id else None
+    elif action_type == ActionType.BUILD.value:
+        building_name = GameRules.get_instance().building_name(action_fields['building_type'])
+        return f"Начато строительство {building_name} на клетке ({target_x}, {target_y})"
+    
+    elif action_type == ActionType.TRANSFER_RESOURCES.value:
+        resources_data = json.loads(action_fields['resources']) if action_fields['resources'] else {}
+        target_faction_id = resources_data.get('target_faction_id')
+        target_faction_name = ActionQueue.get_instance(user_game_id()).faction_name(target_faction_id)
         
         resources_text = []
         if resources_data.get('gold', 0) > 0:
@@ -150,18 +275,18 @@ def format_action_message(action):
             resources_text.append(f"{resources_data.get('ore')} руды")
         
         resources_str = ", ".join(resources_text)
-        faction_name = target_faction.name if target_faction else "неизвестную фракцию"
+        faction_name = target_faction_name or "неизвестную фракцию"
         
         return f"Передано {resources_str} фракции {faction_name}"
     
-    elif action.action_type == ActionType.RECRUIT_WARRIORS.value:
-        return f"Нанято {action.warriors} воинов"
+    elif action_type == ActionType.RECRUIT_WARRIORS.value:
+        return f"Нанято {action_fields['warriors']} воинов"
     
-    elif action.action_type == ActionType.DEFEND_CELL.value:
-        return f"Отправлено {action.warriors} воинов для защиты клетки ({action.target_x}, {action.target_y})"
+    elif action_type == ActionType.DEFEND_CELL.value:
+        return f"Отправлено {action_fields['warriors']} воинов для защиты клетки ({target_x}, {target_y})"
     
     else:
-        return f"Выполнено действие {action.action_type}"
+        return f"Выполнено действие {action_type}"
 
 @bp.route('/api/resources')
 @login_required
@@ -169,10 +294,10 @@ def get_resources():
     """
     Возвращает ресурсы фракции пользователя
     """
-    print(f"[API] Запрос ресурсов от пользователя {current_user.username} (id: {current_user.id})")
+    logger.debug("[API] Запрос ресурсов от пользователя %s (id: %s)", current_user.username, current_user.id)
     
-    if not current_user.faction:
-        print(f"[API] Пользователь {current_user.username} не принадлежит ни к одной фракции")
+    if not current_user.faction_id:
+        logger.debug("[API] Пользователь %s не принадлежит ни к одной фракции", current_user.username)
         return jsonify({
             'gold': 0,
             'wood': 0,
@@ -181,14 +306,31 @@ def get_resources():
             'warriors': 0
         })
     
-    # Получаем текущий ход
-    current_turn = get_current_turn()
+    response_data = faction_resources_data(current_user, get_current_turn(), user_game_id())
     
+    logger.debug("[API] Возвращаем ресурсы для фракции %s: %s", current_user.faction_id, response_data)
+    
+    return jsonify(response_data)
+
+def faction_balance(game_id, faction_id):
+    """Ресурсы фракции из очереди действий игры или None, если фракции нет
+
+    Пока очередь не загрузила состояние игры (или фракция появилась позже),
+    ресурсы берутся из базы данных.
+    """
+    balance = ActionQueue.get_instance(game_id).balance(faction_id)
+    if balance is None:
+        faction = db.session.get(Faction, faction_id)
+        balance = {field: getattr(faction, field) for field in RESOURCE_FIELDS} if faction else None
+    return balance
+
+def faction_resources_data(user, current_turn, game_id):
+    """Возвращает ресурсы фракции пользователя и его отправленных в ходу current_turn воинов"""
     # Проверяем, есть ли отправленные воины на захват в текущем ходу
     warriors_sent = 0
     capture_actions = UserAction.query.filter_by(
-        user_id=current_user.id,
-        action_type='CAPTURE_CELL',
+        user_id=user.id,
+        action_type=ActionType.CAPTURE_CELL.value,
         turn=current_turn  # Только для текущего хода
     ).all()
     
@@ -198,8 +340,8 @@ def get_resources():
     
     # Проверяем, есть ли отправленные воины на защиту в текущем ходу
     defend_actions = UserAction.query.filter_by(
-        user_id=current_user.id,
-        action_type='DEFEND_CELL',
+        user_id=user.id,
+        action_type=ActionType.DEFEND_CELL.value,
         turn=current_turn  # Только для текущего хода
     ).all()
     
@@ -211,232 +353,349 @@ def get_resources():
     # Общее количество отправленных воинов
     total_warriors_sent = warriors_sent + warriors_defending
     
-    response_data = {
-        'gold': current_user.faction.gold,
-        'wood': current_user.faction.wood,
-        'stone': current_user.faction.stone,
-        'ore': current_user.faction.ore,
-        'warriors': current_user.faction.warriors,
+    # Ресурсы берем из состояния очереди действий: оно уже учитывает принятые, но еще не записанные действия
+    balance = faction_balance(game_id, user.faction_id) or dict.fromkeys(RESOURCE_FIELDS, 0)
+    
+    return {
+        'gold': balance['gold'],
+        'wood': balance['wood'],
+        'stone': balance['stone'],
+        'ore': balance['ore'],
+        'warriors': balance['warriors'],
         'warriors_sent': warriors_sent,
         'warriors_defending': warriors_defending,
         'total_warriors_sent': total_warriors_sent
     }
-    
-    print(f"[API] Возвращаем ресурсы для фракции {current_user.faction.name}: {response_data}")
-    
-    return jsonify(response_data)
 
 @bp.route('/api/execute_direct_action', methods=['POST'])
 @login_required
 def execute_direct_action():
-    """Выполняет прямое действие пользователя"""
+    """Выполняет прямое действие пользователя
+
+    Действие проверяется по состоянию в памяти, ставится в очередь и сразу
+    подтверждается. Запись в базу данных выполняет фоновый поток ActionQueue.
+    """
     # Проверяем, что пользователь принадлежит к фракции
     if not current_user.faction_id:
         return jsonify({'success': False, 'message': 'Вы не принадлежите ни к одной фракции'})
     
-    # Получаем данные из запроса
-    data = request.json
+    faction_id = current_user.faction_id
+    action_queue = ActionQueue.get_instance(user_game_id())
+    with action_queue.intake():
+        faction = action_queue.balance(faction_id)
+        if faction is None:
+            return jsonify({'success': False, 'message': 'Фракция не найдена'})
+        
+        result, entry = prepare_action(request.json, faction_id, faction, has_center_bonus(faction_id))
+        if entry:
+            action_queue.enqueue(*entry)
+    
+    return jsonify(result)
+
+@bp.route('/api/actions/batch', methods=['POST'])
+@login_required
+def execute_batch_actions():
+    """Выполняет пакет действий пользователя за один запрос
+
+    Все действия проверяются вместе по одному снимку ресурсов фракции и
+    ставятся в очередь только если корректны все, поэтому они записываются
+    одним коммитом. Возвращает результат по каждому действию.
+    """
+    if not current_user.faction_id:
+        return jsonify({'success': False, 'message': 'Вы не принадлежите ни к одной фракции'})
+    
+    data = request.json or {}
+    commands = data.get('actions')
+    if not isinstance(commands, list) or not commands:
+        return jsonify({'success': False, 'message': 'Необходимо передать список действий'})
+    
+    max_actions = current_app.config.get('MAX_BATCH_ACTIONS', 50)
+    if len(commands) > max_actions:
+        return jsonify({'success': False, 'message': f'Слишком много действий в пакете. Максимум: {max_actions}'})
+    
+    faction_id = current_user.faction_id
+    action_queue = ActionQueue.get_instance(user_game_id())
+    with action_queue.intake():
+        faction = action_queue.balance(faction_id)
+        if faction is None:
+            return jsonify({'success': False, 'message': 'Фракция не найдена'})
+        
+        has_warriors_bonus = has_center_bonus(faction_id)
+        results = []
+        entries = []
+        for command in commands:
+            if not isinstance(command, dict):
+                results.append({'success': False, 'message': 'Некорректный формат действия'})
+                continue
+            if command.get('action_type') not in BATCH_ACTION_TYPES:
+                results.append({'success': False, 'message': 'Неизвестный тип действия'})
+                continue
+            
+            result, entry = prepare_action(command, faction_id, faction, has_warriors_bonus)
+            results.append(result)
+            if entry:
+                entries.append(entry)
+                # Следующие действия пакета проверяются с учетом уже списанных ресурсов
+                for resource, amount in entry[1].get(faction_id, {}).items():
+                    faction[resource] += amount
+        
+        success = len(entries) == len(commands)
+        if success:
+            action_queue.enqueue_many(entries)
+    
+    if not success:
+        # Пакет применяется целиком или не применяется вовсе
+        for result in results:
+            if result['success']:
+                result['success'] = False
+                result['message'] = 'Действие не выполнено из-за ошибок в других действиях пакета'
+    
+    return jsonify({
+        'success': success,
+        'message': f'Выполнено действий: {len(entries)}' if success else 'Пакет действий отклонен',
+        'results': results
+    })
+
+@bp.route('/api/admin/games', methods=['POST'])
+@login_required
+def create_game():
+    """Создает и запускает новую игру со стандартными фракциями (только для администратора)"""
+    if not current_user.is_admin:
+        return jsonify({'success': False, 'message': 'У вас нет прав для выполнения этого действия'}), 403
+
+    name = ((request.json or {}).get('name') or '').strip()
+    if not name:
+        return jsonify({'success': False, 'message': 'Необходимо указать название игры'})
+    if Game.query.filter_by(name=name).first():
+        return jsonify({'success': False, 'message': f'Игра {name} уже существует'})
+
+    from app.games import create_game as create_game_world, start_game
+    game = create_game_world(name)
+    start_game(current_app._get_current_object(), game.id)
+
+    logger.info("Администратор %s создал игру %s (id: %s)", current_user.username, name, game.id)
+    return jsonify({'success': True, 'message': f'Игра {name} создана', 'game': game.to_dict()})
+
+@bp.route('/api/admin/rollback', methods=['POST'])
+@login_required
+def rollback_game():
+    """Откатывает игру к началу указанного хода (только для администратора)
+
+    Игра задается полем game_id, по умолчанию - игра администратора.
+    """
+    if not current_user.is_admin:
+        return jsonify({'success': False, 'message': 'У вас нет прав для выполнения этого действия'}), 403
+
+    data = request.json or {}
+    turn = data.get('turn')
+    if not isinstance(turn, int) or isinstance(turn, bool):
+        return jsonify({'success': False, 'message': 'Необходимо указать номер хода'})
+
+    game_id = data.get('game_id', user_game_id())
+    game_manager = GameManager.find(game_id) if isinstance(game_id, int) else None
+    if game_manager is None:
+        return jsonify({'success': False, 'message': 'Игра не найдена'})
+    try:
+        game_manager.rollback(turn)
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)})
+
+    logger.info("Администратор %s откатил игру %s к началу хода %s", current_user.username, game_id, turn)
+    return jsonify({
+        'success': True,
+        'message': f'Игра откачена к началу хода {turn}',
+        'current_turn': game_manager.current_turn
+    })
+
+def has_center_bonus(faction_id):
+    """Проверяет, владеет ли фракция центральной клеткой (бонус к воинам)"""
+    action_queue = ActionQueue.get_instance(user_game_id())
+    rules = GameRules.get_instance()
+    center_cell = action_queue.cell(*rules.combat_bonus_cell)
+    if center_cell and center_cell['faction_id'] == faction_id:
+        logger.debug("[API] Фракция %s имеет бонус +%s%% к боевой мощи от центральной клетки", action_queue.faction_name(faction_id), rules.combat_bonus_percent)
+        return True
+    return False
+
+def parse_amount(value):
+    """Количество из запроса: целое число не меньше 0 или None
+
+    Логические значения и дробные числа не принимаются, строки с целым
+    числом преобразуются в число.
+    """
+    if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+        return None
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        return None
+    return value if value >= 0 else None
+
+def parse_warriors(value):
+    """Количество воинов из запроса: целое число больше 0 или None (см. parse_amount)"""
+    value = parse_amount(value)
+    return value if value else None
+
+def is_coordinate(value):
+    """Проверяет, что координата клетки из запроса - целое число"""
+    return isinstance(value, int) and not isinstance(value, bool)
+
+def prepare_action(data, faction_id, faction, has_warriors_bonus):
+    """Проверяет действие по состоянию в памяти и формирует запись для очереди
+
+    faction - текущие ресурсы фракции. Возвращает пару (результат для ответа,
+    запись для ActionQueue.enqueue или None, если действие отклонено).
+    Вызывается под блокировкой ActionQueue.intake() очереди игры пользователя.
+    """
+    action_queue = ActionQueue.get_instance(user_game_id())
+    rules = GameRules.get_instance()
     action_type = data.get('action_type')
     target_x = data.get('target_x')
     target_y = data.get('target_y')
     
     # Проверяем, что координаты указаны
-    if action_type != 'TRANSFER_RESOURCES' and (target_x is None or target_y is None):
-        return jsonify({'success': False, 'message': 'Необходимо указать координаты'})
+    if action_type != 'TRANSFER_RESOURCES' and not (is_coordinate(target_x) and is_coordinate(target_y)):
+        return {'success': False, 'message': 'Необходимо указать координаты'}, None
     
     # Получаем клетку по координатам
     if action_type != 'TRANSFER_RESOURCES':
-        cell = Cell.query.filter_by(x=target_x, y=target_y).first()
+        cell = action_queue.cell(target_x, target_y)
         if not cell:
-            return jsonify({'success': False, 'message': 'Клетка не найдена'})
-    
-    # Проверяем, владеет ли фракция центральной клеткой (бонус к воинам)
-    has_warriors_bonus = False
-    center_cell = Cell.query.filter_by(x=3, y=3, faction_id=current_user.faction_id).first()
-    if center_cell:
-        has_warriors_bonus = True
-        print(f"[API] Фракция {current_user.faction.name} имеет бонус +20% к боевой мощи от центральной клетки")
+            return {'success': False, 'message': 'Клетка не найдена'}, None
     
     # Обрабатываем различные типы действий
     if action_type == 'CAPTURE_CELL':
         # Проверяем, что указано количество воинов
-        warriors = data.get('warriors')
-        if not warriors or warriors <= 0:
-            return jsonify({'success': False, 'message': 'Необходимо указать количество воинов'})
+        warriors = parse_warriors(data.get('warriors'))
+        if warriors is None:
+            return {'success': False, 'message': 'Необходимо указать количество воинов'}, None
         
         # Проверяем, является ли клетка угловой (с замком) и принадлежит ли другой фракции
-        if is_corner_cell(target_x, target_y) and cell.faction_id and cell.faction_id != current_user.faction_id:
-            return jsonify({'success': False, 'message': 'Нельзя захватить замок другой фракции'})
+        if is_corner_cell(target_x, target_y) and cell['faction_id'] and cell['faction_id'] != faction_id:
+            return {'success': False, 'message': 'Нельзя захватить замок другой фракции'}, None
         
         # Проверяем, что клетка соседствует с территорией фракции
-        if not is_adjacent_to_faction(target_x, target_y, current_user.faction_id) and not cell.faction_id == current_user.faction_id:
-            return jsonify({'success': False, 'message': 'Можно захватывать только клетки, соседние с вашей территорией'})
+        if not action_queue.is_adjacent(target_x, target_y, faction_id) and not cell['faction_id'] == faction_id:
+            return {'success': False, 'message': 'Можно захватывать только клетки, соседние с вашей территорией'}, None
         
         # Проверяем, что у фракции достаточно воинов
-        if current_user.faction.warriors < warriors:
-            return jsonify({'success': False, 'message': 'Недостаточно воинов'})
-        
-        # Уменьшаем количество воинов у фракции
-        current_user.faction.warriors -= warriors
+        if faction['warriors'] < warriors:
+            return {'success': False, 'message': 'Недостаточно воинов'}, None
         
-        # Если есть бонус к воинам, добавляем 30% к боевой мощи (но не к количеству отправленных воинов)
-        actual_warriors = warriors
-        effective_warriors = warriors
+        # Если есть бонус к воинам, он увеличивает боевую мощь (но не количество отправленных воинов)
+        effective_warriors = rules.combat_strength(warriors, has_warriors_bonus)
         if has_warriors_bonus:
-            bonus_warriors = int(warriors * 0.3)
-            effective_warriors += bonus_warriors
-            print(f"[API] Фракция {current_user.faction.name} получает бонус +{bonus_warriors} к боевой мощи при захвате")
-        
-        # Записываем действие в историю
-        action = UserAction(
-            user_id=current_user.id,
-            action_type=ActionType.CAPTURE_CELL.value,
-            target_x=target_x,
-            target_y=target_y,
-            warriors=actual_warriors,  # Сохраняем фактическое количество воинов без бонуса
-            turn=get_current_turn()
+            logger.debug("[API] Фракция %s получает бонус +%s к боевой мощи при захвате", action_queue.faction_name(faction_id), effective_warriors - warriors)
+        
+        # Формируем запись действия и списываем воинов
+        entry = make_action_entry(
+            make_action_fields(
+                ActionType.CAPTURE_CELL,
+                target_x=target_x,
+                target_y=target_y,
+                warriors=warriors  # Сохраняем фактическое количество воинов без бонуса
+            ),
+            {faction_id: {'warriors': -warriors}}
         )
-        db.session.add(action)
-        db.session.commit()
         
-        return jsonify({
+        return {
             'success': True, 
             'message': f'Отправлено {warriors} воинов для захвата клетки ({target_x}, {target_y})' + 
-                      (f' (эффективная сила: {effective_warriors} с учетом бонуса +30%)' if has_warriors_bonus else '') + 
+                      (f' (эффективная сила: {effective_warriors} с учетом бонуса +{rules.combat_bonus_percent}%)' if has_warriors_bonus else '') + 
                       '. Результат будет известен в конце хода.'
-        })
+        }, entry
         
     elif action_type == 'BUILD':
         # Проверяем, что указан тип здания
         building_type = data.get('building_type')
         if not building_type:
-            return jsonify({'success': False, 'message': 'Необходимо указать тип здания'})
+            return {'success': False, 'message': 'Необходимо указать тип здания'}, None
         
         # Проверяем, что пользователь не пытается построить замок
         if building_type == 'CASTLE':
-            return jsonify({'success': False, 'message': 'Замок является главным зданием фракции и не может быть построен'})
+            return {'success': False, 'message': 'Замок является главным зданием фракции и не может быть построен'}, None
         
         # Проверяем, что клетка принадлежит фракции пользователя
-        if cell.faction_id != current_user.faction_id:
-            return jsonify({'success': False, 'message': 'Эта клетка не принадлежит вашей фракции'})
+        if cell['faction_id'] != faction_id:
+            return {'success': False, 'message': 'Эта клетка не принадлежит вашей фракции'}, None
         
         # Проверяем, что на клетке нет здания
-        if cell.building_type:
-            return jsonify({'success': False, 'message': 'На этой клетке уже есть здание'})
-        
-        # Определяем стоимость здания в зависимости от типа
-        building_costs = {
-            'CASTLE': {'gold': 50, 'wood': 20, 'stone': 20, 'ore': 10},
-            'SAWMILL': {'gold': 30, 'wood': 10, 'stone': 15, 'ore': 5},
-            'MINE': {'gold': 30, 'wood': 15, 'stone': 10, 'ore': 5},
-            'QUARRY': {'gold': 30, 'wood': 15, 'stone': 5, 'ore': 10},
-            'WAREHOUSE': {'gold': 20, 'wood': 20, 'stone': 20, 'ore': 0},
-            'BARRACKS': {'gold': 40, 'wood': 15, 'stone': 15, 'ore': 10}
-        }
-        
-        # Получаем стоимость выбранного здания
-        cost = building_costs.get(building_type)
+        if cell['building_type']:
+            return {'success': False, 'message': 'На этой клетке уже есть здание'}, None
+        
+        # Получаем стоимость выбранного здания из правил игры
+        cost = rules.building_cost(building_type)
         if not cost:
-            return jsonify({'success': False, 'message': 'Неизвестный тип здания'})
+            return {'success': False, 'message': 'Неизвестный тип здания'}, None
         
         # Проверяем, достаточно ли ресурсов у фракции
-        faction = current_user.faction
-        if faction.gold < cost['gold']:
-            return jsonify({'success': False, 'message': f'Недостаточно золота. Требуется: {cost["gold"]}'})
-        if faction.wood < cost['wood']:
-            return jsonify({'success': False, 'message': f'Недостаточно дерева. Требуется: {cost["wood"]}'})
-        if faction.stone < cost['stone']:
-            return jsonify({'success': False, 'message': f'Недостаточно камня. Требуется: {cost["stone"]}'})
-        if faction.ore < cost['ore']:
-            return jsonify({'success': False, 'message': f'Недостаточно руды. Требуется: {cost["ore"]}'})
-        
-        # Списываем ресурсы
-        faction.gold -= cost['gold']
-        faction.wood -= cost['wood']
-        faction.stone -= cost['stone']
-        faction.ore -= cost['ore']
-        
-        # Записываем действие в историю
-        action = UserAction(
-            user_id=current_user.id,
-            action_type=ActionType.BUILD.value,
-            target_x=target_x,
-            target_y=target_y,
-            building_type=building_type,
-            turn=get_current_turn()
+        if faction['gold'] < cost['gold']:
+            return {'success': False, 'message': f'Недостаточно золота. Требуется: {cost["gold"]}'}, None
+        if faction['wood'] < cost['wood']:
+            return {'success': False, 'message': f'Недостаточно дерева. Требуется: {cost["wood"]}'}, None
+        if faction['stone'] < cost['stone']:
+            return {'success': False, 'message': f'Недостаточно камня. Требуется: {cost["stone"]}'}, None
+        if faction['ore'] < cost['ore']:
+            return {'success': False, 'message': f'Недостаточно руды. Требуется: {cost["ore"]}'}, None
+        
+        # Формируем запись действия и списываем ресурсы
+        entry = make_action_entry(
+            make_action_fields(
+                ActionType.BUILD,
+                target_x=target_x,
+                target_y=target_y,
+                building_type=building_type
+            ),
+            {faction_id: {resource: -amount for resource, amount in cost.items()}}
         )
-        db.session.add(action)
-        db.session.commit()
         
-        return jsonify({
+        return {
             'success': True, 
-            'message': f'Ресурсы выделены на строительство {get_building_name(building_type)} на клетке ({target_x}, {target_y}). Строительство будет завершено в конце хода.'
-        })
+            'message': f'Ресурсы выделены на строительство {rules.building_name(building_type)} на клетке ({target_x}, {target_y}). Строительство будет завершено в конце хода.'
+        }, entry
         
     elif action_type == 'TRANSFER_RESOURCES':
         # Проверяем, что указаны ресурсы и фракция-получатель
         resources_data = data.get('resources')
-        if not resources_data or not resources_data.get('faction_id'):
-            return jsonify({'success': False, 'message': 'Необходимо указать ресурсы и фракцию-получателя'})
+        if not isinstance(resources_data, dict) or not resources_data.get('faction_id'):
+            return {'success': False, 'message': 'Необходимо указать ресурсы и фракцию-получателя'}, None
         
         # Получаем фракцию-получателя
-        target_faction_id = resources_data.get('faction_id')
-        target_faction = Faction.query.get(target_faction_id)
-        if not target_faction:
-            return jsonify({'success': False, 'message': 'Фракция-получатель не найдена'})
+        target_faction_id = parse_amount(resources_data.get('faction_id'))
+        if target_faction_id is None or action_queue.balance(target_faction_id) is None:
+            return {'success': False, 'message': 'Фракция-получатель не найдена'}, None
         
         # Проверяем, что фракция-получатель не является фракцией отправителя
-        if target_faction.id == current_user.faction.id:
-            return jsonify({'success': False, 'message': 'Нельзя передать ресурсы своей фракции'})
+        if target_faction_id == faction_id:
+            return {'success': False, 'message': 'Нельзя передать ресурсы своей фракции'}, None
         
-        # Получаем количество ресурсов для передачи
-        gold = int(resources_data.get('gold', 0))
-        wood = int(resources_data.get('wood', 0))
-        stone = int(resources_data.get('stone', 0))
-        ore = int(resources_data.get('ore', 0))
+        # Получаем количество ресурсов для передачи (отрицательное количество забирало бы
+        # ресурсы у получателя)
+        transfer = {resource: parse_amount(resources_data.get(resource, 0)) for resource in ('gold', 'wood', 'stone', 'ore')}
+        if any(amount is None for amount in transfer.values()):
+            return {'success': False, 'message': 'Количество ресурсов должно быть целым неотрицательным числом'}, None
         
         # Проверяем, что передается хотя бы один ресурс
-        if gold <= 0 and wood <= 0 and stone <= 0 and ore <= 0:
-            return jsonify({'success': False, 'message': 'Необходимо передать хотя бы один ресурс'})
+        if not any(transfer.values()):
+            return {'success': False, 'message': 'Необходимо передать хотя бы один ресурс'}, None
         
         # Проверяем, что у фракции достаточно ресурсов
-        faction = current_user.faction
-        if faction.gold < gold or faction.wood < wood or \
-           faction.stone < stone or faction.ore < ore:
-            return jsonify({'success': False, 'message': 'Недостаточно ресурсов'})
-        
-        # Уменьшаем ресурсы фракции-отправителя
-        faction.gold -= gold
-        faction.wood -= wood
-        faction.stone -= stone
-        faction.ore -= ore
-        
-        # Увеличиваем ресурсы фракции-получателя
-        target_faction.gold += gold
-        target_faction.wood += wood
-        target_faction.stone += stone
-        target_faction.ore += ore
+        if any(faction[resource] < amount for resource, amount in transfer.items()):
+            return {'success': False, 'message': 'Недостаточно ресурсов'}, None
         
         # Сохраняем информацию о ресурсах в формате JSON
-        resources_json = json.dumps({
-            'gold': gold,
-            'wood': wood,
-            'stone': stone,
-            'ore': ore,
-            'target_faction_id': target_faction.id
-        })
-        
-        # Записываем действие в историю
-        action = UserAction(
-            user_id=current_user.id,
-            action_type=ActionType.TRANSFER_RESOURCES.value,
-            resources=resources_json,
-            turn=get_current_turn()
+        resources_json = json.dumps(dict(transfer, target_faction_id=target_faction_id))
+        
+        # Формируем запись действия: списываем ресурсы у отправителя и начисляем получателю
+        entry = make_action_entry(
+            make_action_fields(ActionType.TRANSFER_RESOURCES, resources=resources_json),
+            {
+                faction_id: {resource: -amount for resource, amount in transfer.items()},
+                target_faction_id: transfer
+            }
         )
-        db.session.add(action)
-        db.session.commit()
         
-        return jsonify({'success': True, 'message': f'Ресурсы успешно переданы фракции {target_faction.name}'})
+        return {'success': True, 'message': f'Ресурсы успешно переданы фракции {action_queue.faction_name(target_faction_id)}'}, entry
     
     elif action_type == 'RECRUIT_WARRIORS':
         # Проверяем, что указано количество воинов
@@ -444,118 +703,142 @@ def execute_direct_action():
         try:
             warriors_count = int(warriors_count)
         except (TypeError, ValueError):
-            return jsonify({'success': False, 'message': 'Необходимо указать корректное количество воинов для найма'})
+            return {'success': False, 'message': 'Необходимо указать корректное количество воинов для найма'}, None
             
         if warriors_count < 1:
-            return jsonify({'success': False, 'message': 'Количество воинов должно быть больше 0'})
+            return {'success': False, 'message': 'Количество воинов должно быть больше 0'}, None
         
-        # Стоимость найма: 5 золота за воина
-        cost_per_warrior = 5
-        total_cost = warriors_count * cost_per_warrior
+        # Стоимость найма из правил игры
+        total_cost = warriors_count * rules.warrior_cost
         
         # Проверяем, достаточно ли золота у фракции
-        faction = current_user.faction
-        if faction.gold < total_cost:
-            return jsonify({'success': False, 'message': f'Недостаточно золота. Требуется: {total_cost}'})
-        
-        # Списываем золото и добавляем воинов
-        faction.gold -= total_cost
-        faction.warriors += warriors_count
-        
-        # Записываем действие в историю
-        action = UserAction(
-            user_id=current_user.id,
-            action_type=ActionType.RECRUIT_WARRIORS.value,
-            warriors=warriors_count,
-            turn=get_current_turn()
+        if faction['gold'] < total_cost:
+            return {'success': False, 'message': f'Недостаточно золота. Требуется: {total_cost}'}, None
+        
+        # Формируем запись действия: списываем золото и добавляем воинов
+        entry = make_action_entry(
+            make_action_fields(ActionType.RECRUIT_WARRIORS, warriors=warriors_count),
+            {faction_id: {'gold': -total_cost, 'warriors': warriors_count}}
         )
-        db.session.add(action)
-        db.session.commit()
         
-        return jsonify({
+        return {
             'success': True, 
             'message': f'Нанято {warriors_count} воинов за {total_cost} золота.'
-        })
+        }, entry
     
     elif action_type == 'DEFEND_CELL':
         # Проверяем, что указано количество воинов
-        warriors = data.get('warriors')
-        if not warriors or warriors <= 0:
-            return jsonify({'success': False, 'message': 'Необходимо указать количество воинов для защиты'})
+        warriors = parse_warriors(data.get('warriors'))
+        if warriors is None:
+            return {'success': False, 'message': 'Необходимо указать количество воинов для защиты'}, None
         
         # Проверяем, что у фракции достаточно воинов
-        faction = current_user.faction
-        if faction.warriors < warriors:
-            return jsonify({'success': False, 'message': f'Недостаточно воинов. У вас есть только {faction.warriors} воинов.'})
+        if faction['warriors'] < warriors:
+            return {'success': False, 'message': f'Недостаточно воинов. У вас есть только {faction["warriors"]} воинов.'}, None
         
         # Проверяем, что клетка принадлежит фракции пользователя
-        if cell.faction_id != current_user.faction_id:
-            return jsonify({'success': False, 'message': 'Можно защищать только свои клетки'})
+        if cell['faction_id'] != faction_id:
+            return {'success': False, 'message': 'Можно защищать только свои клетки'}, None
         
-        # Списываем воинов
-        faction.warriors -= warriors
-        
-        # Если есть бонус к воинам, добавляем 30% к боевой мощи (но не к количеству отправленных воинов)
-        actual_warriors = warriors
-        effective_warriors = warriors
+        # Если есть бонус к воинам, он увеличивает боевую мощь (но не количество отправленных воинов)
+        effective_warriors = rules.combat_strength(warriors, has_warriors_bonus)
         if has_warriors_bonus:
-            bonus_warriors = int(warriors * 0.3)
-            effective_warriors += bonus_warriors
-            print(f"[API] Фракция {current_user.faction.name} получает бонус +{bonus_warriors} к боевой мощи при защите")
-        
-        # Записываем действие в историю
-        action = UserAction(
-            user_id=current_user.id,
-            action_type=ActionType.DEFEND_CELL.value,
-            target_x=target_x,
-            target_y=target_y,
-            warriors=actual_warriors,  # Сохраняем фактическое количество воинов без бонуса
-            turn=get_current_turn()
+            logger.debug("[API] Фракция %s получает бонус +%s к боевой мощи при защите", action_queue.faction_name(faction_id), effective_warriors - warriors)
+        
+        # Формируем запись действия и списываем воинов
+        entry = make_action_entry(
+            make_action_fields(
+                ActionType.DEFEND_CELL,
+                target_x=target_x,
+                target_y=target_y,
+                warriors=warriors  # Сохраняем фактическое количество воинов без бонуса
+            ),
+            {faction_id: {'warriors': -warriors}}
         )
-        db.session.add(action)
-        db.session.commit()
         
-        return jsonify({
+        return {
             'success': True, 
             'message': f'Отправлено {warriors} воинов для защиты клетки ({target_x}, {target_y})' + 
-                      (f' (эффективная сила: {effective_warriors} с учетом бонуса +30%)' if has_warriors_bonus else '')
-        })
+                      (f' (эффективная сила: {effective_warriors} с учетом бонуса +{rules.combat_bonus_percent}%)' if has_warriors_bonus else '')
+        }, entry
     
     else:
-        return jsonify({'success': False, 'message': 'Неизвестный тип действия'})
+        return {'success': False, 'message': 'Неизвестный тип действия'}, None
+
 
-def get_current_turn():
-    """Возвращает номер текущего хода"""
-    game_manager = GameManager.get_instance()
+def make_action_entry(action_fields, deltas):
+    """Формирует запись для очереди: действие, изменения ресурсов и готовую запись журнала фракции"""
+    log_fields = {
+        'faction_id': current_user.faction_id,
+        'game_id': action_fields['game_id'],
+        'turn': action_fields['turn'],
+        'username': current_user.username,
+        'action_type': action_fields['action_type'],
+        'message': format_action_message(action_fields),
+        'timestamp': action_fields['created_at']
+    }
+    return action_fields, deltas, log_fields
+
+def make_action_fields(action_type, target_x=None, target_y=None, building_type=None, warriors=None, resources=None):
+    """Формирует поля записи UserAction для постановки в очередь"""
+    return {
+        'user_id': current_user.id,
+        'game_id': user_game_id(),
+        'action_type': action_type.value,
+        'turn': get_current_turn(),
+        'target_x': target_x,
+        'target_y': target_y,
+        'building_type': building_type,
+        'warriors': warriors,
+        'resources': resources,
+        'created_at': datetime.utcnow()
+    }
+
+def get_current_turn(game_id=None):
+    """Возвращает номер текущего хода игры (по умолчанию - игры пользователя)
+
+    Во время обработки хода это уже номер следующего хода: к нему относятся
+    все новые действия игроков.
+    """
+    game_manager = get_game_manager(user_game_id() if game_id is None else game_id)
     return game_manager.current_turn
 
-def is_adjacent_to_faction(x, y, faction_id):
-    """Проверяет, граничит ли клетка с территорией фракции"""
-    # Проверяем соседние клетки (вверх, вниз, влево, вправо)
-    adjacent_cells = [
-        (x+1, y), (x-1, y), (x, y+1), (x, y-1)
-    ]
-    
-    for adj_x, adj_y in adjacent_cells:
-        cell = Cell.query.filter_by(x=adj_x, y=adj_y, faction_id=faction_id).first()
-        if cell:
-            return True
-    
-    return False
+def user_game_id():
+    """Возвращает игру, в которой участвует фракция текущего пользователя
+
+    Гости и пользователи без фракции относятся к первой игре.
+    """
+    if current_user.is_authenticated and current_user.faction is not None:
+        return current_user.faction.game_id
+    return DEFAULT_GAME_ID
+
+def requested_game_id():
+    """Возвращает игру из параметра запроса game_id (по умолчанию - игру пользователя)"""
+    game_id = request.args.get('game_id', type=int)
+    return user_game_id() if game_id is None else game_id
+
+def get_game_manager(game_id):
+    """Возвращает игровой цикл игры или отвечает 404, если игра не запущена на сервере"""
+    game_manager = GameManager.find(game_id)
+    if game_manager is None:
+        # Первая игра доступна и без запущенного игрового цикла (как до появления нескольких игр)
+        if game_id != DEFAULT_GAME_ID:
+            abort(404)
+        game_manager = GameManager.get_instance()
+    return game_manager
+
+def map_image_url(game_id):
+    """Возвращает URL изображения карты последнего снимка мира игры или None"""
+    store = MapImageStore.find(game_id)
+    if store is None or not store.enabled:
+        return None
+    try:
+        filename = store.image_name(get_game_manager(game_id).get_snapshot())
+    except OSError as e:
+        logger.error("Ошибка при сохранении изображения карты: %s", str(e))
+        return None
+    return url_for('main.map_image', game_id=game_id, filename=filename) if filename else None
 
 def is_corner_cell(x, y):
     """Проверяет, является ли клетка угловой (с замком)"""
-    corners = [(0, 0), (0, 6), (6, 0), (6, 6)]
-    return (x, y) in corners
-
-# Вспомогательная функция для получения названия здания
-def get_building_name(building_type):
-    building_names = {
-        'CASTLE': 'Замок',
-        'SAWMILL': 'Лесопилка',
-        'MINE': 'Шахта',
-        'QUARRY': 'Карьер',
-        'WAREHOUSE': 'Склад',
-        'BARRACKS': 'Казармы'
-    }
-    return building_names.get(building_type, 'Здание') 
\ No newline at end of file
+    return GameRules.get_instance().is_castle_cell(x, y)
@@ -1,85 +1,77 @@
-from flask import Blueprint, render_template, redirect, url_for
+from flask import Blueprint, render_template, redirect, url_for, abort, send_from_directory
 from flask_login import login_required, current_user
-from app.models.game import Cell, Building, BuildingType
+from app.models.game import Game, Cell, Building, BuildingType
 from app.models.user import Faction, User
 from app import db
+from app.rules import GameRules, start_positions
+from app.map_image import MapImageStore, MAP_IMAGE_FILE_PATTERN, faction_colors
+from app.map_fragment import MapFragmentCache
+from app.map_deltas import MapDeltas
+from app.http_cache import shared_body
+from app.assets import asset_url
+from app.models.user_action import ActionType
+from app.resolver.economy import faction_income
+from app.resolver.state import CellState
 
 bp = Blueprint('main', __name__)
 
+# Изображения карты не меняются (имя файла зависит от содержимого): кешируются на год
+MAP_IMAGE_MAX_AGE = 365 * 24 * 3600
+
 @bp.route('/')
-def index():
-    """Главная страница"""
-    cells = Cell.query.all()
-    factions = Faction.query.all()
-    
-    # Преобразуем клетки в формат, удобный для отображения на карте
-    map_data = []
-    for y in range(7):  # 7x7 карта
-        row = []
-        for x in range(7):
-            cell = next((c for c in cells if c.x == x and c.y == y), None)
-            
-            # Если клетка не найдена, создаем пустую клетку
-            if not cell:
-                cell_data = {
-                    'x': x,
-                    'y': y,
-                    'faction_id': None,
-                    'building_type': None,
-                    'color': '#ffffff'  # Белый цвет для пустых клеток
-                }
-            else:
-                # Определяем цвет клетки в зависимости от фракции
-                color = '#ffffff'  # По умолчанию белый
-                if cell.faction_id:
-                    # Цвета фракций
-                    faction_colors = {
-                        1: '#E53935',  # IT-Квантум - красный
-                        2: '#43A047',  # Design-Квантум - зеленый
-                        3: '#1E88E5',  # Robo-Квантум - синий
-                        4: '#FDD835',  # Aero-Квантум - желтый
-                        5: '#8E24AA',  # Дополнительный цвет - фиолетовый
-                        6: '#F4511E'   # Дополнительный цвет - оранжевый
-                    }
-                    color = faction_colors.get(cell.faction_id, '#757575')
-                
-                # Определяем тип здания
-                building_type = None
-                if cell.building:
-                    building_type = cell.building.type.value.upper()
-                
-                # Проверяем, является ли клетка соседней с территорией текущего пользователя
-                is_adjacent = False
-                if current_user.is_authenticated and current_user.faction:
-                    # Получаем все клетки фракции пользователя
-                    user_faction_cells = Cell.query.filter_by(faction_id=current_user.faction_id).all()
-                    # Проверяем, граничит ли текущая клетка с любой из клеток фракции пользователя
-                    for user_cell in user_faction_cells:
-                        if ((abs(user_cell.x - x) == 1 and user_cell.y == y) or 
-                            (abs(user_cell.y - y) == 1 and user_cell.x == x)):
-                            is_adjacent = True
-                            break
-                
-                cell_data = {
-                    'x': x,
-                    'y': y,
-                    'faction_id': cell.faction_id,
-                    'building_type': building_type,
-                    'color': color,
-                    'is_adjacent': is_adjacent
-                }
-            
-            row.append(cell_data)
-        map_data.append(row)
+@bp.route('/games/<int:game_id>')
+def index(game_id=None):
+    """Главная страница игры
+    
+    Без номера игры показывается игра, в которой участвует пользователь.
+    Карта строится по снимку мира последнего завершенного хода, без запросов
+    к таблицам клеток и фракций, и рисуется один раз на версию снимка и
+    фракцию (см. MapFragmentCache). Гостям показывается страница зрителя
+    с готовым изображением карты хода.
+    """
+    from app.routes.game import user_game_id, get_game_manager, map_image_url, faction_balance
+    if game_id is None:
+        game_id = user_game_id()
+    game = db.session.get(Game, game_id)
+    if game is None:
+        abort(404)
+    
+    if not current_user.is_authenticated:
+        image_url = map_image_url(game_id)
+        if image_url is not None:
+            game_manager = get_game_manager(game_id)
+            return render_template('main/spectator.html',
+                                 game=game,
+                                 map_image_url=image_url,
+                                 current_turn=game_manager.current_turn,
+                                 seconds_left=game_manager.seconds_left)
+    
+    snapshot = get_game_manager(game_id).get_snapshot()
+    rules = GameRules.get_instance()
+    cells = snapshot.cells
+    factions = snapshot.factions
+    
+    # Пользователь может действовать только в игре своей фракции
+    is_player = current_user.is_authenticated and current_user.faction is not None \
+        and current_user.faction.game_id == game_id
+    
+    # Фракция текущего пользователя для подсветки соседних клеток
+    user_faction_id = None
+    # Ресурсы фракции берутся из очереди действий, как в /api/resources
+    # (current_user - данные учетной записи из кеша, без ресурсов фракции)
+    faction_resources = None
+    if is_player:
+        user_faction_id = current_user.faction_id
+        faction_resources = faction_balance(game_id, user_faction_id)
     
     # Если нет клеток с фракциями, создаем начальные территории в углах карты
     if not any(cell.faction_id for cell in cells):
         # Проверяем, есть ли фракции
         if len(factions) >= 4:
             # Создаем начальные территории в углах карты только для фракций без территорий
-            corners = [(0, 0), (0, 6), (6, 0), (6, 6)]
+            corners = start_positions(rules.map_size)
             for i, (x, y) in enumerate(corners):
-                faction_id = i + 1  # Фракции с ID от 1 до 4
+                faction_id = factions[i].id  # Первые четыре фракции игры
                 
                 # Проверяем, есть ли у фракции уже территории
                 faction_has_cells = Cell.query.filter_by(faction_id=faction_id).first() is not None
@@ -87,11 +79,11 @@ def index():
                     continue
                 
                 # Находим клетку в углу
-                corner_cell = next((c for c in cells if c.x == x and c.y == y), None)
+                corner_cell = Cell.query.filter_by(game_id=game_id, x=x, y=y).first()
                 
                 # Если клетка не существует, создаем ее
                 if not corner_cell:
-                    corner_cell = Cell(x=x, y=y, faction_id=faction_id)
+                    corner_cell = Cell(game_id=game_id, x=x, y=y, faction_id=faction_id)
                     db.session.add(corner_cell)
                 else:
                     corner_cell.faction_id = faction_id
@@ -101,16 +93,56 @@ def index():
                     castle = Building(type=BuildingType.CASTLE, level=1, cell=corner_cell)
                     db.session.add(castle)
             
-            # Сохраняем изменения
+            # Сохраняем изменения и публикуем новый снимок мира
             db.session.commit()
+            get_game_manager(game_id).publish_snapshot()
             
             # Обновляем данные карты
-            return redirect(url_for('main.index'))
+            return redirect(url_for('main.index', game_id=game_id))
+    
+    # Сетка карты берется из кеша фрагментов, на запрос рисуется только остальная страница
+    map_html = MapFragmentCache.get_instance().render(game_id, snapshot, rules, user_faction_id)
+    # Дальше страница запрашивает только изменения карты с этой версии
+    MapDeltas.get_instance(game_id).record(snapshot)
+    
+    # Настройки сценария страницы (app.js): передаются в JSON, сам сценарий общий для всех страниц
+    game_config = {
+        'gameId': game_id,
+        'userFactionId': user_faction_id,
+        'mapVersion': snapshot.version,
+        'resourceBonusPercent': rules.resource_bonus_percent,
+        'combatBonusPercent': rules.combat_bonus_percent,
+        # Особые клетки зависят от размера карты, поэтому берутся из правил
+        'castleCells': sorted(rules.castle_cells),
+        'resourceBonusCells': sorted([x, y, resource] for (x, y), resource in rules.resource_bonus_cells.items()),
+        'combatBonusCell': rules.combat_bonus_cell,
+        'factionColors': faction_colors(snapshot.factions),
+        'buildingCosts': {
+            name: dict(cost) for name, cost in rules.building_costs.items() if name != 'CASTLE'
+        },
+        'warriorCost': rules.warrior_cost,
+        'iconsUrl': asset_url('icons.svg')
+    }
     
     return render_template('main/index.html', 
-                         map_data=map_data, 
+                         map_html=map_html, 
+                         game_config=game_config,
+                         faction_resources=faction_resources,
                          factions=factions,
-                         current_user=current_user)
+                         game=game,
+                         is_player=is_player,
+                         current_user=current_user,
+                         rules=rules)
+
+@bp.route('/maps/<int:game_id>/<filename>')
+def map_image(game_id, filename):
+    """Изображение карты игры для зрителей с бессрочным кешированием"""
+    store = MapImageStore.find(game_id)
+    if store is None or not store.enabled or not MAP_IMAGE_FILE_PATTERN.match(filename):
+        abort(404)
+    response = send_from_directory(store.directory, filename, max_age=MAP_IMAGE_MAX_AGE)
+    response.cache_control.immutable = True
+    return shared_body(response)
 
 @bp.route('/faction/<int:faction_id>')
 @login_required
@@ -120,7 +152,7 @@ def faction_info(faction_id):
     
     # Получаем текущий ход
     from app.routes.game import get_current_turn
-    current_turn = get_current_turn()
+    current_turn = get_current_turn(faction.game_id)
     
     # Получаем все действия пользователей фракции в текущем ходу
     from app.models.user_action import UserAction
@@ -132,6 +164,12 @@ def faction_info(faction_id):
         UserAction.turn == current_turn
     ).all()
     
+    # Воины, отправленные в текущем ходу на захват и защиту, тоже требуют содержания
+    warriors_sent = sum(action.warriors or 0 for action in actions
+                        if action.action_type == ActionType.CAPTURE_CELL.value)
+    warriors_defending = sum(action.warriors or 0 for action in actions
+                             if action.action_type == ActionType.DEFEND_CELL.value)
+    
     # Подсчитываем количество зданий каждого типа
     buildings = {}
     cells = Cell.query.filter_by(faction_id=faction_id).all()
@@ -142,14 +180,33 @@ def faction_info(faction_id):
                 buildings[cell.building_type] = 0
             buildings[cell.building_type] += 1
     
+    # Доход за ход считается по текущим правилам так же, как при обработке хода
+    rules = GameRules.get_instance()
+    income = faction_income(rules, [
+        CellState(
+            x=cell.x,
+            y=cell.y,
+            faction_id=cell.faction_id,
+            building_type=cell.building_type,
+            building=cell.building.type.name if cell.building else None,
+            building_level=cell.building.level if cell.building else None,
+            neutral_defenders=cell.neutral_defenders
+        )
+        for cell in cells
+    ], (faction.warriors or 0) + warriors_sent + warriors_defending)
+    
     return render_template('main/faction.html', 
                           faction=faction, 
                           current_turn=current_turn,
                           actions=actions,
                           buildings=buildings,
-                          cells=cells)
+                          cells=cells,
+                          warriors_sent=warriors_sent,
+                          warriors_defending=warriors_defending,
+                          income=income,
+                          rules=rules)
 
 @bp.route('/rules')
 def rules():
     """Страница с правилами игры"""
-    return render_template('main/rules.html') 
\ No newline at end of file
+    return render_template('main/rules.html', rules=GameRules.get_instance()) 
\ No newline at end of file
@@ -0,0 +1,263 @@
+from types import MappingProxyType
+import hashlib
+import json
+import logging
+import os
+import threading
+
+from app.models.game import BuildingType
+
+# Настройки конфигурации, из которых собираются правила игры
+RULE_SETTINGS = (
+    'MAP_SIZE',
+    'INITIAL_RESOURCES',
+    'INITIAL_LIMITS',
+    'BASE_LIMITS',
+    'BASE_INCOME',
+    'GOLD_PER_TERRITORY',
+    'STORAGE_BONUS_PER_BUILDING',
+    'WARRIOR_CAPACITY_PER_BUILDING',
+    'WARRIOR_COST',
+    'WARRIOR_MAINTENANCE',
+    'BARRACKS_WARRIORS_PER_TURN',
+    'BUILDING_COSTS',
+    'BUILDING_PRODUCTION',
+    'BUILDING_LEVEL_PRODUCTION_BONUS',
+    'MAX_BUILDING_LEVEL',
+    'CASTLE_CELLS',
+    'RESOURCE_BONUS_CELLS',
+    'RESOURCE_BONUS',
+    'COMBAT_BONUS_CELL',
+    'COMBAT_BONUS',
+    'NEUTRAL_DEFENDERS_RANGE',
+)
+
+RESOURCES = ('gold', 'wood', 'stone', 'ore', 'warriors')
+
+# Названия зданий для сообщений игрокам (по имени BuildingType)
+BUILDING_NAMES = MappingProxyType({
+    'CASTLE': 'Замок',
+    'SAWMILL': 'Лесопилка',
+    'MINE': 'Шахта',
+    'QUARRY': 'Карьер',
+    'WAREHOUSE': 'Склад',
+    'BARRACKS': 'Казармы'
+})
+
+def _frozen(mapping):
+    return MappingProxyType(dict(mapping))
+
+def start_positions(map_size):
+    """Возвращает стартовые клетки фракций: углы карты в порядке создания фракций"""
+    last = map_size - 1
+    return [(0, 0), (last, 0), (0, last), (last, last)]
+
+def special_cells(map_size):
+    """Особые клетки карты по ее размеру: (замки, бонусы к ресурсам, клетка боевого бонуса)
+
+    Замки стоят в углах карты, клетка боевого бонуса - в центре, клетки
+    бонусов к ресурсам - между центром и серединами сторон карты (на карте
+    7x7 это клетки (1, 3), (3, 1), (3, 5) и (5, 3)).
+    """
+    center = map_size // 2
+    offset = max(1, (map_size - 1) // 2 - 1)
+    resource_cells = [
+        (center - offset, center, 'gold'),
+        (center, center - offset, 'wood'),
+        (center, center + offset, 'ore'),
+        (center + offset, center, 'stone'),
+    ]
+    return start_positions(map_size), resource_cells, (center, center)
+
+def _check_special_cells(map_size, castle_cells, resource_cells, combat_cell):
+    """Проверяет, что особые клетки правил согласованы с размером карты
+
+    resource_cells - ресурсы клеток бонусов по координатам. Бросает ValueError:
+    правила с такими клетками не загружаются.
+    """
+    if map_size < 3:
+        raise ValueError(f"Размер карты {map_size} меньше 3")
+    cells = list(castle_cells) + list(resource_cells) + [combat_cell]
+    outside = [cell for cell in cells if not all(0 <= coordinate < map_size for coordinate in cell)]
+    if outside:
+        raise ValueError(f"Особые клетки {outside} вне карты {map_size}x{map_size}")
+    if castle_cells != set(start_positions(map_size)):
+        raise ValueError(f"Замки должны стоять в углах карты {map_size}x{map_size}: {sorted(castle_cells)}")
+    if len(set(cells)) != len(cells):
+        raise ValueError("Особые клетки карты совпадают")
+    unknown = set(resource_cells.values()) - set(RESOURCES[:-1])
+    if unknown:
+        raise ValueError(f"Неизвестные ресурсы клеток бонусов: {', '.join(sorted(unknown))}")
+
+class GameRules:
+    """Неизменяемый набор правил игры
+
+    Собирается один раз из настроек конфигурации (и необязательного файла
+    GAME_RULES_FILE с переопределениями). Все таблицы (стоимость зданий,
+    производство по типу и уровню, лимиты, бонусные клетки) вычисляются
+    заранее, поэтому обращения к правилам - это поиск в словаре.
+    Текущие правила заменяются целиком между ходами.
+    """
+    _instance = None
+    _source_mtime = None
+    _reload_lock = threading.Lock()
+
+    def __init__(self, settings):
+        source = json.dumps(settings, sort_keys=True, default=list)
+        # Особые клетки, не заданные в настройках, определяются по размеру карты
+        castle_cells, resource_cells, combat_cell = special_cells(settings['MAP_SIZE'])
+        castle_cells = frozenset(tuple(cell) for cell in settings['CASTLE_CELLS'] or castle_cells)
+        resource_cells = {(x, y): resource for x, y, resource in settings['RESOURCE_BONUS_CELLS'] or resource_cells}
+        combat_cell = tuple(settings['COMBAT_BONUS_CELL'] or combat_cell)
+        _check_special_cells(settings['MAP_SIZE'], castle_cells, resource_cells, combat_cell)
+        values = {
+            'version': hashlib.sha1(source.encode('utf-8')).hexdigest()[:12],
+            'source': source,  # настройки в JSON, по которым правила собираются заново в другом процессе
+            'map_size': settings['MAP_SIZE'],
+            'initial_resources': _frozen(settings['INITIAL_RESOURCES']),
+            'initial_limits': _frozen(settings['INITIAL_LIMITS']),
+            'base_limits': _frozen(settings['BASE_LIMITS']),
+            'base_income': _frozen(settings['BASE_INCOME']),
+            'gold_per_territory': settings['GOLD_PER_TERRITORY'],
+            'storage_bonus_per_building': settings['STORAGE_BONUS_PER_BUILDING'],
+            'warrior_capacity_per_building': settings['WARRIOR_CAPACITY_PER_BUILDING'],
+            'warrior_cost': settings['WARRIOR_COST'],
+            'warrior_maintenance': settings['WARRIOR_MAINTENANCE'],
+            'barracks_warriors_per_turn': settings['BARRACKS_WARRIORS_PER_TURN'],
+            'building_costs': _frozen({
+                name: _frozen(cost) for name, cost in settings['BUILDING_COSTS'].items()
+            }),
+            'max_building_level': settings['MAX_BUILDING_LEVEL'],
+            'castle_cells': castle_cells,
+            'resource_bonus_cells': _frozen(resource_cells),
+            'resource_bonus': settings['RESOURCE_BONUS'],
+            'combat_bonus_cell': combat_cell,
+            'combat_bonus': settings['COMBAT_BONUS'],
+            'neutral_defenders_range': tuple(settings['NEUTRAL_DEFENDERS_RANGE']),
+        }
+
+        # Производство по типу и уровню здания: базовое производство растет
+        # на BUILDING_LEVEL_PRODUCTION_BONUS за каждый уровень после первого
+        level_bonus = settings['BUILDING_LEVEL_PRODUCTION_BONUS']
+        production = {}
+        for building_type in BuildingType:
+            base = settings['BUILDING_PRODUCTION'].get(building_type.name, {})
+            for level in range(1, values['max_building_level'] + 1):
+                production[(building_type, level)] = _frozen({
+                    resource: int(amount * (1 + level_bonus * (level - 1)))
+                    for resource, amount in base.items()
+                })
+        values['production'] = _frozen(production)
+
+        for name, value in values.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Правила игры неизменяемы")
+
+    def __reduce__(self):
+        # При передаче в другой процесс правила собираются заново по исходным настройкам
+        return (GameRules.from_source, (self.source,))
+
+    @property
+    def resource_bonus_percent(self):
+        return int(round(self.resource_bonus * 100))
+
+    @property
+    def combat_bonus_percent(self):
+        return int(round(self.combat_bonus * 100))
+
+    def building_cost(self, building_type):
+        """Возвращает стоимость здания по имени типа или None для неизвестного типа"""
+        return self.building_costs.get(building_type)
+
+    def building_production(self, building_type, level):
+        """Возвращает производство здания за ход по типу (BuildingType) и уровню"""
+        level = min(max(level or 1, 1), self.max_building_level)
+        return self.production[(building_type, level)]
+
+    def building_name(self, building_type):
+        """Возвращает название здания по имени типа ('Здание' для неизвестного типа)"""
+        return BUILDING_NAMES.get(building_type, 'Здание')
+
+    def is_castle_cell(self, x, y):
+        """Проверяет, является ли клетка угловой (с замком)"""
+        return (x, y) in self.castle_cells
+
+    def resource_bonus_resource(self, x, y):
+        """Возвращает ресурс, к добыче которого клетка дает бонус, или None"""
+        return self.resource_bonus_cells.get((x, y))
+
+    def is_combat_bonus_cell(self, x, y):
+        """Проверяет, дает ли клетка бонус к боевой мощи"""
+        return (x, y) == self.combat_bonus_cell
+
+    def combat_strength(self, warriors, has_bonus):
+        """Возвращает боевую мощь отряда с учетом бонуса центральной клетки"""
+        if has_bonus:
+            return warriors + int(warriors * self.combat_bonus)
+        return warriors
+
+    @classmethod
+    def from_source(cls, source):
+        """Собирает правила по их исходным настройкам в JSON (атрибут source)"""
+        return cls(json.loads(source))
+
+    @classmethod
+    def get_instance(cls):
+        """Возвращает текущие правила игры"""
+        if cls._instance is None:
+            from config import Config
+            cls._instance = cls({name: getattr(Config, name) for name in RULE_SETTINGS})
+        return cls._instance
+
+    @classmethod
+    def load(cls, app):
+        """Собирает правила из конфигурации приложения и файла переопределений"""
+        with cls._reload_lock:
+            settings = {name: app.config[name] for name in RULE_SETTINGS}
+            path = cls._source_path(app)
+            mtime = None
+            if path and os.path.exists(path):
+                mtime = os.path.getmtime(path)
+                with open(path, encoding='utf-8') as rules_file:
+                    overrides = json.load(rules_file)
+                unknown = set(overrides) - set(RULE_SETTINGS)
+                if unknown:
+                    raise ValueError(f"Неизвестные настройки правил: {', '.join(sorted(unknown))}")
+                settings.update(overrides)
+
+            cls._instance = cls(settings)
+            cls._source_mtime = mtime
+            return cls._instance
+
+    @classmethod
+    def reload_if_changed(cls, app):
+        """Перечитывает правила, если файл переопределений изменился
+
+        Вызывается между ходами. При ошибке в файле остаются прежние правила.
+        Возвращает True, если правила заменены.
+        """
+        path = cls._source_path(app)
+        mtime = os.path.getmtime(path) if path and os.path.exists(path) else None
+        if mtime == cls._source_mtime:
+            return False
+
+        logger = logging.getLogger('game_manager')
+        try:
+            rules = cls.load(app)
+        except Exception as e:
+            logger.error("Ошибка при загрузке правил игры из %s: %s", path, str(e))
+            cls._source_mtime = mtime
+            return False
+        logger.info("Загружены новые правила игры, версия %s", rules.version)
+        return True
+
+    @staticmethod
+    def _source_path(app):
+        filename = app.config.get('GAME_RULES_FILE')
+        if not filename:
+            return None
+        if not os.path.isabs(filename):
+            filename = os.path.join(app.instance_path, filename)
+        return filename
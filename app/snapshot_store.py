@@ -0,0 +1,260 @@
+from array import array
+import mmap
+import os
+import re
+import struct
+import sys
+import zlib
+
+from app.models.game import DEFAULT_GAME_ID
+from app.world_snapshot import WorldSnapshot, CellState, FactionState
+
+# Формат файла снимка мира (все числа little-endian):
+#   заголовок HEADER: сигнатура, версия формата, ход, ширина и высота карты,
+#                     количество фракций, количество строк в таблице типов зданий
+#   массивы карты по клеткам (индекс клетки = x * высота + y):
+#     владелец           uint16 (0 - нейтральная клетка)
+#     тип постройки      uint8  (код в таблице типов, 0 - нет)
+#     здание             uint8  (код в таблице типов, 0 - нет)
+#     уровень здания     uint8  (0 - нет здания)
+#     защитники          uint8  (NO_DEFENDERS - не назначены)
+#   фракции: FACTION_RECORD, затем название и цвет (длина uint16 + UTF-8)
+#   таблица типов зданий: строки (длина uint16 + UTF-8)
+#   контрольная сумма CRC32 всего предшествующего содержимого
+MAGIC = b'KWWS'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<4sHIHHHH')
+FACTION_RECORD = struct.Struct('<I10i')
+STRING_LENGTH = struct.Struct('<H')
+CHECKSUM = struct.Struct('<I')
+NO_DEFENDERS = 0xFF
+
+FACTION_FIELDS = ('gold', 'wood', 'stone', 'ore', 'warriors',
+                  'max_gold', 'max_wood', 'max_stone', 'max_ore', 'max_warriors')
+
+SNAPSHOT_FILE_PATTERN = re.compile(r'^world_(\d+)\.bin$')
+
+class SnapshotFormatError(ValueError):
+    """Файл снимка мира поврежден или имеет неподдерживаемый формат"""
+
+def _pack_string(value):
+    data = (value or '').encode('utf-8')
+    return STRING_LENGTH.pack(len(data)) + data
+
+def _unpack_string(buffer, offset):
+    (length,) = STRING_LENGTH.unpack_from(buffer, offset)
+    offset += STRING_LENGTH.size
+    return bytes(buffer[offset:offset + length]).decode('utf-8'), offset + length
+
+def _grid_bytes(typecode, values):
+    grid = array(typecode, values)
+    if sys.byteorder != 'little':
+        grid.byteswap()
+    return grid.tobytes()
+
+def _read_grid(typecode, buffer, offset, count):
+    grid = array(typecode)
+    end = offset + count * grid.itemsize
+    grid.frombytes(buffer[offset:end])
+    if sys.byteorder != 'little':
+        grid.byteswap()
+    return grid, end
+
+def encode_snapshot(snapshot):
+    """Кодирует снимок мира в компактный двоичный формат"""
+    width = max((cell.x for cell in snapshot.cells), default=-1) + 1
+    height = max((cell.y for cell in snapshot.cells), default=-1) + 1
+    if len(snapshot.cells) != width * height:
+        raise ValueError("Снимок мира содержит неполную карту")
+
+    building_names = sorted({
+        name for cell in snapshot.cells for name in (cell.building_type, cell.building) if name
+    })
+    building_codes = {name: code for code, name in enumerate(building_names, start=1)}
+
+    cells = sorted(snapshot.cells, key=lambda c: (c.x, c.y))
+    parts = [
+        HEADER.pack(MAGIC, FORMAT_VERSION, snapshot.turn, width, height,
+                    len(snapshot.factions), len(building_names)),
+        _grid_bytes('H', [cell.faction_id or 0 for cell in cells]),
+        _grid_bytes('B', [building_codes.get(cell.building_type, 0) for cell in cells]),
+        _grid_bytes('B', [building_codes.get(cell.building, 0) for cell in cells]),
+        _grid_bytes('B', [cell.building_level or 0 for cell in cells]),
+        _grid_bytes('B', [NO_DEFENDERS if cell.neutral_defenders is None else cell.neutral_defenders
+                          for cell in cells]),
+    ]
+    for faction in snapshot.factions:
+        parts.append(FACTION_RECORD.pack(faction.id, *(getattr(faction, field) or 0 for field in FACTION_FIELDS)))
+        parts.append(_pack_string(faction.name))
+        parts.append(_pack_string(faction.color))
+    parts.extend(_pack_string(name) for name in building_names)
+
+    body = b''.join(parts)
+    return body + CHECKSUM.pack(zlib.crc32(body))
+
+def decode_snapshot(buffer, version):
+    """Восстанавливает снимок мира из двоичного представления
+
+    buffer - bytes, memoryview или mmap с содержимым файла снимка.
+    """
+    if len(buffer) < HEADER.size + CHECKSUM.size:
+        raise SnapshotFormatError("Файл снимка мира слишком короткий")
+
+    body_size = len(buffer) - CHECKSUM.size
+    (checksum,) = CHECKSUM.unpack_from(buffer, body_size)
+    if zlib.crc32(buffer[:body_size]) != checksum:
+        raise SnapshotFormatError("Контрольная сумма снимка мира не совпадает")
+
+    magic, format_version, turn, width, height, faction_count, building_count = HEADER.unpack_from(buffer, 0)
+    if magic != MAGIC or format_version != FORMAT_VERSION:
+        raise SnapshotFormatError("Неподдерживаемый формат снимка мира")
+
+    count = width * height
+    offset = HEADER.size
+    owners, offset = _read_grid('H', buffer, offset, count)
+    building_types, offset = _read_grid('B', buffer, offset, count)
+    buildings, offset = _read_grid('B', buffer, offset, count)
+    levels, offset = _read_grid('B', buffer, offset, count)
+    defenders, offset = _read_grid('B', buffer, offset, count)
+
+    factions = []
+    for _ in range(faction_count):
+        values = FACTION_RECORD.unpack_from(buffer, offset)
+        offset += FACTION_RECORD.size
+        name, offset = _unpack_string(buffer, offset)
+        color, offset = _unpack_string(buffer, offset)
+        factions.append(FactionState(
+            id=values[0],
+            name=name,
+            short_name=name.replace("-Квантум", "").replace(" Квантум", ""),
+            color=color,
+            **dict(zip(FACTION_FIELDS, values[1:]))
+        ))
+
+    building_names = [None]
+    for _ in range(building_count):
+        name, offset = _unpack_string(buffer, offset)
+        building_names.append(name)
+
+    cells = []
+    for index in range(count):
+        x, y = divmod(index, height)
+        cells.append(CellState(
+            x=x,
+            y=y,
+            faction_id=owners[index] or None,
+            building_type=building_names[building_types[index]],
+            building=building_names[buildings[index]],
+            building_level=levels[index] or None,
+            neutral_defenders=None if defenders[index] == NO_DEFENDERS else defenders[index]
+        ))
+
+    return WorldSnapshot(version, turn, cells, factions)
+
+class SnapshotStore:
+    """Хранилище двоичных снимков мира на диске
+
+    Снимок с состоянием мира на начало хода записывается раз в
+    WORLD_SNAPSHOT_INTERVAL ходов в файл world_<ход>.bin. Запись идет во
+    временный файл с последующим атомарным переименованием, чтение - через
+    отображение файла в память. Хранится не более WORLD_SNAPSHOT_KEEP снимков.
+    У каждой игры своя папка снимков.
+    """
+    _instances = {}
+
+    def __init__(self, game_id=DEFAULT_GAME_ID):
+        self.game_id = game_id
+        self.directory = None
+        self.interval = 10
+        self.keep = 20
+
+    @classmethod
+    def get_instance(cls, game_id=DEFAULT_GAME_ID):
+        if game_id not in cls._instances:
+            cls._instances[game_id] = SnapshotStore(game_id)
+        return cls._instances[game_id]
+
+    @property
+    def enabled(self):
+        return self.directory is not None
+
+    def init_app(self, app):
+        """Определяет папку снимков по настройке WORLD_SNAPSHOT_DIR
+
+        Относительный путь считается от папки instance приложения,
+        пустое значение отключает снимки. Снимки остальных игр, кроме
+        первой, хранятся во вложенных папках game_<id>.
+        """
+        directory = app.config.get('WORLD_SNAPSHOT_DIR')
+        self.interval = max(1, app.config.get('WORLD_SNAPSHOT_INTERVAL', self.interval))
+        self.keep = app.config.get('WORLD_SNAPSHOT_KEEP', self.keep)
+        if not directory:
+            self.directory = None
+            return
+        if not os.path.isabs(directory):
+            directory = os.path.join(app.instance_path, directory)
+        if self.game_id != DEFAULT_GAME_ID:
+            directory = os.path.join(directory, f'game_{self.game_id}')
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+
+    def path_for(self, turn):
+        return os.path.join(self.directory, f'world_{turn:08d}.bin')
+
+    def is_due(self, turn):
+        """Проверяет, нужно ли сохранять снимок на начало хода turn"""
+        return self.enabled and (turn - 1) % self.interval == 0
+
+    def turns(self):
+        """Возвращает отсортированный список ходов, для которых есть снимки"""
+        if not self.enabled:
+            return []
+        turns = []
+        for filename in os.listdir(self.directory):
+            match = SNAPSHOT_FILE_PATTERN.match(filename)
+            if match:
+                turns.append(int(match.group(1)))
+        return sorted(turns)
+
+    def latest_turn(self, at_most=None):
+        """Возвращает последний ход со снимком (не позже at_most) или None"""
+        turns = [turn for turn in self.turns() if at_most is None or turn <= at_most]
+        return turns[-1] if turns else None
+
+    def save(self, snapshot):
+        """Атомарно записывает снимок мира на диск"""
+        if not self.enabled:
+            return None
+
+        data = encode_snapshot(snapshot)
+        path = self.path_for(snapshot.turn)
+        temp_path = path + '.tmp'
+        with open(temp_path, 'wb') as snapshot_file:
+            snapshot_file.write(data)
+            snapshot_file.flush()
+            os.fsync(snapshot_file.fileno())
+        os.replace(temp_path, path)
+
+        # Удаляем самые старые снимки сверх лимита
+        turns = self.turns()
+        if self.keep and len(turns) > self.keep:
+            for turn in turns[:len(turns) - self.keep]:
+                os.remove(self.path_for(turn))
+        return path
+
+    def load(self, turn, version):
+        """Загружает снимок мира на начало хода turn через отображение файла в память"""
+        with open(self.path_for(turn), 'rb') as snapshot_file:
+            with mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                return decode_snapshot(mapped, version)
+
+    def discard_after(self, turn):
+        """Удаляет снимки ходов после turn (после отката мира)"""
+        for stored_turn in self.turns():
+            if stored_turn > turn:
+                os.remove(self.path_for(stored_turn))
+
+    def clear(self):
+        """Удаляет все снимки"""
+        for turn in self.turns():
+            os.remove(self.path_for(turn))
@@ -0,0 +1,978 @@
+// Главная страница игры: карта, ресурсы, журнал и действия фракции
+(function() {
+    // Настройки страницы из шаблона main/index.html
+    const configElement = document.getElementById('game-config');
+    if (!configElement) return;
+    const config = JSON.parse(configElement.textContent);
+    
+    // Глобальные переменные
+    let userFactionId = config.userFactionId;
+    // Игра, карта которой показана на странице
+    const gameId = config.gameId;
+    // Особые клетки карты по правилам игры (ключ - "x,y")
+    const castleCells = new Set(config.castleCells.map(([x, y]) => `${x},${y}`));
+    const resourceBonusCells = {};
+    config.resourceBonusCells.forEach(([x, y, resource]) => {
+        resourceBonusCells[`${x},${y}`] = resource;
+    });
+    // Цвета фракций игры по идентификатору (обновляются вместе с данными карты)
+    let factionColors = config.factionColors;
+    const RESOURCE_BONUS_COLORS = {gold: '#FFD700', wood: '#228B22', ore: '#A9A9A9', stone: '#708090'};
+    
+    // Функция для обновления таймера хода
+    function updateTurnTimer() {
+        fetch(`/api/turn?game_id=${gameId}`)
+            .then(response => response.json())
+            .then(renderTurn);
+    }
+    
+    function renderTurn(data) {
+        document.getElementById('turn-number').textContent = data.current_turn;
+        document.getElementById('turn-timer').textContent = data.seconds_left;
+    }
+    
+    // Версия снимка мира, по которому нарисована карта (сетка приходит вместе со страницей)
+    let mapVersion = config.mapVersion;
+    
+    // Функция для обновления состояния игры: ход, карта, ресурсы и журнал одним запросом
+    function updateGameState() {
+        const params = new URLSearchParams({game_id: gameId});
+        // Проверяем, авторизован ли пользователь перед обновлением ресурсов и логов
+        params.set('fields', userFactionId ? 'turn,map,resources,logs' : 'turn,map');
+        params.set('map_format', 'columns');
+        if (mapVersion !== null) {
+            params.set('map_version', mapVersion);
+            // Вместо всей карты сервер передаст только клетки, изменившиеся с этой версии
+            params.set('map_changes', '1');
+        }
+        if (factionLogsCursor !== null) {
+            params.set('logs_after', factionLogsCursor);
+        }
+        
+        fetch(`/api/state?${params}`)
+            .then(response => response.json())
+            .then(state => {
+                if (!state.success) {
+                    console.error('Ошибка при получении состояния игры:', state.message);
+                    return;
+                }
+                renderTurn(state.turn);
+                // Карта приходит только после смены снимка мира: изменившиеся клетки или вся карта
+                if (state.map_changes) {
+                    renderMap(state.map_changes.cells);
+                    mapVersion = state.version;
+                } else if (state.map) {
+                    renderMap(decodeMapColumns(state.map));
+                    mapVersion = state.version;
+                }
+                if (state.resources) {
+                    renderResources(state.resources);
+                }
+                if (state.logs) {
+                    renderFactionLogs(state.logs);
+                }
+            })
+            .catch(error => console.error('Ошибка при обновлении состояния игры:', error));
+    }
+    
+    // Функция для обновления логов фракции
+    // Записи журнала текущего хода (по возрастанию id) и курсор последней полученной записи
+    let factionLogEntries = [];
+    let factionLogsCursor = null;
+    
+    function updateFactionLogs() {
+        // После первой загрузки запрашиваем только новые записи
+        const url = factionLogsCursor === null
+            ? '/api/faction_logs'
+            : `/api/faction_logs?after=${factionLogsCursor}`;
+        
+        fetch(url)
+            .then(response => response.json())
+            .then(renderFactionLogs)
+            .catch(error => {
+                console.error('Ошибка при обновлении логов фракции:', error);
+            });
+    }
+    
+    function renderFactionLogs(data) {
+        if (!data.success) {
+            console.error('Ошибка при получении логов:', data.message);
+            return;
+        }
+        
+        const logsContainer = document.getElementById('faction-logs');
+        if (!logsContainer) return;
+        
+        // Первая загрузка возвращает записи от новых к старым, последующие - от старых к новым
+        const newEntries = factionLogsCursor === null ? data.logs.slice().reverse() : data.logs;
+        factionLogsCursor = data.cursor;
+        
+        // Оставляем только записи текущего хода
+        factionLogEntries = factionLogEntries
+            .concat(newEntries)
+            .filter(log => log.turn === data.current_turn);
+        
+        // Обновляем номер хода в заголовке логов
+        const logTurnNumber = document.getElementById('log-turn-number');
+        if (logTurnNumber) {
+            logTurnNumber.textContent = data.current_turn;
+        }
+        
+        // Если нет логов, показываем сообщение
+        if (factionLogEntries.length === 0) {
+            logsContainer.innerHTML = `
+                <div class="text-center text-muted">
+                    <p>В этом ходу ваша фракция еще не совершала действий</p>
+                </div>
+            `;
+            return;
+        }
+        
+        // Формируем HTML для логов (сначала новые)
+        let logsHTML = '<ul class="list-group list-group-flush">';
+        
+        factionLogEntries.slice().reverse().forEach(log => {
+            logsHTML += `
+                <li class="list-group-item p-2">
+                    <div class="d-flex justify-content-between align-items-center">
+                        <small class="text-muted">${log.timestamp}</small>
+                        <small class="text-primary">${log.username}</small>
+                    </div>
+                    <div>${log.message}</div>
+                </li>
+            `;
+        });
+        
+        logsHTML += '</ul>';
+        logsContainer.innerHTML = logsHTML;
+    }
+    
+    // Функция для обновления карты
+    function updateMap() {
+        fetch(`/api/map?game_id=${gameId}`, {headers: {'Accept': MAP_COLUMNS_MIMETYPE}})
+            .then(response => response.json())
+            .then(columns => renderMap(decodeMapColumns(columns)))
+            .catch(error => console.error('Ошибка при обновлении карты:', error));
+    }
+    
+    // Карта по столбцам: поля клеток - массивы, типы зданий - номера в словаре
+    const MAP_COLUMNS_MIMETYPE = 'application/vnd.kvantwars.map-columns+json';
+    
+    // Преобразует карту по столбцам в список клеток, как в обычном ответе /api/map
+    function decodeMapColumns(columns) {
+        factionColors = columns.faction_colors;
+        return columns.x.map((x, index) => {
+            const factionId = columns.faction_id[index];
+            const buildingCode = columns.building_type[index];
+            const cell = {
+                x: x,
+                y: columns.y[index],
+                faction_id: factionId,
+                building_type: buildingCode >= 0 ? columns.building_types[buildingCode] : null
+            };
+            if (factionId && columns.faction_names[factionId] !== undefined) {
+                cell.faction_name = columns.faction_names[factionId];
+            }
+            if (factionId === null && cell.building_type !== null) {
+                cell.neutral_defenders = columns.neutral_defenders[index];
+            }
+            return cell;
+        });
+    }
+    
+    // Модель карты: последнее отрисованное состояние клеток по ключу "x,y"
+    const cellStates = new Map();
+    // Элементы клеток по тому же ключу (ищутся в документе один раз)
+    let cellElements = null;
+    // Изменившиеся клетки, которые будут отрисованы в следующем кадре
+    const pendingCells = new Map();
+    let renderFrame = null;
+    
+    function cellKey(x, y) {
+        return `${x},${y}`;
+    }
+    
+    function getCellElement(x, y) {
+        if (cellElements === null) {
+            cellElements = new Map();
+            document.querySelectorAll('.map-cell').forEach(element => {
+                cellElements.set(cellKey(element.dataset.x, element.dataset.y), element);
+            });
+        }
+        return cellElements.get(cellKey(x, y));
+    }
+    
+    // Поля клетки, от которых зависит ее отрисовка
+    function cellSignature(cell) {
+        return [cell.faction_id, cell.building_type, cell.faction_name, cell.neutral_defenders].join('|');
+    }
+    
+    // Применяет к модели карты клетки из ответа сервера (всю карту или только изменившиеся клетки):
+    // отрисовываются только клетки, состояние которых отличается от модели
+    function renderMap(mapData) {
+        // Проверяем формат данных
+        if (!Array.isArray(mapData)) {
+            console.error('Неверный формат данных карты:', mapData);
+            return;
+        }
+        
+        mapData.forEach(cell => {
+            const key = cellKey(cell.x, cell.y);
+            const signature = cellSignature(cell);
+            if (cellStates.get(key) === signature) return;
+            cellStates.set(key, signature);
+            pendingCells.set(key, cell);
+        });
+        
+        // Все изменения записываются в документ за один кадр
+        if (pendingCells.size && renderFrame === null) {
+            renderFrame = requestAnimationFrame(flushPendingCells);
+        }
+    }
+    
+    function flushPendingCells() {
+        renderFrame = null;
+        // Клетки, у которых могла измениться подсветка соседства с фракцией игрока
+        const adjacencyKeys = new Set();
+        
+        pendingCells.forEach((cell, key) => {
+            const cellElement = getCellElement(cell.x, cell.y);
+            if (!cellElement) {
+                console.warn(`Элемент для клетки (${cell.x}, ${cell.y}) не найден`);
+                return;
+            }
+            if (userFactionId && String(cell.faction_id || '') !== cellElement.dataset.factionId) {
+                [[0, 0], [1, 0], [-1, 0], [0, 1], [0, -1]].forEach(([dx, dy]) => {
+                    adjacencyKeys.add(cellKey(cell.x + dx, cell.y + dy));
+                });
+            }
+            updateCellElement(cellElement, cell);
+        });
+        pendingCells.clear();
+        
+        adjacencyKeys.forEach(key => {
+            const [x, y] = key.split(',').map(Number);
+            const cellElement = getCellElement(x, y);
+            if (cellElement) {
+                cellElement.classList.toggle('adjacent', isAdjacentToFaction(x, y, userFactionId));
+            }
+        });
+    }
+    
+    // Граничит ли клетка с территорией фракции (как WorldSnapshot.is_adjacent на сервере)
+    function isAdjacentToFaction(x, y, factionId) {
+        return [[1, 0], [-1, 0], [0, 1], [0, -1]].some(([dx, dy]) => {
+            const neighbor = getCellElement(x + dx, y + dy);
+            return neighbor !== undefined && neighbor.dataset.factionId === String(factionId);
+        });
+    }
+    
+    // Обновляет элемент клетки по ее состоянию (бонусы клеток не меняются и не перерисовываются)
+    function updateCellElement(cellElement, cell) {
+        // Обновляем фракцию
+        if (cell.faction_id) {
+            cellElement.dataset.factionId = cell.faction_id;
+            cellElement.style.backgroundColor = getFactionColor(cell.faction_id);
+        } else {
+            cellElement.dataset.factionId = '';
+            cellElement.style.backgroundColor = '';
+        }
+        
+        // Обновляем здание
+        const buildingIcon = cellElement.querySelector('.building-icon');
+        if (buildingIcon) {
+            if (cell.building_type) {
+                buildingIcon.innerHTML = getBuildingIcon(cell.building_type);
+                buildingIcon.style.display = 'flex';
+            } else if (cell.faction_id && isCornerCell(parseInt(cell.x), parseInt(cell.y))) {
+                // Если это угловая клетка с фракцией, но без здания, добавляем замок
+                buildingIcon.innerHTML = getBuildingIcon('castle');
+                buildingIcon.style.display = 'flex';
+            } else {
+                buildingIcon.style.display = 'none';
+            }
+        }
+        
+        // Обновляем название фракции над замком
+        const factionLabel = cellElement.querySelector('.faction-label');
+        if (factionLabel && cell.faction_name) {
+            factionLabel.textContent = cell.faction_name;
+        }
+        
+        // Показываем или скрываем информацию о защитниках нейтральных клеток с постройками
+        const defendersElement = cellElement.querySelector('.neutral-defenders');
+        if (defendersElement) {
+            if (cell.faction_id === null && cell.building_type && cell.neutral_defenders) {
+                defendersElement.innerHTML = `${getResourceIcon('shield', 10, 'vertical-align: middle; margin-right: 2px;')} ${cell.neutral_defenders}`;
+                defendersElement.style.display = 'block';
+            } else {
+                defendersElement.style.display = 'none';
+            }
+        }
+    }
+    
+    // Функция для обновления ресурсов
+    function updateResources() {
+        if (!userFactionId) return;
+        
+        fetch('/api/resources')
+            .then(response => response.json())
+            .then(renderResources)
+            .catch(error => console.error('Ошибка при обновлении ресурсов:', error));
+    }
+    
+    function renderResources(data) {
+        // Обновляем отображение ресурсов с увеличенными иконками
+        document.getElementById('gold-amount').innerHTML = `${getResourceIcon('gold', 18, 'vertical-align: middle; margin-right: 4px;')} Золото: ${data.gold}`;
+        document.getElementById('wood-amount').innerHTML = `${getResourceIcon('wood', 18, 'vertical-align: middle; margin-right: 4px;')} Дерево: ${data.wood}`;
+        document.getElementById('stone-amount').innerHTML = `${getResourceIcon('stone', 18, 'vertical-align: middle; margin-right: 4px;')} Камень: ${data.stone}`;
+        document.getElementById('ore-amount').innerHTML = `${getResourceIcon('ore', 18, 'vertical-align: middle; margin-right: 4px;')} Руда: ${data.ore}`;
+        
+        // Обновляем отображение воинов, включая информацию о отправленных воинах
+        const warriorsElement = document.getElementById('warriors-amount');
+        warriorsElement.innerHTML = `${getResourceIcon('warriors', 18, 'vertical-align: middle; margin-right: 4px;')} Воины: ${data.warriors}`;
+        
+        // Если есть информация о отправленных воинах, добавляем её в скобках
+        if (data.total_warriors_sent && data.total_warriors_sent > 0) {
+            let detailText = '';
+            
+            if (data.warriors_sent > 0 && data.warriors_defending > 0) {
+                detailText = `${data.total_warriors_sent} отправлено (${data.warriors_sent} на захват, ${data.warriors_defending} на защиту)`;
+            } else if (data.warriors_sent > 0) {
+                detailText = `${data.warriors_sent} отправлено на захват`;
+            } else if (data.warriors_defending > 0) {
+                detailText = `${data.warriors_defending} отправлено на защиту`;
+            }
+            
+            warriorsElement.innerHTML += ` (${detailText})`;
+        }
+        
+        // Обновляем доступное количество воинов в форме захвата
+        document.getElementById('available-warriors').textContent = data.warriors;
+    }
+    
+    // Функция для получения цвета фракции
+    function getFactionColor(factionId) {
+        return factionColors[factionId] || '#cccccc';
+    }
+    
+    // Иконки зданий и ресурсов берутся из общего спрайта (символы building-<тип> и resource-<ресурс>)
+    const BUILDING_ICONS = ['castle', 'sawmill', 'mine', 'quarry', 'warehouse', 'barracks'];
+    const RESOURCE_ICONS = ['gold', 'wood', 'stone', 'ore', 'warriors', 'shield'];
+    
+    function spriteIcon(symbol, size, style = '') {
+        return `<svg width="${size}" height="${size}" style="${style}" aria-hidden="true"><use href="${config.iconsUrl}#${symbol}"></use></svg>`;
+    }
+    
+    // Функция для получения иконки здания
+    function getBuildingIcon(buildingType) {
+        if (!buildingType) return '';
+        
+        // Преобразуем тип здания в нижний регистр для единообразия
+        const type = buildingType.toLowerCase();
+        if (!BUILDING_ICONS.includes(type)) return '';
+        return spriteIcon(`building-${type}`, 32);
+    }
+    
+    // Функция для получения иконки ресурса
+    function getResourceIcon(resourceType, size = 12, style = 'vertical-align: middle;') {
+        if (!RESOURCE_ICONS.includes(resourceType)) return '';
+        return spriteIcon(`resource-${resourceType}`, size, style);
+    }
+    
+    // Функция для выполнения действия
+    function executeAction(actionType, x, y, buildingType = null, additionalData = null) {
+        console.log(`Выполнение действия: ${actionType} на координатах (${x}, ${y})`);
+        
+        const data = {
+            action_type: actionType,
+            target_x: x,
+            target_y: y
+        };
+        
+        if (buildingType) {
+            data.building_type = buildingType;
+        }
+        
+        if (additionalData) {
+            if (actionType === 'CAPTURE_CELL' && typeof additionalData === 'number') {
+                data.warriors = additionalData;
+            } else if (actionType === 'TRANSFER_RESOURCES' && typeof additionalData === 'object') {
+                data.resources = additionalData;
+            }
+        }
+        
+        fetch('/api/execute_direct_action', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json'
+            },
+            body: JSON.stringify(data)
+        })
+        .then(response => response.json())
+        .then(result => {
+            if (result.success) {
+                if (actionType === 'CAPTURE_CELL') {
+                    // Для захвата клетки показываем специальное сообщение
+                    showNotification(result.message, 'info');
+                } else if (actionType === 'BUILD') {
+                    // Для строительства показываем специальное сообщение
+                    showNotification(result.message, 'info');
+                } else {
+                    // Для других действий показываем стандартное сообщение
+                    showNotification('Действие выполнено успешно!', 'success');
+                }
+                // Обновляем состояние игры (ресурсы и т.д.)
+                updateResources();
+                // Обновляем логи фракции
+                updateFactionLogs();
+            } else {
+                showNotification(`Ошибка: ${result.message || 'Неизвестная ошибка'}`, 'error');
+            }
+        })
+        .catch(error => {
+            console.error('Ошибка при выполнении действия:', error);
+            showNotification('Произошла ошибка при выполнении действия', 'error');
+        });
+    }
+    
+    // Функция для отображения уведомлений
+    function showNotification(message, type = 'info') {
+        // Создаем элемент уведомления
+        const notification = document.createElement('div');
+        notification.className = `alert alert-${type === 'error' ? 'danger' : type === 'success' ? 'success' : 'info'} notification`;
+        notification.textContent = message;
+        
+        // Добавляем стили для уведомления
+        notification.style.position = 'fixed';
+        notification.style.top = '20px';
+        notification.style.right = '20px';
+        notification.style.zIndex = '9999';
+        notification.style.minWidth = '300px';
+        notification.style.padding = '15px';
+        notification.style.borderRadius = '5px';
+        notification.style.boxShadow = '0 4px 8px rgba(0,0,0,0.1)';
+        notification.style.opacity = '0';
+        notification.style.transition = 'opacity 0.3s ease-in-out';
+        
+        // Добавляем уведомление в DOM
+        document.body.appendChild(notification);
+        
+        // Показываем уведомление
+        setTimeout(() => {
+            notification.style.opacity = '1';
+        }, 10);
+        
+        // Скрываем и удаляем уведомление через 3 секунды
+        setTimeout(() => {
+            notification.style.opacity = '0';
+            setTimeout(() => {
+                document.body.removeChild(notification);
+            }, 300);
+        }, 3000);
+    }
+    
+    // Инициализация карты
+    function initMap() {
+        const mapContainer = document.querySelector('.map-container');
+        if (!mapContainer) return;
+        
+        // Клетки уже пришли вместе со страницей, обработчики клика на них добавит initEventListeners
+        if (mapContainer.querySelector('.map-cell')) return;
+        
+        // Очищаем контейнер
+        mapContainer.innerHTML = '';
+        
+        // Получаем данные карты
+        fetch(`/api/map?game_id=${gameId}`)
+            .then(response => response.json())
+            .then(mapData => {
+                console.log('Initial map data:', mapData);
+                
+                // Создаем клетки
+                mapData.forEach(cell => {
+                    const cellElement = createCellElement(cell);
+                    
+                    // Добавляем обработчик клика для выбора клетки
+                    cellElement.addEventListener('click', function() {
+                        // Заполняем поля в модальных окнах
+                        document.querySelectorAll('#capture-x, #build-x, #defend-x').forEach(el => el.value = cell.x);
+                        document.querySelectorAll('#capture-y, #build-y, #defend-y').forEach(el => el.value = cell.y);
+                    });
+                    
+                    // Добавляем клетку на карту
+                    mapContainer.appendChild(cellElement);
+                    cellStates.set(cellKey(cell.x, cell.y), cellSignature(cell));
+                });
+                // Элементы клеток будут найдены заново
+                cellElements = null;
+            })
+            .catch(error => console.error('Ошибка при инициализации карты:', error));
+    }
+    
+    function createCellElement(cell) {
+        const cellElement = document.createElement('div');
+        cellElement.className = 'map-cell';
+        cellElement.dataset.x = cell.x;
+        cellElement.dataset.y = cell.y;
+        
+        // Устанавливаем цвет фона в зависимости от фракции
+        if (cell.faction_id) {
+            cellElement.style.backgroundColor = getFactionColor(cell.faction_id);
+        }
+        
+        // Добавляем координаты клетки в углу
+        const coords = document.createElement('div');
+        coords.className = 'coords';
+        coords.textContent = `${cell.x},${cell.y}`;
+        cellElement.appendChild(coords);
+        
+        // Проверяем, является ли клетка замком
+        let isCastle = false;
+        
+        // Добавляем название фракции над замком, если это замок
+        if ((cell.building_type && cell.building_type.toLowerCase() === 'castle') || 
+            (cell.faction_id && isCornerCell(parseInt(cell.x), parseInt(cell.y)))) {
+            isCastle = true;
+            
+            // Добавляем название фракции над замком
+            if (cell.faction_id && cell.faction_name) {
+                const factionLabel = document.createElement('div');
+                factionLabel.className = 'faction-label';
+                factionLabel.textContent = cell.faction_name;
+                factionLabel.style.position = 'absolute';
+                factionLabel.style.top = '2px';
+                factionLabel.style.left = '50%';
+                factionLabel.style.transform = 'translateX(-50%)';
+                factionLabel.style.fontSize = '7px';
+                factionLabel.style.fontWeight = 'bold';
+                factionLabel.style.backgroundColor = 'rgba(0, 0, 0, 0.7)';
+                factionLabel.style.color = 'white';
+                factionLabel.style.padding = '1px 2px';
+                factionLabel.style.borderRadius = '2px';
+                factionLabel.style.zIndex = '10';
+                cellElement.appendChild(factionLabel);
+            }
+        }
+        
+        // Добавляем информацию о здании, если оно есть
+        const buildingIcon = document.createElement('div');
+        buildingIcon.className = 'building-icon';
+        
+        if (cell.building_type) {
+            // Используем функцию getBuildingIcon для получения HTML с изображением
+            buildingIcon.innerHTML = getBuildingIcon(cell.building_type);
+            buildingIcon.style.display = 'flex';
+        } else if (cell.faction_id && isCornerCell(parseInt(cell.x), parseInt(cell.y))) {
+            // Если это угловая клетка с фракцией, но без здания, добавляем замок
+            buildingIcon.innerHTML = getBuildingIcon('castle');
+            buildingIcon.style.display = 'flex';
+        } else {
+            buildingIcon.style.display = 'none';
+        }
+        
+        cellElement.appendChild(buildingIcon);
+        
+        // Обновляем информацию о защитниках нейтральных клеток с постройками
+        let defendersElement = document.createElement('div');
+        defendersElement.className = 'neutral-defenders';
+        defendersElement.style.position = 'absolute';
+        defendersElement.style.bottom = '2px';
+        defendersElement.style.right = '2px';
+        defendersElement.style.backgroundColor = 'rgba(0, 0, 0, 0.7)'; // Увеличиваем непрозрачность фона
+        defendersElement.style.color = 'white';
+        defendersElement.style.padding = '0px 2px 1px 2px'; // Асимметричные отступы: верх 0px, право 2px, низ 1px, лево 2px
+        defendersElement.style.borderRadius = '3px';
+        defendersElement.style.fontSize = '10px'; // Увеличиваем размер шрифта
+        defendersElement.style.zIndex = '5'; // Добавляем z-index
+        cellElement.appendChild(defendersElement);
+        
+        // Показываем или скрываем информацию о защитниках
+        if (cell.faction_id === null && cell.building_type && cell.neutral_defenders) {
+            defendersElement.innerHTML = `${getResourceIcon('shield', 10, 'vertical-align: middle; margin-right: 2px;')} ${cell.neutral_defenders}`;
+            defendersElement.style.display = 'block';
+        } else {
+            defendersElement.style.display = 'none';
+        }
+        
+        // Добавляем информацию о бонусных ресурсах на специальных клетках
+        let resourceBonusElement = document.createElement('div');
+        resourceBonusElement.className = 'resource-bonus';
+        resourceBonusElement.style.position = 'absolute';
+        resourceBonusElement.style.top = '2px';
+        resourceBonusElement.style.right = '2px';
+        resourceBonusElement.style.backgroundColor = 'rgba(0, 0, 0, 0.5)';
+        resourceBonusElement.style.color = 'white';
+        resourceBonusElement.style.padding = '1px 2px';
+        resourceBonusElement.style.borderRadius = '3px';
+        resourceBonusElement.style.fontSize = '8px';
+        cellElement.appendChild(resourceBonusElement);
+        
+        // Показываем значки ресурсов на специальных клетках
+        const x = parseInt(cell.x);
+        const y = parseInt(cell.y);
+        
+        const resourceType = resourceBonusCells[`${x},${y}`];
+        
+        if (resourceType) {
+            resourceBonusElement.innerHTML = `${getResourceIcon(resourceType)} +${config.resourceBonusPercent}%`;
+            resourceBonusElement.style.display = 'block';
+            resourceBonusElement.style.backgroundColor = 'rgba(0, 0, 0, 0.5)';
+            resourceBonusElement.style.borderColor = RESOURCE_BONUS_COLORS[resourceType];
+        } else if (x === config.combatBonusCell[0] && y === config.combatBonusCell[1]) {
+            // Центральная клетка с бонусом к воинам
+            resourceBonusElement.innerHTML = `${getResourceIcon('warriors')} +${config.combatBonusPercent}%`;
+            resourceBonusElement.style.display = 'block';
+            resourceBonusElement.style.backgroundColor = 'rgba(0, 0, 0, 0.5)';
+            resourceBonusElement.style.borderColor = '#FF4500'; // OrangeRed
+        } else {
+            resourceBonusElement.style.display = 'none';
+        }
+        
+        return cellElement;
+    }
+    
+    // Функция для проверки, является ли клетка угловой (начальной территорией)
+    function isCornerCell(x, y) {
+        return castleCells.has(`${x},${y}`);
+    }
+    
+    // Инициализация обработчиков событий
+    function initEventListeners() {
+        // Обработчики для кнопок в правой колонке
+        const captureCellBtn = document.getElementById('capture-cell-btn');
+        if (captureCellBtn) {
+            captureCellBtn.addEventListener('click', function() {
+                // Открываем модальное окно захвата клетки
+                const modal = new bootstrap.Modal(document.getElementById('captureCellModal'));
+                // Устанавливаем значение воинов по умолчанию
+                document.getElementById('capture-warriors').value = 1;
+                // Обновляем доступное количество воинов
+                updateResources();
+                modal.show();
+            });
+        }
+        
+        const buildBtn = document.getElementById('build-btn');
+        if (buildBtn) {
+            buildBtn.addEventListener('click', function() {
+                // Открываем модальное окно строительства
+                const modal = new bootstrap.Modal(document.getElementById('buildModal'));
+                modal.show();
+            });
+        }
+        
+        // Обработчик для кнопки найма воинов
+        const recruitWarriorsBtn = document.getElementById('recruit-warriors-btn');
+        if (recruitWarriorsBtn) {
+            recruitWarriorsBtn.addEventListener('click', function() {
+                // Открываем модальное окно найма воинов
+                const modal = new bootstrap.Modal(document.getElementById('recruitWarriorsModal'));
+                // Обновляем доступное количество золота
+                updateRecruitModalGold();
+                modal.show();
+            });
+        }
+        
+        // Обработчик для изменения количества воинов в форме найма
+        const recruitWarriorsInput = document.getElementById('recruit-warriors');
+        if (recruitWarriorsInput) {
+            recruitWarriorsInput.addEventListener('input', function() {
+                updateRecruitCost();
+            });
+        }
+        
+        // Обработчик для кнопки подтверждения найма воинов
+        const confirmRecruitBtn = document.getElementById('confirm-recruit');
+        if (confirmRecruitBtn) {
+            confirmRecruitBtn.addEventListener('click', function() {
+                const warriors = parseInt(document.getElementById('recruit-warriors').value);
+                
+                // Создаем объект с данными о количестве воинов
+                const data = {
+                    action_type: 'RECRUIT_WARRIORS',
+                    target_x: 0,
+                    target_y: 0,
+                    warriors: warriors
+                };
+                
+                // Отправляем запрос напрямую, без использования executeAction
+                fetch('/api/execute_direct_action', {
+                    method: 'POST',
+                    headers: {
+                        'Content-Type': 'application/json'
+                    },
+                    body: JSON.stringify(data)
+                })
+                .then(response => response.json())
+                .then(result => {
+                    if (result.success) {
+                        showNotification(result.message, 'success');
+                        // Обновляем ресурсы
+                        updateResources();
+                        // Обновляем логи фракции
+                        updateFactionLogs();
+                    } else {
+                        showNotification(`Ошибка: ${result.message || 'Неизвестная ошибка'}`, 'error');
+                    }
+                })
+                .catch(error => {
+                    console.error('Ошибка при найме воинов:', error);
+                    showNotification('Произошла ошибка при найме воинов', 'error');
+                });
+                
+                // Закрываем модальное окно
+                const modal = bootstrap.Modal.getInstance(document.getElementById('recruitWarriorsModal'));
+                modal.hide();
+            });
+        }
+        
+        // Обработчик для выбора типа здания
+        const buildingTypeSelect = document.getElementById('building-type');
+        if (buildingTypeSelect) {
+            buildingTypeSelect.addEventListener('change', function() {
+                updateBuildingCost(this.value);
+            });
+        }
+        
+        const transferResourcesBtn = document.getElementById('transfer-resources-btn');
+        if (transferResourcesBtn) {
+            transferResourcesBtn.addEventListener('click', function() {
+                // Открываем модальное окно передачи ресурсов
+                const modal = new bootstrap.Modal(document.getElementById('transferModal'));
+                // Обновляем доступные ресурсы
+                updateResources();
+                modal.show();
+            });
+        }
+        
+        // Обработчик для кнопки захвата клетки в модальном окне
+        const confirmCaptureBtn = document.getElementById('confirm-capture');
+        if (confirmCaptureBtn) {
+            confirmCaptureBtn.addEventListener('click', function() {
+                const x = parseInt(document.getElementById('capture-x').value);
+                const y = parseInt(document.getElementById('capture-y').value);
+                const warriors = parseInt(document.getElementById('capture-warriors').value);
+                
+                executeAction('CAPTURE_CELL', x, y, null, warriors);
+                
+                // Закрываем модальное окно
+                const modal = bootstrap.Modal.getInstance(document.getElementById('captureCellModal'));
+                modal.hide();
+            });
+        }
+        
+        // Обработчик для кнопки строительства в модальном окне
+        const confirmBuildBtn = document.getElementById('confirm-build');
+        if (confirmBuildBtn) {
+            confirmBuildBtn.addEventListener('click', function() {
+                const x = parseInt(document.getElementById('build-x').value);
+                const y = parseInt(document.getElementById('build-y').value);
+                const buildingType = document.getElementById('building-type').value;
+                
+                executeAction('BUILD', x, y, buildingType);
+                
+                // Закрываем модальное окно
+                const modal = bootstrap.Modal.getInstance(document.getElementById('buildModal'));
+                modal.hide();
+            });
+        }
+        
+        // Обработчик для кнопки передачи ресурсов в модальном окне
+        const confirmTransferBtn = document.getElementById('confirm-transfer');
+        if (confirmTransferBtn) {
+            confirmTransferBtn.addEventListener('click', function() {
+                const factionId = document.getElementById('transfer-faction').value;
+                const wood = parseInt(document.getElementById('transfer-wood').value) || 0;
+                const stone = parseInt(document.getElementById('transfer-stone').value) || 0;
+                const gold = parseInt(document.getElementById('transfer-gold').value) || 0;
+                const ore = parseInt(document.getElementById('transfer-ore').value) || 0;
+                
+                // Проверяем, что хотя бы один ресурс передается
+                if (wood + stone + gold + ore === 0) {
+                    showNotification('Выберите хотя бы один ресурс для передачи', 'error');
+                    return;
+                }
+                
+                const resources = { wood, stone, gold, ore, faction_id: factionId };
+                executeAction('TRANSFER_RESOURCES', 0, 0, null, resources);
+                
+                // Закрываем модальное окно
+                const modal = bootstrap.Modal.getInstance(document.getElementById('transferModal'));
+                modal.hide();
+            });
+        }
+        
+        // Добавляем обработчики клика на клетки карты
+        const mapCells = document.querySelectorAll('.map-cell');
+        mapCells.forEach(cell => {
+            cell.addEventListener('click', function() {
+                const x = parseInt(this.dataset.x);
+                const y = parseInt(this.dataset.y);
+                
+                // Заполняем поля в модальных окнах
+                document.querySelectorAll('#capture-x, #build-x, #defend-x').forEach(el => el.value = x);
+                document.querySelectorAll('#capture-y, #build-y, #defend-y').forEach(el => el.value = y);
+            });
+        });
+        
+        // Обработчик для кнопки защиты клетки
+        const defendCellBtn = document.getElementById('defend-cell-btn');
+        if (defendCellBtn) {
+            defendCellBtn.addEventListener('click', function() {
+                // Открываем модальное окно защиты клетки
+                const modal = new bootstrap.Modal(document.getElementById('defendCellModal'));
+                // Обновляем доступное количество воинов
+                updateDefendModalWarriors();
+                modal.show();
+            });
+        }
+    }
+    
+    // Функция для обновления отображения стоимости здания
+    function updateBuildingCost(buildingType) {
+        const buildingCostDiv = document.getElementById('building-cost');
+        if (!buildingCostDiv) return;
+        
+        // Стоимость зданий из правил игры
+        const buildingCosts = config.buildingCosts;
+        
+        // Если тип здания не выбран или неизвестен
+        if (!buildingType || !buildingCosts[buildingType]) {
+            buildingCostDiv.innerHTML = '<p class="mb-1">Выберите тип здания, чтобы увидеть стоимость</p>';
+            return;
+        }
+        
+        // Получаем стоимость выбранного здания
+        const cost = buildingCosts[buildingType];
+        
+        // Формируем HTML для отображения стоимости
+        let costHTML = `
+            <ul class="list-unstyled">
+                <li>${getResourceIcon('gold')} Золото: ${cost.gold}</li>
+                <li>${getResourceIcon('wood')} Дерево: ${cost.wood}</li>
+                <li>${getResourceIcon('stone')} Камень: ${cost.stone}</li>
+                <li>${getResourceIcon('ore')} Руда: ${cost.ore}</li>
+            </ul>
+        `;
+        
+        // Обновляем содержимое блока стоимости
+        buildingCostDiv.innerHTML = costHTML;
+    }
+    
+    // Функция для обновления стоимости найма воинов
+    function updateRecruitCost() {
+        const warriorsCount = parseInt(document.getElementById('recruit-warriors').value) || 0;
+        const costPerWarrior = config.warriorCost;
+        const totalCost = warriorsCount * costPerWarrior;
+        
+        document.getElementById('total-recruit-cost').textContent = totalCost;
+    }
+    
+    // Функция для обновления доступного золота в модальном окне найма
+    function updateRecruitModalGold() {
+        const goldAmount = document.getElementById('gold-amount').textContent;
+        document.getElementById('available-gold-recruit').textContent = goldAmount;
+    }
+    
+    // Инициализация обработчиков событий модальных окон
+    function initModalEventListeners() {
+        // Обработчик для модального окна найма воинов
+        const recruitModal = document.getElementById('recruitWarriorsModal');
+        if (recruitModal) {
+            recruitModal.addEventListener('shown.bs.modal', function() {
+                // Обновляем доступное золото при открытии модального окна
+                updateRecruitModalGold();
+                // Обновляем стоимость найма
+                updateRecruitCost();
+            });
+        }
+    }
+    
+    // Функция для обновления количества доступных воинов в модальном окне защиты
+    function updateDefendModalWarriors() {
+        const warriorsAmount = document.getElementById('warriors-amount');
+        const availableWarriors = document.getElementById('available-warriors-defend');
+        
+        if (warriorsAmount && availableWarriors) {
+            availableWarriors.textContent = warriorsAmount.textContent;
+            
+            // Устанавливаем максимальное значение для поля ввода
+            const defendWarriorsInput = document.getElementById('defend-warriors');
+            if (defendWarriorsInput) {
+                defendWarriorsInput.max = warriorsAmount.textContent;
+            }
+        }
+    }
+    
+    // Обработчик для кнопки подтверждения защиты клетки
+    const confirmDefendBtn = document.getElementById('confirm-defend');
+    if (confirmDefendBtn) {
+        confirmDefendBtn.addEventListener('click', function() {
+            const warriors = parseInt(document.getElementById('defend-warriors').value);
+            const x = parseInt(document.getElementById('defend-x').value);
+            const y = parseInt(document.getElementById('defend-y').value);
+            
+            // Создаем объект с данными о защите
+            const data = {
+                action_type: 'DEFEND_CELL',
+                target_x: x,
+                target_y: y,
+                warriors: warriors
+            };
+            
+            // Отправляем запрос
+            fetch('/api/execute_direct_action', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json'
+                },
+                body: JSON.stringify(data)
+            })
+            .then(response => response.json())
+            .then(result => {
+                if (result.success) {
+                    showNotification(result.message, 'success');
+                    // Обновляем ресурсы
+                    updateResources();
+                    // Обновляем логи фракции
+                    updateFactionLogs();
+                } else {
+                    showNotification(`Ошибка: ${result.message || 'Неизвестная ошибка'}`, 'error');
+                }
+            })
+            .catch(error => {
+                console.error('Ошибка при защите клетки:', error);
+                showNotification('Произошла ошибка при защите клетки', 'error');
+            });
+            
+            // Закрываем модальное окно
+            const modal = bootstrap.Modal.getInstance(document.getElementById('defendCellModal'));
+            modal.hide();
+        });
+    }
+    
+    // Инициализация при загрузке страницы
+    document.addEventListener('DOMContentLoaded', function() {
+        // Сначала инициализируем карту
+        initMap();
+        
+        // Затем добавляем обработчики событий
+        initEventListeners();
+        
+        // Инициализируем обработчики событий модальных окон
+        initModalEventListeners();
+        
+        // Обновляем состояние игры через небольшую задержку, чтобы клетки успели создаться
+        setTimeout(function() {
+            // Сначала обновляем всё состояние игры
+            updateGameState();
+            
+            // Устанавливаем интервал обновления таймера хода каждую секунду
+            setInterval(updateTurnTimer, 1000);
+            
+            // Устанавливаем интервал обновления карты и ресурсов каждые 5 секунд
+            setInterval(updateGameState, 5000);
+        }, 1000);
+    });
+})();
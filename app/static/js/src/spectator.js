@@ -0,0 +1,42 @@
+// Страница зрителя: изображение карты, которое сервер рисует раз в ход
+(function() {
+    // Настройки страницы из шаблона main/spectator.html
+    const configElement = document.getElementById('spectator-config');
+    if (!configElement) return;
+    const config = JSON.parse(configElement.textContent);
+    
+    // Игра, карта которой показана на странице
+    const gameId = config.gameId;
+    let secondsLeft = config.secondsLeft;
+    
+    // Таймер хода считается в браузере, без запросов к серверу
+    setInterval(function() {
+        secondsLeft = Math.max(0, secondsLeft - 1);
+        document.getElementById('turn-timer').textContent = secondsLeft;
+    }, 1000);
+    
+    // После окончания хода запрашиваем адрес нового изображения карты
+    function scheduleMapUpdate(delaySeconds) {
+        setTimeout(updateMapImage, (Math.max(1, delaySeconds) + 1) * 1000);
+    }
+    
+    function updateMapImage() {
+        fetch(`/api/map/image?game_id=${gameId}`)
+            .then(response => response.json())
+            .then(data => {
+                const mapImage = document.getElementById('map-image');
+                if (data.url && mapImage.getAttribute('src') !== data.url) {
+                    mapImage.setAttribute('src', data.url);
+                }
+                document.getElementById('turn-number').textContent = data.current_turn;
+                secondsLeft = data.seconds_left;
+                scheduleMapUpdate(data.seconds_left);
+            })
+            .catch(error => {
+                console.error('Ошибка при обновлении изображения карты:', error);
+                scheduleMapUpdate(5);
+            });
+    }
+    
+    scheduleMapUpdate(secondsLeft);
+})();
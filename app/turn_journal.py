@@ -0,0 +1,138 @@
+from collections import namedtuple
+import json
+import os
+import threading
+
+from app.models.game import DEFAULT_GAME_ID
+
+# Поля действия в записи журнала (действия хранятся списками в этом порядке)
+ACTION_COLUMNS = ('user_id', 'action_type', 'target_x', 'target_y', 'building_type', 'warriors', 'resources')
+
+# Запись журнала о ходе:
+# turn - номер хода, seed - зерно генератора случайных чисел хода,
+# rules_version - версия правил, по которым обрабатывался ход,
+# intake - изменения ресурсов фракций при приеме действий {faction_id: [золото, дерево, камень, руда, воины]},
+# actions - действия хода в порядке их записи (словари с полями ACTION_COLUMNS)
+TurnRecord = namedtuple('TurnRecord', ['turn', 'seed', 'rules_version', 'intake', 'actions'])
+
+class TurnJournal:
+    """Журнал входных данных ходов
+
+    Перед обработкой каждого хода в файл дописывается одна строка JSON
+    с зафиксированными действиями хода, зерном генератора случайных чисел
+    и версией правил. По снимку базы данных и журналу можно заново
+    воспроизвести ходы (см. app/turn_replay.py). У каждой игры свой журнал.
+    """
+    _instances = {}
+
+    def __init__(self, game_id=DEFAULT_GAME_ID):
+        self.game_id = game_id
+        self.path = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def get_instance(cls, game_id=DEFAULT_GAME_ID):
+        if game_id not in cls._instances:
+            cls._instances[game_id] = TurnJournal(game_id)
+        return cls._instances[game_id]
+
+    @property
+    def enabled(self):
+        return self.path is not None
+
+    def init_app(self, app):
+        """Определяет путь к файлу журнала по настройке TURN_JOURNAL_FILE
+
+        Относительный путь считается от папки instance приложения,
+        пустое значение отключает журнал. Журналы остальных игр, кроме
+        первой, лежат рядом с суффиксом _game<id>.
+        """
+        filename = app.config.get('TURN_JOURNAL_FILE')
+        if not filename:
+            self.path = None
+            return
+        if not os.path.isabs(filename):
+            filename = os.path.join(app.instance_path, filename)
+        if self.game_id != DEFAULT_GAME_ID:
+            root, extension = os.path.splitext(filename)
+            filename = f'{root}_game{self.game_id}{extension}'
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        self.path = filename
+
+    def append(self, turn, seed, rules_version, intake, actions):
+        """Дописывает в журнал входные данные хода
+
+        actions - объекты UserAction хода в порядке их идентификаторов.
+        """
+        if not self.enabled:
+            return
+
+        entry = {
+            'turn': turn,
+            'seed': seed,
+            'rules': rules_version,
+            'intake': {str(faction_id): delta for faction_id, delta in intake.items()},
+            'actions': [[getattr(action, column) for column in ACTION_COLUMNS] for action in actions]
+        }
+        line = json.dumps(entry, ensure_ascii=False, separators=(',', ':'))
+
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as journal_file:
+                journal_file.write(line + '\n')
+                journal_file.flush()
+                os.fsync(journal_file.fileno())
+
+    @staticmethod
+    def read(path, from_turn=None, to_turn=None):
+        """Читает записи журнала, ограничивая их диапазоном ходов"""
+        with open(path, encoding='utf-8') as journal_file:
+            for line in journal_file:
+                line = line.strip()
+                if not line:
+                    continue
+                entry = json.loads(line)
+                turn = entry['turn']
+                if from_turn is not None and turn < from_turn:
+                    continue
+                if to_turn is not None and turn > to_turn:
+                    continue
+                yield TurnRecord(
+                    turn=turn,
+                    seed=entry['seed'],
+                    rules_version=entry['rules'],
+                    intake={int(faction_id): delta for faction_id, delta in entry['intake'].items()},
+                    actions=[dict(zip(ACTION_COLUMNS, row)) for row in entry['actions']]
+                )
+
+    def records(self, from_turn=None, to_turn=None):
+        """Возвращает записи журнала в диапазоне ходов (пустой список, если журнала нет)"""
+        if not self.enabled or not os.path.exists(self.path):
+            return []
+        return list(self.read(self.path, from_turn, to_turn))
+
+    def last_turn(self):
+        """Возвращает номер последнего записанного хода или None"""
+        records = self.records()
+        return records[-1].turn if records else None
+
+    def truncate(self, from_turn):
+        """Удаляет из журнала записи ходов, начиная с from_turn (после отката мира)"""
+        if not self.enabled or not os.path.exists(self.path):
+            return
+
+        with self._lock:
+            temp_path = self.path + '.tmp'
+            with open(self.path, encoding='utf-8') as journal_file, \
+                    open(temp_path, 'w', encoding='utf-8') as temp_file:
+                for line in journal_file:
+                    if line.strip() and json.loads(line)['turn'] < from_turn:
+                        temp_file.write(line)
+                temp_file.flush()
+                os.fsync(temp_file.fileno())
+            os.replace(temp_path, self.path)
+
+    def clear(self):
+        """Удаляет журнал ходов"""
+        if self.enabled and os.path.exists(self.path):
+            with self._lock:
+                os.remove(self.path)
@@ -0,0 +1,42 @@
+import os
+import shutil
+import time
+
+from config import Config
+from app import create_app
+from app.game_manager import GameManager
+from app.models.game import DEFAULT_GAME_ID
+from app.turn_journal import TurnJournal
+
+def replay_journal(source_db, journal_path, target_db, from_turn=None, to_turn=None, log_level='WARNING',
+                   game_id=DEFAULT_GAME_ID):
+    """Воспроизводит ходы из журнала поверх копии базы данных
+
+    source_db - файл базы SQLite с состоянием мира перед первым воспроизводимым
+    ходом (не изменяется), target_db - файл, в который копируется база и
+    записывается результат. Ходы обрабатываются подряд без ожидания таймера.
+    Пользователи в журнал не пишутся, поэтому они должны быть в исходной базе.
+    game_id - игра, к которой относится журнал.
+
+    Возвращает список пар (номер хода, длительность обработки в секундах).
+    """
+    shutil.copyfile(source_db, target_db)
+
+    class ReplayConfig(Config):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.abspath(target_db)
+        GAME_AUTOSTART = False
+        LOG_LEVEL = log_level
+        LOG_LEVELS = {name: log_level for name in Config.LOG_LEVELS}
+
+    app = create_app(ReplayConfig)
+
+    # Отдельный экземпляр, не связанный с игровым циклом сервера
+    manager = GameManager(game_id)
+    manager.app = app
+
+    timings = []
+    for record in TurnJournal.read(journal_path, from_turn, to_turn):
+        started = time.perf_counter()
+        manager.replay_turn(record)
+        timings.append((record.turn, time.perf_counter() - started))
+    return timings
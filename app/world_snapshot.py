@@ -0,0 +1,145 @@
+from datetime import datetime
+import random
+
+from app import db
+from app.rules import GameRules
+from app.models.game import Cell, DEFAULT_GAME_ID
+from app.models.user import Faction
+from app.map_encoding import map_columns, encode_map
+from app.resolver.state import CellState, FactionState
+
+class WorldSnapshot:
+    """Неизменяемый снимок мира после завершенного хода
+
+    Снимок строится один раз в конце обработки хода и публикуется заменой
+    ссылки в GameManager. Читатели (карта, главная страница) работают только
+    со снимком и не видят промежуточных изменений во время обработки хода.
+    """
+    __slots__ = ('version', 'turn', 'created_at', 'cells', 'factions', '_cell_index', '_map_data', '_map_columns', '_map_payloads')
+
+    def __init__(self, version, turn, cells, factions):
+        self.version = version
+        self.turn = turn
+        self.created_at = datetime.utcnow()
+        self.cells = tuple(cells)
+        self.factions = tuple(factions)
+        self._cell_index = {(cell.x, cell.y): cell for cell in self.cells}
+        self._map_data = None
+        self._map_columns = None
+        self._map_payloads = {}
+
+    @classmethod
+    def build(cls, version, turn, rng=None, game_id=DEFAULT_GAME_ID):
+        """Строит снимок игры game_id по текущему состоянию базы данных (требует контекст приложения)
+
+        Нейтральным клеткам с постройками, у которых еще нет защитников,
+        назначается их количество, чтобы снимок не менялся при чтении.
+        rng - генератор случайных чисел хода (по умолчанию модуль random).
+        """
+        rng = rng or random
+        cells = Cell.query.filter_by(game_id=game_id).all()
+        factions = Faction.query.filter_by(game_id=game_id).order_by(Faction.id).all()
+
+        changed = False
+        for cell in cells:
+            if cell.faction_id is None and cell.building_type is not None and cell.neutral_defenders is None:
+                cell.neutral_defenders = rng.randint(*GameRules.get_instance().neutral_defenders_range)
+                db.session.add(cell)
+                changed = True
+        if changed:
+            db.session.commit()
+
+        cell_states = [
+            CellState(
+                x=cell.x,
+                y=cell.y,
+                faction_id=cell.faction_id,
+                building_type=cell.building_type,
+                building=cell.building.type.name if cell.building else None,
+                building_level=cell.building.level if cell.building else None,
+                neutral_defenders=cell.neutral_defenders
+            )
+            for cell in sorted(cells, key=lambda c: (c.x, c.y))
+        ]
+        faction_states = [
+            FactionState(
+                id=faction.id,
+                name=faction.name,
+                # Сокращаем название фракции, убирая слово "Квантум"
+                short_name=faction.name.replace("-Квантум", "").replace(" Квантум", ""),
+                color=faction.color,
+                gold=faction.gold,
+                wood=faction.wood,
+                stone=faction.stone,
+                ore=faction.ore,
+                warriors=faction.warriors,
+                max_gold=faction.max_gold,
+                max_wood=faction.max_wood,
+                max_stone=faction.max_stone,
+                max_ore=faction.max_ore,
+                max_warriors=faction.max_warriors
+            )
+            for faction in factions
+        ]
+        return cls(version, turn, cell_states, faction_states)
+
+    def cell(self, x, y):
+        """Возвращает клетку по координатам или None"""
+        return self._cell_index.get((x, y))
+
+    def faction(self, faction_id):
+        """Возвращает фракцию по идентификатору или None"""
+        for faction in self.factions:
+            if faction.id == faction_id:
+                return faction
+        return None
+
+    def faction_cells(self, faction_id):
+        """Возвращает клетки, принадлежащие фракции"""
+        return [cell for cell in self.cells if cell.faction_id == faction_id]
+
+    def is_adjacent(self, x, y, faction_id):
+        """Проверяет, граничит ли клетка с территорией фракции"""
+        for adj_x, adj_y in ((x+1, y), (x-1, y), (x, y+1), (x, y-1)):
+            cell = self._cell_index.get((adj_x, adj_y))
+            if cell and cell.faction_id == faction_id:
+                return True
+        return False
+
+    def map_data(self):
+        """Возвращает данные карты для /api/map (вычисляются один раз на снимок)"""
+        if self._map_data is None:
+            faction_names = {faction.id: faction.short_name for faction in self.factions}
+            map_data = []
+            for cell in self.cells:
+                cell_data = {
+                    'x': cell.x,
+                    'y': cell.y,
+                    'faction_id': cell.faction_id,
+                    'building_type': cell.building_type
+                }
+
+                # Добавляем название фракции, если клетка принадлежит фракции
+                if cell.faction_id and cell.faction_id in faction_names:
+                    cell_data['faction_name'] = faction_names[cell.faction_id]
+
+                # Если клетка нейтральная и на ней есть постройка, добавляем информацию о защитниках
+                if cell.faction_id is None and cell.building_type is not None:
+                    cell_data['neutral_defenders'] = cell.neutral_defenders
+
+                map_data.append(cell_data)
+            self._map_data = tuple(map_data)
+        return self._map_data
+
+    def map_columns(self):
+        """Возвращает данные карты по столбцам (app.map_encoding.map_columns, вычисляются один раз на снимок)"""
+        if self._map_columns is None:
+            self._map_columns = map_columns(self)
+        return self._map_columns
+
+    def map_payload(self, mimetype):
+        """Возвращает закодированные данные карты в формате mimetype (кодируются один раз на снимок)"""
+        payload = self._map_payloads.get(mimetype)
+        if payload is None:
+            payload = self._map_payloads[mimetype] = encode_map(self, mimetype)
+        return payload
@@ -0,0 +1,72 @@
+"""Синтетический мир для микробенчмарков обработки хода
+
+Запуск из корня проекта: python -m pytest benchmarks
+"""
+import random
+
+import pytest
+
+from config import Config
+from app.models.game import BuildingType
+from app.models.user_action import ActionType
+from app.rules import GameRules, RULE_SETTINGS
+from app.resolver import WorldState, CellState, FactionState, TurnAction
+
+MAP_SIZE = 100
+CAPTURE_ACTIONS = 3000
+DEFEND_ACTIONS = 1000
+BUILD_ACTIONS = 200
+
+@pytest.fixture(scope='session')
+def rules():
+    """Правила игры для карты MAP_SIZE x MAP_SIZE (особые клетки - по размеру карты)"""
+    settings = {name: getattr(Config, name) for name in RULE_SETTINGS}
+    settings['MAP_SIZE'] = MAP_SIZE
+    return GameRules(settings)
+
+@pytest.fixture(scope='session')
+def world(rules):
+    """Мир из четырех фракций, каждая владеет частью своей четверти карты"""
+    rng = random.Random(1)
+    buildings = [building_type.name for building_type in BuildingType if building_type != BuildingType.CASTLE]
+    half = MAP_SIZE // 2
+    cells = []
+    for x in range(MAP_SIZE):
+        for y in range(MAP_SIZE):
+            faction_id = 1 + (x >= half) + 2 * (y >= half)
+            if rules.is_castle_cell(x, y):
+                cells.append(CellState(x, y, faction_id, 'CASTLE', 'CASTLE', 1, None))
+                continue
+            owner = faction_id if rng.random() < 0.7 else None
+            building = rng.choice(buildings) if rng.random() < 0.2 else None
+            cells.append(CellState(
+                x, y, owner, building, building, rng.randint(1, 3) if building else None,
+                rng.randint(1, 3) if building and owner is None else None
+            ))
+    factions = [
+        FactionState(faction_id, f'Фракция {faction_id}', f'Ф{faction_id}', '#000000',
+                     50, 40, 40, 40, 200, 500, 500, 500, 500, 500)
+        for faction_id in range(1, 5)
+    ]
+    return WorldState(cells, factions)
+
+@pytest.fixture(scope='session')
+def actions(world):
+    """Действия хода: захваты и защиты случайных клеток, строительство на своих клетках"""
+    rng = random.Random(2)
+    turn_actions = []
+
+    def add(faction_id, action_type, x, y, building_type=None, warriors=None):
+        turn_actions.append(TurnAction(len(turn_actions) + 1, faction_id, action_type, x, y, building_type, warriors))
+
+    for _ in range(CAPTURE_ACTIONS):
+        add(rng.randint(1, 4), ActionType.CAPTURE_CELL.value,
+            rng.randrange(MAP_SIZE), rng.randrange(MAP_SIZE), warriors=rng.randint(1, 10))
+    owned = [cell for cell in world.cells if cell.faction_id is not None]
+    for _ in range(DEFEND_ACTIONS):
+        cell = rng.choice(owned)
+        add(cell.faction_id, ActionType.DEFEND_CELL.value, cell.x, cell.y, warriors=rng.randint(1, 10))
+    free = [cell for cell in owned if cell.building_type is None]
+    for cell in rng.sample(free, BUILD_ACTIONS):
+        add(cell.faction_id, ActionType.BUILD.value, cell.x, cell.y, building_type=BuildingType.SAWMILL.name)
+    return tuple(turn_actions)
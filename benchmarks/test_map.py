@@ -0,0 +1,16 @@
+import pytest
+
+from app.map_encoding import MAP_MIMETYPES, MAP_JSON_MIMETYPE, MAP_COLUMNS_MIMETYPE, MAP_BINARY_MIMETYPE
+from app.world_snapshot import WorldSnapshot
+
+@pytest.mark.parametrize('mimetype', MAP_MIMETYPES)
+def test_encode_map(benchmark, world, mimetype):
+    # Каждый раз новый снимок: измеряется кодирование, а не кеш снимка
+    payload = benchmark(lambda: WorldSnapshot(1, 1, world.cells, world.factions).map_payload(mimetype))
+    benchmark.extra_info['bytes'] = len(payload)
+
+def test_map_payload_sizes(world):
+    snapshot = WorldSnapshot(1, 1, world.cells, world.factions)
+    sizes = {mimetype: len(snapshot.map_payload(mimetype)) for mimetype in MAP_MIMETYPES}
+    assert sizes[MAP_BINARY_MIMETYPE] * 10 < sizes[MAP_JSON_MIMETYPE]
+    assert sizes[MAP_COLUMNS_MIMETYPE] < sizes[MAP_JSON_MIMETYPE]
@@ -0,0 +1,54 @@
+"""Микробенчмарки фаз обработки хода (pytest-benchmark)"""
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import random
+
+import numpy as np
+
+from app.resolver import resolve_turn, RegionExecutor
+from app.resolver.buildings import build
+from app.resolver.combat import resolve_captures, assign_neutral_defenders
+from app.resolver.connectivity import release_disconnected
+from app.resolver.economy import update_economy
+from app.resolver.packing import pack_state, unpack_state, pack_actions, pack_result, unpack_result
+
+def test_captures(benchmark, rules, world, actions):
+    state, _, outcome = benchmark(lambda: resolve_captures(rules, world, actions, random.Random(1)))
+    assert outcome is not None and len(outcome.cells) > 0
+
+def test_captures_by_regions(benchmark, rules, world, actions):
+    serial_state, _, serial_outcome = resolve_captures(rules, world, actions, random.Random(1))
+    with ProcessPoolExecutor(max_workers=2, mp_context=multiprocessing.get_context('fork')) as executor:
+        regions = RegionExecutor(executor, 2, 16, 0)
+        state, _, outcome = benchmark(lambda: resolve_captures(rules, world, actions, random.Random(1), regions))
+    assert state.cells == serial_state.cells and state.factions == serial_state.factions
+    assert all(np.array_equal(column, serial_column) for column, serial_column in zip(outcome, serial_outcome))
+
+def test_connectivity(benchmark, rules, world):
+    state, events = benchmark(release_disconnected, rules, world)
+    assert len(state.cells) == len(world.cells)
+
+def test_buildings(benchmark, rules, world, actions):
+    state, events = benchmark(build, rules, world, actions)
+    assert events
+
+def test_economy(benchmark, rules, world, actions):
+    state, _, result = benchmark(update_economy, rules, world, actions)
+    assert result.balances.shape == (len(world.factions), 5)
+
+def test_neutral_defenders(benchmark, rules, world):
+    benchmark(lambda: assign_neutral_defenders(rules, world, random.Random(1)))
+
+def test_full_turn(benchmark, rules, world, actions):
+    result = benchmark(lambda: resolve_turn(rules, world, actions, random.Random(1)))
+    assert len(result.state.cells) == len(world.cells)
+
+def test_pack_turn_input(benchmark, world, actions):
+    packed_state, packed_actions = benchmark(lambda: (pack_state(world), pack_actions(actions)))
+    assert unpack_state(packed_state).cells == world.cells
+
+def test_unpack_turn_result(benchmark, rules, world, actions):
+    result = resolve_turn(rules, world, actions, random.Random(1))
+    packed = pack_result(world, result)
+    unpacked = benchmark(unpack_result, world, packed)
+    assert unpacked.state.cells == result.state.cells and unpacked.events == result.events
@@ -0,0 +1,20 @@
+import argparse
+import os
+
+from app import assets
+
+def main():
+    parser = argparse.ArgumentParser(description='Сборка сценариев страниц и спрайта иконок в static/dist')
+    parser.add_argument('--static-folder', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app', 'static'),
+                        help='папка статических файлов приложения')
+    args = parser.parse_args()
+
+    if assets.rjsmin is None:
+        print("Пакет rjsmin не установлен: app.js записан без сжатия")
+    manifest = assets.build_assets(args.static_folder)
+    for name, path in sorted(manifest['files'].items()):
+        size = os.path.getsize(os.path.join(args.static_folder, path))
+        print(f"{name}: {path} ({size} байт)")
+
+if __name__ == '__main__':
+    main()
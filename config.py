@@ -7,29 +7,154 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///game.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
+    # Настройки логирования
+    LOG_LEVEL = os.environ.get('LOG_LEVEL') or 'INFO'
+    LOG_FORMAT = os.environ.get('LOG_FORMAT') or 'text'  # 'text' или 'json' (JSON lines)
+    LOG_LEVELS = {
+        'werkzeug': 'WARNING',  # Показывать только предупреждения и ошибки
+        'game_manager': 'INFO',
+        'action_queue': 'INFO',
+        'game': 'INFO',
+    }
+    
     # Настройки игры
     GAME_TURN_DURATION = 30  # длительность хода в секундах
     MAP_SIZE = 7  # размер карты (7x7)
+    ACTION_QUEUE_FLUSH_INTERVAL = 0.005  # интервал групповой записи действий игроков в секундах
+    # Повторы записи пакета действий после временных ошибок базы данных (пауза удваивается)
+    ACTION_QUEUE_RETRY_LIMIT = 5
+    ACTION_QUEUE_RETRY_DELAY = 0.05
+    # Действия, которые не удалось записать, сохраняются в этот файл (относительный путь
+    # считается от папки instance, пустое значение - только в лог)
+    ACTION_QUEUE_DEAD_LETTER_FILE = os.environ.get('ACTION_QUEUE_DEAD_LETTER_FILE', 'action_dead_letter.jsonl')
+    MAX_BATCH_ACTIONS = 50  # максимальное количество действий в одном пакетном запросе
+    GAME_AUTOSTART = True  # запускать игровой цикл и прием действий при создании приложения
+    GAME_SCHEDULER_WORKERS = 4  # потоки обработки ходов всех игр сервера
+    # Процессы для вычислений ходов (игры распределяются по процессам, 0 - обрабатывать ходы в потоке игры,
+    # None - по числу активных игр, но не больше числа процессоров)
+    TURN_RESOLVER_PROCESSES = (int(os.environ['TURN_RESOLVER_PROCESSES'])
+                               if os.environ.get('TURN_RESOLVER_PROCESSES') else None)
+    # Время ожидания хода от процесса обработки ходов в секундах (после него ход обрабатывается в потоке игры)
+    TURN_RESOLVER_TIMEOUT = 60
+    # Параллельное разрешение боев по регионам карты (на больших картах): процессы на каждый
+    # процесс обработки ходов (меньше 2 - без разбиения), сторона региона в клетках и
+    # минимальное количество действий боя в ходе, с которого бои делятся по регионам
+    CAPTURE_REGION_PROCESSES = int(os.environ.get('CAPTURE_REGION_PROCESSES', 0))
+    CAPTURE_REGION_SIZE = 16
+    CAPTURE_REGION_MIN_ACTIONS = 2000
+    
+    # Журнал ходов (относительный путь считается от папки instance, пустое значение отключает журнал)
+    TURN_JOURNAL_FILE = os.environ.get('TURN_JOURNAL_FILE', 'turn_journal.jsonl')
+    
+    # Двоичные снимки мира (относительный путь считается от папки instance, пустое значение отключает снимки)
+    WORLD_SNAPSHOT_DIR = os.environ.get('WORLD_SNAPSHOT_DIR', 'snapshots')
+    WORLD_SNAPSHOT_INTERVAL = 10  # сохранять снимок на начало каждого K-го хода
+    WORLD_SNAPSHOT_KEEP = 20  # сколько последних снимков хранить
+    
+    # Изображения карты для зрителей, рисуются раз в ход (относительный путь считается
+    # от папки instance, пустое значение отключает изображения)
+    MAP_IMAGE_DIR = os.environ.get('MAP_IMAGE_DIR', 'map_images')
+    MAP_IMAGE_KEEP = 10  # сколько последних изображений каждой игры хранить
+    
+    # Сколько HTML-фрагментов карты главной страницы (по версии снимка мира
+    # и фракции) хранить в памяти, 0 отключает кеш
+    MAP_FRAGMENT_CACHE_SIZE = 64
+    
+    # Сторона квадрата карты (тайла) в клетках для /api/map/tiles
+    MAP_TILE_SIZE = 16
+    
+    # Сколько последних версий карты помнить, чтобы передавать клиентам
+    # только изменившиеся клетки (/api/state с map_changes), 0 отключает
+    MAP_DELTA_HISTORY = 16
+    
+    # Сжатие ответов (brotli - если установлен пакет brotli, иначе gzip): ответы
+    # короче COMPRESSION_MIN_SIZE байт не сжимаются (0 отключает сжатие),
+    # COMPRESSION_CACHE_SIZE последних сжатых тел хранится в памяти
+    COMPRESSION_MIN_SIZE = 1024
+    COMPRESSION_GZIP_LEVEL = 6
+    COMPRESSION_BROTLI_LEVEL = 5
+    COMPRESSION_CACHE_SIZE = 64
+    
+    # Кеш пользователей и их фракций для current_user: не более IDENTITY_CACHE_SIZE
+    # пользователей, каждый не дольше IDENTITY_CACHE_TTL секунд (0 отключает кеш)
+    IDENTITY_CACHE_SIZE = 1024
+    IDENTITY_CACHE_TTL = 60
+    
+    # Правила игры (собираются в app.rules.GameRules; файл GAME_RULES_FILE в папке instance
+    # может переопределить любые из этих настроек, изменения применяются между ходами)
+    GAME_RULES_FILE = os.environ.get('GAME_RULES_FILE', 'game_rules.json')
     
     # Начальные ресурсы
     INITIAL_RESOURCES = {
-        'gold': 10,
-        'wood': 5,
-        'stone': 5,
-        'ore': 5,
-        'warriors': 1
+        'gold': 15,
+        'wood': 10,
+        'stone': 10,
+        'ore': 10,
+        'warriors': 2
+    }
+    
+    # Начальные лимиты ресурсов
+    INITIAL_LIMITS = {
+        'gold': 100,
+        'wood': 50,
+        'stone': 50,
+        'ore': 50,
+        'warriors': 20
+    }
+    
+    # Базовые лимиты ресурсов, от которых каждый ход пересчитываются лимиты фракций
+    BASE_LIMITS = {
+        'gold': 100,
+        'wood': 50,
+        'stone': 50,
+        'ore': 50,
+        'warriors': 10
     }
+    STORAGE_BONUS_PER_BUILDING = 10  # прибавка к лимиту каждого ресурса за здание
+    WARRIOR_CAPACITY_PER_BUILDING = 5  # прибавка к лимиту воинов за здание
     
     # Базовый прирост ресурсов за ход
     BASE_INCOME = {
-        'gold': 2,
-        'wood': 1,
-        'stone': 1,
-        'ore': 1,
+        'gold': 1,
+        'wood': 3,
+        'stone': 3,
+        'ore': 3,
         'warriors': 0
     }
+    GOLD_PER_TERRITORY = 1  # золото за каждую клетку фракции
     
     # Стоимость найма воинов
     WARRIOR_COST = 5  # золота
     MAX_WARRIORS_PER_TURN = 10
-    WARRIOR_MAINTENANCE = 1  # стоимость содержания одного воина за ход
+    WARRIOR_MAINTENANCE = 0.5  # стоимость содержания одного воина за ход
+    BARRACKS_WARRIORS_PER_TURN = 1  # воинов за ход при наличии казармы
+    
+    # Стоимость строительства зданий
+    BUILDING_COSTS = {
+        'CASTLE': {'gold': 50, 'wood': 20, 'stone': 20, 'ore': 10},
+        'SAWMILL': {'gold': 30, 'wood': 10, 'stone': 15, 'ore': 5},
+        'MINE': {'gold': 30, 'wood': 15, 'stone': 10, 'ore': 5},
+        'QUARRY': {'gold': 30, 'wood': 15, 'stone': 5, 'ore': 10},
+        'WAREHOUSE': {'gold': 20, 'wood': 20, 'stone': 20, 'ore': 0},
+        'BARRACKS': {'gold': 40, 'wood': 15, 'stone': 15, 'ore': 10}
+    }
+    
+    # Производство зданий за ход на первом уровне
+    BUILDING_PRODUCTION = {
+        'CASTLE': {},
+        'SAWMILL': {'wood': 3},
+        'MINE': {'ore': 3},
+        'QUARRY': {'stone': 3},
+        'WAREHOUSE': {},
+        'BARRACKS': {}
+    }
+    BUILDING_LEVEL_PRODUCTION_BONUS = 0.5  # +50% производства за каждый уровень после первого
+    MAX_BUILDING_LEVEL = 5
+    
+    # Особые клетки карты (None - по размеру карты MAP_SIZE, см. app.rules.special_cells)
+    CASTLE_CELLS = None  # угловые клетки с замками
+    RESOURCE_BONUS_CELLS = None  # клетки бонусов к ресурсам: [(x, y, ресурс), ...]
+    RESOURCE_BONUS = 0.3  # бонус к добыче ресурса от особой клетки
+    COMBAT_BONUS_CELL = None  # центральная клетка
+    COMBAT_BONUS = 0.2  # бонус к боевой мощи от центральной клетки
+    NEUTRAL_DEFENDERS_RANGE = (1, 3)  # защитники нейтральных клеток с постройками
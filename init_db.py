@@ -1,6 +1,9 @@
 from app import create_app, db
 from app.models.user import User, Faction
-from app.models.game import Cell, Building, BuildingType
+from app.models.game import DEFAULT_GAME_ID
+from app.games import create_game
+from app.turn_journal import TurnJournal
+from app.snapshot_store import SnapshotStore
 
 def init_db():
     app = create_app()
@@ -9,18 +12,10 @@ def init_db():
         db.drop_all()
         db.create_all()
         
-        print("Создание фракций...")
-        # Создаем фракции
-        factions = [
-            Faction(name='IT-Квантум', color='#FF0000'),
-            Faction(name='Design-Квантум', color='#00FF00'),
-            Faction(name='Robo-Квантум', color='#0000FF'),
-            Faction(name='Aero-Квантум', color='#FFFF00')
-        ]
-        
-        for faction in factions:
-            db.session.add(faction)
-        db.session.commit()
+        print("Создание игры, фракций и карты...")
+        # Создаем первую игру: фракции, клетки карты и замки в стартовых углах
+        game = create_game('Основная игра', game_id=DEFAULT_GAME_ID)
+        factions = Faction.query.filter_by(game_id=game.id).order_by(Faction.id).all()
         
         print("Создание администратора...")
         # Создаем администратора в первой фракции (IT-Квантум)
@@ -75,44 +70,9 @@ def init_db():
         
         db.session.commit()
         
-        print("Создание всех клеток карты 7x7...")
-        # Создаем все клетки карты 7x7
-        for x in range(7):
-            for y in range(7):
-                cell = Cell(
-                    x=x,
-                    y=y,
-                    faction_id=None  # Изначально клетки не принадлежат никакой фракции
-                )
-                db.session.add(cell)
-        db.session.commit()
-        
-        print("Назначение начальных клеток для фракций...")
-        # Назначаем начальные клетки для каждой фракции (стартовые позиции)
-        start_positions = [
-            (0, 0),    # IT-Квантум - верхний левый угол
-            (6, 0),    # Design-Квантум - верхний правый угол
-            (0, 6),    # Robo-Квантум - нижний левый угол
-            (6, 6)     # Aero-Квантум - нижний правый угол
-        ]
-        
-        for i, faction in enumerate(factions):
-            x, y = start_positions[i]
-            # Находим клетку по координатам
-            cell = Cell.query.filter_by(x=x, y=y).first()
-            # Назначаем клетку фракции
-            cell.faction_id = faction.id
-            db.session.add(cell)
-            
-            # Создаем замок для начальной клетки
-            castle = Building(
-                type=BuildingType.CASTLE,
-                level=1,
-                cell_id=cell.id
-            )
-            db.session.add(castle)
-        
-        db.session.commit()
+        print("Удаление снимков мира и журнала ходов прошлой игры...")
+        SnapshotStore.get_instance(DEFAULT_GAME_ID).clear()
+        TurnJournal.get_instance(DEFAULT_GAME_ID).clear()
         print("Инициализация базы данных завершена!")
 
 if __name__ == '__main__':
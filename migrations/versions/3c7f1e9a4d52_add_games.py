@@ -0,0 +1,84 @@
+"""Add games and game_id to cells, factions, user actions and faction logs
+
+Revision ID: 3c7f1e9a4d52
+Revises: 8d3e4a6f2b10
+Create Date: 2026-10-19 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3c7f1e9a4d52'
+down_revision = '8d3e4a6f2b10'
+branch_labels = None
+depends_on = None
+
+# Имена для безымянных ограничений уникальности, созданных create_all
+NAMING_CONVENTION = {'uq': 'uq_%(table_name)s_%(column_0_name)s'}
+
+
+def upgrade():
+    games = op.create_table('game',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=64), nullable=False),
+    sa.Column('is_active', sa.Boolean(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+    # Существующая карта становится первой игрой
+    op.bulk_insert(games, [{'id': 1, 'name': 'Основная игра', 'is_active': True}])
+
+    with op.batch_alter_table('cell', schema=None, naming_convention=NAMING_CONVENTION) as batch_op:
+        batch_op.add_column(sa.Column('game_id', sa.Integer(), nullable=False, server_default='1'))
+        batch_op.drop_constraint('uq_cell_x', type_='unique')
+        batch_op.create_unique_constraint('uq_cell_game_xy', ['game_id', 'x', 'y'])
+        batch_op.create_index('ix_cell_game_id', ['game_id'], unique=False)
+        batch_op.create_foreign_key('fk_cell_game_id', 'game', ['game_id'], ['id'])
+
+    with op.batch_alter_table('faction', schema=None, naming_convention=NAMING_CONVENTION) as batch_op:
+        batch_op.add_column(sa.Column('game_id', sa.Integer(), nullable=False, server_default='1'))
+        batch_op.drop_constraint('uq_faction_name', type_='unique')
+        batch_op.create_unique_constraint('uq_faction_game_name', ['game_id', 'name'])
+        batch_op.create_index('ix_faction_game_id', ['game_id'], unique=False)
+        batch_op.create_foreign_key('fk_faction_game_id', 'game', ['game_id'], ['id'])
+
+    with op.batch_alter_table('user_actions', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('game_id', sa.Integer(), nullable=False, server_default='1'))
+        batch_op.create_index('ix_user_actions_game_turn', ['game_id', 'turn'], unique=False)
+        batch_op.create_foreign_key('fk_user_actions_game_id', 'game', ['game_id'], ['id'])
+
+    with op.batch_alter_table('faction_logs', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('game_id', sa.Integer(), nullable=False, server_default='1'))
+        batch_op.create_index('ix_faction_logs_game_id', ['game_id'], unique=False)
+        batch_op.create_foreign_key('fk_faction_logs_game_id', 'game', ['game_id'], ['id'])
+
+
+def downgrade():
+    with op.batch_alter_table('faction_logs', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_faction_logs_game_id', type_='foreignkey')
+        batch_op.drop_index('ix_faction_logs_game_id')
+        batch_op.drop_column('game_id')
+
+    with op.batch_alter_table('user_actions', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_user_actions_game_id', type_='foreignkey')
+        batch_op.drop_index('ix_user_actions_game_turn')
+        batch_op.drop_column('game_id')
+
+    with op.batch_alter_table('faction', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_faction_game_id', type_='foreignkey')
+        batch_op.drop_index('ix_faction_game_id')
+        batch_op.drop_constraint('uq_faction_game_name', type_='unique')
+        batch_op.create_unique_constraint('uq_faction_name', ['name'])
+        batch_op.drop_column('game_id')
+
+    with op.batch_alter_table('cell', schema=None) as batch_op:
+        batch_op.drop_constraint('fk_cell_game_id', type_='foreignkey')
+        batch_op.drop_index('ix_cell_game_id')
+        batch_op.drop_constraint('uq_cell_game_xy', type_='unique')
+        batch_op.create_unique_constraint('uq_cell_x', ['x', 'y'])
+        batch_op.drop_column('game_id')
+
+    op.drop_table('game')
@@ -0,0 +1,30 @@
+"""Denormalize faction_logs: store username and action type with rendered message
+
+Revision ID: 5b1f0c9d7e21
+Revises: 42c498ab07ba
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b1f0c9d7e21'
+down_revision = '42c498ab07ba'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('faction_logs', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('username', sa.String(length=64), nullable=False, server_default='Система'))
+        batch_op.add_column(sa.Column('action_type', sa.String(length=50), nullable=False, server_default='SYSTEM'))
+        batch_op.create_index('ix_faction_logs_faction_turn', ['faction_id', 'turn'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('faction_logs', schema=None) as batch_op:
+        batch_op.drop_index('ix_faction_logs_faction_turn')
+        batch_op.drop_column('action_type')
+        batch_op.drop_column('username')
@@ -0,0 +1,26 @@
+"""Add (faction_id, id) index to faction_logs for keyset pagination
+
+Revision ID: 8d3e4a6f2b10
+Revises: 5b1f0c9d7e21
+Create Date: 2026-10-19 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8d3e4a6f2b10'
+down_revision = '5b1f0c9d7e21'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('faction_logs', schema=None) as batch_op:
+        batch_op.create_index('ix_faction_logs_faction_id_id', ['faction_id', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('faction_logs', schema=None) as batch_op:
+        batch_op.drop_index('ix_faction_logs_faction_id_id')
@@ -0,0 +1,26 @@
+"""Add turn to games: the turn accepting actions after the last resolved turn
+
+Revision ID: b4e2d7c91a30
+Revises: 3c7f1e9a4d52
+Create Date: 2026-10-19 14:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b4e2d7c91a30'
+down_revision = '3c7f1e9a4d52'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('game', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('turn', sa.Integer(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('game', schema=None) as batch_op:
+        batch_op.drop_column('turn')
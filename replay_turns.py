@@ -0,0 +1,27 @@
+import argparse
+
+from app.turn_replay import replay_journal
+
+def main():
+    parser = argparse.ArgumentParser(description='Воспроизведение ходов игры по журналу ходов')
+    parser.add_argument('source_db', help='база данных SQLite с состоянием мира перед первым ходом')
+    parser.add_argument('journal', help='файл журнала ходов')
+    parser.add_argument('target_db', help='файл для базы данных с результатом воспроизведения')
+    parser.add_argument('--from-turn', type=int, help='первый воспроизводимый ход')
+    parser.add_argument('--to-turn', type=int, help='последний воспроизводимый ход')
+    parser.add_argument('--game-id', type=int, default=1, help='игра, к которой относится журнал')
+    parser.add_argument('--top', type=int, default=5, help='сколько самых долгих ходов показать')
+    args = parser.parse_args()
+
+    timings = replay_journal(args.source_db, args.journal, args.target_db, args.from_turn, args.to_turn,
+                             game_id=args.game_id)
+
+    total = sum(seconds for _, seconds in timings)
+    print(f"Воспроизведено ходов: {len(timings)} за {total:.3f} с")
+    if timings:
+        print("Самые долгие ходы:")
+        for turn, seconds in sorted(timings, key=lambda item: item[1], reverse=True)[:args.top]:
+            print(f"  ход {turn}: {seconds * 1000:.1f} мс")
+
+if __name__ == '__main__':
+    main()
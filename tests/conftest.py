@@ -0,0 +1,151 @@
+"""Приложение с отдельной базой данных SQLite для проверок поведения
+
+Запуск из корня проекта: python -m pytest tests
+"""
+import os
+import sqlite3
+
+import pytest
+
+from config import Config
+from app import create_app, db
+from app.action_queue import ActionQueue
+from app.game_manager import GameManager
+from app.games import create_game, start_positions
+from app.models.game import Cell
+from app.models.user import Faction, User
+from app.models.user_action import UserAction, ActionType
+from app.rules import GameRules
+from app.snapshot_store import SnapshotStore
+from app.turn_journal import TurnJournal
+
+GAME_ID = 1
+
+# Таблицы и поля, по которым сравнивается состояние мира в базах данных
+WORLD_QUERIES = (
+    'SELECT x, y, faction_id, building_type, neutral_defenders FROM cell WHERE game_id = 1 ORDER BY x, y',
+    'SELECT cell_id, type, level FROM building ORDER BY cell_id',
+    'SELECT id, gold, wood, stone, ore, warriors, max_gold, max_wood, max_stone, max_ore, max_warriors '
+    'FROM faction WHERE game_id = 1 ORDER BY id',
+    'SELECT user_id, action_type, turn, target_x, target_y, building_type, warriors FROM user_actions ORDER BY id',
+    'SELECT faction_id, turn, message FROM faction_logs ORDER BY id',
+)
+
+@pytest.fixture
+def app(tmp_path):
+    """Приложение без игрового цикла с новой базой данных и одной игрой"""
+    class TestConfig(Config):
+        SQLALCHEMY_DATABASE_URI = 'sqlite:///' + os.path.join(str(tmp_path), 'game.db')
+        GAME_AUTOSTART = False
+        LOG_LEVEL = 'WARNING'
+        LOG_LEVELS = {name: 'WARNING' for name in Config.LOG_LEVELS}
+        TURN_JOURNAL_FILE = os.path.join(str(tmp_path), 'turn_journal.jsonl')
+        WORLD_SNAPSHOT_DIR = os.path.join(str(tmp_path), 'snapshots')
+        MAP_IMAGE_DIR = ''
+        ACTION_QUEUE_DEAD_LETTER_FILE = os.path.join(str(tmp_path), 'action_dead_letter.jsonl')
+        ACTION_QUEUE_RETRY_DELAY = 0.001
+
+    app = create_app(TestConfig)
+    with app.app_context():
+        db.create_all()
+        create_game('Тестовая игра', game_id=1)
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.engine.dispose()
+
+class GameRunner:
+    """Первая игра без таймера ходов: ходы обрабатываются по вызову play
+
+    У каждой фракции свой игрок, который каждый ход нанимает воинов и
+    захватывает клетку по направлению от своего угла к центру карты.
+    Входные данные ходов пишутся в журнал, снимок мира сохраняется на
+    начало каждого хода.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.database_path = app.config['SQLALCHEMY_DATABASE_URI'][len('sqlite:///'):]
+        self.journal = TurnJournal.get_instance(GAME_ID)
+        self.journal.init_app(app)
+        self.store = SnapshotStore.get_instance(GAME_ID)
+        self.store.init_app(app)
+        self.store.interval = 1
+        action_queue = ActionQueue.get_instance(GAME_ID)
+        action_queue.app = app
+
+        self.manager = GameManager.get_instance(GAME_ID)
+        self.manager.app = app
+        self.manager.current_turn = 1
+        with app.app_context():
+            self.players = []
+            for faction in Faction.query.filter_by(game_id=GAME_ID).order_by(Faction.id):
+                user = User(username=f'player{faction.id}', email=f'player{faction.id}@example.com',
+                            full_name='Игрок', age=20, is_approved=True, faction_id=faction.id)
+                user.set_password('secret')
+                db.session.add(user)
+                db.session.flush()
+                self.players.append((user.id, faction.id))
+            db.session.commit()
+        self.manager._initialize_faction_resources()
+        with app.app_context():
+            for faction in Faction.query.filter_by(game_id=GAME_ID):
+                faction.gold = faction.max_gold = 1000
+                faction.warriors, faction.max_warriors = 20, 100
+            db.session.commit()
+        self.manager.publish_snapshot()
+        with app.app_context():
+            # Нейтральные постройки без защитников: защитники выбираются генератором хода
+            for cell in Cell.query.filter_by(game_id=GAME_ID, faction_id=None):
+                if (cell.x + cell.y) % 3 == 1:
+                    cell.building_type = 'MINE'
+            db.session.commit()
+        action_queue.reload_state()
+
+    def play(self, turns):
+        """Обрабатывает turns ходов, как GameManager._process_turn, но без очереди действий и таймера"""
+        manager = self.manager
+        for _ in range(turns):
+            with self.app.app_context():
+                self._queue_actions(manager.current_turn)
+            manager.resolving_turn = manager._advance_turn_epoch()
+            seed = 1000 + manager.resolving_turn
+            manager._journal_turn(seed)
+            manager._resolve_turn(seed)
+            manager.resolving_turn = None
+            manager._store_snapshot()
+
+    def world(self, path=None):
+        """Состояние мира в базе данных path (по умолчанию - в базе игры) для сравнения"""
+        with sqlite3.connect(path or self.database_path) as connection:
+            return [connection.execute(query).fetchall() for query in WORLD_QUERIES]
+
+    def _queue_actions(self, turn):
+        """Записывает действия хода, как их записала бы очередь действий: с изменениями ресурсов"""
+        rules = GameRules.get_instance()
+        last = rules.map_size - 1
+        rows = []
+        for index, (user_id, faction_id) in enumerate(self.players):
+            x, y = start_positions(rules.map_size)[index]
+            step = min(turn, last)
+            target = (abs(x - step), y) if turn % 2 else (x, abs(y - step))
+            faction = db.session.get(Faction, faction_id)
+            recruit = 3
+            faction.gold -= recruit * rules.warrior_cost
+            faction.warriors += recruit
+            warriors = min(faction.warriors, 2 + turn)
+            faction.warriors -= warriors
+            rows.append(UserAction(user_id=user_id, game_id=GAME_ID, turn=turn,
+                                   action_type=ActionType.RECRUIT_WARRIORS.value, warriors=recruit))
+            rows.append(UserAction(user_id=user_id, game_id=GAME_ID, turn=turn,
+                                   action_type=ActionType.CAPTURE_CELL.value,
+                                   target_x=target[0], target_y=target[1], warriors=warriors))
+        db.session.add_all(rows)
+        db.session.commit()
+
+@pytest.fixture
+def game_runner(app, monkeypatch):
+    """Первая игра с игроками всех фракций, готовая к обработке ходов (см. GameRunner)"""
+    for registry in (TurnJournal, SnapshotStore, ActionQueue, GameManager):
+        monkeypatch.setattr(registry, '_instances', {})
+    return GameRunner(app)
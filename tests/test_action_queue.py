@@ -0,0 +1,124 @@
+"""Групповая запись очереди действий и ее поведение при ошибках базы данных"""
+import json
+from datetime import datetime
+
+import pytest
+from sqlalchemy.exc import OperationalError
+
+from app import db
+from app.action_queue import ActionQueue, FLUSH_WRITTEN, FLUSH_RETRY, FLUSH_DEAD_LETTER
+from app.models.user import Faction
+from app.models.user_action import UserAction
+
+GAME_ID = 1
+
+@pytest.fixture
+def queue(app):
+    """Очередь действий первой игры без фонового потока записи"""
+    queue = ActionQueue(GAME_ID)
+    queue.app = app
+    queue.RETRY_DELAY = app.config['ACTION_QUEUE_RETRY_DELAY']
+    queue.dead_letter_path = queue._dead_letter_path(app)
+    queue.reload_state()
+    return queue
+
+@pytest.fixture
+def faction_id(app):
+    with app.app_context():
+        return Faction.query.filter_by(game_id=GAME_ID).order_by(Faction.id).first().id
+
+def action(faction_id, x, gold=1, action_type='RECRUIT_WARRIORS'):
+    """Действие с полями UserAction и списанием gold золота у фракции"""
+    fields = {
+        'user_id': 1, 'game_id': GAME_ID, 'action_type': action_type, 'turn': 1,
+        'target_x': x, 'target_y': 0, 'building_type': None, 'warriors': 1,
+        'resources': None, 'created_at': datetime(2025, 1, 1)
+    }
+    return fields, {faction_id: {'gold': -gold}}, None
+
+def stored_actions(app):
+    with app.app_context():
+        return [(row.target_x, row.action_type) for row in UserAction.query.order_by(UserAction.id)]
+
+def stored_gold(app, faction_id):
+    with app.app_context():
+        return db.session.get(Faction, faction_id).gold
+
+def fail_writes(monkeypatch, queue, count):
+    """Первые count попыток записи пакета завершаются временной ошибкой (база заблокирована)"""
+    write = queue._write
+    calls = {'failed': 0}
+
+    def flaky_write(batch):
+        if count is None or calls['failed'] < count:
+            calls['failed'] += 1
+            raise OperationalError('INSERT INTO user_actions', {}, Exception('database is locked'))
+        write(batch)
+
+    monkeypatch.setattr(queue, '_write', flaky_write)
+    return calls
+
+def test_flush_writes_batch_in_one_transaction(app, queue, faction_id):
+    gold = stored_gold(app, faction_id)
+    queue.enqueue_many([action(faction_id, x) for x in range(3)])
+    assert queue.balance(faction_id)['gold'] == gold - 3
+
+    assert queue.flush() == FLUSH_WRITTEN
+    assert stored_actions(app) == [(0, 'RECRUIT_WARRIORS'), (1, 'RECRUIT_WARRIORS'), (2, 'RECRUIT_WARRIORS')]
+    assert stored_gold(app, faction_id) == gold - 3
+
+def test_transient_error_returns_batch_to_queue(app, queue, faction_id, monkeypatch):
+    gold = stored_gold(app, faction_id)
+    fail_writes(monkeypatch, queue, 2)
+    queue.enqueue_many([action(faction_id, 0), action(faction_id, 1)])
+
+    assert queue.flush() == FLUSH_RETRY
+    assert stored_actions(app) == []
+    # Подтвержденные списания остаются в памяти до повтора
+    assert queue.balance(faction_id)['gold'] == gold - 2
+
+    # Действие, принятое после ошибки, записывается после возвращенного пакета
+    queue.enqueue(*action(faction_id, 2))
+    assert queue.flush(block=True) == FLUSH_WRITTEN
+    assert [x for x, _ in stored_actions(app)] == [0, 1, 2]
+    assert stored_gold(app, faction_id) == gold - 3
+    assert queue.balance(faction_id)['gold'] == gold - 3
+
+def test_fence_writes_turn_actions_despite_transient_errors(app, queue, faction_id, monkeypatch):
+    fail_writes(monkeypatch, queue, 3)
+    queue.enqueue(*action(faction_id, 0))
+
+    assert queue.fence(lambda: 'next turn') == 'next turn'
+    assert [x for x, _ in stored_actions(app)] == [0]
+    queue.resume()
+
+def test_permanent_error_keeps_valid_actions_and_dead_letters_the_rest(app, queue, faction_id):
+    gold = stored_gold(app, faction_id)
+    # Действие без типа нарушает NOT NULL и не может быть записано ни при каком повторе
+    queue.enqueue_many([action(faction_id, 0), action(faction_id, 1, gold=5, action_type=None), action(faction_id, 2)])
+
+    assert queue.flush() == FLUSH_DEAD_LETTER
+    assert [x for x, _ in stored_actions(app)] == [0, 2]
+    assert stored_gold(app, faction_id) == gold - 2
+    # Списание незаписанного действия откатывается в памяти
+    assert queue.balance(faction_id)['gold'] == gold - 2
+
+    with open(app.config['ACTION_QUEUE_DEAD_LETTER_FILE'], encoding='utf-8') as dead_letter_file:
+        entries = [json.loads(line) for line in dead_letter_file]
+    assert len(entries) == 1
+    assert entries[0]['action']['target_x'] == 1
+    assert entries[0]['deltas'] == {str(faction_id): {'gold': -5}}
+    assert entries[0]['error']
+
+def test_retry_limit_dead_letters_batch(app, queue, faction_id, monkeypatch):
+    gold = stored_gold(app, faction_id)
+    calls = fail_writes(monkeypatch, queue, None)
+    queue.enqueue_many([action(faction_id, 0), action(faction_id, 1)])
+
+    assert queue.flush(block=True) == FLUSH_DEAD_LETTER
+    # Пакет целиком, затем каждое действие по отдельности
+    assert calls['failed'] == queue.RETRY_LIMIT + 1 + 2
+    assert stored_actions(app) == []
+    assert queue.balance(faction_id)['gold'] == gold
+    with open(app.config['ACTION_QUEUE_DEAD_LETTER_FILE'], encoding='utf-8') as dead_letter_file:
+        assert [json.loads(line)['action']['target_x'] for line in dead_letter_file] == [0, 1]
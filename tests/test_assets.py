@@ -0,0 +1,72 @@
+"""Собранные сценарии страниц и спрайт иконок: сборка build_assets.py и сборка в памяти при запуске"""
+import os
+import shutil
+
+import pytest
+from flask import Flask
+
+from app import assets
+
+STATIC_FOLDER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'app', 'static')
+
+@pytest.fixture
+def static_folder(tmp_path):
+    """Папка статических файлов с исходными сценариями и без сборки"""
+    folder = tmp_path / 'static'
+    shutil.copytree(os.path.join(STATIC_FOLDER, 'js', 'src'), folder / 'js' / 'src')
+    return str(folder)
+
+def make_app(static_folder):
+    app = Flask(__name__, static_folder=static_folder)
+    assets.init_app(app)
+    return app
+
+def asset_path(app, name):
+    with app.test_request_context():
+        return assets.asset_url(name)
+
+def test_bundle_concatenates_sources(static_folder):
+    filename, data, mimetype = assets.bundle_assets(static_folder)['app.js']
+
+    sources = []
+    for source in assets.BUNDLE_SOURCES:
+        with open(os.path.join(static_folder, source), encoding='utf-8') as source_file:
+            sources.append(source_file.read().rstrip() + '\n')
+    assert data.decode('utf-8') == '\n'.join(sources)
+    assert filename.startswith('app.') and filename.endswith('.js')
+    assert mimetype == 'text/javascript'
+
+@pytest.mark.skipif(assets.rjsmin is None, reason='пакет rjsmin не установлен')
+def test_build_minifies_scripts(static_folder):
+    manifest = assets.build_assets(static_folder)
+
+    path = manifest['files']['app.js']
+    assert path.endswith('.min.js')
+    with open(os.path.join(static_folder, path), encoding='utf-8') as built_file:
+        built = built_file.read()
+    source = assets.bundle_assets(static_folder)['app.js'][1].decode('utf-8')
+    assert built == assets.rjsmin.jsmin(source)
+    assert len(built) < len(source)
+
+def test_startup_without_build_writes_nothing(static_folder):
+    app = make_app(static_folder)
+
+    assert not os.path.exists(os.path.join(static_folder, assets.DIST_DIR))
+    url = asset_path(app, 'app.js')
+    assert url.startswith('/assets/app.')
+    response = app.test_client().get(url)
+    assert response.status_code == 200
+    assert response.data == assets.bundle_assets(static_folder)['app.js'][1]
+    assert response.cache_control.immutable
+    assert app.test_client().get('/assets/app.0000.js').status_code == 404
+
+def test_startup_uses_build(static_folder):
+    manifest = assets.build_assets(static_folder)
+    app = make_app(static_folder)
+
+    dist_dir = os.path.join(static_folder, assets.DIST_DIR)
+    assert sorted(os.listdir(dist_dir)) == sorted(
+        [assets.MANIFEST_FILE] + [os.path.basename(path) for path in manifest['files'].values()]
+    )
+    assert asset_path(app, 'app.js') == f"/static/{manifest['files']['app.js']}"
+    assert 'assets' not in app.view_functions
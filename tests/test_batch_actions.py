@@ -0,0 +1,116 @@
+"""Проверка действий пакета /api/actions/batch: пакет применяется целиком или отклоняется"""
+import pytest
+
+from app import db
+from app.action_queue import ActionQueue
+from app.game_manager import GameManager
+from app.models.user import Faction, User
+
+GAME_ID = 1
+
+@pytest.fixture
+def client(app, monkeypatch):
+    """Клиент пользователя первой фракции игры, очередь действий загружена из базы"""
+    monkeypatch.setattr(ActionQueue, '_instances', {})
+    monkeypatch.setattr(GameManager, '_instances', {})
+    with app.app_context():
+        faction = Faction.query.filter_by(game_id=GAME_ID).order_by(Faction.id).first()
+        faction.gold = 1000
+        faction.warriors = 10
+        user = User(username='player', email='player@example.com', full_name='Игрок', age=20,
+                    is_approved=True, faction_id=faction.id)
+        user.set_password('secret')
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+        faction_id = faction.id
+
+    action_queue = ActionQueue.get_instance(GAME_ID)
+    action_queue.app = app
+    action_queue.reload_state()
+
+    client = app.test_client()
+    client.faction_id = faction_id
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+    return client
+
+def post_batch(client, actions):
+    response = client.post('/api/actions/batch', json={'actions': actions})
+    assert response.status_code == 200
+    return response.get_json()
+
+def recruit(warriors=1):
+    return {'action_type': 'RECRUIT_WARRIORS', 'target_x': 0, 'target_y': 0, 'warriors': warriors}
+
+@pytest.mark.parametrize('action_type', ['CAPTURE_CELL', 'DEFEND_CELL'])
+@pytest.mark.parametrize('warriors', ['x', True, 0, -3, 2.5, None, [1]])
+def test_invalid_warriors_reject_batch(client, action_type, warriors):
+    result = post_batch(client, [recruit(), {'action_type': action_type, 'target_x': 0, 'target_y': 0,
+                                             'warriors': warriors}])
+
+    assert result['success'] is False
+    assert [item['success'] for item in result['results']] == [False, False]
+    assert 'воинов' in result['results'][1]['message']
+    # Найм из того же пакета тоже не выполнен
+    assert ActionQueue.get_instance(GAME_ID).balance(client.faction_id)['gold'] == 1000
+
+@pytest.mark.parametrize('target', [('0', 0), (0, None), ([0], 0), (True, 0)])
+def test_invalid_coordinates_reject_batch(client, target):
+    target_x, target_y = target
+    result = post_batch(client, [{'action_type': 'DEFEND_CELL', 'target_x': target_x, 'target_y': target_y,
+                                  'warriors': 1}])
+
+    assert result['success'] is False
+    assert result['results'][0]['message'] == 'Необходимо указать координаты'
+
+def test_defend_accepts_numeric_string(client):
+    result = post_batch(client, [recruit(), {'action_type': 'DEFEND_CELL', 'target_x': 0, 'target_y': 0,
+                                             'warriors': '3'}])
+
+    assert result['success'] is True, result
+    assert ActionQueue.get_instance(GAME_ID).balance(client.faction_id)['warriors'] == 10 + 1 - 3
+
+def other_faction_id(client):
+    with client.application.app_context():
+        return Faction.query.filter(Faction.game_id == GAME_ID, Faction.id != client.faction_id).first().id
+
+def transfer(faction_id, **amounts):
+    return {'action_type': 'TRANSFER_RESOURCES', 'resources': dict(amounts, faction_id=faction_id)}
+
+def test_transfer_moves_resources(client):
+    target_id = other_faction_id(client)
+    action_queue = ActionQueue.get_instance(GAME_ID)
+    target_gold = action_queue.balance(target_id)['gold']
+
+    result = post_batch(client, [transfer(target_id, gold='100')])
+
+    assert result['success'] is True, result
+    assert action_queue.balance(client.faction_id)['gold'] == 900
+    assert action_queue.balance(target_id)['gold'] == target_gold + 100
+
+@pytest.mark.parametrize('amounts', [
+    {'gold': -100, 'wood': 1},
+    {'gold': 'abc'},
+    {'gold': True},
+    {'gold': 2.5},
+    {'gold': [1]},
+])
+def test_invalid_transfer_amounts_reject_batch(client, amounts):
+    target_id = other_faction_id(client)
+    action_queue = ActionQueue.get_instance(GAME_ID)
+    before = (action_queue.balance(client.faction_id), action_queue.balance(target_id))
+
+    result = post_batch(client, [transfer(target_id, **amounts)])
+
+    assert result['success'] is False
+    assert result['results'][0]['message'] == 'Количество ресурсов должно быть целым неотрицательным числом'
+    assert (action_queue.balance(client.faction_id), action_queue.balance(target_id)) == before
+
+@pytest.mark.parametrize('resources', [[1, 2], 'gold', 5])
+def test_transfer_requires_resources_object(client, resources):
+    result = post_batch(client, [{'action_type': 'TRANSFER_RESOURCES', 'resources': resources}])
+
+    assert result['success'] is False
+    assert result['results'][0]['message'] == 'Необходимо указать ресурсы и фракцию-получателя'
@@ -0,0 +1,124 @@
+"""Журнал фракции в /api/faction_logs и /api/state: курсоры after и before, порядок записей и limit"""
+import pytest
+
+from app import db
+from app.game_manager import GameManager
+from app.models.faction_log import FactionLog
+from app.models.user import Faction, User
+
+GAME_ID = 1
+CURRENT_TURN = 2
+
+@pytest.fixture
+def client(app, monkeypatch):
+    """Клиент пользователя первой фракции игры во втором ходу
+
+    В журнале фракции три записи первого хода и четыре записи второго
+    (client.log_ids - их id по возрастанию), между ними записи другой фракции.
+    """
+    monkeypatch.setattr(GameManager, '_instances', {})
+    with app.app_context():
+        faction, other = Faction.query.filter_by(game_id=GAME_ID).order_by(Faction.id).limit(2).all()
+        user = User(username='player', email='player@example.com', full_name='Игрок', age=20,
+                    is_approved=True, faction_id=faction.id)
+        user.set_password('secret')
+        db.session.add(user)
+
+        logs = []
+        for turn, count in ((1, 3), (CURRENT_TURN, 4)):
+            for number in range(count):
+                log = FactionLog(faction_id=faction.id, game_id=GAME_ID, turn=turn, message=f'Ход {turn}, запись {number}')
+                db.session.add(log)
+                db.session.add(FactionLog(faction_id=other.id, game_id=GAME_ID, turn=turn, message='Другая фракция'))
+                db.session.flush()
+                logs.append(log.id)
+        db.session.commit()
+        user_id = user.id
+
+    manager = GameManager.get_instance(GAME_ID)
+    manager.app = app
+    manager.current_turn = CURRENT_TURN
+    manager.publish_snapshot()
+
+    client = app.test_client()
+    client.log_ids = logs
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+    return client
+
+def get_logs(client, **params):
+    response = client.get('/api/faction_logs', query_string=params)
+    assert response.status_code == 200
+    data = response.get_json()
+    assert data['success'] is True
+    return data
+
+def log_ids(data):
+    return [log['id'] for log in data['logs']]
+
+def test_current_turn_newest_first(client):
+    turn_logs = client.log_ids[3:]
+
+    data = get_logs(client)
+
+    assert log_ids(data) == turn_logs[::-1]
+    assert {log['turn'] for log in data['logs']} == {CURRENT_TURN}
+    assert (data['cursor'], data['has_more'], data['next_before']) == (turn_logs[-1], False, None)
+
+def test_limit_detects_more(client):
+    turn_logs = client.log_ids[3:]
+
+    data = get_logs(client, limit=3)
+
+    assert log_ids(data) == turn_logs[:0:-1]
+    assert (data['cursor'], data['has_more'], data['next_before']) == (turn_logs[-1], True, turn_logs[1])
+
+def test_before_pages_through_history(client):
+    ids = client.log_ids
+
+    data = get_logs(client, before=ids[4], limit=2)
+    assert log_ids(data) == [ids[3], ids[2]]
+    assert (data['cursor'], data['has_more'], data['next_before']) == (None, True, ids[2])
+
+    data = get_logs(client, before=data['next_before'], limit=2)
+    assert log_ids(data) == [ids[1], ids[0]]
+    assert (data['has_more'], data['next_before']) == (False, None)
+
+def test_after_returns_newer_oldest_first(client):
+    ids = client.log_ids
+
+    data = get_logs(client, after=ids[2], limit=2)
+    assert log_ids(data) == [ids[3], ids[4]]
+    assert (data['cursor'], data['has_more']) == (ids[4], True)
+
+    data = get_logs(client, after=data['cursor'])
+    assert log_ids(data) == ids[5:]
+    assert (data['cursor'], data['has_more']) == (ids[-1], False)
+
+    # Новых записей нет: курсор не меняется
+    data = get_logs(client, after=data['cursor'])
+    assert (log_ids(data), data['cursor']) == ([], ids[-1])
+
+def test_empty_turn_cursor_points_to_last_log(client):
+    GameManager.get_instance(GAME_ID).current_turn = CURRENT_TURN + 1
+
+    data = get_logs(client)
+
+    assert (log_ids(data), data['cursor']) == ([], client.log_ids[-1])
+
+@pytest.mark.parametrize('limit', ['x', '1.5'])
+def test_invalid_limit(client, limit):
+    response = client.get('/api/faction_logs', query_string={'limit': limit})
+
+    assert response.get_json()['success'] is False
+
+def test_state_logs_after(client):
+    ids = client.log_ids
+
+    state = client.get('/api/state', query_string={'game_id': GAME_ID, 'fields': 'logs', 'logs_after': ids[4]}).get_json()
+    assert log_ids(state['logs']) == ids[5:]
+    assert state['logs']['cursor'] == ids[-1]
+
+    state = client.get('/api/state', query_string={'game_id': GAME_ID, 'fields': 'logs'}).get_json()
+    assert log_ids(state['logs']) == ids[:2:-1]
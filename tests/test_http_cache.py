@@ -0,0 +1,40 @@
+"""Сжатие ответов: в кеше сжатых тел только ответы, общие для всех клиентов"""
+import gzip
+
+import pytest
+
+from app.game_manager import GameManager
+from app.http_cache import CompressionCache
+
+@pytest.fixture
+def cached(monkeypatch):
+    """Тела, сжатые через CompressionCache"""
+    bodies = []
+    compress = CompressionCache.compress
+
+    def record(self, data, encoding, level):
+        bodies.append(data)
+        return compress(self, data, encoding, level)
+    monkeypatch.setattr(CompressionCache, 'compress', record)
+    return bodies
+
+@pytest.fixture
+def client(app, monkeypatch):
+    monkeypatch.setattr(GameManager, '_instances', {})
+    manager = GameManager.get_instance(1)
+    manager.app = app
+    manager.publish_snapshot()
+    return app.test_client()
+
+def test_map_is_cached(client, cached):
+    response = client.get('/api/map?game_id=1', headers={'Accept-Encoding': 'gzip'})
+
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert cached == [gzip.decompress(response.data)]
+
+def test_pages_are_compressed_without_cache(client, cached):
+    response = client.get('/', headers={'Accept-Encoding': 'gzip'})
+
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert b'<html' in gzip.decompress(response.data).lower()
+    assert cached == []
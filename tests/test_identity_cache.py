@@ -0,0 +1,98 @@
+"""Кеш пользователей для current_user: время жизни записей, вытеснение и сброс после изменений"""
+import pytest
+
+from app import db, identity_cache
+from app.identity_cache import IdentityCache, UserIdentity
+from app.models.user import User
+
+class Clock:
+    """Часы time.monotonic, которые идут только по вызову advance"""
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(identity_cache, 'time', clock)
+    return clock
+
+@pytest.fixture
+def users(app):
+    """Идентификаторы трех пользователей: администратора и двух неодобренных игроков"""
+    with app.app_context():
+        users = [
+            User(username=f'user{number}', email=f'user{number}@example.com', full_name='Игрок', age=20,
+                 is_admin=number == 0, is_approved=number == 0)
+            for number in range(3)
+        ]
+        for user in users:
+            user.set_password('secret')
+        db.session.add_all(users)
+        db.session.commit()
+        return [user.id for user in users]
+
+def rename(app, user_id, username):
+    with app.app_context():
+        db.session.get(User, user_id).username = username
+        db.session.commit()
+
+def load(app, user_id):
+    with app.app_context():
+        return IdentityCache.get_instance().load(user_id)
+
+def test_entries_expire_after_ttl(app, users, clock):
+    cache = IdentityCache.get_instance()
+    assert load(app, users[1]).username == 'user1'
+    rename(app, users[1], 'renamed')
+
+    clock.advance(cache.ttl - 1)
+    assert load(app, users[1]).username == 'user1'
+    clock.advance(1)
+    assert load(app, users[1]).username == 'renamed'
+
+def test_least_recently_used_is_evicted(app, users, clock, monkeypatch):
+    cache = IdentityCache.get_instance()
+    monkeypatch.setattr(cache, 'size', 2)
+    load(app, users[0])
+    load(app, users[1])
+    # Первый пользователь снова нужен, поэтому вытесняется второй
+    load(app, users[0])
+    load(app, users[2])
+
+    assert list(cache._identities) == [users[0], users[2]]
+
+def test_approve_is_visible_on_next_request(app, users, clock):
+    assert load(app, users[1]).is_approved is False
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(users[0])
+        session['_fresh'] = True
+
+    response = client.post(f'/admin/approve/{users[1]}')
+
+    assert response.status_code == 302
+    # Время жизни записи не истекло, но одобрение уже видно
+    assert load(app, users[1]).is_approved is True
+
+def test_stale_read_is_not_cached(app, users, clock, monkeypatch):
+    cache = IdentityCache.get_instance()
+
+    class InvalidatedIdentity(UserIdentity):
+        """Пользователь изменяется и сбрасывается из кеша, пока load строит запись по прочитанным данным"""
+        def __init__(self, user):
+            super().__init__(user)
+            rename(app, user.id, 'renamed')
+            cache.invalidate(user.id)
+    monkeypatch.setattr(identity_cache, 'UserIdentity', InvalidatedIdentity)
+
+    assert load(app, users[1]).username == 'user1'
+    assert users[1] not in cache._identities
+
+    monkeypatch.setattr(identity_cache, 'UserIdentity', UserIdentity)
+    assert load(app, users[1]).username == 'renamed'
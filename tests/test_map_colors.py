@@ -0,0 +1,46 @@
+"""Фракции на карте: цвета по порядку фракции в игре, любые идентификаторы в двоичном формате"""
+import pytest
+
+from app.games import create_game
+from app.map_encoding import pack_map, unpack_map
+from app.map_fragment import map_cells
+from app.map_image import FACTION_COLORS, render_map_svg
+from app.rules import GameRules, start_positions
+from app.world_snapshot import WorldSnapshot
+
+FACTIONS = (('Первая', '#010101'), ('Вторая', '#020202'), ('Третья', '#030303'),
+            ('Четвертая', '#040404'), ('Пятая', '#050505'))
+
+@pytest.fixture
+def snapshot(app):
+    """Снимок второй игры: идентификаторы ее фракций идут после фракций первой игры"""
+    with app.app_context():
+        create_game('Вторая игра', factions=FACTIONS, game_id=2)
+        return WorldSnapshot.build(1, 1, game_id=2)
+
+def test_factions_of_later_games_keep_colors(snapshot):
+    rules = GameRules.get_instance()
+    expected = {faction.id: color for faction, color in zip(snapshot.factions, FACTION_COLORS)}
+    expected[snapshot.factions[4].id] = '#050505'
+    assert min(expected) > len(FACTION_COLORS)
+
+    assert snapshot.map_columns()['faction_colors'] == expected
+    assert unpack_map(pack_map(snapshot))[2]['faction_colors'] == {str(key): value for key, value in expected.items()}
+
+    colors = {(cell['x'], cell['y']): cell['color'] for cell in map_cells(snapshot, rules)}
+    svg = render_map_svg(snapshot, rules)
+    for faction, position in zip(snapshot.factions, start_positions(rules.map_size)):
+        assert colors[position] == expected[faction.id]
+        assert f'fill="{expected[faction.id]}"' in svg
+
+def test_binary_map_stores_large_faction_ids(snapshot):
+    faction = snapshot.factions[0]._replace(id=70000)
+    cells = [cell._replace(faction_id=faction.id) if cell.faction_id == snapshot.factions[0].id else cell
+             for cell in snapshot.cells]
+    large = WorldSnapshot(snapshot.version, snapshot.turn, cells, (faction,) + snapshot.factions[1:])
+
+    _, _, dictionaries, records = unpack_map(pack_map(large))
+
+    for cell in large.cells:
+        index = records[cell.x, cell.y]['faction']
+        assert (dictionaries['factions'][index - 1] if index else None) == cell.faction_id
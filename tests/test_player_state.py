@@ -0,0 +1,60 @@
+"""Данные игрока в /api/resources и /api/state"""
+import pytest
+
+from app import db
+from app.action_queue import ActionQueue
+from app.game_manager import GameManager
+from app.models.user import Faction, User
+
+GAME_ID = 1
+
+@pytest.fixture
+def client(app, monkeypatch):
+    """Клиент пользователя первой фракции игры; очередь действий еще не загружала состояние игры"""
+    monkeypatch.setattr(ActionQueue, '_instances', {})
+    monkeypatch.setattr(GameManager, '_instances', {})
+    with app.app_context():
+        faction = Faction.query.filter_by(game_id=GAME_ID).order_by(Faction.id).first()
+        faction.gold = 250
+        faction.warriors = 7
+        user = User(username='player', email='player@example.com', full_name='Игрок', age=20,
+                    is_approved=True, faction_id=faction.id)
+        user.set_password('secret')
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+        faction_id = faction.id
+
+    GameManager.get_instance(GAME_ID).app = app
+    GameManager.get_instance(GAME_ID).publish_snapshot()
+    ActionQueue.get_instance(GAME_ID).app = app
+
+    client = app.test_client()
+    client.faction_id = faction_id
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+    return client
+
+def test_resources_fall_back_to_database(client):
+    assert ActionQueue.get_instance(GAME_ID).balance(client.faction_id) is None
+
+    response = client.get('/api/resources')
+    assert response.status_code == 200
+    assert (response.get_json()['gold'], response.get_json()['warriors']) == (250, 7)
+
+    response = client.get(f'/api/state?game_id={GAME_ID}&fields=resources')
+    assert response.status_code == 200
+    assert response.get_json()['resources']['gold'] == 250
+
+def test_state_turn_matches_snapshot(client):
+    manager = GameManager.get_instance(GAME_ID)
+    snapshot = manager.get_snapshot()
+    # Обработка хода началась: номер хода уже увеличен, новый снимок еще не опубликован
+    manager.current_turn = snapshot.turn + 1
+
+    state = client.get(f'/api/state?game_id={GAME_ID}&fields=turn,logs').get_json()
+
+    assert state['version'] == snapshot.version
+    assert state['current_turn'] == state['turn']['current_turn'] == snapshot.turn
+    assert state['logs']['current_turn'] == snapshot.turn
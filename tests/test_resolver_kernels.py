@@ -0,0 +1,293 @@
+"""Векторные фазы экономики и захватов дают тот же результат, что и прежний расчет по фракциям и клеткам
+
+scalar_captures и scalar_economy повторяют циклы GameManager._process_cell_captures
+и GameManager._update_faction_resources до перевода фаз на NumPy, но работают
+с WorldState вместо моделей базы данных.
+"""
+import random
+
+import pytest
+
+from config import Config
+from app.models.game import BuildingType
+from app.models.user_action import ActionType
+from app.rules import GameRules, RULE_SETTINGS
+from app.resolver import WorldState, CellState, FactionState, TurnAction
+from app.resolver import events
+from app.resolver.combat import resolve_captures
+from app.resolver.economy import INCOME_RESOURCES, faction_income, update_economy
+
+CAPTURE = ActionType.CAPTURE_CELL.value
+DEFEND = ActionType.DEFEND_CELL.value
+RESOURCES = ('gold', 'wood', 'stone', 'ore', 'warriors')
+WORLDS = range(200)
+
+@pytest.fixture(scope='module')
+def rules():
+    return GameRules({name: getattr(Config, name) for name in RULE_SETTINGS})
+
+def random_world(rules, seed):
+    """Случайный мир: владельцы, постройки и здания клеток, ресурсы фракций (иногда сверх лимитов)"""
+    rng = random.Random(seed)
+    buildings = [building_type.name for building_type in BuildingType if building_type != BuildingType.CASTLE]
+    cells = []
+    for x in range(rules.map_size):
+        for y in range(rules.map_size):
+            owner = rng.choice([None, None, 1, 2, 3, 4])
+            if rules.is_castle_cell(x, y) and rng.random() < 0.8:
+                cells.append(CellState(x, y, owner or 1, 'CASTLE', 'CASTLE', 1, None))
+                continue
+            building_type = rng.choice(buildings) if rng.random() < 0.4 else None
+            building = building_type if building_type and owner and rng.random() < 0.7 else None
+            defenders = rng.randint(1, 3) if building_type and owner is None and rng.random() < 0.5 else None
+            cells.append(CellState(x, y, owner, building_type, building,
+                                   rng.randint(1, 4) if building else None, defenders))
+    factions = []
+    for faction_id in range(1, 5):
+        limits = [rng.randint(20, 200) for _ in RESOURCES]
+        balances = [rng.randint(0, limit + 20) for limit in limits]
+        if rng.random() < 0.3:
+            balances[0] = rng.randint(0, 3)
+        factions.append(FactionState(faction_id, f'Фракция {faction_id}', f'Ф{faction_id}', '#000000',
+                                     *balances, *limits))
+    return WorldState(cells, factions)
+
+def random_actions(rules, state, seed):
+    """Захваты (в том числе замков, своих клеток и одной клетки несколькими фракциями) и защиты клеток"""
+    rng = random.Random(seed)
+    actions = []
+    owned = [cell for cell in state.cells if cell.faction_id is not None]
+    targets = rng.sample(state.cells, 8)
+    for _ in range(rng.randint(0, 25)):
+        if owned and rng.random() < 0.3:
+            cell = rng.choice(owned)
+            faction_id = cell.faction_id if rng.random() < 0.8 else rng.randint(1, 4)
+            action_type = DEFEND
+        else:
+            cell = rng.choice(targets)
+            faction_id = rng.randint(1, 4)
+            action_type = CAPTURE
+        actions.append(TurnAction(len(actions) + 1, faction_id, action_type, cell.x, cell.y, None,
+                                  rng.randint(1, 15)))
+    return tuple(actions)
+
+def scalar_captures(rules, state, actions, rng):
+    """Захваты клеток по одной клетке, как до векторного расчета
+
+    Возвращает (клетки {(x, y): [владелец, защитники]}, воины фракций {id: воины}).
+    """
+    cells = {(cell.x, cell.y): [cell.faction_id, cell.neutral_defenders, cell.building_type] for cell in state.cells}
+    factions = {faction.id: [faction.warriors, faction.max_warriors] for faction in state.factions}
+
+    cell_defenses = {}
+    cell_captures = {}
+    for action in actions:
+        if action.action_type == DEFEND:
+            cell_defenses.setdefault((action.x, action.y), []).append(action)
+        elif action.action_type == CAPTURE:
+            cell_captures.setdefault((action.x, action.y), []).append(action)
+
+    center_owner = cells[rules.combat_bonus_cell][0]
+    factions_with_bonus = {center_owner} if center_owner else set()
+
+    def refund(faction_id, warriors):
+        faction = factions[faction_id]
+        faction[0] = min(faction[0] + warriors, faction[1])
+
+    def required_warriors(cell):
+        if cell[0] is not None:
+            return 0
+        if cell[2] is not None:
+            if cell[1] is None:
+                cell[1] = rng.randint(*rules.neutral_defenders_range)
+            return cell[1]
+        return 0
+
+    for (x, y), cell_actions in cell_captures.items():
+        cell = cells[(x, y)]
+        if rules.is_castle_cell(x, y) and cell[0]:
+            for action in cell_actions:
+                refund(action.faction_id, action.warriors)
+            continue
+
+        total_defenders = 0
+        if cell[0]:
+            for action in cell_defenses.get((x, y), []):
+                total_defenders += rules.combat_strength(action.warriors, action.faction_id in factions_with_bonus)
+
+        if len(cell_actions) == 1:
+            action = cell_actions[0]
+            faction_id = action.faction_id
+            effective_warriors = rules.combat_strength(action.warriors, faction_id in factions_with_bonus)
+            if cell[0] == faction_id:
+                refund(faction_id, action.warriors)
+                continue
+            additional = required_warriors(cell)
+            if cell[0] and total_defenders > 0:
+                additional += total_defenders
+            if additional > 0 and effective_warriors <= additional:
+                continue
+            cell[0] = faction_id
+            refund(faction_id, max(0, action.warriors - additional))
+        else:
+            faction_warriors = {}
+            for action in cell_actions:
+                faction_warriors.setdefault(action.faction_id, 0)
+                faction_warriors[action.faction_id] += rules.combat_strength(
+                    action.warriors, action.faction_id in factions_with_bonus
+                )
+            additional = required_warriors(cell)
+            if cell[0] and total_defenders > 0:
+                additional += total_defenders
+            sorted_factions = sorted(faction_warriors.items(), key=lambda item: item[1], reverse=True)
+            if len(sorted_factions) >= 2 and sorted_factions[0][1] == sorted_factions[1][1]:
+                cell[0] = None
+                continue
+            winner, strongest = sorted_factions[0]
+            if strongest <= additional:
+                cell[0] = None
+                continue
+            remaining = strongest - sorted_factions[1][1] if len(sorted_factions) >= 2 else strongest
+            remaining = max(0, remaining - additional)
+            cell[0] = winner
+            if remaining > 0:
+                refund(winner, remaining)
+
+    return ({xy: cell[:2] for xy, cell in cells.items()},
+            {faction_id: faction[0] for faction_id, faction in factions.items()})
+
+def scalar_economy(rules, state, actions):
+    """Доход, лимиты и содержание воинов по одной фракции, как до векторного расчета
+
+    Возвращает (ресурсы и лимиты фракций {id: {поле: значение}}, распущенные воины [(действие, количество)]).
+    """
+    result = {}
+    dismissed = []
+    for faction in state.factions:
+        values = faction._asdict()
+        faction_cells = [cell for cell in state.cells if cell.faction_id == faction.id]
+        territories_count = len(faction_cells)
+
+        for resource in RESOURCES:
+            values[f'max_{resource}'] = rules.base_limits[resource]
+        buildings_count = sum(1 for cell in faction_cells if cell.building_type)
+        for resource in ('gold', 'wood', 'stone', 'ore'):
+            values[f'max_{resource}'] += buildings_count * rules.storage_bonus_per_building
+        values['max_warriors'] += buildings_count * rules.warrior_capacity_per_building
+
+        base_income = rules.base_income
+        for resource in ('wood', 'stone', 'ore'):
+            values[resource] = min(values[resource] + base_income[resource], values[f'max_{resource}'])
+
+        gold_from_territories = territories_count * rules.gold_per_territory
+        resource_bonus = {'gold': 0, 'wood': 0, 'stone': 0, 'ore': 0}
+        for cell in faction_cells:
+            resource = rules.resource_bonus_resource(cell.x, cell.y)
+            if resource == 'gold':
+                resource_bonus['gold'] = rules.resource_bonus * (base_income['gold'] + gold_from_territories)
+            elif resource:
+                resource_bonus[resource] = rules.resource_bonus * base_income[resource]
+        for resource in resource_bonus:
+            resource_bonus[resource] = int(resource_bonus[resource])
+
+        faction_actions = [action for action in actions if action.faction_id == faction.id]
+        defend_actions = [action for action in faction_actions if action.action_type == DEFEND]
+        capture_actions = [action for action in faction_actions if action.action_type == CAPTURE]
+        sent_to_defend = sum(action.warriors or 0 for action in defend_actions)
+        sent_to_capture = sum(action.warriors or 0 for action in capture_actions)
+        total_warriors = values['warriors'] + sent_to_capture + sent_to_defend
+        gold_for_warriors = int(total_warriors * rules.warrior_maintenance)
+        gold_change = base_income['gold'] + gold_from_territories + resource_bonus['gold'] - gold_for_warriors
+        values['gold'] = max(0, min(values['gold'] + gold_change, values['max_gold']))
+
+        if values['gold'] == 0 and gold_change < 0:
+            warriors_to_dismiss = abs(gold_change)
+            if values['warriors'] > 0:
+                from_reserve = min(values['warriors'], warriors_to_dismiss)
+                values['warriors'] -= from_reserve
+                warriors_to_dismiss -= from_reserve
+            for sent, sent_actions in ((sent_to_defend, defend_actions), (sent_to_capture, capture_actions)):
+                if warriors_to_dismiss <= 0 or sent <= 0:
+                    continue
+                for action in sorted(sent_actions, key=lambda a: a.warriors or 0, reverse=True):
+                    if warriors_to_dismiss <= 0:
+                        break
+                    if action.warriors:
+                        warriors_to_remove = min(action.warriors, warriors_to_dismiss)
+                        warriors_to_dismiss -= warriors_to_remove
+                        dismissed.append((action.id, warriors_to_remove))
+
+        if any(cell.building == BuildingType.BARRACKS.name for cell in faction_cells):
+            values['warriors'] = min(values['warriors'] + rules.barracks_warriors_per_turn, values['max_warriors'])
+
+        for cell in faction_cells:
+            if cell.building:
+                production = rules.building_production(BuildingType[cell.building], cell.building_level)
+                for resource, amount in production.items():
+                    if resource in ('wood', 'stone', 'ore', 'gold'):
+                        values[resource] = min(values[resource] + amount, values[f'max_{resource}'])
+
+        for resource in ('wood', 'stone', 'ore'):
+            values[resource] = min(values[resource] + resource_bonus[resource], values[f'max_{resource}'])
+
+        result[faction.id] = {field: values[field] for field in FactionState._fields[4:]}
+    return result, dismissed
+
+@pytest.mark.parametrize('seed', WORLDS)
+def test_captures_match_scalar(rules, seed):
+    state = random_world(rules, seed)
+    actions = random_actions(rules, state, seed)
+    expected_cells, expected_warriors = scalar_captures(rules, state, actions, random.Random(seed))
+
+    new_state, _, _ = resolve_captures(rules, state, actions, random.Random(seed))
+
+    assert {(cell.x, cell.y): [cell.faction_id, cell.neutral_defenders] for cell in new_state.cells} == expected_cells
+    assert {faction.id: faction.warriors for faction in new_state.factions} == expected_warriors
+
+@pytest.mark.parametrize('seed', WORLDS)
+def test_economy_matches_scalar(rules, seed):
+    state = random_world(rules, seed)
+    actions = random_actions(rules, state, seed)
+    expected, expected_dismissed = scalar_economy(rules, state, actions)
+
+    new_state, turn_events, _ = update_economy(rules, state, actions)
+
+    assert {faction.id: faction._asdict() for faction in new_state.factions} == {
+        faction.id: dict(faction._asdict(), **expected[faction.id]) for faction in state.factions
+    }
+    assert [(event.action_id, event.amount) for event in turn_events
+            if event.kind == events.WARRIORS_DISMISSED] == expected_dismissed
+
+@pytest.mark.parametrize('seed', range(20))
+def test_faction_income_matches_turn(rules, seed):
+    """Доход на странице фракции совпадает с расчетом при обработке хода"""
+    state = random_world(rules, seed)
+    actions = random_actions(rules, state, seed)
+
+    _, _, result = update_economy(rules, state, actions)
+
+    for index, faction in enumerate(state.factions):
+        committed = sum(action.warriors or 0 for action in actions if action.faction_id == faction.id
+                        and action.action_type in (CAPTURE, DEFEND))
+        income = faction_income(rules, [cell for cell in state.cells if cell.faction_id == faction.id],
+                                faction.warriors + committed)
+        assert income.upkeep == result.upkeep[index]
+        assert list(income.bonus.values()) == list(result.resource_bonus[index])
+        assert list(income.production.values()) == list(result.production[index])
+        assert income.base['gold'] == rules.base_income['gold'] + result.territories[index] * rules.gold_per_territory
+        assert income.base['gold'] + income.bonus['gold'] - income.upkeep == result.gold_change[index]
+        assert list(income.base) == list(INCOME_RESOURCES)
+
+def test_random_worlds_cover_all_outcomes(rules):
+    """Случайные миры проверяют все исходы боев и роспуск воинов из действий"""
+    outcomes = set()
+    dismissed = 0
+    for seed in WORLDS:
+        state = random_world(rules, seed)
+        actions = random_actions(rules, state, seed)
+        _, _, outcome = resolve_captures(rules, state, actions, random.Random(seed))
+        if outcome is not None:
+            outcomes.update(outcome.outcomes.tolist())
+        dismissed += len(scalar_economy(rules, state, actions)[1])
+    assert outcomes == set(range(6))
+    assert dismissed > 0
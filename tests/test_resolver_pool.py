@@ -0,0 +1,123 @@
+"""Пул процессов обработки ходов дает тот же результат, что и обработка в потоке игры"""
+import os
+import random
+
+import numpy as np
+import pytest
+
+from app import resolver_pool
+from app.resolver import resolve_turn
+from app.resolver_pool import ResolverPool
+from app.rules import GameRules
+
+GAME_ID = 1
+SEEDS = range(10)
+
+@pytest.fixture
+def turn(app, game_runner):
+    """Состояние мира и действия третьего хода первой игры"""
+    game_runner.play(2)
+    manager = game_runner.manager
+    with app.app_context():
+        game_runner._queue_actions(manager.current_turn)
+        manager.resolving_turn = manager.current_turn
+        state, _ = manager._load_world_state()
+        actions = manager._load_turn_actions()
+    manager.resolving_turn = None
+    return state, actions
+
+@pytest.fixture
+def pool(app):
+    """Пул из двух процессов обработки ходов, бои каждого хода делятся по регионам"""
+    app.config.update(TURN_RESOLVER_PROCESSES=2, CAPTURE_REGION_PROCESSES=2,
+                      CAPTURE_REGION_SIZE=2, CAPTURE_REGION_MIN_ACTIONS=0)
+    pool = ResolverPool()
+    pool.init_app(app)
+    yield pool
+    pool.shutdown()
+
+def worker_regions():
+    """Работает ли пул регионов процесса обработки ходов (выполняется в процессе шарда)"""
+    return resolver_pool._worker_regions is not None
+
+def break_worker_regions():
+    """Аварийно завершает процесс пула регионов (выполняется в процессе шарда)"""
+    resolver_pool._worker_regions.executor.submit(os._exit, 1)
+
+def assert_same_result(result, expected):
+    assert (result.state.cells, result.state.factions) == (expected.state.cells, expected.state.factions)
+    assert result.events == expected.events
+    for table, expected_table in ((result.combat, expected.combat), (result.economy, expected.economy)):
+        assert (table is None) == (expected_table is None)
+        if table is not None:
+            for column, expected_column in zip(table, expected_table):
+                assert np.array_equal(column, expected_column)
+
+def test_pool_matches_in_thread(pool, turn):
+    state, actions = turn
+    rules = GameRules.get_instance()
+    for seed in SEEDS:
+        expected = resolve_turn(rules, state, actions, random.Random(seed))
+
+        assert_same_result(pool.resolve(GAME_ID, rules, state, actions, seed), expected)
+        assert_same_result(pool.resolve(GAME_ID + 1, rules, state, actions, seed), expected)
+
+def test_games_share_shards_evenly(pool, turn):
+    state, actions = turn
+    rules = GameRules.get_instance()
+    for game_id in (2, 4, 6, 8):
+        pool.resolve(game_id, rules, state, actions, 1)
+
+    assert sorted(pool._game_shards.values()) == [0, 0, 1, 1]
+
+def test_broken_shard_is_not_recreated(pool, turn):
+    state, actions = turn
+    rules = GameRules.get_instance()
+    expected = resolve_turn(rules, state, actions, random.Random(1))
+    pool.resolve(GAME_ID, rules, state, actions, 1)
+    index = pool._game_shards[GAME_ID]
+    # Процесс шарда игры завершается аварийно
+    pool._shards[index].submit(os._exit, 1)
+
+    assert_same_result(pool.resolve(GAME_ID, rules, state, actions, 1), expected)
+    assert pool._shards[index] is None
+    # Следующие ходы игры обрабатывает оставшийся шард
+    assert_same_result(pool.resolve(GAME_ID, rules, state, actions, 1), expected)
+    assert pool._game_shards[GAME_ID] == 1 - index
+    assert pool._shards[index] is None
+
+def test_broken_regions_are_not_recreated(pool, turn):
+    state, actions = turn
+    rules = GameRules.get_instance()
+    expected = resolve_turn(rules, state, actions, random.Random(1))
+    shard = pool._shards[0]
+    assert shard.submit(worker_regions).result()
+    shard.submit(break_worker_regions).result()
+
+    # Бои хода разрешаются без разбиения, и пул регионов больше не создается
+    for _ in range(2):
+        assert_same_result(pool.resolve(GAME_ID, rules, state, actions, 1), expected)
+        assert not shard.submit(worker_regions).result()
+    assert pool._shards[0] is shard
+
+def test_timeout_falls_back_to_thread(pool, turn):
+    state, actions = turn
+    rules = GameRules.get_instance()
+    expected = resolve_turn(rules, state, actions, random.Random(1))
+    pool.timeout = 1e-6
+
+    assert_same_result(pool.resolve(GAME_ID, rules, state, actions, 1), expected)
+    assert_same_result(pool.resolve(GAME_ID, rules, state, actions, 1), expected)
+    # Оба шарда остановлены, ходы обрабатываются в вызывающем потоке
+    assert pool._shards == [None, None]
+    assert_same_result(pool.resolve(GAME_ID, rules, state, actions, 1), expected)
+
+@pytest.mark.parametrize('games, processes', [(0, 1), (1, 1), (3, min(os.cpu_count() or 1, 3))])
+def test_processes_default_to_active_games(app, games, processes):
+    app.config.update(TURN_RESOLVER_PROCESSES=None)
+    pool = ResolverPool()
+    pool.init_app(app, games=games)
+    try:
+        assert pool.processes == len(pool._shards) == processes
+    finally:
+        pool.shutdown()
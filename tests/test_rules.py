@@ -0,0 +1,114 @@
+"""Правила игры: особые клетки по размеру карты, названия зданий и перечитывание файла правил"""
+import json
+import os
+
+import pytest
+
+from config import Config
+from app import db
+from app.models.game import Cell
+from app.models.user import Faction, User
+from app.rules import GameRules, RULE_SETTINGS, special_cells, start_positions
+
+def rule_settings(**overrides):
+    settings = {name: getattr(Config, name) for name in RULE_SETTINGS}
+    settings.update(overrides)
+    return settings
+
+@pytest.fixture
+def rules_file(app, tmp_path, monkeypatch):
+    """Файл переопределений правил приложения; прежние правила восстанавливаются после проверки"""
+    monkeypatch.setattr(GameRules, '_instance', GameRules._instance)
+    monkeypatch.setattr(GameRules, '_source_mtime', GameRules._source_mtime)
+    path = tmp_path / 'game_rules.json'
+    app.config['GAME_RULES_FILE'] = str(path)
+    written = []
+
+    def write(text):
+        path.write_text(text, encoding='utf-8')
+        # Время изменения растет при каждой записи, даже если часы файловой системы грубые
+        mtime = 1_000_000 + len(written)
+        os.utime(path, (mtime, mtime))
+        written.append(text)
+    return write
+
+def test_map_7x7_keeps_special_cells():
+    rules = GameRules(rule_settings(MAP_SIZE=7))
+
+    assert rules.castle_cells == {(0, 0), (0, 6), (6, 0), (6, 6)}
+    assert dict(rules.resource_bonus_cells) == {(1, 3): 'gold', (3, 1): 'wood', (3, 5): 'ore', (5, 3): 'stone'}
+    assert rules.combat_bonus_cell == (3, 3)
+
+@pytest.mark.parametrize('map_size', [3, 5, 8, 100])
+def test_special_cells_follow_map_size(map_size):
+    rules = GameRules(rule_settings(MAP_SIZE=map_size))
+    combat_cell = special_cells(map_size)[2]
+
+    assert rules.castle_cells == set(start_positions(map_size))
+    assert set(rules.resource_bonus_cells.values()) == {'gold', 'wood', 'stone', 'ore'}
+    assert rules.combat_bonus_cell == combat_cell
+    cells = list(rules.castle_cells) + list(rules.resource_bonus_cells) + [rules.combat_bonus_cell]
+    assert len(set(cells)) == len(cells) == 9
+    assert all(0 <= coordinate < map_size for cell in cells for coordinate in cell)
+
+@pytest.mark.parametrize('overrides', [
+    {'MAP_SIZE': 9, 'CASTLE_CELLS': [[0, 0], [0, 6], [6, 0], [6, 6]]},
+    {'MAP_SIZE': 5, 'COMBAT_BONUS_CELL': [5, 2]},
+    {'MAP_SIZE': 7, 'RESOURCE_BONUS_CELLS': [[3, 3, 'gold']]},
+    {'MAP_SIZE': 7, 'RESOURCE_BONUS_CELLS': [[1, 3, 'mana']]},
+    {'MAP_SIZE': 2},
+])
+def test_inconsistent_special_cells_are_rejected(overrides):
+    with pytest.raises(ValueError):
+        GameRules(rule_settings(**overrides))
+
+def test_building_name():
+    rules = GameRules.get_instance()
+
+    assert rules.building_name('BARRACKS') == 'Казармы'
+    assert rules.building_name('CASTLE') == 'Замок'
+    assert rules.building_name('TOWER') == 'Здание'
+
+@pytest.mark.parametrize('bad_file', [
+    '{"MAP_SIZE": 9, "CASTLE_CELLS": [[0, 0], [0, 6], [6, 0], [6, 6]]}',
+    '{"COMBAT_BONUS_CELL": [7, 7]}',
+    '{"WARRIOR_LIMIT": 5}',
+    '{"WARRIOR_COST": ',
+])
+def test_reload_keeps_rules_on_bad_file(app, rules_file, bad_file):
+    rules_file(json.dumps({'MAP_SIZE': 9}))
+    assert GameRules.reload_if_changed(app) is True
+    rules = GameRules.get_instance()
+    assert rules.map_size == 9 and rules.combat_bonus_cell == (4, 4)
+
+    rules_file(bad_file)
+    assert GameRules.reload_if_changed(app) is False
+    assert GameRules.get_instance() is rules
+
+    # Исправленный файл снова применяется
+    rules_file(json.dumps({'MAP_SIZE': 11}))
+    assert GameRules.reload_if_changed(app) is True
+    assert GameRules.get_instance().castle_cells == set(start_positions(11))
+
+def test_faction_page_follows_rules(app, rules_file):
+    rules_file(json.dumps({'RESOURCE_BONUS': 0.5, 'WARRIOR_MAINTENANCE': 2}))
+    assert GameRules.reload_if_changed(app) is True
+    with app.app_context():
+        faction = Faction.query.filter_by(game_id=1).order_by(Faction.id).first()
+        faction.warriors = 3
+        Cell.query.filter_by(game_id=1, x=1, y=3).one().faction_id = faction.id
+        user = User(username='player', email='player@example.com', full_name='Игрок', age=20,
+                    is_approved=True, faction_id=faction.id)
+        user.set_password('secret')
+        db.session.add(user)
+        db.session.commit()
+        user_id, faction_id = user.id, faction.id
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+
+    page = client.get(f'/faction/{faction_id}').get_data(as_text=True)
+
+    assert '+50%' in page and '+20%' not in page
+    assert 'Содержание воинов: -6 золота (3 воинов × 2 золота)' in page
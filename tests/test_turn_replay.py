@@ -0,0 +1,56 @@
+"""Воспроизведение ходов по журналу дает то же состояние мира, что и исходная обработка"""
+import json
+import shutil
+
+import pytest
+
+from app.turn_replay import replay_journal
+
+TURNS = 4
+
+@pytest.fixture
+def played_game(game_runner, tmp_path):
+    """Сыгранные TURNS ходов: (база перед первым ходом, журнал ходов, база после последнего хода)"""
+    source_db = str(tmp_path / 'source.db')
+    shutil.copyfile(game_runner.database_path, source_db)
+    game_runner.play(TURNS)
+    return source_db, game_runner.journal.path, game_runner.database_path
+
+def test_replay_reproduces_world(game_runner, played_game, tmp_path):
+    source_db, journal_path, played_db = played_game
+    target_db = str(tmp_path / 'replay.db')
+
+    timings = replay_journal(source_db, journal_path, target_db)
+
+    assert [turn for turn, _ in timings] == list(range(1, TURNS + 1))
+    played = game_runner.world(played_db)
+    assert played != game_runner.world(source_db)
+    assert any(defenders is not None for *_, defenders in played[0])
+    assert game_runner.world(target_db) == played
+
+def test_replay_of_turn_range(game_runner, played_game, tmp_path):
+    source_db, journal_path, played_db = played_game
+    first_db = str(tmp_path / 'first.db')
+    target_db = str(tmp_path / 'replay.db')
+
+    # Ходы воспроизводятся частями: сначала первые два, затем остальные поверх результата
+    replay_journal(source_db, journal_path, first_db, to_turn=2)
+    timings = replay_journal(first_db, journal_path, target_db, from_turn=3)
+
+    assert [turn for turn, _ in timings] == list(range(3, TURNS + 1))
+    assert game_runner.world(target_db) == game_runner.world(played_db)
+
+def test_replay_depends_on_journaled_seed(game_runner, played_game, tmp_path):
+    source_db, journal_path, played_db = played_game
+    changed_journal = str(tmp_path / 'changed.jsonl')
+    target_db = str(tmp_path / 'replay.db')
+    with open(journal_path, encoding='utf-8') as journal_file, \
+            open(changed_journal, 'w', encoding='utf-8') as changed_file:
+        for line in journal_file:
+            entry = json.loads(line)
+            entry['seed'] += 1
+            changed_file.write(json.dumps(entry) + '\n')
+
+    replay_journal(source_db, changed_journal, target_db)
+
+    assert game_runner.world(target_db) != game_runner.world(played_db)
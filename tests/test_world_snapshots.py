@@ -0,0 +1,140 @@
+"""Двоичные снимки мира: запись и чтение, поврежденные файлы, откат мира и версии снимков"""
+import os
+import sqlite3
+import time
+
+import pytest
+
+from app.game_manager import GameManager
+from app.snapshot_store import SnapshotFormatError, encode_snapshot, decode_snapshot
+from app.turn_journal import TurnJournal
+
+def restart(game_runner):
+    """Игра после перезапуска сервера: новый GameManager продолжает ее по диску и базе данных"""
+    restarted = GameManager(game_runner.manager.game_id)
+    restarted.app = game_runner.app
+    assert restarted._resume_from_store() is True
+    return restarted
+
+def test_snapshot_round_trip(game_runner):
+    game_runner.play(2)
+    snapshot = game_runner.manager.snapshot
+
+    decoded = decode_snapshot(encode_snapshot(snapshot), 5)
+    loaded = game_runner.store.load(snapshot.turn, 6)
+
+    assert (decoded.version, loaded.version) == (5, 6)
+    for restored in (decoded, loaded):
+        assert restored.turn == snapshot.turn == 3
+        assert restored.cells == snapshot.cells
+        assert restored.factions == snapshot.factions
+    assert any(cell.neutral_defenders is not None for cell in loaded.cells)
+
+@pytest.mark.parametrize('damage', ['flip', 'truncate'])
+def test_damaged_snapshot_is_rejected(game_runner, damage):
+    game_runner.play(1)
+    turn = game_runner.store.latest_turn()
+    path = game_runner.store.path_for(turn)
+    with open(path, 'r+b') as snapshot_file:
+        if damage == 'flip':
+            snapshot_file.seek(os.path.getsize(path) // 2)
+            byte = snapshot_file.read(1)
+            snapshot_file.seek(-1, os.SEEK_CUR)
+            snapshot_file.write(bytes([byte[0] ^ 0xFF]))
+        else:
+            snapshot_file.truncate(os.path.getsize(path) - 7)
+
+    with pytest.raises(SnapshotFormatError):
+        game_runner.store.load(turn, 1)
+
+    # Игра продолжается по базе данных, а не начинается заново
+    world = game_runner.world()
+    restarted = restart(game_runner)
+    assert restarted.current_turn == 2
+    assert game_runner.world() == world
+
+def test_rollback_restores_world(game_runner):
+    game_runner.play(1)
+    world_at_turn_2 = game_runner.world()
+    game_runner.play(2)
+    version = game_runner.manager.snapshot.version
+
+    game_runner.manager.rollback(2)
+
+    assert game_runner.world() == world_at_turn_2
+    assert game_runner.manager.current_turn == 2
+    assert game_runner.manager.snapshot.version > version
+    assert game_runner.journal.last_turn() == 1
+    assert game_runner.store.turns() == [2]
+
+def test_rollback_replays_journal_after_snapshot(game_runner):
+    game_runner.play(3)
+    world_at_turn_4 = game_runner.world()
+    game_runner.play(1)
+    # Остается только снимок хода 2: ходы 2 и 3 воспроизводятся по журналу
+    for turn in game_runner.store.turns():
+        if turn != 2:
+            os.remove(game_runner.store.path_for(turn))
+
+    game_runner.manager.rollback(4)
+
+    assert game_runner.world() == world_at_turn_4
+    assert game_runner.journal.last_turn() == 3
+
+def test_rollback_needs_snapshot(game_runner):
+    game_runner.play(1)
+    with pytest.raises(ValueError):
+        game_runner.manager.rollback(1)
+
+def test_versions_grow_across_restart(game_runner, monkeypatch):
+    game_runner.play(2)
+    version = game_runner.manager.snapshot.version
+
+    # Сервер перезапущен через минуту и продолжает игру по снимку на диске
+    started = time.time() + 60
+    monkeypatch.setattr(time, 'time', lambda: started)
+    restarted = restart(game_runner)
+
+    assert restarted.current_turn == 3
+    assert restarted.snapshot.version > version
+
+def assert_resumed_from_database(game_runner, turn):
+    """Перезапуск продолжает игру с хода turn базы данных, уже обработанные ходы не повторяются"""
+    world = game_runner.world()
+    restarted = restart(game_runner)
+
+    assert restarted.current_turn == restarted.snapshot.turn == turn
+    assert game_runner.world() == world
+    with sqlite3.connect(game_runner.database_path) as connection:
+        faction_gold = dict(connection.execute('SELECT id, gold FROM faction WHERE game_id = 1'))
+    assert {faction.id: faction.gold for faction in restarted.snapshot.factions} == faction_gold
+
+def test_restart_without_journal_continues_from_database(game_runner):
+    game_runner.journal.path = None
+    # Снимки на начало ходов 1 и 4, база данных - на начале хода 5
+    game_runner.store.interval = 3
+    game_runner.play(4)
+    assert game_runner.store.latest_turn() == 4
+
+    assert_resumed_from_database(game_runner, 5)
+
+def test_restart_after_failed_journal_write_continues_from_database(game_runner, monkeypatch):
+    game_runner.store.interval = 3
+    game_runner.play(3)
+
+    def fail(*args, **kwargs):
+        raise OSError('диск заполнен')
+    monkeypatch.setattr(TurnJournal, 'append', fail)
+    game_runner.play(1)
+    assert (game_runner.store.latest_turn(), game_runner.journal.last_turn()) == (4, 3)
+
+    assert_resumed_from_database(game_runner, 5)
+
+def test_versions_grow_while_clock_stands_still(game_runner, monkeypatch):
+    monkeypatch.setattr(time, 'time', lambda: 1000.0)
+    manager = game_runner.manager
+    versions = [manager.publish_snapshot().version for _ in range(3)]
+    game_runner.play(1)
+    versions.append(manager.snapshot.version)
+
+    assert versions == sorted(set(versions))